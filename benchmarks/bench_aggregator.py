@@ -0,0 +1,241 @@
+"""
+Replay a synthetic Kinesis batch through the aggregator against a stub candles table and
+report DynamoDB calls per record, next to the previous per-record write path. Rollup
+tiers are checked against the 1-minute candles they cover.
+
+The same ticks are then delivered out of order, a few seconds of jitter plus some held
+back for minutes: candles must match an in-order run without the held-back ticks, which
+must all end up in the late-tick side partition, and every candle the watermark has
+passed must be final.
+
+    python benchmarks/bench_aggregator.py --records 50 --symbols 1 --batches 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from botocore.exceptions import ClientError  # noqa: E402
+
+from harness import kinesis_event, load_lambda  # noqa: E402
+from stubs import StubDynamoDB, StubTable  # noqa: E402
+
+TABLE_NAME = "bench-candles"
+SYMBOLS = ["AAPL", "GOOGL", "MSFT", "AMZN", "TSLA", "META", "NVDA", "NFLX", "JPM", "V"]
+
+
+def synthetic_batches(num_batches: int, records_per_batch: int, num_symbols: int, seed: int) -> list[list[dict]]:
+    """Random-walk ticks, one second apart per symbol, spread round-robin over symbols."""
+    rng = random.Random(seed)
+    symbols = SYMBOLS[:num_symbols]
+    prices = {s: 100.0 + 50 * i for i, s in enumerate(symbols)}
+    clock = datetime(2026, 1, 5, 14, 30, tzinfo=timezone.utc)
+    batches = []
+    for _ in range(num_batches):
+        batch = []
+        for i in range(records_per_batch):
+            symbol = symbols[i % len(symbols)]
+            prices[symbol] = round(prices[symbol] * (1 + rng.gauss(0, 0.001)), 2)
+            if i % len(symbols) == 0:
+                clock += timedelta(seconds=1)
+            batch.append({
+                "symbol": symbol,
+                "price": prices[symbol],
+                "volume": rng.randint(100, 5000),
+                "change_percent": 0.0,
+                "timestamp": clock.isoformat(),
+                "source": "bench",
+            })
+        batches.append(batch)
+    return batches
+
+
+def parse_timestamp(ts: str) -> datetime:
+    """The bench's ISO timestamps ("Z" or "+00:00") as aware datetimes."""
+    return datetime.fromisoformat(ts.replace("Z", "+00:00"))
+
+
+def round_timestamp_to_minute(ts: str) -> str:
+    """Candle key of the minute `ts` falls in, as the previous write path computed it."""
+    return parse_timestamp(ts).replace(second=0, microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def legacy_per_record(table: StubTable, batch: list[dict], ttl_seconds: int) -> None:
+    """The previous write path: upsert plus conditional high and low per record."""
+    for data in batch:
+        price = Decimal(str(data["price"]))
+        key = {"symbol": data["symbol"], "candle_timestamp": round_timestamp_to_minute(data["timestamp"])}
+        table.update_item(
+            Key=key,
+            UpdateExpression="SET #close = :price, #vol = if_not_exists(#vol, :zero) + :v, #nt = if_not_exists(#nt, :zero) + :one, #open = if_not_exists(#open, :price), #high = if_not_exists(#high, :price), #low = if_not_exists(#low, :price), #ttl = :ttl",
+            ExpressionAttributeNames={"#close": "close", "#vol": "volume", "#nt": "num_trades", "#open": "open", "#high": "high", "#low": "low", "#ttl": "ttl"},
+            ExpressionAttributeValues={":price": price, ":v": data["volume"], ":one": 1, ":zero": 0, ":ttl": ttl_seconds},
+        )
+        for attr, op in (("high", "<"), ("low", ">")):
+            try:
+                table.update_item(
+                    Key=key,
+                    UpdateExpression=f"SET #{attr} = :price",
+                    ConditionExpression=f"attribute_not_exists(#{attr}) OR #{attr} {op} :price",
+                    ExpressionAttributeNames={f"#{attr}": attr},
+                    ExpressionAttributeValues={":price": price},
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+
+
+def shuffled_arrival(batches: list[list[dict]], jitter: int, hold_every: int, hold: int,
+                     seed: int) -> tuple[list[dict], list[dict]]:
+    """(arrival order, held-back ticks): each tick moves up to `jitter` places, and every
+    `hold_every`-th one arrives `hold` places late."""
+    rng = random.Random(seed)
+    ticks = [t for batch in batches for t in batch]
+    held = []
+    keyed = []
+    for i, tick in enumerate(ticks):
+        if hold_every and i % hold_every == hold_every - 1 and i + hold < len(ticks):
+            held.append(tick)
+            keyed.append((i + hold + 0.5, tick))
+        else:
+            keyed.append((i + rng.uniform(0, jitter), tick))
+    return [t for _, t in sorted(keyed, key=lambda entry: entry[0])], held
+
+
+def run_events(aggregator, table: StubTable, ticks: list[dict], batch_size: int) -> None:
+    aggregator.watermarks.STATES.clear()
+    aggregator._dynamodb = StubDynamoDB(table)
+    sequence = 1
+    for i in range(0, len(ticks), batch_size):
+        batch = ticks[i:i + batch_size]
+        aggregator.lambda_handler(kinesis_event(batch, first_sequence=sequence), None)
+        sequence += len(batch)
+
+
+def candle_fields(table: StubTable) -> dict:
+    fields = ("open", "high", "low", "close", "volume", "num_trades")
+    return {key: tuple(item.get(f) for f in fields) for key, item in table.items.items() if not key[0].startswith("__")}
+
+
+def report(label: str, table: StubTable, num_records: int, elapsed: float) -> None:
+    calls = ", ".join(f"{op}={n}" for op, n in sorted(table.calls.items()))
+    print(
+        f"{label:<12} calls/record={table.total_calls / num_records:6.3f}  "
+        f"conditional_failures={table.conditional_failures:<5d} "
+        f"candles={len(table.items):<5d} elapsed={elapsed * 1000:8.1f} ms  ({calls})"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=50, help="records per Kinesis batch")
+    parser.add_argument("--symbols", type=int, default=1, help="distinct symbols (max 10)")
+    parser.add_argument("--batches", type=int, default=20, help="number of batches to replay")
+    parser.add_argument("--rollups", default="5m,15m,1h,1d", help="ROLLUP_RESOLUTIONS for the folded run ('' for none)")
+    parser.add_argument("--jitter", type=int, default=20, help="places a tick may move in the out-of-order run")
+    parser.add_argument("--hold-every", type=int, default=97, help="hold back every n-th tick (0 for none)")
+    parser.add_argument("--hold-seconds", type=int, default=240, help="how long held-back ticks are delayed")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    aggregator = load_lambda("aggregator")
+    num_symbols = max(1, min(args.symbols, len(SYMBOLS)))
+    batches = synthetic_batches(args.batches, args.records, num_symbols, args.seed)
+    num_records = sum(len(b) for b in batches)
+    ttl_seconds = int(time.time()) + 86400
+
+    legacy_table = StubTable(TABLE_NAME, "symbol", "candle_timestamp")
+    start = time.perf_counter()
+    for batch in batches:
+        legacy_per_record(legacy_table, batch, ttl_seconds)
+    report("per-record", legacy_table, num_records, time.perf_counter() - start)
+
+    folded_table = StubTable(TABLE_NAME, "symbol", "candle_timestamp")
+    events = []
+    sequence = 1
+    for batch in batches:
+        events.append(kinesis_event(batch, first_sequence=sequence))
+        sequence += len(batch)
+    aggregator._dynamodb = StubDynamoDB(folded_table)
+    with mock.patch.dict(os.environ, {"DYNAMODB_TABLE": TABLE_NAME, "ROLLUP_RESOLUTIONS": args.rollups}):
+        start = time.perf_counter()
+        for event in events:
+            aggregator.lambda_handler(event, None)
+        elapsed = time.perf_counter() - start
+        report("folded", folded_table, num_records, elapsed)
+
+        # Replay every batch as a retried Kinesis batch would; candles must not change.
+        before = {key: dict(item) for key, item in folded_table.items.items()}
+        for event in events:
+            aggregator.lambda_handler(event, None)
+        replay_changed = sum(folded_table.items[key] != item for key, item in before.items())
+    print(f"candles changed by replaying every batch: {replay_changed}")
+
+    mismatched = [
+        key for key, item in legacy_table.items.items()
+        if any(folded_table.items.get(key, {}).get(f) != item[f] for f in ("open", "high", "low", "close", "volume", "num_trades"))
+    ]
+    print(f"candles differing between paths: {len(mismatched)}")
+
+    # Each rollup candle must equal the 1-minute candles it covers, folded from scratch.
+    tier_errors = 0
+    for (partition, bucket), item in folded_table.items.items():
+        if "#" not in partition or partition.startswith("__"):
+            continue
+        symbol, resolution = partition.split("#", 1)
+        seconds = aggregator.RESOLUTION_SECONDS[resolution]
+        start = parse_timestamp(bucket)
+        minutes = [
+            m for (s, ts), m in sorted(legacy_table.items.items())
+            if s == symbol and aggregator.bucket_start(parse_timestamp(ts), seconds) == start
+        ]
+        expected = {
+            "open": minutes[0]["open"],
+            "close": minutes[-1]["close"],
+            "high": max(m["high"] for m in minutes),
+            "low": min(m["low"] for m in minutes),
+            "volume": sum(m["volume"] for m in minutes),
+            "num_trades": sum(m["num_trades"] for m in minutes),
+        }
+        tier_errors += any(item[f] != v for f, v in expected.items())
+    print(f"rollup candles differing from 1m candles: {tier_errors}")
+
+    # Out-of-order delivery: event time decides open/close, held-back ticks are set aside.
+    arrival, held = shuffled_arrival(batches, jitter=args.jitter, hold_every=args.hold_every,
+                                     hold=args.hold_seconds * num_symbols, seed=args.seed)
+    held_ids = {id(t) for t in held}
+    in_order_table = StubTable(TABLE_NAME, "symbol", "candle_timestamp")
+    shuffled_table = StubTable(TABLE_NAME, "symbol", "candle_timestamp")
+    with mock.patch.dict(os.environ, {"DYNAMODB_TABLE": TABLE_NAME, "ROLLUP_RESOLUTIONS": args.rollups}):
+        run_events(aggregator, in_order_table, [t for b in batches for t in b if id(t) not in held_ids], args.records)
+        run_events(aggregator, shuffled_table, arrival, args.records)
+    expected, actual = candle_fields(in_order_table), candle_fields(shuffled_table)
+    differing = sum(expected.get(key) != value for key, value in actual.items()) + len(expected.keys() - actual.keys())
+    late_items = sum(1 for key in shuffled_table.items if key[0].startswith(aggregator.watermarks.LATE_PREFIX))
+    print(f"out-of-order candles differing from in-order: {differing}  late ticks set aside: {late_items} of {len(held)} held back")
+
+    lateness = int(os.environ.get("ALLOWED_LATENESS_SECONDS", aggregator.watermarks.DEFAULT_ALLOWED_LATENESS_SECONDS))
+    for label, table in (("in-order", in_order_table), ("out-of-order", shuffled_table)):
+        marks = [i for k, i in table.items.items() if k[0] == aggregator.watermarks.WATERMARK_PARTITION]
+        due = final = 0
+        for (partition, bucket), item in table.items.items():
+            if partition.startswith("__"):
+                continue
+            symbol, _, resolution = partition.partition("#")
+            mark = next(int(m["watermark_us"]) for m in marks if m["candle_timestamp"] == symbol)
+            end = aggregator.watermarks.candle_end_us(f"{resolution or '1m'}|{bucket}", aggregator.RESOLUTION_SECONDS)
+            if end + lateness * 1_000_000 <= mark:
+                due += 1
+                final += bool(item.get("final"))
+        print(f"{label:<12} candles past the watermark: {due}  final: {final}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Drive the anomaly detector through a market-wide sell-off and compare its alert stage
+configured as the old one-publish-per-anomaly path (no cooldown, digests of one, one
+publisher thread) with the default digests and cooldown. SNS and DynamoDB calls sleep
+--latency-ms each. Both runs must record the same anomalies; only the alerts differ.
+
+    python benchmarks/bench_alerts.py --symbols 50 --latency-ms 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from harness import kinesis_event, load_lambda  # noqa: E402
+from stubs import StubDynamoDB, StubSNS, StubTable  # noqa: E402
+
+PRICES_TABLE = "bench-prices"
+ANOMALY_TABLE = "bench-anomalies"
+START = datetime(2026, 1, 5, 14, 30, tzinfo=timezone.utc)
+MODES = {
+    "per-anomaly": {"ALERT_COOLDOWN_SECONDS": "0", "ALERT_DIGEST_MAX": "1", "ALERT_CONCURRENCY": "1"},
+    "digest+cooldown": {},
+}
+
+
+def sell_off(symbols: int, calm: int, falling: int, drop: float, seed: int) -> list[list[dict]]:
+    """One tick per symbol per minute: `calm` quiet minutes, then every symbol drops `drop`
+    a minute for `falling` minutes."""
+    rng = random.Random(seed)
+    names = [f"SYM{i:03d}" for i in range(symbols)]
+    prices = {s: 50 + rng.random() * 450 for s in names}
+    batches = []
+    for minute in range(calm + falling):
+        ts = (START + timedelta(minutes=minute)).isoformat()
+        batch = []
+        for symbol in names:
+            prices[symbol] *= 1 + rng.gauss(0, 0.001) - (drop if minute >= calm else 0.0)
+            batch.append({"symbol": symbol, "price": round(prices[symbol], 2), "volume": 1000, "timestamp": ts})
+        batches.append(batch)
+    return batches
+
+
+def run(detector, batches: list[list[dict]], latency: float, env: dict) -> dict:
+    prices = StubTable(PRICES_TABLE, "symbol", "timestamp")
+    anomalies = StubTable(ANOMALY_TABLE, "symbol", "detected_at", latency=latency)
+    sns = StubSNS(latency=latency)
+    detector._dynamodb = StubDynamoDB(prices, anomalies)
+    detector._sns = sns
+    detector.WINDOW_CACHE.clear()
+    # Cooldowns run on the stream's clock: one batch per minute.
+    clock = {"now": START.timestamp()}
+    detector.ALERT_COOLDOWNS = detector.alerts.Cooldowns(clock=lambda: clock["now"])
+    env = {"DYNAMODB_TABLE": PRICES_TABLE, "ANOMALY_TABLE": ANOMALY_TABLE, "SNS_TOPIC_ARN": "arn:bench", **env}
+    totals = {"anomalies": 0, "alerts_sent": 0, "alerts_suppressed": 0}
+    latencies = []
+    sequence = 1
+    with mock.patch.dict(os.environ, env):
+        for minute, batch in enumerate(batches):
+            clock["now"] = (START + timedelta(minutes=minute)).timestamp()
+            event = kinesis_event(batch, first_sequence=sequence)
+            sequence += len(batch)
+            start = time.perf_counter()
+            result = detector.lambda_handler(event, None)
+            latencies.append(time.perf_counter() - start)
+            totals["anomalies"] += result["anomalies_detected"]
+            totals["alerts_sent"] += result.get("alerts_sent", 0)
+            totals["alerts_suppressed"] += result.get("alerts_suppressed", 0)
+            for tick in batch:
+                prices.put_item(Item={"symbol": tick["symbol"], "timestamp": tick["timestamp"], "price": str(tick["price"])})
+    totals.update({
+        "publishes": sns.calls["Publish"],
+        "worst_ms": max(latencies) * 1000,
+        "total_ms": sum(latencies) * 1000,
+        "recorded": {key for key in anomalies.items if not str(key[0]).startswith("__")},
+    })
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--calm-minutes", type=int, default=40)
+    parser.add_argument("--falling-minutes", type=int, default=10)
+    parser.add_argument("--drop", type=float, default=0.02, help="fractional drop per minute during the sell-off")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="stub latency per SNS / anomaly-table call")
+    parser.add_argument("--seed", type=int, default=21)
+    args = parser.parse_args()
+
+    detector = load_lambda("anomaly_detector")
+    batches = sell_off(args.symbols, args.calm_minutes, args.falling_minutes, args.drop, args.seed)
+    results = {}
+    for label, env in MODES.items():
+        results[label] = r = run(detector, batches, args.latency_ms / 1000, env)
+        print(
+            f"{label:<16} anomalies={r['anomalies']:<5d} alerted={r['alerts_sent']:<5d} "
+            f"suppressed={r['alerts_suppressed']:<5d} publishes={r['publishes']:<5d} "
+            f"worst batch={r['worst_ms']:8.1f} ms  total={r['total_ms']:8.1f} ms"
+        )
+    first, second = (results[label]["recorded"] for label in MODES)
+    print(f"anomalies differing between runs: {len(first ^ second)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Replay ingestion ticks through the anomaly detector against stub tables and report
+history reads per batch, cold (state cache cleared before every invocation) versus warm
+(cache kept, as in a reused Lambda container). Both runs must flag the same anomalies.
+
+    python benchmarks/bench_anomaly_detector.py --symbols 10 --batches 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from harness import kinesis_event, load_lambda  # noqa: E402
+from stubs import StubDynamoDB, StubSNS, StubTable  # noqa: E402
+
+PRICES_TABLE = "bench-prices"
+ANOMALY_TABLE = "bench-anomalies"
+SYMBOLS = ["AAPL", "GOOGL", "MSFT", "AMZN", "TSLA", "META", "NVDA", "NFLX", "JPM", "V"]
+
+
+def tick_batches(num_batches: int, num_symbols: int, seed: int, spike_rate: float) -> list[list[dict]]:
+    """One tick per symbol per batch (like one ingestion cycle), with occasional spikes."""
+    rng = random.Random(seed)
+    symbols = [SYMBOLS[i] if i < len(SYMBOLS) else f"SYM{i}" for i in range(num_symbols)]
+    prices = {s: 100.0 + 10 * i for i, s in enumerate(symbols)}
+    clock = datetime(2026, 1, 5, 14, 30, tzinfo=timezone.utc)
+    batches = []
+    for _ in range(num_batches):
+        clock += timedelta(seconds=60)
+        batch = []
+        for symbol in symbols:
+            prices[symbol] *= 1 + rng.gauss(0, 0.002)
+            price = prices[symbol] * (1.05 if rng.random() < spike_rate else 1.0)
+            batch.append({"symbol": symbol, "price": round(price, 2), "volume": 1000, "timestamp": clock.isoformat()})
+        batches.append(batch)
+    return batches
+
+
+def run(detector, batches: list[list[dict]], warm: bool) -> tuple[StubTable, StubTable, float]:
+    prices = StubTable(PRICES_TABLE, "symbol", "timestamp")
+    anomalies = StubTable(ANOMALY_TABLE, "symbol", "detected_at")
+    dynamodb = StubDynamoDB(prices, anomalies)
+    detector.WINDOW_CACHE.clear()
+    detector.ALERT_COOLDOWNS.clear()
+    detector._dynamodb = dynamodb
+    detector._sns = StubSNS()
+    env = {"DYNAMODB_TABLE": PRICES_TABLE, "ANOMALY_TABLE": ANOMALY_TABLE, "SNS_TOPIC_ARN": "arn:bench"}
+    elapsed = 0.0
+    sequence = 1
+    with mock.patch.dict(os.environ, env):
+        for batch in batches:
+            if not warm:
+                detector.WINDOW_CACHE.clear()
+            event = kinesis_event(batch, first_sequence=sequence)
+            sequence += len(batch)
+            start = time.perf_counter()
+            detector.lambda_handler(event, None)
+            elapsed += time.perf_counter() - start
+            # Stand in for the price processor, which stores the same ticks concurrently.
+            for tick in batch:
+                prices.put_item(Item={"symbol": tick["symbol"], "timestamp": tick["timestamp"], "price": str(tick["price"])})
+    return prices, anomalies, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=10)
+    parser.add_argument("--batches", type=int, default=200)
+    parser.add_argument("--spike-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    detector = load_lambda("anomaly_detector")
+    batches = tick_batches(args.batches, args.symbols, args.seed, args.spike_rate)
+    results = {}
+    for label, warm in (("cold", False), ("warm", True)):
+        prices, anomalies, elapsed = run(detector, batches, warm)
+        counters = [item for key, item in anomalies.items.items() if key[0] == detector.ANOMALY_COUNTER_PARTITION]
+        results[label] = {key for key in anomalies.items if not key[0].startswith("__")}  # counters, cooldowns
+        print(
+            f"{label:<5} history queries/batch={prices.calls['Query'] / len(batches):6.2f}  "
+            f"anomalies={len(results[label]):<4d} counted={sum(int(c['count']) for c in counters):<4d} "
+            f"elapsed={elapsed * 1000:8.1f} ms"
+        )
+    print(f"anomalies differing between runs: {len(results['cold'] ^ results['warm'])}")
+
+
+if __name__ == "__main__":
+    main()
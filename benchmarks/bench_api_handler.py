@@ -0,0 +1,237 @@
+"""
+Measure what each dashboard API route costs in DynamoDB calls and wall time, against stub
+tables filled by running the real price processor over synthetic ticks.
+
+    python benchmarks/bench_api_handler.py --symbols 200 --ticks 20 --latency-ms 5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from harness import kinesis_event, load_lambda  # noqa: E402
+from stubs import StubDynamoDB, StubDynamoDBClient, StubTable  # noqa: E402
+
+PRICES_TABLE = "bench-prices"
+CANDLES_TABLE = "bench-candles"
+ANOMALY_TABLE = "bench-anomalies"
+
+
+def synthetic_ticks(symbols: list[str], ticks: int, seed: int) -> list[list[dict]]:
+    """One batch per tick interval, each with one record per symbol."""
+    rng = random.Random(seed)
+    clock = datetime.now(timezone.utc) - timedelta(minutes=ticks)
+    prices = {s: 100 + rng.random() * 400 for s in symbols}
+    batches = []
+    for _ in range(ticks):
+        clock += timedelta(minutes=1)
+        batch = []
+        for symbol in symbols:
+            prices[symbol] *= 1 + rng.gauss(0, 0.002)
+            batch.append({
+                "symbol": symbol,
+                "price": round(prices[symbol], 2),
+                "volume": rng.randint(100, 5000),
+                "change_percent": round(rng.gauss(0, 1), 3),
+                "timestamp": clock.isoformat(),
+                "source": "bench",
+            })
+        batches.append(batch)
+    return batches
+
+
+def legacy_latest_prices(prices_table, symbols: list[str]) -> dict:
+    """The previous GET /prices: one Limit=1 descending query per symbol."""
+    results = {}
+    for symbol in symbols:
+        r = prices_table.query(
+            KeyConditionExpression="symbol = :s",
+            ExpressionAttributeValues={":s": symbol},
+            Limit=1,
+            ScanIndexForward=False,
+        )
+        for item in r.get("Items", []):
+            results[symbol] = item.get("price")
+    return results
+
+
+def legacy_events_last_hour(prices_table, symbols: list[str]) -> int:
+    """The previous /stats event count: one Select=COUNT query per symbol over the last hour."""
+    one_hour_ago = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    total = 0
+    for symbol in symbols:
+        r = prices_table.query(
+            KeyConditionExpression="symbol = :s AND #ts >= :t",
+            ExpressionAttributeNames={"#ts": "timestamp"},
+            ExpressionAttributeValues={":s": symbol, ":t": one_hour_ago},
+            Select="COUNT",
+        )
+        total += r.get("Count", 0)
+    return total
+
+
+def poll(get, dashboards: int, rounds: int) -> tuple[int, int, int]:
+    """Each dashboard fetches /prices, /stats and /anomalies every round, sending back the
+    ETag it last saw. Returns (requests, 304s, body bytes)."""
+    etags: dict[tuple, str] = {}
+    requests = not_modified = body_bytes = 0
+    for _ in range(rounds):
+        for dashboard in range(dashboards):
+            for path, query in (("/prices", None), ("/stats", None), ("/anomalies", {"limit": "20"})):
+                headers = {"If-None-Match": etags[(dashboard, path)]} if (dashboard, path) in etags else {}
+                resp = get(path, query, headers)
+                requests += 1
+                not_modified += resp["statusCode"] == 304
+                body_bytes += len(resp["body"])
+                if "ETag" in resp["headers"]:
+                    etags[(dashboard, path)] = resp["headers"]["ETag"]
+    return requests, not_modified, body_bytes
+
+
+def candle_polls(api, aggregator, batches: list[list[dict]], loaded: int, dashboards: int, env: dict,
+                 cache_partitions: int, others: list[StubTable]) -> tuple[StubTable, list[str]]:
+    """Aggregate the first `loaded` batches, then each remaining batch is followed by every
+    dashboard fetching each default symbol's 1m chart. Returns the table and the bodies."""
+    table = StubTable(CANDLES_TABLE, "symbol", "candle_timestamp")
+    aggregator.watermarks.STATES.clear()
+    aggregator._dynamodb = StubDynamoDB(table)
+    api._dynamodb = StubDynamoDB(table, *others)
+    api._candle_cache = None
+    bodies = []
+    sequence = 1
+    with mock.patch.dict(os.environ, {**env, "DYNAMODB_TABLE": CANDLES_TABLE, "RESPONSE_CACHE_ENABLED": "false",
+                                      "CANDLE_CACHE_MAX_PARTITIONS": str(cache_partitions)}):
+        for i, batch in enumerate(batches):
+            aggregator.lambda_handler(kinesis_event(batch, first_sequence=sequence), None)
+            sequence += len(batch)
+            if i == loaded - 1:
+                table.calls.clear()
+                table.items_scanned = 0
+            if i < loaded:
+                continue
+            for _ in range(dashboards):
+                for symbol in api.SYMBOLS:
+                    event = {"requestContext": {"http": {"method": "GET"}}, "rawPath": f"/candles/{symbol}",
+                             "queryStringParameters": {"limit": "500"}, "headers": {}}
+                    bodies.append(api.lambda_handler(event, None)["body"])
+    return table, bodies
+
+
+def timed(label: str, tables: list[StubTable], fn) -> object:
+    before = {t.name: t.total_calls for t in tables}
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    calls = sum(t.total_calls - before[t.name] for t in tables)
+    print(f"{label:<22} {elapsed * 1000:8.1f} ms  dynamodb_calls={calls}")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=200, help="symbols tracked (the 10 defaults plus synthetic ones)")
+    parser.add_argument("--ticks", type=int, default=20, help="ingestion ticks to load before measuring")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="simulated DynamoDB round trip")
+    parser.add_argument("--dashboards", type=int, default=50, help="polling clients for the cache comparison")
+    parser.add_argument("--candle-rounds", type=int, default=10, help="new minutes while dashboards poll /candles")
+    parser.add_argument("--stats-shards", type=int, default=8, help="STATS_SHARDS for the fan-out comparison")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    processor = load_lambda("price_processor")
+    aggregator = load_lambda("aggregator")
+    api = load_lambda("api_handler")
+
+    symbols = list(api.SYMBOLS) + [f"SYM{i:04d}" for i in range(max(0, args.symbols - len(api.SYMBOLS)))]
+    prices = StubTable(PRICES_TABLE, "symbol", "timestamp")
+    candles = StubTable(CANDLES_TABLE, "symbol", "candle_timestamp")
+    anomalies = StubTable(ANOMALY_TABLE, "symbol", "detected_at", indexes={"by_time": ("time_bucket", "detected_at")})
+    tables = [prices, candles, anomalies]
+
+    processor._dynamodb_client = StubDynamoDBClient(prices)
+    with mock.patch.dict(os.environ, {"DYNAMODB_TABLE": PRICES_TABLE}):
+        for i, batch in enumerate(synthetic_ticks(symbols, args.ticks, args.seed)):
+            processor.lambda_handler(kinesis_event(batch, first_sequence=1 + i * len(batch)), None)
+
+    for table in tables:
+        table.latency = args.latency_ms / 1000
+    env = {"PRICES_TABLE": PRICES_TABLE, "CANDLES_TABLE": CANDLES_TABLE, "ANOMALY_TABLE": ANOMALY_TABLE}
+    api._dynamodb = StubDynamoDB(*tables)
+
+    def get(path: str, query: dict | None = None, headers: dict | None = None) -> dict:
+        event = {"requestContext": {"http": {"method": "GET"}}, "rawPath": path,
+                 "queryStringParameters": query, "headers": headers or {}}
+        return api.lambda_handler(event, None)
+
+    print(f"{len(symbols)} symbols, {args.ticks} ticks each, {args.latency_ms} ms per call")
+    legacy = timed("/prices (per-symbol)", tables, lambda: legacy_latest_prices(prices, symbols))
+    legacy_events = timed("events/hour (COUNT)", tables, lambda: legacy_events_last_hour(prices, symbols))
+    with mock.patch.dict(os.environ, {**env, "RESPONSE_CACHE_ENABLED": "false"}):
+        resp = timed("/prices", tables, lambda: get("/prices"))
+        stats = json.loads(timed("/stats", tables, lambda: get("/stats"))["body"])
+        timed("/anomalies", tables, lambda: get("/anomalies", {"limit": "20"}))
+
+    for enabled in ("false", "true"):
+        api.get_response_cache().clear()
+        with mock.patch.dict(os.environ, {**env, "RESPONSE_CACHE_ENABLED": enabled}):
+            before = sum(t.total_calls for t in tables)
+            start = time.perf_counter()
+            requests, not_modified, body_bytes = poll(get, args.dashboards, 2)
+            elapsed = time.perf_counter() - start
+        calls = sum(t.total_calls for t in tables) - before
+        print(
+            f"{args.dashboards} dashboards x2 polls, cache={enabled:<5}  requests={requests}  dynamodb_calls={calls}  "
+            f"304s={not_modified}  body_bytes={body_bytes}  elapsed={elapsed * 1000:.0f} ms"
+        )
+
+    # Fan-out: a cold snapshot (every symbol falls back to its own query) and sharded stats
+    # counters, read one at a time vs concurrently, then with a deadline shorter than a call.
+    snapshot = prices.items.pop(("__latest__#0", "snapshot"))
+    fanout_env = {**env, "RESPONSE_CACHE_ENABLED": "false", "STATS_SHARDS": str(args.stats_shards)}
+    for workers in ("1", "16"):
+        with mock.patch.dict(os.environ, {**fanout_env, "FANOUT_MAX_WORKERS": workers}):
+            timed(f"/prices cold, {workers:>2} wkr", tables, lambda: get("/prices"))
+            timed(f"/stats {args.stats_shards} shards, {workers:>2} wkr", tables, lambda: get("/stats"))
+    deadline = args.latency_ms / 2000
+    with mock.patch.dict(os.environ, {**fanout_env, "FANOUT_DEADLINE_SECONDS": str(deadline)}):
+        partial = json.loads(get("/stats")["body"])
+    print(f"/stats with a {deadline * 1000:.1f} ms deadline: partial={partial.get('partial', False)} "
+          f"missing={len(partial.get('missing', []))}")
+    prices.items[("__latest__#0", "snapshot")] = snapshot
+
+    # /candles while new minutes arrive: final candles are served from the candle cache,
+    # so each poll reads only the open ones.
+    candle_batches = synthetic_ticks(list(api.SYMBOLS), args.ticks + args.candle_rounds, args.seed)
+    results = {}
+    for partitions in (0, 256):
+        table, bodies = candle_polls(api, aggregator, candle_batches, args.ticks, 5, env, partitions,
+                                     [prices, anomalies])
+        queries = table.calls["Query"]
+        results[partitions] = bodies
+        print(f"/candles x{len(bodies)}, candle cache={'on' if partitions else 'off':<3}  queries={queries}  "
+              f"items read={table.items_scanned}  ({table.items_scanned / max(1, queries):.1f} per query)")
+    def candles(body: str) -> list[dict]:  # TTLs follow the wall clock of each run
+        return [{k: v for k, v in c.items() if k != "ttl"} for c in json.loads(body)["candles"]]
+
+    differing = sum(candles(a) != candles(b) for a, b in zip(*results.values()))
+    print(f"/candles responses differing with the cache: {differing}")
+    api._dynamodb = StubDynamoDB(*tables)
+
+    served = json.loads(resp["body"])["prices"]
+    mismatched = [s for s in symbols if str(served.get(s, {}).get("price")) != str(legacy.get(s))]
+    print(f"symbols served={len(served)}  mismatched vs per-symbol queries={len(mismatched)}")
+    print(
+        f"events_last_hour={stats['events_last_hour']} (COUNT queries: {legacy_events})  "
+        f"pipeline_status={stats['pipeline_status']}  ingest_lag_ms={stats['ingest_lag_ms']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Cold-start cost per handler. Every run is a fresh interpreter that
+
+  import   imports lambda_function, as the Lambda init phase does
+  clients  creates the handler's AWS clients with real boto3 (placeholder credentials and
+           region; nothing is sent), as its first invocation does unless preloaded
+  first    handles one event against the stand-ins from suite.py
+  warm     handles a second one
+
+and reports the median over --runs, with the modules the import loaded and whether boto3
+was among them. The handlers run from a temporary copy of lambdas/, either as source only
+(every module compiled on import; /var/task is read-only, so a package without bytecode
+pays this on every cold start) or precompiled the way scripts/package_lambdas.sh ships
+them. --preload sets PRELOAD_AWS_CLIENTS=true, as the deployed functions are, which moves
+client creation into the import.
+
+Timings are at full CPU; a 128 MB function gets a fraction of a vCPU, so scale them up.
+
+    python benchmarks/bench_cold_start.py --runs 5
+    python benchmarks/bench_cold_start.py --only api_handler,price_processor --preload
+"""
+import argparse
+import compileall
+import contextlib
+import json
+import os
+import py_compile
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR))
+
+import harness  # noqa: E402  (light: no boto3, no handler modules)
+
+HANDLERS = ("data_ingester", "price_processor", "aggregator", "anomaly_detector", "stream_broadcaster",
+            "lake_transformer", "api_handler")
+# Client getters per handler, as its first invocation would call them.
+CLIENT_GETTERS = {
+    "data_ingester": lambda m: m.get_kinesis(),
+    "price_processor": lambda m: m.get_dynamodb_client(),
+    "aggregator": lambda m: m.get_dynamodb(),
+    "anomaly_detector": lambda m: (m.get_dynamodb(), m.get_sns()),
+    "stream_broadcaster": lambda m: (m.get_dynamodb(),
+                                     m.get_management("https://bench.execute-api.us-east-1.amazonaws.com/prod")),
+    "lake_transformer": lambda m: None,
+    "api_handler": lambda m: m.get_dynamodb(),
+}
+CHILD_ENV = {
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "bench",
+    "AWS_SECRET_ACCESS_KEY": "bench",
+    "AWS_EC2_METADATA_DISABLED": "true",
+    "PYTHONDONTWRITEBYTECODE": "1",
+}
+COLUMNS = ("import_ms", "clients_ms", "first_ms", "cold_ms", "warm_ms")
+
+
+def child(name: str, lambdas_dir: str) -> dict:
+    """One cold start of `name`, measured in this (fresh) interpreter."""
+    harness.LAMBDAS_DIR = Path(lambdas_dir)
+    harness.SHARED_DIR = harness.LAMBDAS_DIR / "shared"
+    before = len(sys.modules)
+    with contextlib.redirect_stdout(None):
+        start = time.perf_counter()
+        module = harness.load_lambda(name)
+        import_s = time.perf_counter() - start
+    result = {"modules": len(sys.modules) - before, "boto3": "boto3" in sys.modules}
+
+    start = time.perf_counter()
+    CLIENT_GETTERS[name](module)
+    clients_s = time.perf_counter() - start
+
+    # The stand-ins (and suite's own imports) come after the measured import.
+    import loadgen
+    import suite
+
+    stream, _ = suite.build_stream(loadgen.StreamSpec(symbols=10, seconds=60, seed=19), batch_size=100)
+    args = argparse.Namespace(seed=19, latency=0.0, connections=100, ingest_invocations=2)
+    run = suite.CASES[name](stream, args)
+    timings = []
+    try:
+        with mock.patch.dict(os.environ, {**suite.HANDLER_ENV, **run.env}), contextlib.redirect_stdout(None):
+            for event in run.events[:2]:
+                start = time.perf_counter()
+                run.handler(event, None)
+                timings.append(time.perf_counter() - start)
+    finally:
+        if run.teardown:
+            run.teardown()
+    first_s, warm_s = timings[0], timings[-1]
+    result.update({
+        "import_ms": import_s * 1000,
+        "clients_ms": clients_s * 1000,
+        "first_ms": first_s * 1000,
+        "cold_ms": (import_s + clients_s + first_s) * 1000,
+        "warm_ms": warm_s * 1000,
+    })
+    return result
+
+
+def stage_lambdas(root: Path, compiled: bool) -> Path:
+    """Copy lambdas/ under root; compiled copies get the bytecode package_lambdas.sh ships."""
+    target = root / ("compiled" if compiled else "source")
+    shutil.copytree(harness.LAMBDAS_DIR, target,
+                    ignore=shutil.ignore_patterns("__pycache__", "*.pyc", "*.zip", "requirements.txt"))
+    if compiled:
+        compileall.compile_dir(target, quiet=1, invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+    return target
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help=f"comma separated subset of: {', '.join(HANDLERS)}")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per handler and mode")
+    parser.add_argument("--modes", default="source,compiled", help="source, compiled or both")
+    parser.add_argument("--preload", action="store_true", help="PRELOAD_AWS_CLIENTS=true in the handlers")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--lambdas", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child, args.lambdas)))
+        return
+
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(HANDLERS)
+    unknown = [n for n in names if n not in HANDLERS]
+    if unknown:
+        parser.error(f"unknown handlers: {', '.join(unknown)}")
+    modes = [m.strip() for m in args.modes.split(",")]
+    env = {**os.environ, **CHILD_ENV, "PRELOAD_AWS_CLIENTS": "true" if args.preload else "false"}
+
+    print(f"median of {args.runs} fresh interpreters; preload={'on' if args.preload else 'off'}")
+    print(f"{'handler':<19} {'mode':<9} {'import':>8} {'clients':>8} {'first':>8} {'cold':>8} {'warm':>8} "
+          f"{'modules':>8}  boto3 at import")
+    with tempfile.TemporaryDirectory() as tmp:
+        dirs = {mode: stage_lambdas(Path(tmp), mode == "compiled") for mode in modes}
+        for name in names:
+            for mode in modes:
+                runs = []
+                for _ in range(max(1, args.runs)):
+                    proc = subprocess.run(
+                        [sys.executable, __file__, "--child", name, "--lambdas", str(dirs[mode])],
+                        env=env, capture_output=True, text=True, check=True,
+                    )
+                    runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+                median = {c: statistics.median(r[c] for r in runs) for c in COLUMNS}
+                print(f"{name:<19} {mode:<9} " + " ".join(f"{median[c]:>8.1f}" for c in COLUMNS)
+                      + f" {runs[0]['modules']:>8d}  {'yes' if runs[0]['boto3'] else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+The anomaly detector's cross-symbol correlation (lambdas/anomaly_detector/correlation.py).
+
+  accuracy  feeds --steps rounds of one-factor returns for --symbols symbols through the
+            engine and compares its incrementally updated covariance with the same
+            exponentially weighted covariance recomputed from every return
+  handler   drives the detector through a calm market, one symbol jumping on its own and
+            a market-wide sell-off, with CORRELATION_ENABLED off and on: alerts sent, the
+            MARKET anomaly, folded alerts and the divergence
+  scale     per-step update and scoring time, state size and snapshot encode / decode /
+            restore for --scale symbol counts
+
+    python benchmarks/bench_correlation.py
+    python benchmarks/bench_correlation.py --scale 100,300,500,1000 --steps 300
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from harness import kinesis_event, load_lambda  # noqa: E402
+from stubs import StubDynamoDB, StubSNS, StubTable  # noqa: E402
+
+PRICES_TABLE = "bench-prices"
+ANOMALY_TABLE = "bench-anomalies"
+START = datetime(2026, 1, 5, 14, 30, tzinfo=timezone.utc)
+
+
+def factor_returns(symbols: int, steps: int, seed: int, noise: float = 0.001,
+                   drops: np.ndarray | None = None) -> np.ndarray:
+    """(steps x symbols) log returns: a common market factor (less `drops`, per step) times
+    a per-symbol beta, plus noise."""
+    rng = np.random.default_rng(seed)
+    betas = rng.uniform(0.5, 1.5, symbols)
+    market = rng.normal(0, noise, steps) - (drops if drops is not None else 0.0)
+    return np.outer(market, betas) + rng.normal(0, noise, (steps, symbols))
+
+
+def feed(engine, names: list[str], prices: np.ndarray) -> tuple[list, list[float]]:
+    """One round per row of `prices`, a minute apart; returns the events and per-step seconds."""
+    engine.track(names)
+    events, timings = [], []
+    for step, row in enumerate(prices):
+        when = START + timedelta(minutes=step)
+        micros = int(when.timestamp() * 1_000_000)
+        ts = when.isoformat()
+        for symbol, price in zip(names, row):
+            engine.add(symbol, micros, float(price), ts)
+        start = time.perf_counter()
+        events.extend(engine.flush())
+        timings.append(time.perf_counter() - start)
+    return events, timings
+
+
+def batch_covariance(returns: np.ndarray, alpha: float) -> np.ndarray:
+    """The exponentially weighted covariance the engine's recursion converges to, from all
+    returns at once. Starting from zero state counts as one zero return before the first."""
+    observations = np.vstack([np.zeros(returns.shape[1]), returns])
+    n = len(returns)
+    weights = alpha * (1 - alpha) ** np.arange(n - 1, -1, -1)
+    weights = np.concatenate([[(1 - alpha) ** n], weights])
+    mean = weights @ observations
+    centered = observations - mean
+    return (centered * weights[:, None]).T @ centered
+
+
+def accuracy(correlation, symbols: int, steps: int, window: int, seed: int) -> None:
+    names = [f"SYM{i:03d}" for i in range(symbols)]
+    returns = factor_returns(symbols, steps, seed)
+    prices = 100 * np.exp(np.vstack([np.zeros(symbols), np.cumsum(returns, axis=0)]))
+    engine = correlation.CorrelationEngine(window=window, min_steps=steps + 1)
+    feed(engine, names, prices)
+    expected = batch_covariance(returns, engine.alpha)
+    cov_error = np.max(np.abs(engine.cov - expected)) / np.max(np.abs(expected))
+    sd = np.sqrt(np.diagonal(expected))
+    corr_error = np.nanmax(np.abs(engine.correlations() - expected / np.outer(sd, sd)))
+    print(f"accuracy: {symbols} symbols, {steps} steps, window {window}: "
+          f"covariance max relative error {cov_error:.2e}, correlation max error {corr_error:.2e}")
+
+
+def scenario(symbols: int, calm: int, falling: int, drop: float, jump: float, seed: int) -> tuple[list[list[dict]], str, int]:
+    """One tick per symbol per minute of a one-factor market. SYM000 jumps `jump` on its
+    own late in the calm, then the market drops `drop` a minute (each symbol by its beta)."""
+    names = [f"SYM{i:03d}" for i in range(symbols)]
+    drops = np.where(np.arange(calm + falling) >= calm, drop, 0.0)
+    returns = factor_returns(symbols, calm + falling, seed, drops=drops)
+    jump_minute = calm - 5
+    returns[jump_minute, 0] += jump
+    prices = 50 * np.exp(np.cumsum(returns, axis=0))
+    batches = []
+    for minute, row in enumerate(prices):
+        ts = (START + timedelta(minutes=minute)).isoformat()
+        batches.append([{"symbol": s, "price": round(float(p), 4), "volume": 1000, "timestamp": ts}
+                        for s, p in zip(names, row)])
+    return batches, names[0], jump_minute
+
+
+def run_handler(detector, batches: list[list[dict]], env: dict) -> dict:
+    prices = StubTable(PRICES_TABLE, "symbol", "timestamp")
+    anomalies = StubTable(ANOMALY_TABLE, "symbol", "detected_at")
+    sns = StubSNS()
+    detector._dynamodb = StubDynamoDB(prices, anomalies)
+    detector._sns = sns
+    detector.WINDOW_CACHE.clear()
+    detector.CORRELATIONS = None
+    clock = {"now": START.timestamp()}
+    detector.ALERT_COOLDOWNS = detector.alerts.Cooldowns(clock=lambda: clock["now"])
+    env = {"DYNAMODB_TABLE": PRICES_TABLE, "ANOMALY_TABLE": ANOMALY_TABLE, "SNS_TOPIC_ARN": "arn:bench", **env}
+    totals = {"anomalies": 0, "alerts_sent": 0, "market_moves": 0, "divergences": 0, "alerts_folded": 0}
+    latencies = []
+    sequence = 1
+    with mock.patch.dict(os.environ, env), mock.patch("time.time", lambda: clock["now"]):
+        for minute, batch in enumerate(batches):
+            clock["now"] = (START + timedelta(minutes=minute)).timestamp()
+            event = kinesis_event(batch, first_sequence=sequence)
+            sequence += len(batch)
+            start = time.perf_counter()
+            result = detector.lambda_handler(event, None)
+            latencies.append((time.perf_counter() - start) * 1000)
+            totals["anomalies"] += result["anomalies_detected"]
+            for key in ("alerts_sent", "market_moves", "divergences", "alerts_folded"):
+                totals[key] += result.get(key, 0)
+            for tick in batch:
+                prices.put_item(Item={"symbol": tick["symbol"], "timestamp": tick["timestamp"], "price": str(tick["price"])})
+    totals["table"] = anomalies
+    totals["batch_ms"] = statistics.median(latencies)
+    return totals
+
+
+def handler(detector, args) -> None:
+    batches, jumper, jump_minute = scenario(args.symbols, args.calm_minutes, args.falling_minutes,
+                                            args.drop, args.jump, args.seed)
+    env = {"CORRELATION_MIN_STEPS": str(min(30, args.calm_minutes - 10))}
+    runs = {}
+    for label, enabled in (("correlation off", "false"), ("correlation on", "true")):
+        runs[label] = r = run_handler(detector, batches, {**env, "CORRELATION_ENABLED": enabled})
+        print(f"{label:<16} anomalies={r['anomalies']:<5d} alerts={r['alerts_sent']:<5d} "
+              f"market moves={r['market_moves']:<3d} folded={r['alerts_folded']:<5d} "
+              f"divergences={r['divergences']:<3d} median batch={r['batch_ms']:.1f} ms")
+    table = runs["correlation on"]["table"]
+    items = table.items
+    market = sorted(key[1] for key in items if key[0] == detector.correlation.MARKET_SYMBOL)
+    first_drop = (START + timedelta(minutes=args.calm_minutes)).isoformat()
+    jump_at = (START + timedelta(minutes=jump_minute)).isoformat()
+    jumped = items.get((jumper, jump_at), {})
+    print(f"MARKET anomalies: {len(market)}, first at the sell-off's first minute: {bool(market) and market[0] == first_drop}")
+    print(f"{jumper}'s jump recorded with detectors {jumped.get('detectors')}")
+    saved = detector.correlation_state.load(table)
+    if saved is not None:
+        chunks = sum(1 for key in items if key[0] == detector.correlation_state.CORRELATION_PARTITION) - 1
+        print(f"saved state: {len(saved[0].symbols)} symbols, {saved[0].steps} steps, {chunks} chunk item(s) left")
+
+    api = load_lambda("api_handler")
+    api._dynamodb = StubDynamoDB(StubTable(PRICES_TABLE, "symbol", "timestamp"),
+                                 StubTable("bench-candles", "symbol", "candle_timestamp"), table)
+    env = {"PRICES_TABLE": PRICES_TABLE, "CANDLES_TABLE": "bench-candles", "ANOMALY_TABLE": ANOMALY_TABLE,
+           "RESPONSE_CACHE_MAX_ENTRIES": "0"}
+    with mock.patch.dict(os.environ, env):
+        reply = api.lambda_handler({"rawPath": "/correlations", "queryStringParameters": {"symbols": "SYM000,SYM001,SYM002"}}, None)
+    body = json.loads(reply["body"])
+    print(f"GET /correlations?symbols=SYM000,SYM001,SYM002 -> {reply['statusCode']}: {body.get('matrix')}")
+
+
+def scale(correlation, correlation_state, counts: list[int], steps: int, seed: int) -> None:
+    print(f"{'symbols':>8} {'step ms':>8} {'p99 ms':>8} {'state MB':>9} {'snapshot KB':>12} {'chunks':>7} "
+          f"{'encode ms':>10} {'decode ms':>10} {'restore ms':>11} {'max corr err':>13}")
+    for k in counts:
+        names = [f"S{i:04d}" for i in range(k)]
+        returns = factor_returns(k, steps, seed)
+        prices = 100 * np.exp(np.vstack([np.zeros(k), np.cumsum(returns, axis=0)]))
+        engine = correlation.CorrelationEngine(min_steps=10, max_symbols=k)
+        _, timings = feed(engine, names, prices)
+        timings = sorted(timings[20:])
+        state_mb = sum(a.nbytes for a in (engine.cov, engine.means, engine.last_prices, engine.observations)) / 1e6
+
+        start = time.perf_counter()
+        snapshot = engine.snapshot()
+        blob = correlation_state.encode(snapshot)
+        encode_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        decoded = correlation_state.decode(blob)
+        decode_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        restored = correlation.CorrelationEngine(min_steps=10, max_symbols=k)
+        restored.restore(decoded)
+        restore_ms = (time.perf_counter() - start) * 1000
+        error = np.nanmax(np.abs(restored.correlations() - engine.correlations()))
+        chunks = math.ceil(len(blob) / correlation_state.MAX_CHUNK_BYTES)
+        print(f"{k:>8d} {statistics.median(timings) * 1000:>8.2f} {timings[int(len(timings) * 0.99)] * 1000:>8.2f} "
+              f"{state_mb:>9.2f} {len(blob) / 1000:>12.1f} {chunks:>7d} {encode_ms:>10.1f} {decode_ms:>10.1f} "
+              f"{restore_ms:>11.1f} {error:>13.1e}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=600, help="rounds for the accuracy and scale runs")
+    parser.add_argument("--window", type=int, default=120)
+    parser.add_argument("--calm-minutes", type=int, default=60)
+    parser.add_argument("--falling-minutes", type=int, default=5)
+    parser.add_argument("--drop", type=float, default=0.01, help="fractional drop per minute during the sell-off")
+    parser.add_argument("--jump", type=float, default=0.02, help="SYM000's own jump during the calm")
+    parser.add_argument("--scale", default="100,300,500", help="comma separated symbol counts")
+    parser.add_argument("--seed", type=int, default=23)
+    args = parser.parse_args()
+
+    detector = load_lambda("anomaly_detector")
+    accuracy(detector.correlation, args.symbols, args.steps, args.window, args.seed)
+    handler(detector, args)
+    scale(detector.correlation, detector.correlation_state, [int(k) for k in args.scale.split(",")], args.steps, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Drive the ingester against the local fake quote server and a stub Kinesis client, and
+compare wall time for one ingestion tick: the previous serial urlopen + put_record loop
+versus concurrent pooled fetching + PutRecords.
+
+    python benchmarks/bench_data_ingester.py --symbols 300 --latency-ms 40
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from unittest import mock
+from urllib.request import Request, urlopen
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_quote_server import FakeQuoteServer  # noqa: E402
+from harness import load_lambda  # noqa: E402
+from stubs import StubKinesis  # noqa: E402
+
+
+def serial_tick(quotes, base_url: str, symbols: list[str], kinesis: StubKinesis) -> int:
+    """The previous path: one fresh connection per symbol, one put_record per quote."""
+    put_count = 0
+    for symbol in symbols:
+        req = Request(f"{base_url}/api/v1/quote?symbol={symbol}&token=bench", headers={"User-Agent": "bench"})
+        with urlopen(req, timeout=10) as resp:
+            record = quotes.parse_quote(symbol, json.loads(resp.read().decode()), "finnhub")
+        if record is None:
+            continue
+        kinesis.put_record(StreamName="bench", Data=json.dumps(record).encode("utf-8"), PartitionKey=symbol)
+        put_count += 1
+    return put_count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="fake upstream response latency")
+    parser.add_argument("--kinesis-latency-ms", type=float, default=10.0)
+    parser.add_argument("--kinesis-failure-rate", type=float, default=0.02)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rate-limit", type=float, default=1000.0, help="QUOTE_RATE_LIMIT requests/sec")
+    parser.add_argument("--shards", type=int, default=1, help="open shards in the stub stream")
+    args = parser.parse_args()
+
+    ingester = load_lambda("data_ingester")
+    quotes = sys.modules["quotes"]  # the ingester's sibling module, imported by load_lambda
+    record_codec = sys.modules["record_codec"]
+
+    symbols = [f"SYM{i:04d}" for i in range(args.symbols)]
+    server = FakeQuoteServer(latency=args.latency_ms / 1000).start()
+    try:
+        kinesis = StubKinesis(latency=args.kinesis_latency_ms / 1000)
+        start = time.perf_counter()
+        put = serial_tick(quotes, server.base_url, symbols, kinesis)
+        elapsed = time.perf_counter() - start
+        print(f"serial      {elapsed:7.2f} s  records_put={put}  connections={server.connections}  kinesis_calls={sum(kinesis.calls.values())}")
+
+        for label, aggregation in (("concurrent", "false"), ("aggregated", "true")):
+            server.connections = 0
+            kinesis = StubKinesis(latency=args.kinesis_latency_ms / 1000, failure_rate=args.kinesis_failure_rate,
+                                  shards=args.shards)
+            ingester._kinesis = kinesis
+            ingester._shard_map = None
+            env = {
+                "KINESIS_STREAM_NAME": "bench",
+                "ALPHA_VANTAGE_API_KEY": "bench",
+                "QUOTE_API_URL": server.base_url,
+                "SYMBOLS": ",".join(symbols),
+                "FETCH_CONCURRENCY": str(args.concurrency),
+                "QUOTE_RATE_LIMIT": str(args.rate_limit),
+                "RECORD_AGGREGATION": aggregation,
+            }
+            with mock.patch.dict(os.environ, env):
+                start = time.perf_counter()
+                result = ingester.lambda_handler({}, None)
+                elapsed = time.perf_counter() - start
+            ticks = sum(len(record_codec.decode_records(r["Data"])) for r in kinesis.records)
+            stored_bytes = sum(len(r["Data"]) for r in kinesis.records)
+            print(
+                f"{label:<11} {elapsed:7.2f} s  records_put={result['records_put']}  connections={server.connections}  "
+                f"kinesis_calls={sum(kinesis.calls.values())}  kinesis_records={len(kinesis.records)}  "
+                f"ticks={ticks}  bytes={stored_bytes}"
+            )
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
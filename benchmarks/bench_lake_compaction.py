@@ -0,0 +1,135 @@
+"""
+Build one day of Firehose-style raw JSON in a temporary directory, compact it with the lake
+compactor, and compare a per-symbol, two-hour query against both layouts: bytes read and
+wall time for scanning every raw object versus reading the symbol's Parquet file (only
+the row groups and columns the query needs, as Athena would).
+
+    python benchmarks/bench_lake_compaction.py --symbols 50 --interval-seconds 60
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from harness import load_lambda  # noqa: E402
+
+QUERY_COLUMNS = ["event_time", "price", "volume"]
+
+
+def write_raw_day(store, lake, day: date, symbols: list[str], interval: int, seed: int) -> int:
+    """Ticks every `interval` seconds per symbol, flushed in 5-minute objects like Firehose.
+    Older objects hold back-to-back JSON, newer ones one object per line."""
+    rng = random.Random(seed)
+    prices = {s: 50 + rng.random() * 450 for s in symbols}
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    prefix = lake.raw_prefix(day)
+    raw_bytes = 0
+    for window in range(24 * 12):
+        ticks = []
+        for offset in range(0, 300, interval):
+            ts = start + timedelta(seconds=window * 300 + offset)
+            for symbol in symbols:
+                prices[symbol] *= 1 + rng.gauss(0, 0.001)
+                ticks.append({
+                    "symbol": symbol,
+                    "price": round(prices[symbol], 2),
+                    "volume": rng.randint(100, 5000),
+                    "change_percent": round(rng.gauss(0, 1), 3),
+                    "timestamp": ts.isoformat(),
+                    "source": "finnhub",
+                })
+        separator = "" if window < 144 else "\n"
+        data = separator.join(json.dumps(t) for t in ticks).encode("utf-8")
+        store.put(f"{prefix}/finpulse-firehose-s3-{window:04d}", data)
+        raw_bytes += len(data)
+    return raw_bytes
+
+
+def query_raw(store, compaction, day: date, symbol: str, since: datetime, until: datetime) -> tuple[list, int]:
+    rows, scanned = [], 0
+    for key in store.list(compaction.raw_prefix(day)):
+        data = store.get(key)
+        scanned += len(data)
+        for tick in compaction.iter_ticks(data):
+            if tick["symbol"] != symbol:
+                continue
+            event_time = compaction.parse_event_time(tick["timestamp"])
+            if since <= event_time < until:
+                rows.append((event_time, tick["price"], tick["volume"]))
+    return sorted(rows), scanned
+
+
+def query_parquet(pq, path: Path, since: datetime, until: datetime) -> tuple[list, int]:
+    """Read only row groups whose event_time statistics overlap [since, until)."""
+    parquet = pq.ParquetFile(path)
+    metadata = parquet.metadata
+    column = parquet.schema_arrow.get_field_index("event_time")
+    wanted = [parquet.schema_arrow.get_field_index(c) for c in QUERY_COLUMNS]
+    rows, scanned = [], 0
+    for i in range(metadata.num_row_groups):
+        group = metadata.row_group(i)
+        stats = group.column(column).statistics
+        if stats is not None and stats.has_min_max and (stats.max < since or stats.min >= until):
+            continue
+        scanned += sum(group.column(c).total_compressed_size for c in wanted)
+        table = parquet.read_row_group(i, columns=QUERY_COLUMNS)
+        for event_time, price, volume in zip(*(table.column(c).to_pylist() for c in QUERY_COLUMNS)):
+            if since <= event_time < until:
+                rows.append((event_time, price, volume))
+    return sorted(rows), scanned
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--interval-seconds", type=int, default=60, help="seconds between ticks per symbol")
+    parser.add_argument("--row-group-rows", type=int, default=None, help="defaults to the compactor's")
+    parser.add_argument("--seed", type=int, default=17)
+    args = parser.parse_args()
+
+    load_lambda("lake_compactor")
+    compaction = sys.modules["compaction"]
+    import pyarrow.parquet as pq
+
+    symbols = [f"SYM{i:03d}" for i in range(args.symbols)]
+    day = date(2026, 1, 5)
+    with tempfile.TemporaryDirectory() as root:
+        store = compaction.LocalStore(root)
+        raw_bytes = write_raw_day(store, compaction, day, symbols, args.interval_seconds, args.seed)
+
+        row_group_rows = args.row_group_rows or compaction.DEFAULT_ROW_GROUP_ROWS
+        start = time.perf_counter()
+        result = compaction.compact_day(store, day, row_group_rows)
+        elapsed = time.perf_counter() - start
+        print(
+            f"compacted {result['rows']} rows, {len(result['symbols'])} symbols: raw={raw_bytes} bytes  "
+            f"parquet={result['bytes_written']} bytes  ({raw_bytes / result['bytes_written']:.1f}x)  {elapsed:.2f} s"
+        )
+
+        symbol = symbols[len(symbols) // 2]
+        since = datetime(day.year, day.month, day.day, 14, tzinfo=timezone.utc)
+        until = since + timedelta(hours=2)
+        t0 = time.perf_counter()
+        raw_rows, raw_scanned = query_raw(store, compaction, day, symbol, since, until)
+        raw_time = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        pq_rows, pq_scanned = query_parquet(pq, Path(root) / compaction.curated_key(day, symbol), since, until)
+        pq_time = time.perf_counter() - t0
+
+        print(f"{symbol} 14:00-16:00  raw JSON: {raw_scanned:>10} bytes  {raw_time * 1000:8.1f} ms  rows={len(raw_rows)}")
+        print(f"{symbol} 14:00-16:00  parquet:  {pq_scanned:>10} bytes  {pq_time * 1000:8.1f} ms  rows={len(pq_rows)}")
+        print(f"scanned bytes {raw_scanned / max(1, pq_scanned):.0f}x less, {raw_time / pq_time:.0f}x faster, "
+              f"results match={raw_rows == pq_rows}")
+
+        again = compaction.compact_day(store, day, row_group_rows)
+        print(f"re-running the day is idempotent: {again['rows'] == result['rows'] and again['bytes_written'] == result['bytes_written']}")
+
+
+if __name__ == "__main__":
+    main()
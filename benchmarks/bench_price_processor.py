@@ -0,0 +1,91 @@
+"""
+Compare price processor write throughput (rows/sec) for the previous one-PutItem-per-record
+path and the batched BatchWriteItem path, against stub tables with a simulated round trip
+latency and optional throttling (UnprocessedItems).
+
+    python benchmarks/bench_price_processor.py --records 500 --latency-ms 8 --unprocessed-rate 0.05
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from harness import kinesis_event, load_lambda  # noqa: E402
+from stubs import StubDynamoDBClient, StubTable  # noqa: E402
+
+TABLE_NAME = "bench-prices"
+SYMBOLS = ["AAPL", "GOOGL", "MSFT", "AMZN", "TSLA", "META", "NVDA", "NFLX", "JPM", "V"]
+
+
+def synthetic_records(count: int, duplicate_rate: float, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    clock = datetime(2026, 1, 5, 14, 30, tzinfo=timezone.utc)
+    records = []
+    for i in range(count):
+        if records and rng.random() < duplicate_rate:
+            records.append(dict(records[-1]))
+            continue
+        if i % len(SYMBOLS) == 0:
+            clock += timedelta(seconds=1)
+        records.append({
+            "symbol": SYMBOLS[i % len(SYMBOLS)],
+            "price": round(100 + rng.random() * 50, 2),
+            "volume": rng.randint(100, 5000),
+            "change_percent": round(rng.gauss(0, 1), 3),
+            "timestamp": clock.isoformat(),
+            "source": "bench",
+        })
+    return records
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=500, help="records per Kinesis batch")
+    parser.add_argument("--batches", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=8.0, help="simulated DynamoDB round trip")
+    parser.add_argument("--unprocessed-rate", type=float, default=0.0, help="chance a put is returned unprocessed")
+    parser.add_argument("--duplicate-rate", type=float, default=0.02, help="chance a record repeats the previous key")
+    parser.add_argument("--concurrency", type=int, default=4, help="BATCH_WRITE_CONCURRENCY for the batched run")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    processor = load_lambda("price_processor")
+    latency = args.latency_ms / 1000
+    batches = [synthetic_records(args.records, args.duplicate_rate, args.seed + b) for b in range(args.batches)]
+    events = [kinesis_event(batch) for batch in batches]
+    num_records = sum(len(b) for b in batches)
+
+    serial_table = StubTable(TABLE_NAME, "symbol", "timestamp", latency=latency)
+    start = time.perf_counter()
+    for batch in batches:
+        for data in batch:
+            serial_table.put_item(Item=processor.build_item(data))
+    serial_elapsed = time.perf_counter() - start
+    print(f"put_item       rows/sec={num_records / serial_elapsed:9.0f}  calls={serial_table.total_calls}")
+
+    for concurrency in sorted({1, args.concurrency}):
+        table = StubTable(TABLE_NAME, "symbol", "timestamp")
+        client = StubDynamoDBClient(table, latency=latency, unprocessed_rate=args.unprocessed_rate, seed=args.seed)
+        processor._dynamodb_client = client
+        with mock.patch.dict(os.environ, {"DYNAMODB_TABLE": TABLE_NAME, "BATCH_WRITE_CONCURRENCY": str(concurrency)}):
+            failed = 0
+            start = time.perf_counter()
+            for event in events:
+                failed += processor.lambda_handler(event, None)["failed"]
+            elapsed = time.perf_counter() - start
+        label = f"batch x{concurrency}"
+        ticks = sum(1 for key in table.items if not key[0].startswith("__"))  # skip snapshot and stats items
+        print(
+            f"{label:<14} rows/sec={num_records / elapsed:9.0f}  calls={client.calls['BatchWriteItem']}  "
+            f"snapshot_updates={client.calls['UpdateItem']}  failed={failed}  items={ticks} (expected {len(serial_table.items)})"
+        )
+
+
+if __name__ == "__main__":
+    main()
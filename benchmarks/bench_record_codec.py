@@ -0,0 +1,100 @@
+"""
+Compare the JSON and binary Kinesis record encodings: bytes per tick (and what that means
+against a shard's 1 MB/s write limit) and consumer-side decode cost, where the previous
+path base64-decodes, JSON-parses and ISO-parses every record in each consumer.
+
+    python benchmarks/bench_record_codec.py --records 10000
+"""
+import argparse
+import base64
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from harness import SHARED_DIR, kinesis_event  # noqa: E402
+
+sys.path.insert(0, str(SHARED_DIR))
+
+import record_codec  # noqa: E402
+
+SYMBOLS = ["AAPL", "GOOGL", "MSFT", "AMZN", "TSLA", "META", "NVDA", "NFLX", "JPM", "V", "BRK.B", "ORCL"]
+SHARD_BYTES_PER_SECOND = 1_000_000
+SHARD_RECORDS_PER_SECOND = 1_000
+
+
+def synthetic_ticks(count: int, seed: int) -> list[dict]:
+    """Ingester-shaped records: float price and change, int volume, isoformat() timestamps."""
+    rng = random.Random(seed)
+    clock = datetime.now(timezone.utc)
+    ticks = []
+    for i in range(count):
+        clock += timedelta(microseconds=rng.randint(1, 2_000_000))
+        ticks.append({
+            "symbol": SYMBOLS[i % len(SYMBOLS)],
+            "price": round(50 + rng.random() * 450, 2),
+            "volume": rng.randint(0, 5_000_000),
+            "change_percent": round(rng.gauss(0, 1.5), 4),
+            "timestamp": clock.isoformat(),
+            "source": "finnhub",
+        })
+    return ticks
+
+
+def legacy_decode(event: dict) -> list[tuple]:
+    """What each consumer did per record: base64, json.loads, then parse the ISO timestamp."""
+    rows = []
+    for record in event["Records"]:
+        data = json.loads(base64.b64decode(record["kinesis"]["data"]).decode("utf-8"))
+        ts = datetime.fromisoformat(data["timestamp"].replace("Z", "+00:00"))
+        rows.append((data["symbol"], ts, float(data["price"]), int(data["volume"])))
+    return rows
+
+
+def best_of(repeats: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=10_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    ticks = synthetic_ticks(args.records, args.seed)
+    json_event = kinesis_event(ticks)
+    binary_event = kinesis_event(ticks, binary=True)
+
+    for label, event in (("json", json_event), ("binary", binary_event)):
+        sizes = [len(base64.b64decode(r["kinesis"]["data"])) for r in event["Records"]]
+        mean = sum(sizes) / len(sizes)
+        print(
+            f"{label:<7} {mean:6.1f} bytes/tick  ticks/shard/s by bytes={SHARD_BYTES_PER_SECOND / mean:8.0f}  "
+            f"by record count={SHARD_RECORDS_PER_SECOND}"
+        )
+
+    legacy = best_of(args.repeats, lambda: legacy_decode(json_event))
+    batch_json = best_of(args.repeats, lambda: record_codec.decode_batch(json_event["Records"]))
+    batch_binary = best_of(args.repeats, lambda: record_codec.decode_batch(binary_event["Records"]))
+    per_tick = 1e6 / args.records
+    print(f"decode, per-record json + ISO parse  {legacy * per_tick:6.2f} us/tick")
+    print(f"decode_batch, json records           {batch_json * per_tick:6.2f} us/tick")
+    print(f"decode_batch, binary records         {batch_binary * per_tick:6.2f} us/tick")
+
+    batch = record_codec.decode_batch(binary_event["Records"])
+    lossy = sum(batch.record(i) != tick for i, tick in enumerate(ticks))
+    print(f"binary records not round-tripping exactly: {lossy} of {len(ticks)}  failed={batch.failed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Compare the two price-history read paths over a day of ticks written by the real price
+processor: the per-tick items (/prices/{symbol} before HISTORY_FROM_BUCKETS) and the
+compressed tick buckets. Reports DynamoDB calls, items and bytes read, the read capacity
+they bill (eventually consistent: 0.5 RCU per 4 KB of a query's items) and decode time,
+and checks both paths return the same ticks, for the API and for the detector's window.
+
+    python benchmarks/bench_tick_buckets.py --symbols 10 --hours 24
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from harness import kinesis_event, load_lambda  # noqa: E402
+from stubs import StubDynamoDB, StubDynamoDBClient, StubTable  # noqa: E402
+
+PRICES_TABLE = "bench-prices"
+
+
+def synthetic_day(symbols: list[str], minutes: int, seed: int) -> list[list[dict]]:
+    """One batch per minute ending now, each with one tick per symbol."""
+    rng = random.Random(seed)
+    clock = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(minutes=minutes)
+    prices = {s: 100 + rng.random() * 400 for s in symbols}
+    batches = []
+    for _ in range(minutes):
+        clock += timedelta(minutes=1)
+        batch = []
+        for symbol in symbols:
+            prices[symbol] *= 1 + rng.gauss(0, 0.002)
+            batch.append({
+                "symbol": symbol,
+                "price": round(prices[symbol], 2),
+                "volume": rng.randint(100, 5000),
+                "change_percent": 0.0,
+                "timestamp": clock.isoformat(),
+                "source": "bench",
+            })
+        batches.append(batch)
+    return batches
+
+
+def item_size(value) -> int:
+    """Approximate DynamoDB item size: attribute names plus string, number and binary bytes."""
+    if isinstance(value, dict):
+        return sum(len(k) + item_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(1 + item_size(v) for v in value)
+    value = getattr(value, "value", value)
+    return len(value) if isinstance(value, (bytes, bytearray)) else len(str(value))
+
+
+class SizedTable:
+    """Wraps a StubTable to total the items and bytes its queries return."""
+
+    def __init__(self, table: StubTable):
+        self.table = table
+        self.items = self.bytes = self.rcu = 0
+
+    def query(self, **kwargs):
+        resp = self.table.query(**kwargs)
+        size = sum(item_size(item) for item in resp.get("Items", []))
+        self.items += len(resp.get("Items", []))
+        self.bytes += size
+        self.rcu += math.ceil(size / 4096) * 0.5
+        return resp
+
+
+def ticks_of(prices: list[dict], micros) -> list[tuple[int, float]]:
+    return sorted((micros(p["timestamp"]), float(p["price"])) for p in prices)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=10)
+    parser.add_argument("--hours", type=int, default=24)
+    parser.add_argument("--limit", type=int, default=500, help="history limit for the item path (its cap)")
+    parser.add_argument("--window", type=int, default=30, help="detector HISTORY_WINDOW")
+    parser.add_argument("--seed", type=int, default=22)
+    args = parser.parse_args()
+
+    api = load_lambda("api_handler")
+    processor = load_lambda("price_processor")
+    detector = load_lambda("anomaly_detector")
+    symbols = api.SYMBOLS[:args.symbols]
+    batches = synthetic_day(symbols, args.hours * 60, args.seed)
+
+    prices = StubTable(PRICES_TABLE, "symbol", "timestamp")
+    processor._dynamodb_client = StubDynamoDBClient(prices)
+    start = time.perf_counter()
+    with mock.patch.dict(os.environ, {"DYNAMODB_TABLE": PRICES_TABLE}), contextlib.redirect_stdout(None):
+        for i, batch in enumerate(batches):
+            processor.lambda_handler(kinesis_event(batch, first_sequence=1 + i * len(batch)), None)
+    write_s = time.perf_counter() - start
+    buckets = [item for key, item in prices.items.items() if str(key[0]).startswith("__ticks__#")]
+    chunk_bytes = sum(int(item["chunk_bytes"]) for item in buckets)
+    ticks = len(batches) * len(symbols)
+    print(f"wrote {ticks} ticks in {write_s:.1f}s: {len(buckets)} bucket items, {chunk_bytes / ticks:.1f} B/tick")
+
+    micros = detector.timestamp_to_micros
+    results = {}
+    for label, enabled, limit in (("items", "false", args.limit), ("buckets", "true", args.limit),
+                                  ("buckets, full range", "true", 5000)):
+        table = SizedTable(prices)
+        prices.calls.clear()
+        returned = {}
+        with mock.patch.dict(os.environ, {"HISTORY_FROM_BUCKETS": enabled}):
+            start = time.perf_counter()
+            for symbol in symbols:
+                resp = api.get_price_history(table, symbol, {"hours": str(args.hours), "limit": str(limit)})
+                returned[symbol] = ticks_of(json.loads(resp["body"])["prices"], micros)
+            elapsed = time.perf_counter() - start
+        results[label] = returned
+        count = sum(len(v) for v in returned.values())
+        print(
+            f"{label:<20} ticks={count:<7d} queries={prices.calls['Query']:<5d} items read={table.items:<7d} "
+            f"bytes={table.bytes:<9d} RCU={table.rcu:<7.1f} time={elapsed * 1000:7.1f} ms"
+        )
+    diffs = sum(results["items"][s] != results["buckets"][s] for s in symbols)
+    print(f"symbols whose history differs between paths: {diffs}")
+
+    before = batches[-1][0]["timestamp"]
+    windows = {}
+    for enabled in ("false", "true"):
+        prices.calls.clear()
+        with mock.patch.dict(os.environ, {"HISTORY_FROM_BUCKETS": enabled}):
+            windows[enabled] = {
+                s: detector.seed_window(StubDynamoDB(prices), PRICES_TABLE, s, args.window, before).values()
+                for s in symbols
+            }
+        print(f"detector windows (buckets={enabled}): queries={prices.calls['Query']}")
+    print(f"detector windows differing between paths: {sum(windows['false'][s] != windows['true'][s] for s in symbols)}")
+
+
+if __name__ == "__main__":
+    main()
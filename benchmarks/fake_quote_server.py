@@ -0,0 +1,88 @@
+"""
+Local Finnhub-compatible quote server for driving the ingester in tests and benchmarks.
+
+Serves GET /api/v1/quote?symbol=...&token=... with a random-walk quote after an optional
+artificial latency, over HTTP/1.1 keep-alive. Run standalone or start in-process:
+
+    python benchmarks/fake_quote_server.py --port 8765 --latency-ms 40
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeQuoteServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0, seed: int = 0):
+        super().__init__(("127.0.0.1", port), _QuoteHandler)
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self._prices: dict[str, float] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def quote(self, symbol: str) -> dict:
+        with self._lock:
+            self.requests += 1
+            price = self._prices.get(symbol, 100.0 + self._rng.random() * 400)
+            price *= 1 + self._rng.gauss(0, 0.002)
+            self._prices[symbol] = price
+        return {"c": round(price, 2), "v": self._rng.randint(1000, 100000), "dp": round(self._rng.gauss(0, 1), 3)}
+
+    def start(self) -> "FakeQuoteServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _QuoteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY the body waits on a
+    # delayed ACK and every keep-alive request takes ~40 ms regardless of --latency-ms.
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server._lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        symbol = (parse_qs(url.query).get("symbol") or [""])[0]
+        if url.path != "/api/v1/quote" or not symbol:
+            body, status = b'{"error": "not found"}', 404
+        else:
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            body, status = json.dumps(self.server.quote(symbol)).encode(), 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    args = parser.parse_args()
+    server = FakeQuoteServer(args.port, args.latency_ms / 1000)
+    print(f"Serving fake quotes on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Helpers shared by the benchmark scripts: load a lambda by directory name and build
+Kinesis-shaped events from plain record dicts.
+"""
+import base64
+import importlib.util
+import json
+import sys
+from pathlib import Path
+
+LAMBDAS_DIR = Path(__file__).resolve().parent.parent / "lambdas"
+SHARED_DIR = LAMBDAS_DIR / "shared"
+
+
+def load_lambda(name: str):
+    """Import lambdas/<name>/lambda_function.py under a unique module name.
+
+    Every lambda ships a module called lambda_function, so they cannot be imported
+    side by side by their real name. The lambda's directory goes on sys.path so its
+    sibling modules resolve the same way they do in the deployed package, and so does
+    lambdas/shared/, which packaging copies into every zip.
+    """
+    lambda_dir = LAMBDAS_DIR / name
+    for path in (SHARED_DIR, lambda_dir):
+        if str(path) not in sys.path:
+            sys.path.insert(0, str(path))
+    module_name = f"{name}_lambda_function"
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, lambda_dir / "lambda_function.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def kinesis_event(records: list[dict], first_sequence: int = 1, binary: bool = False) -> dict:
+    """Wrap records as a Kinesis event with increasing sequence numbers; data is base64 JSON,
+    or the binary record_codec encoding with `binary`."""
+    if binary:
+        if str(SHARED_DIR) not in sys.path:
+            sys.path.insert(0, str(SHARED_DIR))
+        from record_codec import encode_record
+
+        encode = encode_record
+    else:
+        def encode(record):
+            return json.dumps(record).encode("utf-8")
+    return {
+        "Records": [
+            {
+                "eventSource": "aws:kinesis",
+                "kinesis": {
+                    "partitionKey": record.get("symbol", ""),
+                    "sequenceNumber": str(first_sequence + i),
+                    "data": base64.b64encode(encode(record)).decode("ascii"),
+                },
+            }
+            for i, record in enumerate(records)
+        ]
+    }
@@ -0,0 +1,57 @@
+"""
+Synthetic tick streams for the benchmark suite: every symbol ticks `rate` times a second as
+a geometric random walk with `volatility` per tick, and a `spike_rate` share of ticks jump
+by `spike_size` for that one tick, which is what the anomaly detectors should flag.
+Ticks come out in event-time order with the ingester's field types.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+DEFAULT_SYMBOLS = ["AAPL", "GOOGL", "MSFT", "AMZN", "TSLA", "META", "NVDA", "NFLX", "JPM", "V"]
+
+
+@dataclass
+class StreamSpec:
+    symbols: int = 10
+    rate: float = 1.0  # ticks per second per symbol
+    seconds: float = 300.0
+    volatility: float = 0.001
+    spike_rate: float = 0.002
+    spike_size: float = 0.05
+    seed: int = 0
+    start: datetime = field(default_factory=lambda: datetime(2026, 1, 5, 14, 30, tzinfo=timezone.utc))
+
+
+def symbol_names(count: int) -> list[str]:
+    return DEFAULT_SYMBOLS[:count] + [f"SYM{i:04d}" for i in range(max(0, count - len(DEFAULT_SYMBOLS)))]
+
+
+def generate(spec: StreamSpec) -> tuple[list[dict], int]:
+    """The stream's ticks and how many of them are injected spikes."""
+    rng = random.Random(spec.seed)
+    symbols = symbol_names(spec.symbols)
+    prices = {s: 50 + rng.random() * 450 for s in symbols}
+    ticks = []
+    spikes = 0
+    for step in range(max(1, int(spec.seconds * spec.rate))):
+        ts = (spec.start + timedelta(seconds=step / spec.rate)).isoformat()
+        for symbol in symbols:
+            prices[symbol] *= 1 + rng.gauss(0, spec.volatility)
+            price = prices[symbol]
+            if rng.random() < spec.spike_rate:
+                price *= 1 + rng.choice((-1, 1)) * spec.spike_size
+                spikes += 1
+            ticks.append({
+                "symbol": symbol,
+                "price": round(price, 2),
+                "volume": rng.randint(100, 5000),
+                "change_percent": round(rng.gauss(0, 1), 3),
+                "timestamp": ts,
+                "source": "bench",
+            })
+    return ticks, spikes
+
+
+def batches(ticks: list[dict], size: int) -> list[list[dict]]:
+    return [ticks[i:i + size] for i in range(0, len(ticks), size)]
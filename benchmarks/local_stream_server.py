@@ -0,0 +1,160 @@
+"""
+Local live-stream server for the dashboard and for testing the fan-out without AWS.
+
+Serves Server-Sent Events on GET /stream?symbols=AAPL,MSFT (all symbols if omitted) using
+the broadcaster's Hub, so slow clients get coalesced updates exactly as in the Lambda.
+Messages are injected with POST /publish (one message or a JSON list), or generated with
+--demo, which random-walks prices and occasionally emits an anomaly.
+
+    python benchmarks/local_stream_server.py --port 8787 --demo
+    VITE_STREAM_URL=http://127.0.0.1:8787/stream npm run dev   # in frontend/
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "lambdas" / "stream_broadcaster"))
+
+from fanout import Hub, parse_symbols  # noqa: E402
+
+DEMO_SYMBOLS = ["AAPL", "GOOGL", "MSFT", "AMZN", "TSLA", "META", "NVDA", "NFLX", "JPM", "V"]
+KEEPALIVE_SECONDS = 15
+
+
+class StreamServer:
+    def __init__(self, max_pending: int = 256):
+        self.hub = Hub(max_pending=max_pending, on_ready=self._wake)
+        self._events: dict[str, asyncio.Event] = {}
+        self._ids = itertools.count(1)
+        self.published = 0
+
+    def _wake(self, client_id: str) -> None:
+        event = self._events.get(client_id)
+        if event is not None:
+            event.set()
+
+    def publish(self, message: dict) -> int:
+        self.published += 1
+        return self.hub.publish(message)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            method, target, _ = (request_line.split(" ") + ["", "", ""])[:3]
+            url = urlparse(target)
+
+            if method == "GET" and url.path == "/stream":
+                symbols = parse_symbols((parse_qs(url.query).get("symbols") or [None])[0])
+                await self.stream(writer, symbols)
+            elif method == "POST" and url.path == "/publish":
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                payload = json.loads(body or b"[]")
+                messages = payload if isinstance(payload, list) else [payload]
+                reached = sum(self.publish(m) for m in messages)
+                await self.respond(writer, 200, {"published": len(messages), "deliveries": reached})
+            elif method == "OPTIONS":
+                await self.respond(writer, 204, None)
+            else:
+                await self.respond(writer, 404, {"error": "not found"})
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer: asyncio.StreamWriter, status: int, body) -> None:
+        data = json.dumps(body).encode() if body is not None else b""
+        writer.write(
+            f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+            "Access-Control-Allow-Origin: *\r\nAccess-Control-Allow-Headers: Content-Type\r\n"
+            "Connection: close\r\n\r\n".encode() + data
+        )
+        await writer.drain()
+
+    async def stream(self, writer: asyncio.StreamWriter, symbols: frozenset | None) -> None:
+        client_id = f"client-{next(self._ids)}"
+        ready = self._events[client_id] = asyncio.Event()
+        self.hub.subscribe(client_id, symbols)
+        try:
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                b"Access-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\n"
+            )
+            await writer.drain()
+            while True:
+                try:
+                    await asyncio.wait_for(ready.wait(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                    await writer.drain()
+                    continue
+                ready.clear()
+                # Whatever piled up while the previous drain() was blocked has been
+                # coalesced in the outbox; write it out in one go.
+                for message in self.hub.drain(client_id):
+                    writer.write(f"event: {message['type']}\ndata: {json.dumps(message)}\n\n".encode())
+                await writer.drain()
+        finally:
+            self.hub.unsubscribe(client_id)
+            self._events.pop(client_id, None)
+
+
+async def demo_feed(server: StreamServer, interval: float, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    prices = {s: 100.0 + rng.random() * 400 for s in DEMO_SYMBOLS}
+    while True:
+        now = datetime.now(timezone.utc).isoformat()
+        for symbol in DEMO_SYMBOLS:
+            change = rng.gauss(0, 0.002)
+            prices[symbol] *= 1 + change
+            server.publish({
+                "type": "price", "symbol": symbol, "price": round(prices[symbol], 2),
+                "volume": rng.randint(1000, 100000), "change_percent": round(change * 100, 3), "timestamp": now,
+            })
+            if rng.random() < 0.01:
+                server.publish({
+                    "type": "anomaly", "symbol": symbol, "detected_at": now,
+                    "direction": "SPIKE" if change > 0 else "DROP", "severity": "MEDIUM",
+                    "current_price": round(prices[symbol], 2), "mean_price": round(prices[symbol] / (1 + change), 2),
+                    "deviation_percent": round(change * 100, 4), "z_score": round(rng.uniform(2.5, 4.0), 4),
+                    "detector": "zscore", "detectors": ["zscore"],
+                })
+        await asyncio.sleep(interval)
+
+
+async def serve(port: int, demo: bool, interval: float) -> None:
+    server = StreamServer()
+    tcp = await asyncio.start_server(server.handle, "127.0.0.1", port)
+    print(f"Streaming on http://127.0.0.1:{port}/stream (POST /publish to inject messages)")
+    if demo:
+        asyncio.create_task(demo_feed(server, interval))
+    async with tcp:
+        await tcp.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--demo", action="store_true", help="publish a random-walk price feed")
+    parser.add_argument("--interval", type=float, default=0.25, help="demo tick interval in seconds")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.port, args.demo, args.interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
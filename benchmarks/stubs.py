@@ -0,0 +1,599 @@
+"""
+In-memory stand-ins for the AWS resources the lambdas touch, for local benchmarks.
+
+StubTable understands the small subset of DynamoDB expression syntax the handlers use
+(SET / ADD / REMOVE with if_not_exists, list_append and +/-, and AND/OR/NOT conditions with
+comparisons, BETWEEN and attribute_(not_)exists, over top-level or dotted map paths)
+and counts every call it receives. Calls made through the client stand-ins are counted
+on each table they touch as well, so a table's `calls` is everything sent its way.
+"""
+import random
+import re
+import threading
+import time
+from collections import Counter
+from copy import deepcopy
+from types import SimpleNamespace
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+_TOKEN = re.compile(r"\s*(<=|>=|<>|[=<>(),+\-]|[#:]?[A-Za-z_][A-Za-z0-9_]*(?:\.#?[A-Za-z_][A-Za-z0-9_]*)*)")
+_MISSING = object()
+
+
+def _tokenize(expression: str) -> list[str]:
+    tokens = []
+    pos = 0
+    expression = expression.strip()
+    while pos < len(expression):
+        m = _TOKEN.match(expression, pos)
+        if not m:
+            raise ValueError(f"Cannot tokenize expression at: {expression[pos:]!r}")
+        tokens.append(m.group(1))
+        pos = m.end()
+    return tokens
+
+
+def _conditional_check_failed(operation: str, item: dict | None = None) -> ClientError:
+    response = {"Error": {"Code": "ConditionalCheckFailedException", "Message": "The conditional request failed"}}
+    if item:
+        response["Item"] = deepcopy(item)  # ReturnValuesOnConditionCheckFailure=ALL_OLD
+    return ClientError(response, operation)
+
+
+class _Expression:
+    """Recursive-descent evaluator over a token list."""
+
+    def __init__(self, expression: str, names: dict | None, values: dict | None):
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, offset: int = 0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else None
+
+    def take(self, expected: str | None = None) -> str:
+        token = self.peek()
+        if token is None or (expected is not None and token.upper() != expected.upper()):
+            raise ValueError(f"Expected {expected!r}, got {token!r}")
+        self.pos += 1
+        return token
+
+    def name(self, token: str) -> str:
+        return self.names[token] if token.startswith("#") else token
+
+    def path(self, token: str) -> list[str]:
+        return [self.name(part) for part in token.split(".")]
+
+    def lookup(self, item: dict, token: str, default=None):
+        value = item
+        for part in self.path(token):
+            if not isinstance(value, dict) or part not in value:
+                return default
+            value = value[part]
+        return value
+
+    def assign(self, item: dict, token: str, value) -> None:
+        *parents, last = self.path(token)
+        target = item
+        for part in parents:
+            if not isinstance(target.get(part), dict):
+                raise ValueError("The document path provided in the update expression is invalid for update")
+            target[part] = dict(target[part])
+            target = target[part]
+        target[last] = value
+
+    # ── operands ──
+    def operand(self, item: dict):
+        token = self.take()
+        if token.startswith(":"):
+            return self.values[token]
+        if token.lower() == "if_not_exists":
+            self.take("(")
+            found = self.lookup(item, self.take(), _MISSING)
+            self.take(",")
+            fallback = self.operand(item)
+            self.take(")")
+            return fallback if found is _MISSING else found
+        if token.lower() == "list_append":
+            self.take("(")
+            first = self.operand(item)
+            self.take(",")
+            second = self.operand(item)
+            self.take(")")
+            return list(first) + list(second)
+        if token.lower() == "size":
+            self.take("(")
+            value = self.lookup(item, self.take())
+            self.take(")")
+            return len(value) if value is not None else 0
+        return self.lookup(item, token)
+
+    def value(self, item: dict):
+        left = self.operand(item)
+        while self.peek() in ("+", "-"):
+            op = self.take()
+            right = self.operand(item)
+            left = left + right if op == "+" else left - right
+        return left
+
+    # ── conditions ──
+    def condition(self, item: dict) -> bool:
+        result = self.conjunction(item)
+        while self.peek() and self.peek().upper() == "OR":
+            self.take()
+            rhs = self.conjunction(item)
+            result = result or rhs
+        return result
+
+    def conjunction(self, item: dict) -> bool:
+        result = self.primary(item)
+        while self.peek() and self.peek().upper() == "AND":
+            self.take()
+            rhs = self.primary(item)
+            result = result and rhs
+        return result
+
+    def primary(self, item: dict) -> bool:
+        token = self.peek()
+        if token == "(":
+            self.take("(")
+            result = self.condition(item)
+            self.take(")")
+            return result
+        if token.upper() == "NOT":
+            self.take()
+            return not self.primary(item)
+        if token.lower() in ("attribute_exists", "attribute_not_exists"):
+            self.take()
+            self.take("(")
+            present = self.lookup(item, self.take(), _MISSING) is not _MISSING
+            self.take(")")
+            return present if token.lower() == "attribute_exists" else not present
+        left = self.value(item)
+        if self.peek() and self.peek().upper() == "BETWEEN":
+            self.take()
+            low = self.value(item)
+            self.take("AND")
+            high = self.value(item)
+            return left is not None and low <= left <= high
+        op = self.take()
+        right = self.value(item)
+        if left is None or right is None:
+            return op == "<>" and left != right
+        return {
+            "=": left == right,
+            "<>": left != right,
+            "<": left < right,
+            "<=": left <= right,
+            ">": left > right,
+            ">=": left >= right,
+        }[op]
+
+    # ── update clauses ──
+    def apply_update(self, item: dict) -> dict:
+        updated = dict(item)
+        while self.peek() is not None:
+            clause = self.take().upper()
+            while True:
+                if clause == "SET":
+                    target = self.take()
+                    self.take("=")
+                    self.assign(updated, target, self.value(item))
+                elif clause == "ADD":
+                    target = self.take()
+                    operand = self.operand(item)
+                    if isinstance(operand, (set, frozenset)):  # set ADD is a union
+                        self.assign(updated, target, set(self.lookup(item, target, set())) | operand)
+                    else:
+                        self.assign(updated, target, self.lookup(item, target, 0) + operand)
+                elif clause == "REMOVE":
+                    updated.pop(self.name(self.take()), None)
+                else:
+                    raise ValueError(f"Unsupported update clause {clause!r}")
+                if self.peek() != ",":
+                    break
+                self.take(",")
+        return updated
+
+
+class StubTable:
+    """Dict-backed DynamoDB Table stand-in keyed by (hash, range).
+
+    `latency` (seconds) is slept on every call to model the network round trip.
+    `indexes` maps a GSI name to its (hash, range) attributes; queries with IndexName see
+    only items that carry the index's hash key, ordered by the index key.
+    """
+
+    def __init__(self, name: str, hash_key: str, range_key: str | None = None, latency: float = 0.0,
+                 indexes: dict[str, tuple[str, str]] | None = None):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.latency = latency
+        self.indexes = indexes or {}
+        self.items: dict[tuple, dict] = {}
+        self.calls: Counter = Counter()
+        self.conditional_failures = 0
+        self.items_scanned = 0  # items queries and scans evaluated, what their read capacity follows
+        self._lock = threading.Lock()
+
+    def _record(self, operation: str) -> None:
+        with self._lock:
+            self.calls[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _key(self, key_or_item: dict) -> tuple:
+        if self.range_key is None:
+            return (key_or_item[self.hash_key],)
+        return (key_or_item[self.hash_key], key_or_item[self.range_key])
+
+    def _check(self, operation: str, item: dict, kwargs: dict) -> None:
+        condition = kwargs.get("ConditionExpression")
+        if condition is None:
+            return
+        expr = _Expression(condition, kwargs.get("ExpressionAttributeNames"), kwargs.get("ExpressionAttributeValues"))
+        if not expr.condition(item):
+            self.conditional_failures += 1
+            old = item if kwargs.get("ReturnValuesOnConditionCheckFailure") == "ALL_OLD" else None
+            raise _conditional_check_failed(operation, old)
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def put_item(self, Item: dict, **kwargs):
+        self._record("PutItem")
+        key = self._key(Item)
+        old = self.items.get(key)
+        self._check("PutItem", old or {}, kwargs)
+        self.items[key] = deepcopy(Item)
+        if old is not None and kwargs.get("ReturnValues") == "ALL_OLD":
+            return {"Attributes": deepcopy(old)}
+        return {}
+
+    def delete_item(self, Key: dict, **kwargs):
+        self._record("DeleteItem")
+        self.items.pop(self._key(Key), None)
+        return {}
+
+    def get_item(self, Key: dict, **kwargs):
+        self._record("GetItem")
+        item = self.items.get(self._key(Key))
+        return {"Item": deepcopy(item)} if item is not None else {}
+
+    def update_item(self, Key: dict, UpdateExpression: str, **kwargs):
+        self._record("UpdateItem")
+        key = self._key(Key)
+        current = self.items.get(key, {})
+        self._check("UpdateItem", current, kwargs)
+        expr = _Expression(UpdateExpression, kwargs.get("ExpressionAttributeNames"), kwargs.get("ExpressionAttributeValues"))
+        updated = expr.apply_update(current)
+        updated.update(Key)
+        self.items[key] = updated
+        if kwargs.get("ReturnValues") == "ALL_NEW":
+            return {"Attributes": deepcopy(updated)}
+        return {}
+
+
+    def query(self, KeyConditionExpression: str, **kwargs):
+        """Evaluate the key condition (and any FilterExpression) over every item, in key order."""
+        self._record("Query")
+        return self._read(KeyConditionExpression, kwargs)
+
+    def scan(self, **kwargs):
+        self._record("Scan")
+        return self._read(None, {**kwargs, "ScanIndexForward": True})
+
+    def _read(self, key_condition: str | None, kwargs: dict) -> dict:
+        names = kwargs.get("ExpressionAttributeNames")
+        values = kwargs.get("ExpressionAttributeValues")
+        key_fields = [k for k in (self.hash_key, self.range_key) if k]
+        index = kwargs.get("IndexName")
+        partition_key = self.indexes[index][0] if index is not None else self.hash_key
+        keys = [k for k, item in self.items.items() if partition_key in item]
+        if key_condition is not None:
+            # Key conditions open with "<hash> = :value"; narrow to that partition up front.
+            tokens = _tokenize(key_condition)
+            if len(tokens) >= 3 and (names or {}).get(tokens[0], tokens[0]) == partition_key and tokens[1] == "=":
+                wanted = values[tokens[2]]
+                keys = [k for k in keys if self.items[k][partition_key] == wanted]
+        if index is not None:
+            index_hash, index_range = self.indexes[index]
+            keys.sort(key=lambda k: (self.items[k][index_hash], self.items[k].get(index_range, ""), k))
+            key_fields += [f for f in (index_hash, index_range) if f not in key_fields]
+        else:
+            keys.sort()
+        if not kwargs.get("ScanIndexForward", True):
+            keys.reverse()
+        start = kwargs.get("ExclusiveStartKey")
+        if start is not None:
+            start_key = self._key(start)
+            keys = keys[keys.index(start_key) + 1:]
+        limit = kwargs.get("Limit")
+        evaluated = []
+        matched = []
+        for key in keys:
+            item = self.items[key]
+            if key_condition is not None and not _Expression(key_condition, names, values).condition(item):
+                continue
+            evaluated.append(key)
+            filter_expression = kwargs.get("FilterExpression")
+            if filter_expression is None or _Expression(filter_expression, names, values).condition(item):
+                matched.append(deepcopy(item))
+            if limit is not None and len(evaluated) >= limit:
+                break
+        with self._lock:
+            self.items_scanned += len(evaluated)
+        resp = {"Count": len(matched), "ScannedCount": len(evaluated)}
+        if kwargs.get("Select") != "COUNT":
+            resp["Items"] = matched
+        if limit is not None and len(evaluated) >= limit and evaluated[-1] != keys[-1]:
+            last = self.items[evaluated[-1]]
+            resp["LastEvaluatedKey"] = {k: last[k] for k in key_fields}
+        return resp
+
+
+class StubDynamoDB:
+    """Stand-in for boto3.resource("dynamodb"); Table(name) returns registered StubTables.
+
+    `meta.client` is a StubDynamoDBClient over the same tables, as on a real resource.
+    """
+
+    def __init__(self, *tables: StubTable):
+        self.tables = {t.name: t for t in tables}
+        self.meta = SimpleNamespace(client=StubDynamoDBClient(*tables))
+
+    def Table(self, name: str) -> StubTable:
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems: dict, **kwargs):
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.tables[name]
+            table._record("BatchGetItem")
+            found = (table.items.get(table._key(key)) for key in request["Keys"])
+            responses[name] = [deepcopy(item) for item in found if item is not None]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+
+class StubDynamoDBClient:
+    """Stand-in for boto3.client("dynamodb") over StubTables (BatchWriteItem, UpdateItem,
+    TransactWriteItems with Put/Update actions, and the GetItem / BatchGetItem / Query reads).
+
+    `unprocessed_rate` is the chance that each put request is bounced back in
+    UnprocessedItems, modelling partition throttling.
+    """
+
+    def __init__(self, *tables: StubTable, latency: float = 0.0, unprocessed_rate: float = 0.0, seed: int = 0):
+        self.tables = {t.name: t for t in tables}
+        self.latency = latency
+        self.unprocessed_rate = unprocessed_rate
+        self.calls: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._deserializer = TypeDeserializer()
+        self._serializer = TypeSerializer()
+
+    def batch_write_item(self, RequestItems: dict, **kwargs):
+        with self._lock:
+            self.calls["BatchWriteItem"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        unprocessed = {}
+        for table_name, requests in RequestItems.items():
+            if len(requests) > 25:
+                raise ClientError({"Error": {"Code": "ValidationException", "Message": "Too many items"}}, "BatchWriteItem")
+            table = self.tables[table_name]
+            with table._lock:
+                table.calls["BatchWriteItem"] += 1
+            keys = set()
+            for request in requests:
+                item = {k: self._deserializer.deserialize(v) for k, v in request["PutRequest"]["Item"].items()}
+                key = table._key(item)
+                if key in keys:
+                    raise ClientError(
+                        {"Error": {"Code": "ValidationException", "Message": "Provided list of item keys contains duplicates"}},
+                        "BatchWriteItem",
+                    )
+                keys.add(key)
+                with self._lock:
+                    bounced = self._rng.random() < self.unprocessed_rate
+                if bounced:
+                    unprocessed.setdefault(table_name, []).append(request)
+                else:
+                    table.items[key] = item
+        return {"UnprocessedItems": unprocessed}
+
+    def _deserialize(self, values: dict | None) -> dict | None:
+        if values is None:
+            return None
+        return {k: self._deserializer.deserialize(v) for k, v in values.items()}
+
+    def _serialize(self, item: dict) -> dict:
+        return {k: self._serializer.serialize(v) for k, v in item.items()}
+
+    def get_item(self, TableName: str, Key: dict, **kwargs):
+        with self._lock:
+            self.calls["GetItem"] += 1
+        resp = self.tables[TableName].get_item(Key=self._deserialize(Key))
+        return {"Item": self._serialize(resp["Item"])} if "Item" in resp else {}
+
+    def batch_get_item(self, RequestItems: dict, **kwargs):
+        with self._lock:
+            self.calls["BatchGetItem"] += 1
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.tables[name]
+            table._record("BatchGetItem")
+            found = (table.items.get(table._key(self._deserialize(key))) for key in request["Keys"])
+            responses[name] = [self._serialize(item) for item in found if item is not None]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+    def query(self, TableName: str, KeyConditionExpression: str, **kwargs):
+        with self._lock:
+            self.calls["Query"] += 1
+        for field in ("ExpressionAttributeValues", "ExclusiveStartKey"):
+            if field in kwargs:
+                kwargs[field] = self._deserialize(kwargs[field])
+        resp = self.tables[TableName].query(KeyConditionExpression=KeyConditionExpression, **kwargs)
+        if "Items" in resp:
+            resp["Items"] = [self._serialize(item) for item in resp["Items"]]
+        if "LastEvaluatedKey" in resp:
+            resp["LastEvaluatedKey"] = self._serialize(resp["LastEvaluatedKey"])
+        return resp
+
+    def update_item(self, TableName: str, Key: dict, UpdateExpression: str, **kwargs):
+        with self._lock:
+            self.calls["UpdateItem"] += 1
+        if "ExpressionAttributeValues" in kwargs:
+            kwargs["ExpressionAttributeValues"] = self._deserialize(kwargs["ExpressionAttributeValues"])
+        try:
+            return self.tables[TableName].update_item(Key=self._deserialize(Key), UpdateExpression=UpdateExpression, **kwargs)
+        except ClientError as e:
+            if "Item" in e.response:
+                e.response["Item"] = self._serialize(e.response["Item"])
+            raise
+
+    def transact_write_items(self, TransactItems: list[dict], **kwargs):
+        """All-or-nothing: every condition is checked before any write is applied."""
+        with self._lock:
+            self.calls["TransactWriteItems"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        # Checked and applied under one lock: DynamoDB applies a transaction atomically.
+        with self._lock:
+            return self._transact(TransactItems)
+
+    def _transact(self, TransactItems: list[dict]):
+        for name in {spec["TableName"] for action in TransactItems for spec in action.values()}:
+            with self.tables[name]._lock:
+                self.tables[name].calls["TransactWriteItems"] += 1
+        writes = []
+        reasons = []
+        for action in TransactItems:
+            (kind, spec), = action.items()
+            table = self.tables[spec["TableName"]]
+            names = spec.get("ExpressionAttributeNames")
+            values = self._deserialize(spec.get("ExpressionAttributeValues"))
+            if kind == "Put":
+                key_or_item = self._deserialize(spec["Item"])
+            else:
+                key_or_item = self._deserialize(spec["Key"])
+            key = table._key(key_or_item)
+            current = table.items.get(key, {})
+            condition = spec.get("ConditionExpression")
+            if condition is not None and not _Expression(condition, names, values).condition(current):
+                reasons.append({"Code": "ConditionalCheckFailed"})
+                continue
+            reasons.append({"Code": "None"})
+            if kind == "Put":
+                writes.append((table, key, key_or_item))
+            else:
+                updated = _Expression(spec["UpdateExpression"], names, values).apply_update(current)
+                updated.update(key_or_item)
+                writes.append((table, key, updated))
+        if any(r["Code"] != "None" for r in reasons):
+            raise ClientError(
+                {"Error": {"Code": "TransactionCanceledException", "Message": "Transaction cancelled"},
+                 "CancellationReasons": reasons},
+                "TransactWriteItems",
+            )
+        for table, key, item in writes:
+            table.items[key] = item
+        return {}
+
+
+class StubSNS:
+    """Stand-in for boto3.client("sns") that keeps every published message."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.published: list[dict] = []
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def publish(self, **kwargs):
+        with self._lock:
+            self.calls["Publish"] += 1
+            self.published.append(kwargs)
+            message_id = str(len(self.published))
+        if self.latency:
+            time.sleep(self.latency)
+        return {"MessageId": message_id}
+
+
+class StubManagementApi:
+    """Stand-in for boto3.client("apigatewaymanagementapi"); `gone` connections raise GoneException."""
+
+    def __init__(self, latency: float = 0.0, gone: set | None = None):
+        self.latency = latency
+        self.gone = set(gone or ())
+        self.posted: Counter = Counter()
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def post_to_connection(self, ConnectionId: str, Data: bytes, **kwargs):
+        with self._lock:
+            self.calls["PostToConnection"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if ConnectionId in self.gone:
+            raise ClientError({"Error": {"Code": "GoneException", "Message": "Gone"}}, "PostToConnection")
+        with self._lock:
+            self.posted[ConnectionId] += len(Data)
+        return {}
+
+
+class StubKinesis:
+    """Stand-in for boto3.client("kinesis"); `failure_rate` rejects PutRecords entries as throttled.
+
+    The stream has `shards` open shards splitting the hash key space evenly (ListShards).
+    """
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0, shards: int = 1):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.shards = shards
+        self.records: list[dict] = []
+        self.calls: Counter = Counter()
+        self._rng = random.Random(seed)
+
+    def _sequence(self) -> str:
+        return str(len(self.records)).zfill(20)
+
+    def list_shards(self, **kwargs):
+        self.calls["ListShards"] += 1
+        width = 2 ** 128 // self.shards
+        shards = []
+        for i in range(self.shards):
+            end = 2 ** 128 - 1 if i == self.shards - 1 else (i + 1) * width - 1
+            shards.append({
+                "ShardId": f"shardId-{i:012d}",
+                "HashKeyRange": {"StartingHashKey": str(i * width), "EndingHashKey": str(end)},
+            })
+        return {"Shards": shards}
+
+    def put_record(self, StreamName: str, Data: bytes, PartitionKey: str, **kwargs):
+        self.calls["PutRecord"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        self.records.append({"Data": Data, "PartitionKey": PartitionKey})
+        return {"ShardId": "shardId-000000000000", "SequenceNumber": self._sequence()}
+
+    def put_records(self, StreamName: str, Records: list[dict], **kwargs):
+        self.calls["PutRecords"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        results = []
+        for entry in Records:
+            if self._rng.random() < self.failure_rate:
+                results.append({"ErrorCode": "ProvisionedThroughputExceededException", "ErrorMessage": "Rate exceeded"})
+                continue
+            self.records.append(entry)
+            results.append({"ShardId": "shardId-000000000000", "SequenceNumber": self._sequence()})
+        return {"FailedRecordCount": sum(1 for r in results if "ErrorCode" in r), "Records": results}
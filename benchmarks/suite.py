@@ -0,0 +1,393 @@
+"""
+Benchmark suite: drive every pipeline Lambda with one synthetic tick stream (loadgen.py)
+against the in-memory stand-ins in stubs.py and report, per handler:
+
+  records/s      records handled per second spent inside the handler (best of --repeats)
+  p50 / p99      invocation latency, ms
+  ddb/record     DynamoDB requests per record (batch and transactional writes count once)
+  aws/record     other AWS requests per record (Kinesis, SNS, WebSocket posts)
+  peak KiB       largest traced allocation growth during one invocation (tracemalloc, in a
+                 separate pass so tracing does not skew the timings)
+
+The stream consumers get the stream in Kinesis batches of --batch-size binary records,
+the lake transformer the same batches as Firehose records, the stream broadcaster the
+same batches as the prices table's stream records of the stored ticks, the ingester polls
+fake_quote_server for every symbol, and api_handler answers /prices, /stats and
+/anomalies (response cache off) over tables the price processor filled from the stream.
+Embedded metrics are on (METRICS_ENABLED=true) as in the deployed functions, so their
+cost is part of every number; so is the anomaly detector's correlation pass
+(CORRELATION_ENABLED=true), starting from no saved state.
+
+--save-baseline writes the results with the profile that produced them; --baseline
+compares against such a file and exits 1 if any metric is worse by more than
+--tolerance. Timings and memory depend on the machine, so keep baselines per machine;
+request counts are deterministic for a profile.
+
+    python benchmarks/suite.py
+    python benchmarks/suite.py --save-baseline benchmarks/baselines/default.json
+    python benchmarks/suite.py --baseline benchmarks/baselines/default.json
+    python benchmarks/suite.py --only aggregator,anomaly_detector --symbols 50 --rate 2
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, NamedTuple
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import loadgen  # noqa: E402
+from fake_quote_server import FakeQuoteServer  # noqa: E402
+from harness import kinesis_event, load_lambda  # noqa: E402
+from stubs import (  # noqa: E402
+    StubDynamoDB, StubDynamoDBClient, StubKinesis, StubManagementApi, StubSNS, StubTable,
+)
+
+PRICES_TABLE = "bench-prices"
+CANDLES_TABLE = "bench-candles"
+ANOMALY_TABLE = "bench-anomalies"
+CONNECTIONS_TABLE = "bench-connections"
+# Environment every handler runs with, before its own settings.
+HANDLER_ENV = {"METRICS_ENABLED": "true", "METRICS_SAMPLE_RATE": "1"}
+
+# metric: True if higher is better
+METRICS = {
+    "records_per_sec": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "ddb_per_record": False,
+    "aws_per_record": False,
+    "peak_kib": False,
+}
+
+
+class Run(NamedTuple):
+    handler: Callable
+    events: list
+    records: int
+    env: dict
+    tables: list  # StubTables whose calls are DynamoDB requests
+    clients: list  # other stand-ins with a `calls` Counter
+    teardown: Callable | None = None
+
+
+def ddb_calls(run: Run) -> int:
+    return sum(t.total_calls for t in run.tables)
+
+
+def aws_calls(run: Run) -> int:
+    return sum(sum(c.calls.values()) for c in run.clients)
+
+
+def consumer_events(batches: list[list[dict]]) -> list[dict]:
+    events, sequence = [], 1
+    for batch in batches:
+        events.append(kinesis_event(batch, first_sequence=sequence, binary=True))
+        sequence += len(batch)
+    return events
+
+
+def build_stream(spec: loadgen.StreamSpec, batch_size: int) -> tuple[dict, int]:
+    """The stream every case is set up from, and how many spikes it carries."""
+    ticks, spikes = loadgen.generate(spec)
+    batches = loadgen.batches(ticks, batch_size)
+    stream = {
+        "symbols": loadgen.symbol_names(spec.symbols),
+        "ticks": ticks,
+        "batches": batches,
+        "events": consumer_events(batches),
+        "records": len(ticks),
+    }
+    return stream, spikes
+
+
+def setup_data_ingester(stream, args) -> Run:
+    ingester = load_lambda("data_ingester")
+    server = FakeQuoteServer(seed=args.seed).start()
+    kinesis = StubKinesis(shards=2, seed=args.seed)
+    ingester._kinesis = kinesis
+    ingester._shard_map = None
+    env = {
+        "KINESIS_STREAM_NAME": "bench",
+        "ALPHA_VANTAGE_API_KEY": "bench",
+        "QUOTE_API_URL": server.base_url,
+        "SYMBOLS": ",".join(stream["symbols"]),
+        "QUOTE_RATE_LIMIT": "1000000",
+    }
+    invocations = max(1, min(len(stream["batches"]), args.ingest_invocations))
+    return Run(ingester.lambda_handler, [{}] * invocations, invocations * len(stream["symbols"]), env,
+               [], [kinesis], server.shutdown)
+
+
+def setup_price_processor(stream, args) -> Run:
+    processor = load_lambda("price_processor")
+    prices = StubTable(PRICES_TABLE, "symbol", "timestamp")
+    processor._dynamodb_client = StubDynamoDBClient(prices, latency=args.latency)
+    return Run(processor.lambda_handler, stream["events"], stream["records"], {"DYNAMODB_TABLE": PRICES_TABLE},
+               [prices], [])
+
+
+def setup_aggregator(stream, args) -> Run:
+    aggregator = load_lambda("aggregator")
+    candles = StubTable(CANDLES_TABLE, "symbol", "candle_timestamp", latency=args.latency)
+    aggregator._dynamodb = StubDynamoDB(candles)
+    aggregator.watermarks.STATES.clear()
+    return Run(aggregator.lambda_handler, stream["events"], stream["records"], {"DYNAMODB_TABLE": CANDLES_TABLE},
+               [candles], [])
+
+
+def setup_anomaly_detector(stream, args) -> Run:
+    detector = load_lambda("anomaly_detector")
+    processor = load_lambda("price_processor")
+    prices = StubTable(PRICES_TABLE, "symbol", "timestamp", latency=args.latency)
+    anomalies = StubTable(ANOMALY_TABLE, "symbol", "detected_at", latency=args.latency)
+    # The price processor stores the same ticks concurrently; windows seed from before a batch.
+    for tick in stream["ticks"]:
+        item = processor.build_item(tick)
+        prices.items[prices._key(item)] = item
+    sns = StubSNS()
+    detector._dynamodb = StubDynamoDB(prices, anomalies)
+    detector._sns = sns
+    detector.WINDOW_CACHE.clear()
+    detector.ALERT_COOLDOWNS.clear()
+    detector.CORRELATIONS = None
+    env = {"DYNAMODB_TABLE": PRICES_TABLE, "ANOMALY_TABLE": ANOMALY_TABLE, "SNS_TOPIC_ARN": "arn:bench",
+           "CORRELATION_ENABLED": "true"}
+    return Run(detector.lambda_handler, stream["events"], stream["records"], env, [prices, anomalies], [sns])
+
+
+def setup_stream_broadcaster(stream, args) -> Run:
+    broadcaster = load_lambda("stream_broadcaster")
+    processor = load_lambda("price_processor")
+    fanout, aws = sys.modules["fanout"], sys.modules["aws"]
+    connections = StubTable(CONNECTIONS_TABLE, "connection_id", latency=args.latency)
+    symbols = stream["symbols"]
+    for i in range(args.connections):
+        # Half follow everything, half a few symbols each, like dashboards and watchlists.
+        subscribed = fanout.ALL_SYMBOLS if i % 2 == 0 else ",".join(symbols[(i + k) % len(symbols)] for k in range(3))
+        connections.items[(f"conn-{i}",)] = {"connection_id": f"conn-{i}", "symbols": subscribed}
+    management = StubManagementApi(latency=args.latency)
+    broadcaster._dynamodb = StubDynamoDB(connections)
+    broadcaster._management = management
+    broadcaster._connections = None
+    # Prices reach the broadcaster as the prices table's stream, not from Kinesis.
+    events = [
+        {"Records": [
+            {"eventSource": "aws:dynamodb", "eventName": "INSERT",
+             "dynamodb": {"NewImage": aws.serialize_item(processor.build_item(tick))}}
+            for tick in batch
+        ]}
+        for batch in stream["batches"]
+    ]
+    env = {"CONNECTIONS_TABLE": CONNECTIONS_TABLE, "WEBSOCKET_ENDPOINT": "https://bench.invalid"}
+    return Run(broadcaster.lambda_handler, events, stream["records"], env, [connections], [management])
+
+
+def setup_lake_transformer(stream, args) -> Run:
+    transformer = load_lambda("lake_transformer")
+    events = [
+        {"records": [{"recordId": r["kinesis"]["sequenceNumber"], "data": r["kinesis"]["data"]} for r in event["Records"]]}
+        for event in stream["events"]
+    ]
+    return Run(transformer.lambda_handler, events, stream["records"], {}, [], [])
+
+
+def setup_api_handler(stream, args) -> Run:
+    api = load_lambda("api_handler")
+    processor = load_lambda("price_processor")
+    prices = StubTable(PRICES_TABLE, "symbol", "timestamp")
+    candles = StubTable(CANDLES_TABLE, "symbol", "candle_timestamp")
+    anomalies = StubTable(ANOMALY_TABLE, "symbol", "detected_at", indexes={"by_time": ("time_bucket", "detected_at")})
+    processor._dynamodb_client = StubDynamoDBClient(prices)
+    with mock.patch.dict(os.environ, {"DYNAMODB_TABLE": PRICES_TABLE}), contextlib.redirect_stdout(None):
+        for event in stream["events"]:
+            processor.lambda_handler(event, None)
+    for table in (prices, candles, anomalies):
+        table.latency = args.latency
+        table.calls.clear()
+    api._dynamodb = StubDynamoDB(prices, candles, anomalies)
+
+    routes = (("/prices", None), ("/stats", None), ("/anomalies", {"limit": "20"}))
+    events = [
+        {"requestContext": {"http": {"method": "GET"}}, "rawPath": path, "queryStringParameters": query, "headers": {}}
+        for path, query in (routes[i % len(routes)] for i in range(len(stream["events"])))
+    ]
+    env = {"PRICES_TABLE": PRICES_TABLE, "CANDLES_TABLE": CANDLES_TABLE, "ANOMALY_TABLE": ANOMALY_TABLE,
+           "RESPONSE_CACHE_ENABLED": "false"}
+    return Run(api.lambda_handler, events, len(events), env, [prices, candles, anomalies], [])
+
+
+CASES = {
+    "data_ingester": setup_data_ingester,
+    "price_processor": setup_price_processor,
+    "aggregator": setup_aggregator,
+    "anomaly_detector": setup_anomaly_detector,
+    "stream_broadcaster": setup_stream_broadcaster,
+    "lake_transformer": setup_lake_transformer,
+    "api_handler": setup_api_handler,
+}
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def timed_pass(run: Run) -> dict:
+    latencies = []
+    with mock.patch.dict(os.environ, {**HANDLER_ENV, **run.env}), contextlib.redirect_stdout(None):
+        for event in run.events:
+            start = time.perf_counter()
+            run.handler(event, None)
+            latencies.append(time.perf_counter() - start)
+    total = sum(latencies)
+    return {
+        "records": run.records,
+        "invocations": len(run.events),
+        "records_per_sec": round(run.records / total, 1) if total else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "ddb_per_record": round(ddb_calls(run) / run.records, 4),
+        "aws_per_record": round(aws_calls(run) / run.records, 4),
+    }
+
+
+def memory_pass(run: Run, invocations: int) -> float:
+    peak = 0
+    tracemalloc.start()
+    try:
+        with mock.patch.dict(os.environ, {**HANDLER_ENV, **run.env}), contextlib.redirect_stdout(None):
+            for event in run.events[:invocations]:
+                before, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                run.handler(event, None)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def measure(name: str, stream: dict, args) -> dict:
+    """Best of --repeats timed passes (each from fresh stand-ins), plus a memory pass."""
+    result = None
+    for _ in range(max(1, args.repeats)):
+        run = CASES[name](stream, args)
+        try:
+            attempt = timed_pass(run)
+        finally:
+            if run.teardown:
+                run.teardown()
+        if result is None or attempt["records_per_sec"] > result["records_per_sec"]:
+            result = attempt
+    run = CASES[name](stream, args)
+    try:
+        result["peak_kib"] = memory_pass(run, args.memory_invocations)
+    finally:
+        if run.teardown:
+            run.teardown()
+    return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Print each metric against the baseline; returns the regressions."""
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:<19} (no baseline)")
+            continue
+        cells = []
+        for metric, higher_is_better in METRICS.items():
+            old, new = base.get(metric), metrics.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else (0.0 if new == old else math.inf)
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > tolerance:
+                flag = "!"
+                regressions.append(f"{name} {metric}: {old} -> {new} ({change:+.0%})")
+            cells.append(f"{metric}={change:+.0%}{flag}")
+        print(f"{name:<19} " + "  ".join(cells))
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help=f"comma separated subset of: {', '.join(CASES)}")
+    parser.add_argument("--symbols", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=1.0, help="ticks per second per symbol")
+    parser.add_argument("--seconds", type=float, default=600.0, help="event time covered by the stream")
+    parser.add_argument("--volatility", type=float, default=0.001, help="per-tick relative price stddev")
+    parser.add_argument("--spike-rate", type=float, default=0.002, help="share of ticks that are spikes")
+    parser.add_argument("--spike-size", type=float, default=0.05, help="relative size of a spike")
+    parser.add_argument("--batch-size", type=int, default=100, help="records per Kinesis batch")
+    parser.add_argument("--connections", type=int, default=100, help="WebSocket connections for the broadcaster")
+    parser.add_argument("--ingest-invocations", type=int, default=10, help="polling rounds for the ingester")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="stub latency per AWS call")
+    parser.add_argument("--repeats", type=int, default=3, help="timed passes per handler; the best is kept")
+    parser.add_argument("--memory-invocations", type=int, default=20, help="invocations traced for peak memory")
+    parser.add_argument("--seed", type=int, default=19)
+    parser.add_argument("--save-baseline", help="write results and profile to this JSON file")
+    parser.add_argument("--baseline", help="compare against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed relative regression per metric")
+    args = parser.parse_args()
+    args.latency = args.latency_ms / 1000
+
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        parser.error(f"unknown handlers: {', '.join(unknown)}")
+
+    spec = loadgen.StreamSpec(args.symbols, args.rate, args.seconds, args.volatility, args.spike_rate,
+                              args.spike_size, args.seed)
+    stream, spikes = build_stream(spec, args.batch_size)
+    ticks, batches = stream["ticks"], stream["batches"]
+    profile = {k: getattr(args, k) for k in (
+        "symbols", "rate", "seconds", "volatility", "spike_rate", "spike_size", "batch_size", "connections",
+        "ingest_invocations", "latency_ms", "seed",
+    )}
+    print(f"{len(ticks)} ticks ({spikes} spikes), {len(batches)} batches of {args.batch_size}, "
+          f"{args.symbols} symbols, {args.latency_ms} ms per AWS call")
+    print(f"{'handler':<19} {'records/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'ddb/record':>10} {'aws/record':>10} {'peak KiB':>9}")
+
+    results = {}
+    for name in names:
+        r = measure(name, stream, args)
+        results[name] = r
+        print(f"{name:<19} {r['records_per_sec']:>10.0f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+              f"{r['ddb_per_record']:>10.3f} {r['aws_per_record']:>10.3f} {r['peak_kib']:>9.0f}")
+
+    if args.save_baseline:
+        Path(args.save_baseline).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump({
+                "profile": profile,
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("profile") != profile:
+            print("warning: baseline was recorded with a different profile; comparisons are not like for like")
+        print(f"against {args.baseline} (tolerance {args.tolerance:.0%}, ! = regression):")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
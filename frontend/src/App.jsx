@@ -9,8 +9,12 @@ import {
   getLatestPrices,
   getPriceHistory,
   getStats,
+  isLiveStreamConfigured,
+  openLiveStream,
 } from './services/api'
 
+const MAX_ANOMALIES = 20
+
 function App() {
   const [prices, setPrices] = useState({})
   const [anomalies, setAnomalies] = useState([])
@@ -21,6 +25,7 @@ function App() {
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState(null)
   const [autoRefresh, setAutoRefresh] = useState(true)
+  const [live, setLive] = useState(false)
 
   const fetchDashboard = useCallback(async () => {
     try {
@@ -40,6 +45,15 @@ function App() {
     }
   }, [])
 
+  const fetchStats = useCallback(async () => {
+    try {
+      const res = await getStats()
+      setStats(res.data ?? null)
+    } catch (err) {
+      // Keep the last stats; the next poll or a full refresh tries again.
+    }
+  }, [])
+
   const fetchPriceHistory = useCallback(async () => {
     if (!selectedSymbol) return
     try {
@@ -54,11 +68,32 @@ function App() {
     fetchDashboard()
   }, [fetchDashboard])
 
+  // With a push channel, prices and anomalies arrive as they happen; polling them is only
+  // the fallback while the stream is down or not configured. Stats are not pushed, so they
+  // keep polling either way.
+  useEffect(() => {
+    if (!autoRefresh || !isLiveStreamConfigured()) return
+    const close = openLiveStream(
+      (message) => {
+        if (message.type === 'price') {
+          setPrices((prev) => ({ ...prev, [message.symbol]: { ...prev[message.symbol], ...message } }))
+        } else if (message.type === 'anomaly') {
+          setAnomalies((prev) => [message, ...prev].slice(0, MAX_ANOMALIES))
+        }
+      },
+      { onStatus: (status) => setLive(status === 'open') },
+    )
+    return () => {
+      close()
+      setLive(false)
+    }
+  }, [autoRefresh])
+
   useEffect(() => {
     if (!autoRefresh) return
-    const id = setInterval(fetchDashboard, 60_000)
+    const id = setInterval(live ? fetchStats : fetchDashboard, 60_000)
     return () => clearInterval(id)
-  }, [autoRefresh, fetchDashboard])
+  }, [autoRefresh, live, fetchDashboard, fetchStats])
 
   useEffect(() => {
     fetchPriceHistory()
@@ -91,7 +126,7 @@ function App() {
                 : 'border-zinc-600 bg-zinc-800 text-zinc-400'
             }`}
           >
-            Auto-refresh {autoRefresh ? 'ON' : 'OFF'}
+            {live ? 'Live' : 'Auto-refresh'} {autoRefresh ? 'ON' : 'OFF'}
           </button>
         </header>
 
@@ -6,9 +6,12 @@ export default function StatsBar({ stats }) {
     anomalies_24h = 0,
     symbols_tracked = [],
     pipeline_status = 'unknown',
+    status_reasons = [],
   } = stats
 
-  const isActive = String(pipeline_status).toLowerCase() === 'operational' || String(pipeline_status).toLowerCase() === 'active'
+  const status = String(pipeline_status).toLowerCase()
+  const isActive = status === 'operational' || status === 'active'
+  const isDegraded = status === 'degraded'
   const symbolCount = Array.isArray(symbols_tracked) ? symbols_tracked.length : 0
 
   return (
@@ -31,12 +34,14 @@ export default function StatsBar({ stats }) {
       </div>
       <div className="flex-1 min-w-[140px] rounded border border-zinc-600/60 bg-zinc-800/80 px-4 py-3 text-white shadow-sm">
         <div className="text-zinc-400 text-xs uppercase tracking-wider">Pipeline Status</div>
-        <div className="mt-0.5 flex items-center gap-2">
+        <div className="mt-0.5 flex items-center gap-2" title={status_reasons.join('; ')}>
           <span
-            className={`h-2 w-2 shrink-0 rounded-full ${isActive ? 'bg-emerald-500' : 'bg-red-500'}`}
+            className={`h-2 w-2 shrink-0 rounded-full ${
+              isActive ? 'bg-emerald-500' : isDegraded ? 'bg-amber-500' : 'bg-red-500'
+            }`}
             aria-hidden
           />
-          <span className="tabular-nums">{isActive ? 'Active' : 'Down'}</span>
+          <span className="tabular-nums">{isActive ? 'Active' : isDegraded ? 'Degraded' : 'Down'}</span>
         </div>
       </div>
     </div>
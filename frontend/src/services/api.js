@@ -12,14 +12,70 @@ export function getPriceHistory(symbol, hours = 24) {
   return api.get(`/prices/${encodeURIComponent(symbol)}`, { params: { hours } })
 }
 
-export function getAnomalies(limit = 20) {
-  return api.get('/anomalies', { params: { limit } })
+// Filters are optional; pass the previous response's next_cursor to fetch the next page.
+export function getAnomalies(limit = 20, { symbol, severity, cursor } = {}) {
+  return api.get('/anomalies', { params: { limit, symbol, severity, cursor } })
 }
 
-export function getCandles(symbol, limit = 50) {
-  return api.get(`/candles/${encodeURIComponent(symbol)}`, { params: { limit } })
+export function getCandles(symbol, limit = 50, resolution = '1m') {
+  return api.get(`/candles/${encodeURIComponent(symbol)}`, { params: { limit, resolution } })
 }
 
 export function getStats() {
   return api.get('/stats')
 }
+
+const STREAM_URL = import.meta.env.VITE_STREAM_URL
+
+export function isLiveStreamConfigured() {
+  return Boolean(STREAM_URL)
+}
+
+// Push channel: the broadcaster's WebSocket (wss://, frames of {messages: [...]}) or the
+// local SSE server (http://, one event per message). Returns a function that closes it.
+export function openLiveStream(onMessage, { symbols, onStatus } = {}) {
+  if (!STREAM_URL) return () => {}
+  const url = new URL(STREAM_URL)
+  if (symbols?.length) url.searchParams.set('symbols', symbols.join(','))
+
+  if (url.protocol === 'ws:' || url.protocol === 'wss:') {
+    let socket
+    let closed = false
+    let retryTimer
+    const connect = () => {
+      socket = new WebSocket(url)
+      socket.onopen = () => onStatus?.('open')
+      socket.onmessage = (event) => {
+        try {
+          const frame = JSON.parse(event.data)
+          ;(frame.messages ?? [frame]).forEach(onMessage)
+        } catch {
+          // ignore malformed frames
+        }
+      }
+      socket.onclose = () => {
+        onStatus?.('closed')
+        if (!closed) retryTimer = setTimeout(connect, 3000)
+      }
+    }
+    connect()
+    return () => {
+      closed = true
+      clearTimeout(retryTimer)
+      socket?.close()
+    }
+  }
+
+  const source = new EventSource(url)
+  source.onopen = () => onStatus?.('open')
+  source.onerror = () => onStatus?.('closed')
+  const handle = (event) => {
+    try {
+      onMessage(JSON.parse(event.data))
+    } catch {
+      // ignore malformed events
+    }
+  }
+  ;['price', 'candle', 'anomaly'].forEach((type) => source.addEventListener(type, handle))
+  return () => source.close()
+}
@@ -0,0 +1,214 @@
+"""
+Event-time watermarks for the aggregator: when a candle is complete, and what to do with
+ticks that arrive after that.
+
+Each symbol has one item under a reserved partition of the candles table,
+symbol="__watermark__", candle_timestamp=<SYMBOL>, holding
+
+  watermark_us    latest tick event time taken in for the symbol (epoch microseconds)
+  merged_through  highest Kinesis sequence number taken in (zero-padded, "" if none)
+  pending         "<resolution>|<candle start>" of every candle not final yet
+
+A candle is final once the watermark reaches its end plus the allowed lateness
+(ALLOWED_LATENESS_SECONDS). Finalizing sets final=true on the candle; the candles
+table's stream turns that write into a "candle closed" message for the dashboard, and the
+aggregator refuses to merge into a final candle, so it never changes again and readers
+may cache it for good.
+
+Lateness is judged against the watermark as of the start of the batch. A tick whose
+1-minute candle is already due is late: it is kept under symbol="__late__#<SYMBOL>"
+(candle_timestamp="<event time>#<sequence>") instead of reopening the candle. Ticks at or
+below merged_through are replays of records already taken in and are dropped.
+
+A symbol's watermark only moves after every candle write for it in the batch succeeded,
+so a retried batch is judged against the same watermark. The candles it did write are
+still added to pending: the retry restarts at the lowest failed record, so the records
+before it are not delivered again and nothing else would bring their candles back to be
+finalized. An item with pending but no watermark yet reads as NO_WATERMARK. States are cached per
+container, since a symbol stays on its shard; each update is conditioned on the state it
+was computed from, and a container that fell behind rereads and retries.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from botocore.exceptions import ClientError
+
+from record_codec import micros_to_datetime, timestamp_to_micros
+from timeutil import format_timestamp
+
+WATERMARK_PARTITION = "__watermark__"
+LATE_PREFIX = "__late__"
+DEFAULT_ALLOWED_LATENESS_SECONDS = 60
+MAX_UPDATE_ATTEMPTS = 3
+NO_WATERMARK = -1
+BATCH_GET_LIMIT = 100
+NAMES = {"#wm": "watermark_us", "#mt": "merged_through", "#pending": "pending", "#ttl": "ttl"}
+
+
+@dataclass(frozen=True)
+class Watermark:
+    watermark_us: int
+    merged_through: str
+    pending: frozenset
+
+
+# Last state written or read per symbol, reused across warm invocations.
+STATES: dict[str, Watermark] = {}
+
+
+def from_item(item: dict | None) -> Watermark | None:
+    if not item or ("watermark_us" not in item and not item.get("pending")):
+        return None
+    return Watermark(int(item.get("watermark_us", NO_WATERMARK)), str(item.get("merged_through", "")),
+                     frozenset(item.get("pending") or ()))
+
+
+def pending_key(resolution: str, candle_ts: str) -> str:
+    return f"{resolution}|{candle_ts}"
+
+
+def candle_end_us(key: str, resolution_seconds: dict) -> int:
+    resolution, candle_ts = key.split("|", 1)
+    return timestamp_to_micros(candle_ts) + resolution_seconds[resolution] * 1_000_000
+
+
+def load(dynamodb, table_name: str, symbols) -> dict[str, Watermark | None]:
+    """States for `symbols`: cached ones as they are, the rest in BatchGetItem calls."""
+    states = {s: STATES.get(s) for s in symbols}
+    missing = [s for s, state in states.items() if state is None]
+    for i in range(0, len(missing), BATCH_GET_LIMIT):
+        keys = [{"symbol": WATERMARK_PARTITION, "candle_timestamp": s} for s in missing[i:i + BATCH_GET_LIMIT]]
+        r = dynamodb.batch_get_item(RequestItems={table_name: {"Keys": keys, "ConsistentRead": True}})
+        # Unprocessed keys stay unknown; the conditional update in advance() finds them.
+        for item in r.get("Responses", {}).get(table_name, []):
+            state = from_item(item)
+            if state is not None:
+                STATES[item["candle_timestamp"]] = state
+                states[item["candle_timestamp"]] = state
+    return states
+
+
+def read(table, symbol: str) -> Watermark | None:
+    item = table.get_item(
+        Key={"symbol": WATERMARK_PARTITION, "candle_timestamp": symbol}, ConsistentRead=True
+    ).get("Item")
+    return from_item(item)
+
+
+def finalize(table, partition: str, candle_ts: str) -> bool:
+    """Mark a candle final; False if it does not exist or already was."""
+    try:
+        table.update_item(
+            Key={"symbol": partition, "candle_timestamp": candle_ts},
+            UpdateExpression="SET #final = :final",
+            ConditionExpression="attribute_exists(#ts) AND attribute_not_exists(#final)",
+            ExpressionAttributeNames={"#final": "final", "#ts": "candle_timestamp"},
+            ExpressionAttributeValues={":final": True},
+        )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return False
+
+
+def advance(table, symbol: str, state: Watermark | None, event_us: int, sequence: str, touched: set,
+            lateness_us: int, resolution_seconds: dict, partition_of, ttl_seconds: int) -> list[str]:
+    """Move the symbol's watermark to `event_us`, add the candles the batch merged into
+    (`touched` pending keys) and finalize whatever is now due. Returns the finalized keys.
+
+    `partition_of(symbol, resolution)` is the candle's hash key.
+    """
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        watermark = max(state.watermark_us, event_us) if state else event_us
+        pending = set(state.pending if state else ()) | touched
+        due = sorted(k for k in pending if candle_end_us(k, resolution_seconds) + lateness_us <= watermark)
+        # Finalizing first and recording it after means a crash in between only repeats
+        # idempotent finalize calls.
+        finalized = []
+        for key in due:
+            resolution, candle_ts = key.split("|", 1)
+            if finalize(table, partition_of(symbol, resolution), candle_ts):
+                finalized.append(key)
+        pending.difference_update(due)
+
+        merged_through = max(state.merged_through if state else "", sequence)
+        values = {":wm": watermark, ":mt": merged_through, ":ttl": ttl_seconds}
+        update = "SET #wm = :wm, #mt = :mt, #ttl = :ttl"
+        if pending:
+            update += ", #pending = :pending"
+            values[":pending"] = pending
+        else:
+            update += " REMOVE #pending"
+        condition = _unchanged(state, values)
+        try:
+            table.update_item(
+                Key={"symbol": WATERMARK_PARTITION, "candle_timestamp": symbol},
+                UpdateExpression=update,
+                ConditionExpression=condition,
+                ExpressionAttributeNames=NAMES,
+                ExpressionAttributeValues=values,
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            state = read(table, symbol)
+            continue
+        STATES[symbol] = Watermark(watermark, merged_through, frozenset(pending))
+        return finalized
+
+    STATES.pop(symbol, None)
+    raise RuntimeError(f"Could not advance the watermark of {symbol} after {MAX_UPDATE_ATTEMPTS} attempts")
+
+
+def _unchanged(state: Watermark | None, values: dict) -> str:
+    """Condition that the stored watermark and merged_through are still those of `state`."""
+    if state is None or state.watermark_us == NO_WATERMARK:
+        return "attribute_not_exists(#wm)"
+    values[":old_wm"] = state.watermark_us
+    values[":old_mt"] = state.merged_through
+    return "#wm = :old_wm AND #mt = :old_mt"
+
+
+def add_pending(table, symbol: str, state: Watermark | None, touched: set) -> None:
+    """Record candles a partly failed batch merged into as pending, leaving the watermark
+    and merged_through where they are."""
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        values = {":pending": set(touched)}
+        condition = _unchanged(state, values)
+        try:
+            table.update_item(
+                Key={"symbol": WATERMARK_PARTITION, "candle_timestamp": symbol},
+                UpdateExpression="ADD #pending :pending",
+                ConditionExpression=condition,
+                ExpressionAttributeNames={k: NAMES[k] for k in ("#wm", "#mt", "#pending")},
+                ExpressionAttributeValues=values,
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            state = read(table, symbol)
+            continue
+        if state is None:
+            state = Watermark(NO_WATERMARK, "", frozenset())
+        STATES[symbol] = Watermark(state.watermark_us, state.merged_through, state.pending | touched)
+        return
+
+    STATES.pop(symbol, None)
+    raise RuntimeError(f"Could not record pending candles of {symbol} after {MAX_UPDATE_ATTEMPTS} attempts")
+
+
+def put_late(table, symbol: str, ticks: list[tuple], watermark_us: int | None, ttl_seconds: int) -> None:
+    """Keep late ticks, (sequence, event time, price, volume), in the symbol's side partition."""
+    known = watermark_us is not None and watermark_us != NO_WATERMARK
+    watermark = {"watermark": format_timestamp(micros_to_datetime(watermark_us))} if known else {}
+    for sequence, event_time, price, volume in ticks:
+        table.put_item(Item={
+            "symbol": f"{LATE_PREFIX}#{symbol}",
+            "candle_timestamp": f"{format_timestamp(event_time)}#{sequence}",
+            "price": Decimal(str(price)),
+            "volume": volume,
+            "sequence": sequence,
+            **watermark,
+            "ttl": ttl_seconds,
+        })
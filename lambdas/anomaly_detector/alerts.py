@@ -0,0 +1,179 @@
+"""
+Alert stage for the anomaly detector: the anomalies a batch recorded become a few SNS
+messages instead of one synchronous publish each.
+
+  * Coalesce: one alert per (symbol, direction) per batch, the strongest one, counting
+    how many anomalies it stands for.
+  * Cooldown: a (symbol, direction) alerts at most once per cooldown window. Claims are
+    conditional writes, so containers reading different shards cannot both send one;
+    DynamoDBCooldowns keeps them under a reserved partition of the anomalies table and
+    MemoryCooldowns is the local stand-in for benchmarks and replays. Cooldowns
+    remembers the holds it has seen, so repeats inside a window cost no round trip.
+  * Digest: the surviving alerts go out as one message per ALERT_DIGEST_MAX alerts; a
+    lone alert keeps the single-anomaly format subscribers already parse.
+
+Claims and publishes run concurrently on one small pool. Anomalies are written before
+any of this, so a suppressed or failed alert never loses the anomaly itself; if the
+cooldown store cannot be reached the alert is sent anyway.
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+# Reserved partition in the anomalies table, keyed "<symbol>#<direction>" in detected_at.
+ALERT_COOLDOWN_PARTITION = "__alert_cooldown__"
+DEFAULT_COOLDOWN_SECONDS = 300
+DEFAULT_DIGEST_MAX = 50
+DEFAULT_CONCURRENCY = 8
+SUBJECT_MAX_LENGTH = 100  # SNS limit
+
+
+def cooldown_key(alert: dict) -> str:
+    return f"{alert['symbol']}#{alert['direction']}"
+
+
+class MemoryCooldowns:
+    """Cooldown store stand-in: claims in a dict."""
+
+    def __init__(self):
+        self.until: dict[str, float] = {}
+
+    def claim(self, key: str, now: float, seconds: float) -> tuple[bool, float | None]:
+        held = self.until.get(key, 0.0)
+        if held > now:
+            return False, held
+        self.until[key] = now + seconds
+        return True, now + seconds
+
+
+class DynamoDBCooldowns:
+    """Cooldown claims as conditional updates on the anomalies table (low-level client)."""
+
+    def __init__(self, client, table_name: str):
+        self.client = client
+        self.table_name = table_name
+
+    def claim(self, key: str, now: float, seconds: float) -> tuple[bool, float | None]:
+        """(claimed, end of the claim in force); the end is None when DynamoDB did not say."""
+        until = now + seconds
+        try:
+            self.client.update_item(
+                TableName=self.table_name,
+                Key={"symbol": {"S": ALERT_COOLDOWN_PARTITION}, "detected_at": {"S": key}},
+                UpdateExpression="SET #until = :until",
+                ConditionExpression="attribute_not_exists(#until) OR #until <= :now",
+                ExpressionAttributeNames={"#until": "alert_until"},
+                ExpressionAttributeValues={":until": {"N": f"{until:.3f}"}, ":now": {"N": f"{now:.3f}"}},
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            held = (e.response.get("Item") or {}).get("alert_until", {}).get("N")
+            return False, float(held) if held else None
+        return True, until
+
+
+class Cooldowns:
+    """Holds this container has seen, in front of a shared cooldown store."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._held: dict[str, float] = {}
+        self.claims = 0
+        self.local_hits = 0
+
+    def clear(self) -> None:
+        self._held.clear()
+
+    def held_locally(self, key: str, now: float) -> bool:
+        held = self._held.get(key)
+        if held is not None and held > now:
+            return True
+        self._held.pop(key, None)
+        return False
+
+    def claim(self, store, key: str, now: float, seconds: float) -> bool:
+        self.claims += 1
+        try:
+            claimed, until = store.claim(key, now, seconds)
+        except (ClientError, BotoCoreError) as e:
+            print(f"Alert cooldown claim failed for {key}, sending anyway: {e}")
+            return True
+        if until is not None:
+            self._held[key] = until
+        return claimed
+
+
+def coalesce(alerts: list[dict]) -> list[dict]:
+    """One alert per (symbol, direction), the one furthest from its mean, with `occurrences`."""
+    strongest: dict[str, dict] = {}
+    for alert in alerts:
+        key = cooldown_key(alert)
+        current = strongest.get(key)
+        occurrences = (current["occurrences"] if current else 0) + 1
+        if current is None or abs(alert["z_score"]) > abs(current["z_score"]):
+            current = {**alert}
+        current["occurrences"] = occurrences
+        strongest[key] = current
+    return list(strongest.values())
+
+
+def digest_messages(alerts: list[dict], suppressed: int, digest_max: int) -> list[tuple[str, str]]:
+    """(Subject, Message) pairs for SNS."""
+    if len(alerts) == 1 and alerts[0]["occurrences"] == 1 and not suppressed:
+        alert = {k: v for k, v in alerts[0].items() if k != "occurrences"}
+        subject = f"FinPulse Anomaly: {alert['symbol']} {alert['direction']} ({alert['severity']})"
+        return [(subject, json.dumps(alert, indent=2))]
+    ordered = sorted(alerts, key=lambda a: (a["severity"] != "HIGH", -abs(a["z_score"])))
+    messages = []
+    for i in range(0, len(ordered), max(1, digest_max)):
+        chunk = ordered[i:i + max(1, digest_max)]
+        names = ", ".join(f"{a['symbol']} {a['direction']}" for a in chunk)
+        subject = f"FinPulse Anomalies: {len(chunk)} alerts ({names})"
+        if len(subject) > SUBJECT_MAX_LENGTH:
+            subject = subject[:SUBJECT_MAX_LENGTH - 4] + "...)"
+        body = {"count": len(chunk), "suppressed": suppressed, "alerts": chunk}
+        messages.append((subject, json.dumps(body, indent=2)))
+    return messages
+
+
+def send_alerts(sns, topic_arn: str, alerts: list[dict], cooldowns: Cooldowns, store,
+                cooldown_seconds: float = DEFAULT_COOLDOWN_SECONDS, digest_max: int = DEFAULT_DIGEST_MAX,
+                concurrency: int = DEFAULT_CONCURRENCY) -> dict:
+    """Coalesce, apply cooldowns and publish digests; returns counts for the handler's result."""
+    result = {"alerts_sent": 0, "alerts_suppressed": 0, "alert_messages": 0, "alert_publish_failures": 0}
+    if not alerts:
+        return result
+    candidates = coalesce(alerts)
+    result["alerts_suppressed"] = len(alerts) - len(candidates)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        if cooldown_seconds > 0:
+            now = cooldowns.clock()
+            fresh = [a for a in candidates if not cooldowns.held_locally(cooldown_key(a), now)]
+            cooldowns.local_hits += len(candidates) - len(fresh)
+            claimed = list(pool.map(lambda a: cooldowns.claim(store, cooldown_key(a), now, cooldown_seconds), fresh))
+            allowed = [a for a, ok in zip(fresh, claimed) if ok]
+            result["alerts_suppressed"] += len(candidates) - len(allowed)
+        else:
+            allowed = candidates
+        if not allowed:
+            return result
+
+        def publish(message: tuple[str, str]) -> bool:
+            try:
+                sns.publish(TopicArn=topic_arn, Subject=message[0], Message=message[1])
+                return True
+            except Exception as e:
+                print(f"SNS publish failed for {message[0]!r}: {e}")
+                return False
+
+        messages = digest_messages(allowed, result["alerts_suppressed"], digest_max)
+        published = list(pool.map(publish, messages))
+    result["alerts_sent"] = len(allowed)
+    result["alert_messages"] = sum(published)
+    result["alert_publish_failures"] = published.count(False)
+    return result
@@ -0,0 +1,265 @@
+"""
+Incremental correlation of returns across symbols, for market-wide moves and for symbols
+breaking away from the market they usually follow.
+
+The ingester quotes every tracked symbol once a minute, so ticks come in rounds, and a
+step is one round: one price per symbol. A step closes once every symbol the engine
+tracks has reported, when a symbol reports a second, later price, or when a tick comes
+CORRELATION_STEP_SECONDS after the step's first one. A symbol missing from a step keeps
+its last price, i.e. a zero return. A round split over two batches closes in the second;
+ticks at or before the last closed step are ignored, so replays do not count twice.
+
+Per closed step, r holds each symbol's log return and the engine keeps an exponentially
+weighted mean μ and covariance C of r, with span CORRELATION_WINDOW steps (α = 2/(span+1)):
+
+    δ = r − μ,   μ ← μ + αδ,   C ← (1 − α)(C + αδδᵀ)
+
+one rank-1 update, O(k²) for k symbols, instead of recomputing over a window of returns.
+C is float64, 8·k² bytes (2 MB at 500 symbols); symbols past CORRELATION_MAX_SYMBOLS are
+left out.
+
+A step is scored against the state before it is folded in, over the symbols with a fresh
+return and at least CORRELATION_MIN_STEPS of them behind it. With w the equal weights of
+those symbols and m = wᵀr the market return:
+
+  market move  m is more than MARKET_Z_THRESHOLD standard deviations (√wᵀCw) from wᵀμ
+               and at least MARKET_BREADTH of the symbols moved the same way. One MARKET
+               anomaly stands for the move.
+  divergence   symbol i against what the market implied for it, μᵢ + βᵢ(m − wᵀμ) with
+               βᵢ = (Cw)ᵢ / wᵀCw, in residual standard deviations √(Cᵢᵢ − (Cw)ᵢ²/wᵀCw),
+               for symbols whose correlation with the market is at least
+               MIN_PEER_CORRELATION. Flagged past DIVERGENCE_Z_THRESHOLD.
+
+Both only need Cw, so scoring is O(k²) too. The state is saved with correlation_state.py
+every CORRELATION_SAVE_SECONDS for cold starts and the API's /correlations.
+"""
+import math
+from array import array
+from dataclasses import dataclass
+
+import numpy as np
+
+from config import env_number
+from correlation_state import Snapshot
+from detectors import Detector
+
+DEFAULT_WINDOW = 120
+DEFAULT_STEP_SECONDS = 60
+DEFAULT_MIN_STEPS = 30
+DEFAULT_MAX_SYMBOLS = 500
+DEFAULT_SAVE_SECONDS = 300
+DEFAULT_MARKET_BREADTH = 0.7
+DEFAULT_MIN_PEER_CORRELATION = 0.5
+MIN_MARKET_SYMBOLS = 3
+# Share of a symbol's variance the market may explain at most, as far as its residual
+# is concerned; keeps near-perfect correlations from dividing by noise.
+MIN_RESIDUAL_SHARE = 0.05
+MARKET_SYMBOL = "MARKET"
+
+MARKET_MOVE = Detector("market", None, "MARKET_Z_THRESHOLD", 3.0, 5.0)
+DIVERGENCE = Detector("divergence", None, "DIVERGENCE_Z_THRESHOLD", 4.0, 6.0)
+
+
+@dataclass
+class MarketMove:
+    detected_at: str
+    market_return: float
+    expected_return: float
+    z_score: float
+    breadth: float
+    symbols: list[str]  # the ones that moved with the market
+
+    @property
+    def direction(self) -> str:
+        return "SPIKE" if self.market_return > self.expected_return else "DROP"
+
+
+@dataclass
+class Divergence:
+    symbol: str
+    detected_at: str
+    price: float
+    expected_price: float
+    z_score: float
+    market_correlation: float
+
+
+class CorrelationEngine:
+    def __init__(self, window: int = DEFAULT_WINDOW, step_seconds: int = DEFAULT_STEP_SECONDS,
+                 min_steps: int = DEFAULT_MIN_STEPS, max_symbols: int = DEFAULT_MAX_SYMBOLS):
+        self.window = max(1, window)
+        self.alpha = 2.0 / (self.window + 1)
+        self.step_us = max(1, step_seconds) * 1_000_000
+        self.min_steps = max(2, min_steps)
+        self.max_symbols = max_symbols
+        self.symbols: list[str] = []
+        self.index: dict[str, int] = {}
+        self.last_prices = np.empty(0)
+        self.means = np.empty(0)
+        self.cov = np.empty((0, 0))
+        self.observations = np.empty(0)
+        self.steps = 0
+        self.through_us = -1  # latest tick time folded into a closed step
+        self.step_start_us = 0
+        self.pending: dict[int, tuple[int, float, str]] = {}  # index -> (micros, price, timestamp)
+        self.ignored = 0
+        self.saved_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def track(self, symbols) -> None:
+        """Add columns for symbols not tracked yet, in one resize."""
+        new = [s for s in dict.fromkeys(symbols) if s not in self.index]
+        new = new[:max(0, self.max_symbols - len(self.symbols))]
+        if not new:
+            return
+        k, n = len(self.symbols), len(new)
+        for s in new:
+            self.index[s] = len(self.symbols)
+            self.symbols.append(s)
+        self.last_prices = np.concatenate([self.last_prices, np.full(n, np.nan)])
+        self.means = np.concatenate([self.means, np.zeros(n)])
+        self.observations = np.concatenate([self.observations, np.zeros(n)])
+        cov = np.zeros((k + n, k + n))
+        cov[:k, :k] = self.cov
+        self.cov = cov
+
+    def add(self, symbol: str, micros: int, price: float, timestamp: str) -> list:
+        """Take one tick; returns the events of the step it closed, if any."""
+        i = self.index.get(symbol)
+        if i is None or micros <= self.through_us or not price > 0:
+            self.ignored += 1
+            return []
+        events = []
+        if self.pending:
+            held = self.pending.get(i)
+            if (held is not None and micros > held[0]) or micros - self.step_start_us >= self.step_us:
+                events = self.close()
+        if not self.pending:
+            self.step_start_us = micros
+        held = self.pending.get(i)
+        if held is None or micros >= held[0]:
+            self.pending[i] = (micros, price, timestamp)
+        return events
+
+    def flush(self) -> list:
+        """Close the open step if every tracked symbol has reported in it."""
+        if self.pending and len(self.pending) == len(self.symbols):
+            return self.close()
+        return []
+
+    def close(self) -> list:
+        if not self.pending:
+            return []
+        k = len(self.symbols)
+        present = np.fromiter(self.pending.keys(), dtype=np.intp, count=len(self.pending))
+        prices = self.last_prices.copy()
+        prices[present] = [price for _, price, _ in self.pending.values()]
+        fresh = np.zeros(k, dtype=bool)
+        fresh[present] = ~np.isnan(self.last_prices[present])
+        returns = np.zeros(k)
+        returns[fresh] = np.log(prices[fresh] / self.last_prices[fresh])
+
+        events = self.score(returns, fresh) if fresh.any() else []
+        if fresh.any():
+            self.update(returns)
+            self.observations[fresh] += 1
+            self.steps += 1
+        self.last_prices = prices
+        self.through_us = max(self.through_us, max(micros for micros, _, _ in self.pending.values()))
+        self.pending.clear()
+        return events
+
+    def update(self, returns: np.ndarray) -> None:
+        delta = returns - self.means
+        self.means += self.alpha * delta
+        self.cov += np.outer(self.alpha * delta, delta)
+        self.cov *= 1.0 - self.alpha
+
+    def score(self, returns: np.ndarray, fresh: np.ndarray) -> list:
+        # The state starts at zero, which weighs (1 - α)^steps; scale that back out.
+        unbiased = 1.0 / (1.0 - (1.0 - self.alpha) ** self.steps) if self.steps else 1.0
+        means = self.means * unbiased
+        variances = np.diagonal(self.cov) * unbiased
+        eligible = fresh & (self.observations >= self.min_steps) & (variances > 0)
+        n = int(np.count_nonzero(eligible))
+        if n < MIN_MARKET_SYMBOLS:
+            return []
+        weights = eligible / n
+        cov_w = (self.cov @ weights) * unbiased
+        market_var = float(weights @ cov_w)
+        if market_var <= 0:
+            return []
+        market = float(weights @ returns)
+        expected_market = float(weights @ means)
+        surprise = market - expected_market
+        events = []
+
+        moved = eligible & (np.sign(returns - means) == np.sign(surprise))
+        breadth = np.count_nonzero(moved) / n
+        market_z = surprise / math.sqrt(market_var)
+        if (abs(market_z) > MARKET_MOVE.threshold
+                and breadth >= env_number("MARKET_BREADTH", DEFAULT_MARKET_BREADTH, float)):
+            latest = max(self.pending.values())
+            events.append(MarketMove(latest[2], market, expected_market, market_z, breadth,
+                                     [self.symbols[i] for i in np.flatnonzero(moved)]))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            market_corr = cov_w / np.sqrt(variances * market_var)
+            expected = means + cov_w / market_var * surprise
+            residual_var = np.maximum(variances - cov_w ** 2 / market_var, MIN_RESIDUAL_SHARE * variances)
+            z = (returns - expected) / np.sqrt(residual_var)
+            min_corr = env_number("MIN_PEER_CORRELATION", DEFAULT_MIN_PEER_CORRELATION, float)
+            diverged = eligible & (market_corr >= min_corr) & (np.abs(z) > DIVERGENCE.threshold)
+        for i in np.flatnonzero(diverged):
+            _, price, timestamp = self.pending[i]
+            events.append(Divergence(self.symbols[i], timestamp, price,
+                                     float(self.last_prices[i] * math.exp(expected[i])),
+                                     float(z[i]), float(market_corr[i])))
+        return events
+
+    def correlations(self) -> np.ndarray:
+        """k x k correlation matrix; NaN where a symbol has no variance yet."""
+        sd = np.sqrt(np.diagonal(self.cov))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = self.cov / np.outer(sd, sd)
+        corr[:, sd == 0] = np.nan
+        corr[sd == 0, :] = np.nan
+        np.fill_diagonal(corr, 1.0)
+        return corr
+
+    def snapshot(self) -> Snapshot:
+        upper = self.correlations()[np.triu_indices(len(self.symbols), 1)]
+        return Snapshot(
+            symbols=list(self.symbols),
+            step_us=self.through_us,
+            steps=self.steps,
+            window=self.window,
+            last_prices=array("d", self.last_prices.tobytes()),
+            means=array("d", self.means.tobytes()),
+            variances=array("d", np.diagonal(self.cov).tobytes()),
+            observations=array("d", self.observations.tobytes()),
+            correlations=array("f", upper.astype(np.float32).tobytes()),
+        )
+
+    def restore(self, snapshot: Snapshot) -> None:
+        """Take over a saved state; the configured window and limits stay."""
+        k = min(len(snapshot.symbols), self.max_symbols)
+        self.symbols = list(snapshot.symbols[:k])
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self.last_prices = np.frombuffer(snapshot.last_prices, dtype=np.float64)[:k].copy()
+        self.means = np.frombuffer(snapshot.means, dtype=np.float64)[:k].copy()
+        self.observations = np.frombuffer(snapshot.observations, dtype=np.float64)[:k].copy()
+        variances = np.frombuffer(snapshot.variances, dtype=np.float64)[:k]
+        n = len(snapshot.symbols)
+        corr = np.zeros((n, n))
+        corr[np.triu_indices(n, 1)] = np.frombuffer(snapshot.correlations, dtype=np.float32)
+        corr = corr[:k, :k]
+        corr = np.nan_to_num(corr + corr.T)
+        sd = np.sqrt(variances)
+        self.cov = corr * np.outer(sd, sd)
+        np.fill_diagonal(self.cov, variances)
+        self.steps = snapshot.steps
+        self.through_us = snapshot.step_us
+        self.pending.clear()
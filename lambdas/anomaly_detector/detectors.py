@@ -0,0 +1,200 @@
+"""
+Vectorized anomaly detectors.
+
+A batch is scored as one (records x window) matrix: row i holds the HISTORY_WINDOW prices
+that preceded record i for its symbol (earlier records of the same batch included), left
+padded with NaN when less history exists. Every detector maps that matrix plus the
+records' prices to one score and one reference price per record in a single NumPy pass,
+so cost grows with the batch, not with the number of Python-level loop iterations.
+
+Detectors with a `running` scorer (z-score) read the mean and sample standard deviation
+each record's RollingWindow held before it instead, which the window keeps in O(1) per
+push; the matrix is only built when a selected detector needs it.
+
+Detectors are looked up by name in DETECTORS; ANOMALY_DETECTORS selects which ones run
+(comma separated, default "zscore").
+"""
+import os
+import warnings
+from contextlib import contextmanager
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+DEFAULT_DETECTORS = "zscore"
+MIN_HISTORY = 2
+
+
+class Detector:
+    """A named scoring function with its flagging and HIGH-severity thresholds.
+
+    `score(windows, prices)` returns (scores, reference_prices); a NaN score means the
+    record cannot be scored (too little history or zero dispersion). `running(stats,
+    prices)`, if set, computes the same from RunningStats.
+    """
+
+    def __init__(self, name: str, score, threshold_env: str, default_threshold: float, high_severity: float,
+                 running=None):
+        self.name = name
+        self.score = score
+        self.running = running
+        self.threshold_env = threshold_env
+        self.default_threshold = default_threshold
+        self.high_severity = high_severity
+
+    @property
+    def threshold(self) -> float:
+        try:
+            return float(os.environ.get(self.threshold_env, self.default_threshold))
+        except (TypeError, ValueError):
+            return self.default_threshold
+
+
+@contextmanager
+def _quiet_nan_warnings():
+    """Silence all-NaN row warnings from nan* reductions; those rows score NaN anyway."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        yield
+
+
+class RunningStats:
+    """Per-record count, mean and sample standard deviation of the window before it."""
+
+    def __init__(self, counts: np.ndarray, means: np.ndarray, stdevs: np.ndarray):
+        self.counts = counts
+        self.means = means
+        self.stdevs = stdevs
+
+
+def _enough_history(windows: np.ndarray) -> np.ndarray:
+    return np.count_nonzero(~np.isnan(windows), axis=1) >= MIN_HISTORY
+
+
+def _row_percentile(windows: np.ndarray, q):
+    """np.nanpercentile along rows, but only NaN-padded rows take NumPy's slow per-row path."""
+    padded = np.isnan(windows).any(axis=1)
+    q_shape = np.shape(q)
+    out = np.full(q_shape + (windows.shape[0],), np.nan)
+    if (~padded).any():
+        out[..., ~padded] = np.percentile(windows[~padded], q, axis=1)
+    if padded.any():
+        with _quiet_nan_warnings():
+            out[..., padded] = np.nanpercentile(windows[padded], q, axis=1)
+    return out
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    valid = valid & (denominator > 0)
+    out = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=valid)
+    return out
+
+
+def zscore(windows: np.ndarray, prices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Distance from the window mean in sample standard deviations."""
+    valid = _enough_history(windows)
+    with _quiet_nan_warnings():
+        mean = np.nanmean(windows, axis=1)
+        std = np.nanstd(windows, axis=1, ddof=1)
+    return _ratio(prices - mean, std, valid), mean
+
+
+def zscore_running(stats: RunningStats, prices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """zscore from the windows' running mean and standard deviation, O(1) per record."""
+    valid = stats.counts >= MIN_HISTORY
+    mean = np.where(stats.counts > 0, stats.means, np.nan)
+    return _ratio(prices - mean, stats.stdevs, valid), mean
+
+
+def ewma(windows: np.ndarray, prices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Distance from an exponentially weighted mean in exponentially weighted std units.
+
+    EWMA_ALPHA sets the decay (default 2 / (window + 1)); the newest price weighs most.
+    """
+    width = windows.shape[1]
+    try:
+        alpha = float(os.environ.get("EWMA_ALPHA", 2.0 / (width + 1)))
+    except (TypeError, ValueError):
+        alpha = 2.0 / (width + 1)
+    weights = (1.0 - alpha) ** np.arange(width - 1, -1, -1, dtype=float)
+    present = ~np.isnan(windows)
+    w = np.where(present, weights, 0.0)
+    filled = np.where(present, windows, 0.0)
+    total = w.sum(axis=1)
+    valid = _enough_history(windows)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (w * filled).sum(axis=1) / total
+        var = (w * (filled - mean[:, None]) ** 2).sum(axis=1) / total
+    return _ratio(prices - mean, np.sqrt(var), valid), mean
+
+
+def mad(windows: np.ndarray, prices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Robust z-score: 0.6745 * (price - median) / median absolute deviation."""
+    valid = _enough_history(windows)
+    median = _row_percentile(windows, 50)
+    deviation = _row_percentile(np.abs(windows - median[:, None]), 50)
+    return _ratio(0.6745 * (prices - median), deviation, valid), median
+
+
+def percentile(windows: np.ndarray, prices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Distance outside the [low, high] percentile band, in band widths (0 inside the band).
+
+    PERCENTILE_BAND sets the band as "low,high" (default "5,95").
+    """
+    try:
+        low_q, high_q = (float(q) for q in os.environ.get("PERCENTILE_BAND", "5,95").split(","))
+    except (TypeError, ValueError):
+        low_q, high_q = 5.0, 95.0
+    valid = _enough_history(windows)
+    low, high = _row_percentile(windows, [low_q, high_q])
+    outside = np.where(prices > high, prices - high, np.where(prices < low, prices - low, 0.0))
+    return _ratio(outside, high - low, valid), (low + high) / 2
+
+
+DETECTORS = {
+    d.name: d
+    for d in (
+        Detector("zscore", zscore, "Z_SCORE_THRESHOLD", 2.5, 3.5, running=zscore_running),
+        Detector("ewma", ewma, "EWMA_THRESHOLD", 2.5, 3.5),
+        Detector("mad", mad, "MAD_THRESHOLD", 3.5, 5.0),
+        Detector("percentile", percentile, "PERCENTILE_THRESHOLD", 0.25, 1.0),
+    )
+}
+
+
+def get_detectors() -> list[Detector]:
+    """Detectors named in ANOMALY_DETECTORS, in the order given; unknown names are skipped."""
+    selected = []
+    for name in os.environ.get("ANOMALY_DETECTORS", DEFAULT_DETECTORS).split(","):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in DETECTORS:
+            print(f"Ignoring unknown detector: {name}")
+            continue
+        selected.append(DETECTORS[name])
+    return selected or [DETECTORS[DEFAULT_DETECTORS]]
+
+
+def history_windows(history: np.ndarray, prices: np.ndarray, width: int) -> np.ndarray:
+    """Rows of the `width` prices preceding each of `prices`, NaN-padded on the left."""
+    series = np.concatenate((np.full(width, np.nan), history[-width:], prices[:-1]))
+    return sliding_window_view(series, width)[-len(prices):]
+
+
+def needs_windows(detectors: list[Detector]) -> bool:
+    return any(d.running is None for d in detectors)
+
+
+def score_batch(windows: np.ndarray | None, prices: np.ndarray, detectors: list[Detector],
+                stats: RunningStats | None = None) -> dict:
+    """Run each detector over the stacked batch; returns {name: (scores, reference_prices)}.
+
+    Detectors with a running scorer use `stats` when given; `windows` may be None if every
+    detector does.
+    """
+    return {
+        d.name: d.running(stats, prices) if d.running is not None and stats is not None else d.score(windows, prices)
+        for d in detectors
+    }
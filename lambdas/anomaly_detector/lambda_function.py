@@ -1,102 +1,396 @@
 """
-Anomaly Detector Lambda — consumes Kinesis price records, computes Z-score vs last 30
-prices in DynamoDB, and writes anomalies + SNS alerts when threshold is exceeded.
+Anomaly Detector Lambda — consumes Kinesis price records, scores them against the last
+HISTORY_WINDOW (default 30) prices (Z-score by default), and writes anomalies + SNS alerts
+when a detector's threshold is exceeded.
+
+Each symbol's RollingWindow is seeded from DynamoDB (from the price processor's tick
+buckets with HISTORY_FROM_BUCKETS=true, see tick_buckets.py) and kept in a module-level
+WindowStateCache, so warm containers only re-read history on cold starts, replays
+(sequence number not past the cached one) or after STATE_CACHE_TTL_SECONDS of inactivity.
+Scoring is vectorized over the whole batch by the detectors selected in
+ANOMALY_DETECTORS (see detectors.py); earlier records of a symbol in the same batch count
+as history for later ones.
+
+Each anomaly carries a day `time_bucket` for the anomalies table's by_time index, and is
+written in one transaction with an increment of its hour's counter item, so /anomalies
+and /stats never scan the table. The put is conditional on the item not existing yet: a
+replayed record neither double-counts nor re-sends its alert.
+
+Alerts for the anomalies a batch recorded are coalesced per symbol and direction, held
+back by a cooldown (ALERT_COOLDOWN_SECONDS) and published as digests, concurrently, once
+the batch's writes are done (see alerts.py).
+
+With CORRELATION_ENABLED=true the batch's ticks also feed a rolling correlation of
+returns across symbols (see correlation.py), kept warm per container and saved to the
+anomalies table for cold starts and /correlations. A market-wide move is recorded as one
+anomaly for symbol MARKET, and the batch's alerts for symbols that moved with it are
+folded into that one alert. A symbol breaking away from the market it normally follows
+counts as one more detector, "divergence", on its tick.
+
+Stage timings (decode, history, compute, write, correlation, publish), lag and call
+counts go out as embedded metrics (see metrics.py).
 """
-import base64
-import json
+import math
 import os
-import statistics
+import time
 from datetime import datetime, timezone
 
-import boto3
+import numpy as np
+from botocore.exceptions import ClientError
+
+import alerts
+import aws
+import correlation
+import correlation_state
+import detectors
+from config import env_flag, env_number
+from metrics import instrumented, observe_batch, stage
+from partitions import ANOMALY_COUNTER_PARTITION
+from record_codec import decode_batch, parse_float, timestamp_to_micros
+from rolling_window import RollingWindow
+from state_cache import WindowStateCache
+from tick_buckets import DEFAULT_BUCKET_SECONDS, read_latest
 
-DEFAULT_Z_THRESHOLD = 2.5
 HISTORY_LIMIT = 30
-HIGH_SEVERITY_Z = 3.5
+DEFAULT_STATE_CACHE_MAX_SYMBOLS = 1000
+DEFAULT_STATE_CACHE_TTL_SECONDS = 180
 
+# Module-level state survives warm starts; clients are created on first use.
+_dynamodb = None
+_sns = None
+WINDOW_CACHE = WindowStateCache(
+    max_symbols=env_number("STATE_CACHE_MAX_SYMBOLS", DEFAULT_STATE_CACHE_MAX_SYMBOLS),
+    ttl_seconds=env_number("STATE_CACHE_TTL_SECONDS", DEFAULT_STATE_CACHE_TTL_SECONDS, float),
+)
+ALERT_COOLDOWNS = alerts.Cooldowns()
+CORRELATIONS: correlation.CorrelationEngine | None = None
 
-def parse_price(value) -> float:
-    """Parse price from JSON (float) or DynamoDB string."""
-    if value is None:
-        return 0.0
-    if isinstance(value, (int, float)):
-        return float(value)
-    try:
-        return float(str(value).strip())
-    except (ValueError, TypeError):
-        return 0.0
+
+def get_dynamodb():
+    global _dynamodb
+    if _dynamodb is None:
+        _dynamodb = aws.resource("dynamodb")
+    return _dynamodb
 
 
-def get_last_prices(dynamodb, table_name: str, symbol: str, limit: int = HISTORY_LIMIT) -> list[float]:
-    """Query last N prices for symbol from live_prices (range key timestamp, desc)."""
+def get_sns():
+    global _sns
+    if _sns is None:
+        _sns = aws.client("sns")
+    return _sns
+
+
+aws.preload(get_dynamodb, get_sns)
+
+
+def get_last_prices(dynamodb, table_name: str, symbol: str, limit: int = HISTORY_LIMIT, before: str | None = None) -> list[float]:
+    """Query last N prices for symbol from live_prices (range key timestamp, desc).
+
+    With `before`, only ticks strictly older than that timestamp are returned, so records
+    the price processor has already stored from the current batch are not counted twice.
+    """
     table = dynamodb.Table(table_name)
-    resp = table.query(
-        KeyConditionExpression="symbol = :sym",
-        ExpressionAttributeValues={":sym": symbol},
-        Limit=limit,
-        ScanIndexForward=False,
-        ProjectionExpression="price",
-    )
+    query = {
+        "KeyConditionExpression": "symbol = :sym",
+        "ExpressionAttributeValues": {":sym": symbol},
+        "ScanIndexForward": False,
+        "ProjectionExpression": "price",
+    }
+    if before:
+        query["KeyConditionExpression"] = "symbol = :sym AND #ts < :before"
+        query["ExpressionAttributeNames"] = {"#ts": "timestamp"}
+        query["ExpressionAttributeValues"][":before"] = before
     prices = []
-    for item in resp.get("Items", []):
-        p = parse_price(item.get("price"))
-        prices.append(p)
+    while len(prices) < limit:
+        resp = table.query(Limit=limit - len(prices), **query)
+        for item in resp.get("Items", []):
+            p = parse_float(item.get("price"), 0.0)
+            prices.append(p)
+        if not resp.get("LastEvaluatedKey"):
+            break
+        query["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
     return prices
 
 
+def seed_window(dynamodb, table_name: str, symbol: str, capacity: int, before: str) -> RollingWindow:
+    """Build a symbol's window from the ticks stored before the batch's first record.
+
+    Tick buckets are used when enabled and they hold a full window; otherwise (e.g. right
+    after buckets were turned on) the per-tick items are read.
+    """
+    window = RollingWindow(capacity)
+    before_micros = timestamp_to_micros(before)
+    if env_flag("HISTORY_FROM_BUCKETS") and before_micros is not None:
+        seconds = max(1, env_number("TICK_BUCKET_SECONDS", DEFAULT_BUCKET_SECONDS))
+        ticks = read_latest(dynamodb.Table(table_name), symbol, before_micros, capacity, seconds)
+        if len(ticks) == capacity:
+            for _, price, _ in ticks:
+                window.push(price)
+            return window
+    for price in reversed(get_last_prices(dynamodb, table_name, symbol, capacity, before)):
+        window.push(price)
+    return window
+
+
+def get_history_window() -> int:
+    return max(2, env_number("HISTORY_WINDOW", HISTORY_LIMIT))
+
+
+def parse_sequence(record: dict) -> int | None:
+    try:
+        return int(record["kinesis"]["sequenceNumber"])
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+def pick_primary(record_scores: list[tuple]) -> tuple:
+    """Of the (detector, score, reference) triples that fired, the one furthest past its threshold."""
+    return max(record_scores, key=lambda t: abs(t[1]) / t[0].threshold if t[0].threshold else abs(t[1]))
+
+
+def time_buckets(detected_at: str) -> tuple[str, str]:
+    """(day bucket "YYYY-MM-DD", hour bucket "YYYY-MM-DDTHH") in UTC for an ISO timestamp."""
+    try:
+        dt = datetime.fromisoformat(detected_at.replace("Z", "+00:00"))
+    except ValueError:
+        dt = datetime.now(timezone.utc)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    dt = dt.astimezone(timezone.utc)
+    return dt.strftime("%Y-%m-%d"), dt.strftime("%Y-%m-%dT%H")
+
+
+def record_anomaly(client, table_name: str, item: dict) -> bool:
+    """Put the anomaly and bump its hour counter atomically; False if it was already recorded."""
+    day, hour = time_buckets(item["detected_at"])
+    item = {**item, "time_bucket": day}
+    try:
+        client.transact_write_items(TransactItems=[
+            {"Put": {
+                "TableName": table_name,
+                "Item": aws.serialize_item(item),
+                "ConditionExpression": "attribute_not_exists(detected_at)",
+            }},
+            {"Update": {
+                "TableName": table_name,
+                "Key": {"symbol": {"S": ANOMALY_COUNTER_PARTITION}, "detected_at": {"S": hour}},
+                "UpdateExpression": "ADD #n :one",
+                "ExpressionAttributeNames": {"#n": "count"},
+                "ExpressionAttributeValues": {":one": {"N": "1"}},
+            }},
+        ])
+    except ClientError as e:
+        reasons = e.response.get("CancellationReasons") or []
+        if reasons and reasons[0].get("Code") == "ConditionalCheckFailed":
+            return False
+        raise
+    return True
+
+
+def record_failures(anomaly_table, count: int) -> None:
+    """Add to the current hour's "failed" counter, which /stats reports; best effort."""
+    _, hour = time_buckets(datetime.now(timezone.utc).isoformat())
+    try:
+        anomaly_table.update_item(
+            Key={"symbol": ANOMALY_COUNTER_PARTITION, "detected_at": hour},
+            UpdateExpression="ADD #f :n",
+            ExpressionAttributeNames={"#f": "failed"},
+            ExpressionAttributeValues={":n": count},
+        )
+    except Exception as e:
+        print(f"Failed to record {count} failures: {e}")
+
+
+def get_correlations(anomaly_table) -> correlation.CorrelationEngine:
+    """The container's engine; a cold container starts from the last saved state."""
+    global CORRELATIONS
+    if CORRELATIONS is None:
+        engine = correlation.CorrelationEngine(
+            window=env_number("CORRELATION_WINDOW", correlation.DEFAULT_WINDOW),
+            step_seconds=env_number("CORRELATION_STEP_SECONDS", correlation.DEFAULT_STEP_SECONDS),
+            min_steps=env_number("CORRELATION_MIN_STEPS", correlation.DEFAULT_MIN_STEPS),
+            max_symbols=env_number("CORRELATION_MAX_SYMBOLS", correlation.DEFAULT_MAX_SYMBOLS),
+        )
+        saved = correlation_state.load(anomaly_table)
+        if saved is not None:
+            engine.restore(saved[0])
+        CORRELATIONS = engine
+    return CORRELATIONS
+
+
+def update_correlations(anomaly_table, ticks: list[tuple]) -> list:
+    """Feed (symbol, timestamp, price) ticks in event-time order; returns the closed steps'
+    events. Saves the state every CORRELATION_SAVE_SECONDS."""
+    global CORRELATIONS
+    engine = get_correlations(anomaly_table)
+    engine.track(symbol for symbol, _, _ in ticks)
+    timed = [(timestamp_to_micros(ts), symbol, ts, price) for symbol, ts, price in ticks]
+    timed.sort(key=lambda t: t[0] if t[0] is not None else -1)
+    steps = engine.steps
+    events = []
+    for micros, symbol, ts, price in timed:
+        if micros is not None:
+            events.extend(engine.add(symbol, micros, price, ts))
+    events.extend(engine.flush())
+
+    now = time.time()
+    save_seconds = env_number("CORRELATION_SAVE_SECONDS", correlation.DEFAULT_SAVE_SECONDS, float)
+    if engine.steps > steps and now - engine.saved_at >= save_seconds:
+        try:
+            if correlation_state.save(anomaly_table, engine.snapshot(), datetime.now(timezone.utc).isoformat(), now):
+                engine.saved_at = now
+            else:
+                # Another container saved a later step; start over from it next batch.
+                CORRELATIONS = None
+        except Exception as e:
+            print(f"Failed to save correlation state: {e}")
+    return events
+
+
+def correlation_alert(event) -> dict:
+    """Alert fields for a market move or divergence; the anomaly item holds the same."""
+    if isinstance(event, correlation.MarketMove):
+        detector, z_score = correlation.MARKET_MOVE, event.z_score
+        fields = {
+            "symbol": correlation.MARKET_SYMBOL,
+            "direction": event.direction,
+            "deviation_percent": round(math.expm1(event.market_return - event.expected_return) * 100, 4),
+            "breadth": round(event.breadth, 4),
+            "symbols": event.symbols,
+        }
+    else:
+        detector, z_score = correlation.DIVERGENCE, event.z_score
+        fields = {
+            "symbol": event.symbol,
+            "direction": "SPIKE" if event.price > event.expected_price else "DROP",
+            "current_price": event.price,
+            "mean_price": event.expected_price,
+            "deviation_percent": round((event.price - event.expected_price) / event.expected_price * 100, 4),
+            "market_correlation": round(event.market_correlation, 4),
+        }
+    return {
+        **fields,
+        "z_score": round(z_score, 4),
+        "severity": "HIGH" if abs(z_score) > detector.high_severity else "MEDIUM",
+        "detector": detector.name,
+        "detectors": [detector.name],
+        "detected_at": event.detected_at,
+    }
+
+
+@instrumented("anomaly_detector")
 def lambda_handler(event, context):
     table_name = os.environ.get("DYNAMODB_TABLE")
     anomaly_table_name = os.environ.get("ANOMALY_TABLE")
     sns_topic_arn = os.environ.get("SNS_TOPIC_ARN")
-    try:
-        z_threshold = float(os.environ.get("Z_SCORE_THRESHOLD", DEFAULT_Z_THRESHOLD))
-    except (TypeError, ValueError):
-        z_threshold = DEFAULT_Z_THRESHOLD
 
     if not table_name or not anomaly_table_name or not sns_topic_arn:
         raise ValueError("DYNAMODB_TABLE, ANOMALY_TABLE, and SNS_TOPIC_ARN must be set")
 
-    dynamodb = boto3.resource("dynamodb")
-    sns = boto3.client("sns")
-    anomaly_table = dynamodb.Table(anomaly_table_name)
+    dynamodb = get_dynamodb()
+    sns = get_sns()
+    history_window = get_history_window()
+    active_detectors = detectors.get_detectors()
+    history_reads = 0
     detected = 0
     failed = 0
+    failed_sequences = []
+    pending_alerts = []
 
-    for record in event.get("Records", []):
-        try:
-            payload = base64.b64decode(record["kinesis"]["data"]).decode("utf-8")
-            data = json.loads(payload)
-        except (KeyError, ValueError, TypeError) as e:
-            print(f"Bad record: {e}")
-            failed += 1
-            continue
-
-        symbol = data.get("symbol", "").strip()
-        ts = data.get("timestamp", "")
-        current_price = parse_price(data.get("price"))
+    # 1) Decode the batch and group it per symbol, keeping arrival order within a symbol.
+    by_symbol: dict[str, list[tuple]] = {}
+    with stage("decode"):
+        batch = decode_batch(event.get("Records", []))
+    observe_batch(batch)
+    failed += batch.failed
+    for i in range(len(batch)):
+        symbol = batch.symbols[i].strip()
+        ts = batch.timestamp(i)
         if not symbol or not ts:
             failed += 1
             continue
+        current_price = batch.prices[i]
+        if math.isnan(current_price):
+            current_price = parse_float(batch.record(i).get("price"), 0.0)
+        by_symbol.setdefault(symbol, []).append((ts, current_price, parse_sequence(batch.kinesis_records[i])))
 
-        history = get_last_prices(dynamodb, table_name, symbol)
-        if len(history) < 2:
-            continue
+    if not by_symbol:
+        return {"batchItemFailures": [], "anomalies_detected": 0, "failed": failed, "history_reads": 0}
+
+    # 2) Note each record's running window statistics as the windows advance, and build the
+    # (records x window) matrix only if a selected detector needs it.
+    build_windows = detectors.needs_windows(active_detectors)
+    rows = []
+    scored = []
+    counts, means, stdevs = [], [], []
+    for symbol, ticks in by_symbol.items():
+        first_ts, _, first_sequence = ticks[0]
+        window = WINDOW_CACHE.get(symbol, first_sequence, history_window)
+        if window is None:
+            with stage("history"):
+                window = seed_window(dynamodb, table_name, symbol, history_window, first_ts)
+            history_reads += 1
+        if build_windows:
+            prices = np.fromiter((price for _, price, _ in ticks), dtype=float, count=len(ticks))
+            rows.append(detectors.history_windows(np.array(window.values()), prices, history_window))
+        for ts, price, sequence in ticks:
+            scored.append((symbol, ts, price, sequence))
+            counts.append(len(window))
+            means.append(window.mean)
+            stdevs.append(window.stdev)
+            window.push(price)
+        last_ts, _, last_sequence = ticks[-1]
+        WINDOW_CACHE.record(symbol, window, last_sequence, last_ts)
 
-        mean_price = statistics.mean(history)
+    with stage("compute"):
+        windows = np.vstack(rows) if build_windows else None
+        stats = detectors.RunningStats(np.array(counts), np.array(means), np.array(stdevs))
+        current_prices = np.fromiter((price for _, _, price, _ in scored), dtype=float, count=len(scored))
+        results = detectors.score_batch(windows, current_prices, active_detectors, stats)
+        flagged = np.zeros(len(scored), dtype=bool)
+        for d in active_detectors:
+            scores = results[d.name][0]
+            with np.errstate(invalid="ignore"):
+                flagged |= np.abs(scores) > d.threshold
+
+    # 3) Returns across symbols: market-wide moves, and divergences, which count as one
+    # more detector on the tick they were found on.
+    correlation_events = []
+    divergences = {}
+    correlation_result = {}
+    if env_flag("CORRELATION_ENABLED"):
+        correlation_result = {"market_moves": 0, "divergences": 0, "alerts_folded": 0}
         try:
-            stdev = statistics.stdev(history)
-        except statistics.StatisticsError:
-            stdev = 0.0
-        if stdev <= 0:
-            continue
+            with stage("correlation"):
+                correlation_events = update_correlations(
+                    dynamodb.Table(anomaly_table_name), [(symbol, ts, price) for symbol, ts, price, _ in scored]
+                )
+        except Exception as e:
+            print(f"Correlation update failed: {e}")
+        divergences = {(e.symbol, e.detected_at): e for e in correlation_events if isinstance(e, correlation.Divergence)}
+        for i, (symbol, ts, _, _) in enumerate(scored):
+            if (symbol, ts) in divergences:
+                flagged[i] = True
 
-        z_score = (current_price - mean_price) / stdev
-        if abs(z_score) <= z_threshold:
-            continue
+    # 4) Persist and alert on flagged records only.
+    for i in np.flatnonzero(flagged):
+        symbol, ts, current_price, sequence = scored[i]
+        fired = [
+            (d, float(results[d.name][0][i]), float(results[d.name][1][i]))
+            for d in active_detectors
+            if abs(results[d.name][0][i]) > d.threshold
+        ]
+        divergence = divergences.pop((symbol, ts), None)
+        if divergence is not None:
+            fired.append((correlation.DIVERGENCE, divergence.z_score, divergence.expected_price))
+        detector, z_score, mean_price = pick_primary(fired)
 
         direction = "SPIKE" if current_price > mean_price else "DROP"
         deviation_pct = ((current_price - mean_price) / mean_price * 100) if mean_price else 0.0
-        severity = "HIGH" if abs(z_score) > HIGH_SEVERITY_Z else "MEDIUM"
+        severity = "HIGH" if abs(z_score) > detector.high_severity else "MEDIUM"
+        # Running window stats depend on the order values came in, so a window rebuilt
+        # after a restart may differ in the last bits; keep those out of the item.
+        mean_price = round(mean_price, 6)
         detected_at = ts or datetime.now(timezone.utc).isoformat()
 
         anomaly_item = {
@@ -108,15 +402,23 @@ def lambda_handler(event, context):
             "deviation_percent": str(round(deviation_pct, 4)),
             "z_score": str(round(z_score, 4)),
             "severity": severity,
+            "detector": detector.name,
+            "detectors": [d.name for d, _, _ in fired],
         }
         try:
-            anomaly_table.put_item(Item=anomaly_item)
+            with stage("write"):
+                recorded = record_anomaly(dynamodb.meta.client, anomaly_table_name, anomaly_item)
+            if not recorded:
+                print(f"Anomaly for {symbol} at {detected_at} already recorded; skipping alert")
+                continue
         except Exception as e:
             print(f"Failed to write anomaly for {symbol}: {e}")
             failed += 1
+            if sequence is not None:
+                failed_sequences.append(sequence)
             continue
 
-        alert_body = {
+        pending_alerts.append({
             "symbol": symbol,
             "direction": direction,
             "current_price": current_price,
@@ -124,17 +426,63 @@ def lambda_handler(event, context):
             "deviation_percent": round(deviation_pct, 4),
             "z_score": round(z_score, 4),
             "severity": severity,
+            "detector": detector.name,
+            "detectors": [d.name for d, _, _ in fired],
             "detected_at": detected_at,
-        }
+        })
+        detected += 1
+        if divergence is not None:
+            correlation_result["divergences"] += 1
+
+    # 5) Market moves, and divergences found on ticks of an earlier batch (a round split
+    # over two). A market move's alert stands in for the alerts of the symbols that moved
+    # with it, divergences aside.
+    leftover = [e for e in correlation_events if not isinstance(e, correlation.Divergence)] + list(divergences.values())
+    for event in leftover:
+        alert = correlation_alert(event)
+        item = {k: str(v) if isinstance(v, float) else v for k, v in alert.items()}
         try:
-            sns.publish(
-                TopicArn=sns_topic_arn,
-                Subject=f"FinPulse Anomaly: {symbol} {direction} ({severity})",
-                Message=json.dumps(alert_body, indent=2),
-            )
+            with stage("write"):
+                recorded = record_anomaly(dynamodb.meta.client, anomaly_table_name, item)
         except Exception as e:
-            print(f"SNS publish failed for {symbol}: {e}")
-
+            print(f"Failed to write {alert['detector']} anomaly for {alert['symbol']}: {e}")
+            failed += 1
+            continue
+        if not recorded:
+            continue
+        if isinstance(event, correlation.MarketMove):
+            moved = set(event.symbols)
+            kept = [a for a in pending_alerts
+                    if a["symbol"] not in moved or a["direction"] != alert["direction"]
+                    or correlation.DIVERGENCE.name in a["detectors"]]
+            correlation_result["alerts_folded"] += len(pending_alerts) - len(kept)
+            pending_alerts = kept
+            correlation_result["market_moves"] += 1
+        else:
+            correlation_result["divergences"] += 1
+        pending_alerts.append(alert)
         detected += 1
 
-    return {"anomalies_detected": detected, "failed": failed}
+    # 6) Alerts are best effort and never make Kinesis retry the batch.
+    with stage("publish"):
+        alert_result = alerts.send_alerts(
+            sns, sns_topic_arn, pending_alerts, ALERT_COOLDOWNS,
+            alerts.DynamoDBCooldowns(dynamodb.meta.client, anomaly_table_name),
+            cooldown_seconds=env_number("ALERT_COOLDOWN_SECONDS", alerts.DEFAULT_COOLDOWN_SECONDS, float),
+            digest_max=max(1, env_number("ALERT_DIGEST_MAX", alerts.DEFAULT_DIGEST_MAX)),
+            concurrency=max(1, env_number("ALERT_CONCURRENCY", alerts.DEFAULT_CONCURRENCY)),
+        )
+
+    if failed:
+        record_failures(dynamodb.Table(anomaly_table_name), failed)
+
+    # The replayed tail is re-scored against a freshly seeded window (the cached one is
+    # rejected because its sequence number is past the replayed records).
+    return {
+        "batchItemFailures": [{"itemIdentifier": str(seq)} for seq in sorted(failed_sequences)],
+        "anomalies_detected": detected,
+        "failed": failed,
+        "history_reads": history_reads,
+        **correlation_result,
+        **alert_result,
+    }
@@ -0,0 +1,74 @@
+"""
+Fixed-capacity rolling window over a symbol's recent prices with O(1) running mean and
+sample variance (Welford's update, plus the matching replace step once the window is full).
+"""
+import math
+from array import array
+
+
+class RollingWindow:
+    """Ring buffer of the last `capacity` prices, stored as a compact C double array."""
+
+    __slots__ = ("capacity", "_values", "_start", "_count", "_mean", "_m2", "_replacements")
+
+    def __init__(self, capacity: int):
+        if capacity < 2:
+            raise ValueError("RollingWindow capacity must be at least 2")
+        self.capacity = capacity
+        self._values = array("d", bytes(8 * capacity))
+        self._start = 0
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._replacements = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def push(self, value: float) -> None:
+        """Append a price, evicting the oldest once the window is full."""
+        value = float(value)
+        if self._count < self.capacity:
+            self._values[(self._start + self._count) % self.capacity] = value
+            self._count += 1
+            delta = value - self._mean
+            self._mean += delta / self._count
+            self._m2 += delta * (value - self._mean)
+            return
+
+        oldest = self._values[self._start]
+        self._values[self._start] = value
+        self._start = (self._start + 1) % self.capacity
+        old_mean = self._mean
+        self._mean += (value - oldest) / self._count
+        self._m2 += (value - oldest) * (value - self._mean + oldest - old_mean)
+        self._replacements += 1
+        # Replacing values accumulates rounding error; re-derive from the buffer once per
+        # full turnover so the amortised cost stays O(1).
+        if self._replacements >= self.capacity:
+            self._recompute()
+
+    def _recompute(self) -> None:
+        self._replacements = 0
+        mean = math.fsum(self._values) / self._count
+        self._mean = mean
+        self._m2 = math.fsum((v - mean) * (v - mean) for v in self._values)
+
+    @property
+    def mean(self) -> float:
+        return self._mean
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (n - 1), matching statistics.variance; 0.0 below two values."""
+        if self._count < 2:
+            return 0.0
+        return max(self._m2, 0.0) / (self._count - 1)
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self.variance)
+
+    def values(self) -> list[float]:
+        """Window contents, oldest first."""
+        return [self._values[(self._start + i) % self.capacity] for i in range(self._count)]
@@ -0,0 +1,78 @@
+"""
+Warm-container cache of per-symbol rolling windows, kept at module level so it survives
+between invocations of the same Lambda container.
+
+An entry is trusted only if the next batch continues where it left off: the symbol's first
+record must carry a higher Kinesis sequence number than the last one folded into the window
+(symbols are the partition key, so a symbol's records always share a shard and their
+sequence numbers are comparable). Retries and bisected replays therefore force a re-seed.
+Batches handled by a different container cannot be seen from here, so entries also expire
+after a staleness TTL; with one batch per ingestion tick that bounds how much history a
+window can be missing.
+"""
+import time
+from collections import OrderedDict
+
+from rolling_window import RollingWindow
+
+
+class SymbolState:
+    __slots__ = ("window", "last_sequence", "last_timestamp", "updated_at")
+
+    def __init__(self, window: RollingWindow, last_sequence: int | None, last_timestamp: str, updated_at: float):
+        self.window = window
+        self.last_sequence = last_sequence
+        self.last_timestamp = last_timestamp
+        self.updated_at = updated_at
+
+
+class WindowStateCache:
+    """Bounded LRU of SymbolState with TTL and sequence-number validation."""
+
+    def __init__(self, max_symbols: int, ttl_seconds: float, clock=time.monotonic):
+        self.max_symbols = max_symbols
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries: OrderedDict[str, SymbolState] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, symbol: str, sequence: int | None, capacity: int) -> RollingWindow | None:
+        """Return the cached window if it is fresh and `sequence` continues it, else None."""
+        state = self._entries.get(symbol)
+        valid = (
+            state is not None
+            and sequence is not None
+            and state.last_sequence is not None
+            and sequence > state.last_sequence
+            and state.window.capacity == capacity
+            and self.clock() - state.updated_at <= self.ttl_seconds
+        )
+        if not valid:
+            if state is not None:
+                del self._entries[symbol]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(symbol)
+        self.hits += 1
+        return state.window
+
+    def record(self, symbol: str, window: RollingWindow, sequence: int | None, timestamp: str) -> None:
+        """Note that the record at `sequence` has been folded into `window`."""
+        state = self._entries.get(symbol)
+        if state is None:
+            self._entries[symbol] = SymbolState(window, sequence, timestamp, self.clock())
+            while len(self._entries) > self.max_symbols:
+                self._entries.popitem(last=False)
+            return
+        state.window = window
+        state.last_sequence = sequence
+        state.last_timestamp = timestamp
+        state.updated_at = self.clock()
+        self._entries.move_to_end(symbol)
+
+    def clear(self) -> None:
+        self._entries.clear()
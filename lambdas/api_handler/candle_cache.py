@@ -0,0 +1,80 @@
+"""
+Final candles for /candles, kept for the life of the warm container.
+
+The aggregator marks a candle final once its symbol's watermark has passed it and never
+writes to it again, so a final candle read once is good for as long as the table keeps
+it. Per candle partition ("AAPL", "AAPL#5m", ...) the cache holds one run of final
+candles without gaps: every candle in the partition from `covered_from` through
+`final_through` is in it. A read that starts inside a run only queries the candles after
+`final_through` (the one or two still open) and takes the rest from memory.
+
+Runs are evicted least recently used beyond max_partitions, and candles older than the
+route's longest window are dropped as runs grow.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+DEFAULT_MAX_PARTITIONS = 256
+
+
+@dataclass
+class FinalRun:
+    covered_from: str
+    final_through: str = ""
+    candles: dict = field(default_factory=dict)  # candle_timestamp -> item, oldest first
+
+    def newest_first(self, since: str, limit: int) -> list[dict]:
+        items = []
+        for ts, item in reversed(self.candles.items()):
+            if ts < since or len(items) >= limit:
+                break
+            items.append(item)
+        return items
+
+
+class CandleCache:
+    def __init__(self, max_partitions: int = DEFAULT_MAX_PARTITIONS):
+        self.max_partitions = max_partitions
+        self._runs: OrderedDict[str, FinalRun] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+    def clear(self) -> None:
+        self._runs.clear()
+
+    def get(self, partition: str, since: str) -> FinalRun | None:
+        """The partition's run, if it covers every candle from `since` to its final_through."""
+        run = self._runs.get(partition)
+        if run is None or run.covered_from > since:
+            return None
+        self._runs.move_to_end(partition)
+        return run
+
+    def put(self, partition: str, covered_from: str, items: list[dict], keep_from: str) -> None:
+        """Start a run from a complete read: `items` are every candle from covered_from on,
+        oldest first. Only the final ones at the front are kept."""
+        self._grow(partition, FinalRun(covered_from), items, keep_from)
+
+    def extend(self, partition: str, items: list[dict], keep_from: str) -> None:
+        """Add a complete read of the candles after the run's final_through, oldest first."""
+        run = self._runs.get(partition)
+        if run is not None:
+            self._grow(partition, run, items, keep_from)
+
+    def _grow(self, partition: str, run: FinalRun, items: list[dict], keep_from: str) -> None:
+        for item in items:
+            if not item.get("final"):
+                break
+            run.candles[item["candle_timestamp"]] = item
+            run.final_through = item["candle_timestamp"]
+        if keep_from > run.covered_from:
+            run.candles = {ts: item for ts, item in run.candles.items() if ts >= keep_from}
+            run.covered_from = keep_from
+        if not run.candles:
+            self._runs.pop(partition, None)
+            return
+        self._runs[partition] = run
+        self._runs.move_to_end(partition)
+        while len(self._runs) > self.max_partitions:
+            self._runs.popitem(last=False)
@@ -1,13 +1,49 @@
 """
 API Handler Lambda — HTTP API routes for prices, anomalies, candles, and pipeline stats.
 Uses DynamoDB (PRICES_TABLE, CANDLES_TABLE, ANOMALY_TABLE). Returns JSON with CORS headers.
+
+Successful GETs are cached for a few seconds per route (see response_cache.py) and carry
+an ETag and Cache-Control; a request whose If-None-Match still matches gets a bodyless 304.
+
+Independent reads (stats shards, counters, per-symbol fallbacks) run concurrently on one
+pooled client (see parallel.py) under FANOUT_DEADLINE_SECONDS. Whatever misses the
+deadline is listed in the body's "missing" with "partial": true, and that response is
+not cached. Query time, cache hits and DynamoDB call counts go out as embedded metrics
+(see metrics.py).
+
+With HISTORY_FROM_BUCKETS=true, /prices/{symbol} reads the price processor's compressed
+hourly tick buckets (see tick_buckets.py) instead of one item per tick, falling back to
+the tick items when a symbol has no buckets yet.
+
+Candles the aggregator has marked final never change, so /candles keeps them per partition
+for the life of the container (see candle_cache.py) and queries only the open ones.
+
+/correlations serves the return correlations across symbols that the anomaly detector
+keeps and saves every few minutes (see correlation_state.py).
 """
+import base64
+import binascii
 import json
+import math
 import os
+import time
 from datetime import datetime, timezone, timedelta
 from decimal import Decimal
 
-import boto3
+import aws
+import correlation_state
+from config import env_flag, env_number, tracked_symbols
+from metrics import count, instrumented, stage
+from parallel import DEFAULT_MAX_WORKERS, run_parallel
+from partitions import (
+    ANOMALY_COUNTER_PARTITION, DEFAULT_SNAPSHOT_SHARDS, DEFAULT_STATS_SHARDS, SNAPSHOT_PREFIX, SNAPSHOT_SORT_KEY,
+    STATS_PREFIX,
+)
+from candle_cache import DEFAULT_MAX_PARTITIONS as DEFAULT_CANDLE_CACHE_PARTITIONS, CandleCache
+from record_codec import micros_to_datetime
+from response_cache import DEFAULT_MAX_ENTRIES, DynamoDBStore, ResponseCache, cache_key, etag_matches
+from tick_buckets import DEFAULT_BUCKET_SECONDS, as_price_items, read_range
+from timeutil import format_timestamp
 
 
 class DecimalEncoder(json.JSONEncoder):
@@ -19,13 +55,47 @@ class DecimalEncoder(json.JSONEncoder):
         return super().default(obj)
 
 
-SYMBOLS = ["AAPL", "GOOGL", "MSFT", "AMZN", "TSLA", "META", "NVDA", "NFLX", "JPM", "V"]
+SYMBOLS = tracked_symbols()
+# Candle tiers maintained by the aggregator; coarser tiers are keyed "<symbol>#<resolution>".
+CANDLE_RESOLUTIONS = ["1m", "5m", "15m", "1h", "1d"]
+MAX_CANDLE_HOURS = 168
+# Anomalies are indexed by day bucket in the by_time GSI, written by anomaly_detector;
+# the snapshot, stats and anomaly counter partitions are in partitions.py.
+ANOMALY_INDEX = "by_time"
+ANOMALY_SEVERITIES = ["HIGH", "MEDIUM"]
+MAX_CORRELATION_SYMBOLS = 200
+# /prices/{symbol} page size caps: per-tick items, and decoded tick buckets.
+MAX_HISTORY_LIMIT = 500
+MAX_BUCKET_HISTORY_LIMIT = 5000
+# pipeline_status thresholds. Ingestion runs every 60 s, so one missed tick is tolerated.
+STATUS_DEGRADED_AFTER_SECONDS = 180
+STATUS_STALLED_AFTER_SECONDS = 600
+STATUS_MAX_FAILURE_RATE = 0.05
+STATUS_MAX_LAG_MS = 60_000
+# Seconds a successful response is reused, by route; dashboards poll these in lockstep.
+ROUTE_CACHE_SECONDS = {
+    "/prices": 2,
+    "/prices/": 5,
+    "/stats": 5,
+    "/anomalies": 5,
+    "/candles/": 5,
+    "/correlations": 30,
+}
+DEFAULT_FANOUT_DEADLINE_SECONDS = 5.0
+# One connection per fan-out worker plus headroom for the request thread and retries.
+DEFAULT_MAX_POOL_CONNECTIONS = 32
 CORS_HEADERS = {
     "Access-Control-Allow-Origin": "*",
-    "Access-Control-Allow-Headers": "Content-Type",
+    "Access-Control-Allow-Headers": "Content-Type, If-None-Match",
+    "Access-Control-Expose-Headers": "ETag",
     "Content-Type": "application/json",
 }
 
+# Live as long as the warm container.
+_dynamodb = None
+_response_cache = None
+_candle_cache = None
+
 
 def response(body, status_code=200):
     return {"statusCode": status_code, "headers": CORS_HEADERS, "body": json.dumps(body, cls=DecimalEncoder)}
@@ -35,46 +105,198 @@ def error_response(message: str, status_code=400):
     return response({"error": message}, status_code)
 
 
+def partial_response(body: dict, missing: list[str]) -> dict:
+    """200 with what could be read before the fan-out deadline; never cached."""
+    result = response({**body, "partial": True, "missing": sorted(missing)})
+    result["headers"] = {**CORS_HEADERS, "Cache-Control": "no-store"}
+    return result
+
+
+def get_dynamodb():
+    """Module-level DynamoDB resource; its client (thread-safe) is what fan-out tasks use."""
+    global _dynamodb
+    if _dynamodb is None:
+        from botocore.config import Config
+
+        config = Config(
+            max_pool_connections=max(1, env_number("DYNAMODB_MAX_POOL_CONNECTIONS", DEFAULT_MAX_POOL_CONNECTIONS)),
+            connect_timeout=2,
+            read_timeout=5,
+            retries={"mode": "standard", "max_attempts": 3},
+        )
+        _dynamodb = aws.resource("dynamodb", config=config)
+    return _dynamodb
+
+
+aws.preload(get_dynamodb)
+
+
+def fan_out(tasks: dict, deadline_seconds: float | None = None) -> tuple[dict, list]:
+    if deadline_seconds is None:
+        deadline_seconds = env_number("FANOUT_DEADLINE_SECONDS", DEFAULT_FANOUT_DEADLINE_SECONDS, float)
+    workers = max(1, env_number("FANOUT_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+    return run_parallel(tasks, deadline_seconds, workers)
+
+
+def to_attribute_values(values: dict) -> dict:
+    return aws.serialize_item(values)
+
+
+def from_item(item: dict) -> dict:
+    return aws.deserialize_item(item)
+
+
+def query_pages(table, **query):
+    """Yield query pages (Items deserialized) through the low-level client, which, unlike a
+    resource Table, is safe to share across fan-out threads."""
+    client = get_dynamodb().meta.client
+    if "ExpressionAttributeValues" in query:
+        query["ExpressionAttributeValues"] = to_attribute_values(query["ExpressionAttributeValues"])
+    while True:
+        r = client.query(TableName=table.name, **query)
+        if "Items" in r:
+            r["Items"] = [from_item(item) for item in r["Items"]]
+        yield r
+        if not r.get("LastEvaluatedKey"):
+            return
+        query["ExclusiveStartKey"] = r["LastEvaluatedKey"]
+
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+    if _response_cache is None:
+        max_entries = env_number("RESPONSE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+        shared_table = os.environ.get("RESPONSE_CACHE_TABLE")
+        shared = DynamoDBStore(get_dynamodb().Table(shared_table)) if shared_table else None
+        _response_cache = ResponseCache(max_entries, shared=shared)
+    return _response_cache
+
+
+def route_cache_seconds(raw_path: str) -> int:
+    """Cache lifetime for a path (0 = not cached); RESPONSE_CACHE_ENABLED=false turns it off."""
+    if os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() == "false":
+        return 0
+    if raw_path in ROUTE_CACHE_SECONDS:
+        return ROUTE_CACHE_SECONDS[raw_path]
+    for prefix in ("/prices/", "/candles/"):
+        if raw_path.startswith(prefix):
+            return ROUTE_CACHE_SECONDS[prefix]
+    return 0
+
+
+def cached_response(entry, if_none_match: str | None, now: float) -> dict:
+    headers = {
+        **CORS_HEADERS,
+        "ETag": entry.etag,
+        "Cache-Control": f"public, max-age={max(0, int(entry.expires_at - now))}",
+    }
+    if etag_matches(if_none_match, entry.etag):
+        return {"statusCode": 304, "headers": headers, "body": ""}
+    return {"statusCode": 200, "headers": headers, "body": entry.body}
+
+
 def get_table(name_env: str):
     table_name = os.environ.get(name_env)
     if not table_name:
         raise ValueError(f"{name_env} must be set")
-    return boto3.resource("dynamodb").Table(table_name)
+    return get_dynamodb().Table(table_name)
+
+
+def get_snapshot_shards() -> int:
+    return max(1, env_number("SNAPSHOT_SHARDS", DEFAULT_SNAPSHOT_SHARDS))
+
+
+def get_stats_shards() -> int:
+    return max(1, env_number("STATS_SHARDS", DEFAULT_STATS_SHARDS))
+
+
+def get_latest_snapshot(prices_table) -> dict:
+    """Every symbol's latest price from the snapshot items: one GetItem, or one BatchGetItem if sharded."""
+    client = get_dynamodb().meta.client
+    keys = [
+        to_attribute_values({"symbol": f"{SNAPSHOT_PREFIX}#{shard}", "timestamp": SNAPSHOT_SORT_KEY})
+        for shard in range(get_snapshot_shards())
+    ]
+    if len(keys) == 1:
+        item = client.get_item(TableName=prices_table.name, Key=keys[0]).get("Item")
+        items = [item] if item else []
+    else:
+        request = {prices_table.name: {"Keys": keys}}
+        items = []
+        while request:
+            r = client.batch_get_item(RequestItems=request)
+            items.extend(r.get("Responses", {}).get(prices_table.name, []))
+            request = r.get("UnprocessedKeys") or {}
+    latest = {}
+    for item in map(from_item, items):
+        for symbol, entry in item.items():
+            if symbol not in ("symbol", "timestamp") and isinstance(entry, dict):
+                latest[symbol] = {"symbol": symbol, **entry}
+    return latest
+
+
+def latest_item(prices_table, symbol: str) -> dict | None:
+    page = next(query_pages(
+        prices_table,
+        KeyConditionExpression="symbol = :s",
+        ExpressionAttributeValues={":s": symbol},
+        Limit=1,
+        ScanIndexForward=False,
+    ))
+    items = page.get("Items", [])
+    return items[0] if items else None
+
+
+def latest_price_items(prices_table, deadline_seconds: float | None = None) -> tuple[dict, list]:
+    """Snapshot entries, plus concurrent Limit=1 queries for any known symbol the snapshot has
+    not seen yet. Returns (items by symbol, symbols whose fallback missed the deadline)."""
+    results = get_latest_snapshot(prices_table)
+    tasks = {
+        symbol: (lambda symbol=symbol: latest_item(prices_table, symbol))
+        for symbol in SYMBOLS if symbol not in results
+    }
+    found, missing = fan_out(tasks, deadline_seconds)
+    results.update((symbol, item) for symbol, item in found.items() if item is not None)
+    return results, missing
 
 
 def get_latest_prices_all(prices_table) -> dict:
-    """GET /prices — latest price for all 5 symbols."""
+    """GET /prices — latest price for every tracked symbol."""
+    items, missing = latest_price_items(prices_table)
     results = {}
-    for symbol in SYMBOLS:
-        r = prices_table.query(
-            KeyConditionExpression="symbol = :s",
-            ExpressionAttributeValues={":s": symbol},
-            Limit=1,
-            ScanIndexForward=False,
-        )
-        items = r.get("Items", [])
-        if items:
-            item = items[0]
-            results[symbol] = {
-                "symbol": item.get("symbol"),
-                "price": item.get("price"),
-                "timestamp": item.get("timestamp"),
-                "volume": item.get("volume"),
-                "change_percent": item.get("change_percent"),
-            }
+    for symbol, item in items.items():
+        results[symbol] = {
+            "symbol": symbol,
+            "price": item.get("price"),
+            "timestamp": item.get("timestamp"),
+            "volume": item.get("volume"),
+            "change_percent": item.get("change_percent"),
+        }
+    if missing:
+        return partial_response({"prices": results}, missing)
     return response({"prices": results})
 
 
 def get_price_history(prices_table, symbol: str, query_params: dict) -> dict:
-    """GET /prices/{symbol} — history with optional hours (default 24) and limit (default 100)."""
+    """GET /prices/{symbol} — history with optional hours (default 24) and limit (default 100).
+
+    Newest first. Limit is capped at 500 over tick items, 5000 over tick buckets.
+    """
     symbol = (symbol or "").upper().strip()
     if symbol not in SYMBOLS:
         return error_response(f"Unknown symbol: {symbol}", 400)
     hours = int(query_params.get("hours", 24)) if query_params else 24
     limit = int(query_params.get("limit", 100)) if query_params else 100
     hours = max(1, min(hours, 168))
-    limit = max(1, min(limit, 500))
-    since = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat().replace("+00:00", "Z")
+    since_dt = datetime.now(timezone.utc) - timedelta(hours=hours)
+    if env_flag("HISTORY_FROM_BUCKETS"):
+        seconds = max(1, env_number("TICK_BUCKET_SECONDS", DEFAULT_BUCKET_SECONDS))
+        ticks = read_range(prices_table, symbol, int(since_dt.timestamp() * 1_000_000), seconds=seconds)
+        if ticks:
+            newest = ticks[-max(1, min(limit, MAX_BUCKET_HISTORY_LIMIT)):][::-1]
+            return response({"symbol": symbol, "prices": as_price_items(symbol, newest), "count": len(newest)})
+    limit = max(1, min(limit, MAX_HISTORY_LIMIT))
+    since = format_timestamp(since_dt)
     r = prices_table.query(
         KeyConditionExpression="symbol = :s AND #ts >= :since",
         ExpressionAttributeNames={"#ts": "timestamp"},
@@ -86,103 +308,314 @@ def get_price_history(prices_table, symbol: str, query_params: dict) -> dict:
     return response({"symbol": symbol, "prices": items, "count": len(items)})
 
 
+def encode_cursor(partition: str, last_key: dict | None) -> str:
+    raw = json.dumps({"p": partition, "k": last_key}, cls=DecimalEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, dict | None]:
+    """Inverse of encode_cursor; raises ValueError for anything that is not one of ours."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(data, dict) or not isinstance(data.get("p"), str) or not isinstance(data.get("k"), (dict, type(None))):
+        raise ValueError("Invalid cursor")
+    return data["p"], data["k"]
+
+
+def day_buckets(since: datetime, until: datetime) -> list[str]:
+    """Day buckets ("YYYY-MM-DD") covering [since, until], newest first."""
+    day, last = until.date(), since.date()
+    buckets = []
+    while day >= last:
+        buckets.append(day.isoformat())
+        day -= timedelta(days=1)
+    return buckets
+
+
 def get_anomalies(anomaly_table, query_params: dict) -> dict:
-    """GET /anomalies — recent anomalies across all symbols."""
-    limit = int(query_params.get("limit", 50)) if query_params else 50
-    limit = max(1, min(limit, 200))
-    since = (datetime.now(timezone.utc) - timedelta(hours=24)).isoformat().replace("+00:00", "Z")
-    # Scan with filter (no GSI); for larger scale you’d use a GSI on detected_at
-    r = anomaly_table.scan(
-        FilterExpression="detected_at >= :since",
-        ExpressionAttributeValues={":since": since},
-        Limit=limit * 2,
-    )
-    items = r.get("Items", [])
-    while r.get("LastEvaluatedKey") and len(items) < limit:
-        r = anomaly_table.scan(
-            FilterExpression="detected_at >= :since",
-            ExpressionAttributeValues={":since": since},
-            ExclusiveStartKey=r["LastEvaluatedKey"],
-            Limit=limit * 2,
-        )
+    """GET /anomalies — newest anomalies first, optionally for one symbol and/or severity.
+
+    Reads the by_time index one day bucket at a time (or the symbol's own partition), so
+    cost follows the page size, not the table size. `next_cursor` resumes where a page ended.
+    """
+    query_params = query_params or {}
+    limit = max(1, min(int(query_params.get("limit", 50)), 200))
+    hours = max(1, min(int(query_params.get("hours", 24)), 168))
+    symbol = (query_params.get("symbol") or "").upper().strip()
+    severity = (query_params.get("severity") or "").upper().strip()
+    if severity and severity not in ANOMALY_SEVERITIES:
+        return error_response(f"Unknown severity: {severity} (expected one of {', '.join(ANOMALY_SEVERITIES)})", 400)
+    now = datetime.now(timezone.utc)
+    since = format_timestamp(now - timedelta(hours=hours))
+
+    partitions = [symbol] if symbol else day_buckets(now - timedelta(hours=hours), now)
+    position, start_key = 0, None
+    if query_params.get("cursor"):
+        try:
+            partition, start_key = decode_cursor(query_params["cursor"])
+            position = partitions.index(partition)
+        except ValueError:
+            return error_response("Invalid cursor", 400)
+
+    base = {"ScanIndexForward": False, "ExpressionAttributeNames": {"#d": "detected_at"}}
+    if symbol:
+        base["KeyConditionExpression"] = "symbol = :p AND #d >= :since"
+    else:
+        base["IndexName"] = ANOMALY_INDEX
+        base["KeyConditionExpression"] = "time_bucket = :p AND #d >= :since"
+    if severity:
+        base["FilterExpression"] = "severity = :sev"
+
+    items = []
+    next_cursor = None
+    while position < len(partitions) and len(items) < limit:
+        values = {":p": partitions[position], ":since": since}
+        if severity:
+            values[":sev"] = severity
+        query = {**base, "ExpressionAttributeValues": values, "Limit": limit - len(items)}
+        if start_key:
+            query["ExclusiveStartKey"] = start_key
+        r = anomaly_table.query(**query)
         items.extend(r.get("Items", []))
-    items = sorted(items, key=lambda x: x.get("detected_at", ""), reverse=True)[:limit]
-    return response({"anomalies": items, "count": len(items)})
+        start_key = r.get("LastEvaluatedKey")
+        if not start_key:
+            position += 1
+        if len(items) >= limit and position < len(partitions):
+            next_cursor = encode_cursor(partitions[position], start_key)
+    for item in items:
+        item.pop("time_bucket", None)
+    return response({"anomalies": items, "count": len(items), "next_cursor": next_cursor})
+
+
+def query_all(table, **query) -> list[dict]:
+    return [item for page in query_pages(table, **query) for item in page.get("Items", [])]
+
+
+def first_whole_hour(since: datetime) -> datetime:
+    first_hour = since.replace(minute=0, second=0, microsecond=0)
+    return first_hour + timedelta(hours=1) if first_hour < since else first_hour
+
+
+def count_partial_hour(anomaly_table, since: datetime) -> int:
+    """Anomalies between `since` and the next whole hour, which the hourly counters cannot
+    split: one COUNT query on the index."""
+    first_hour = first_whole_hour(since)
+    if first_hour == since:
+        return 0
+    # Every timestamp inside first_hour sorts after its "YYYY-MM-DDTHH" prefix.
+    pages = query_pages(
+        anomaly_table,
+        IndexName=ANOMALY_INDEX,
+        KeyConditionExpression="time_bucket = :b AND detected_at BETWEEN :since AND :h",
+        ExpressionAttributeValues={
+            ":b": since.strftime("%Y-%m-%d"),
+            ":since": format_timestamp(since),
+            ":h": first_hour.strftime("%Y-%m-%dT%H"),
+        },
+        Select="COUNT",
+    )
+    return sum(page.get("Count", 0) for page in pages)
+
+
+def count_anomalies_since(since: datetime, counters: list[dict], partial_hour: int) -> int:
+    """Anomalies detected at or after `since`: the hourly `counters` for whole hours plus the
+    count_partial_hour result for the start of the window."""
+    hour_key = first_whole_hour(since).strftime("%Y-%m-%dT%H")
+    return partial_hour + sum(int(item.get("count", 0)) for item in counters if item["detected_at"] >= hour_key)
+
+
+def get_candle_cache() -> CandleCache:
+    global _candle_cache
+    if _candle_cache is None:
+        _candle_cache = CandleCache(max(0, env_number("CANDLE_CACHE_MAX_PARTITIONS", DEFAULT_CANDLE_CACHE_PARTITIONS)))
+    return _candle_cache
 
 
 def get_candles(candles_table, symbol: str, query_params: dict) -> dict:
-    """GET /candles/{symbol} — OHLCV candles with optional hours and limit."""
+    """GET /candles/{symbol} — OHLCV candles with optional hours, limit and resolution (default 1m).
+
+    Final candles come from the container's candle cache where it covers the window, so
+    only the candles still open are queried.
+    """
     symbol = (symbol or "").upper().strip()
     if symbol not in SYMBOLS:
         return error_response(f"Unknown symbol: {symbol}", 400)
+    resolution = (query_params.get("resolution") or "1m").strip() if query_params else "1m"
+    if resolution not in CANDLE_RESOLUTIONS:
+        return error_response(f"Unknown resolution: {resolution} (expected one of {', '.join(CANDLE_RESOLUTIONS)})", 400)
+    partition = symbol if resolution == "1m" else f"{symbol}#{resolution}"
     hours = int(query_params.get("hours", 24)) if query_params else 24
     limit = int(query_params.get("limit", 100)) if query_params else 100
-    hours = max(1, min(hours, 168))
+    hours = max(1, min(hours, MAX_CANDLE_HOURS))
     limit = max(1, min(limit, 500))
-    since = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat().replace("+00:00", "Z")
+    now = datetime.now(timezone.utc)
+    since = format_timestamp(now - timedelta(hours=hours))
+    keep_from = format_timestamp(now - timedelta(hours=MAX_CANDLE_HOURS))
+
+    cache = get_candle_cache()
+    run = cache.get(partition, since) if cache.max_partitions else None
+    if run is not None and run.final_through < since:
+        run = None
+    # With a run, only the candles after its last final one are read.
+    bound, op = (run.final_through, ">") if run is not None else (since, ">=")
     r = candles_table.query(
-        KeyConditionExpression="symbol = :s AND candle_timestamp >= :since",
-        ExpressionAttributeValues={":s": symbol, ":since": since},
+        KeyConditionExpression=f"symbol = :s AND candle_timestamp {op} :since",
+        ExpressionAttributeValues={":s": partition, ":since": bound},
         Limit=limit,
         ScanIndexForward=False,
     )
     items = r.get("Items", [])
-    return response({"symbol": symbol, "candles": items, "count": len(items)})
+    for item in items:
+        item["symbol"] = symbol
+    complete = not r.get("LastEvaluatedKey")
+    if run is not None:
+        count("candle_cache_hits")
+        cached = run.newest_first(since, limit - len(items))
+        if complete:
+            cache.extend(partition, items[::-1], keep_from)
+        items = items + cached
+    elif cache.max_partitions:
+        count("candle_cache_misses")
+        cache.put(partition, since if complete else items[-1]["candle_timestamp"], items[::-1], keep_from)
+    return response({"symbol": symbol, "resolution": resolution, "candles": items, "count": len(items)})
+
+
+def get_correlations(anomaly_table, query_params: dict) -> dict:
+    """GET /correlations — correlation matrix of per-step returns, by default for SYMBOLS.
+
+    `symbols` (comma separated) picks the rows and columns, in that order. Entries are null
+    while a symbol has too few returns; `volatility_percent` is each symbol's standard
+    deviation of returns per step.
+    """
+    query_params = query_params or {}
+    raw = query_params.get("symbols")
+    wanted = [s.strip().upper() for s in raw.split(",") if s.strip()] if raw else list(SYMBOLS)
+    wanted = list(dict.fromkeys(wanted))
+    if len(wanted) > MAX_CORRELATION_SYMBOLS:
+        return error_response(f"At most {MAX_CORRELATION_SYMBOLS} symbols per request", 400)
+    saved = correlation_state.load(anomaly_table)
+    if saved is None:
+        return error_response("No correlations recorded yet", 404)
+    snapshot, head = saved
+    index = {s: i for i, s in enumerate(snapshot.symbols)}
+    symbols = [s for s in wanted if s in index]
+    rows = [index[s] for s in symbols]
+
+    def rounded(value: float) -> float | None:
+        return round(value, 4) if math.isfinite(value) else None
+
+    return response({
+        "symbols": symbols,
+        "unknown": [s for s in wanted if s not in index],
+        "matrix": [[rounded(snapshot.correlation(i, j)) for j in rows] for i in rows],
+        "volatility_percent": [rounded(snapshot.volatility(i) * 100) for i in rows],
+        "observations": [int(snapshot.observations[i]) for i in rows],
+        "steps": snapshot.steps,
+        "window": snapshot.window,
+        "as_of": format_timestamp(micros_to_datetime(snapshot.step_us)),
+        "updated_at": head.get("updated_at"),
+    })
+
+
+def pipeline_status(now: datetime, last_update: str | None, events: int, failures: int, lag_ms: float | None) -> tuple[str, list[str]]:
+    """operational / degraded / stalled from counter freshness, failure rate and ingest lag."""
+    if last_update is None:
+        return "stalled", ["no events processed in the last hour"]
+    age = (now - datetime.fromisoformat(last_update)).total_seconds()
+    if age > STATUS_STALLED_AFTER_SECONDS:
+        return "stalled", [f"last batch processed {int(age)}s ago"]
+    reasons = []
+    if age > STATUS_DEGRADED_AFTER_SECONDS:
+        reasons.append(f"last batch processed {int(age)}s ago")
+    if events + failures and failures / (events + failures) > STATUS_MAX_FAILURE_RATE:
+        reasons.append(f"{failures} of {events + failures} records failed in the last hour")
+    if lag_ms is not None and lag_ms > STATUS_MAX_LAG_MS:
+        reasons.append(f"ingest lag {lag_ms / 1000:.1f}s")
+    return ("degraded" if reasons else "operational"), reasons
 
 
 def get_stats(prices_table, anomaly_table) -> dict:
-    """GET /stats — events last hour, anomalies 24h, symbols tracked, latest prices, pipeline status."""
-    one_hour_ago = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat().replace("+00:00", "Z")
-    day_ago = (datetime.now(timezone.utc) - timedelta(hours=24)).isoformat().replace("+00:00", "Z")
-    events_last_hour = 0
-    latest_prices = {}
-    for symbol in SYMBOLS:
-        r = prices_table.query(
-            KeyConditionExpression="symbol = :s AND #ts >= :t",
+    """GET /stats — events last hour, anomalies 24h, symbols tracked, latest prices, pipeline status.
+
+    Sums the per-minute counters kept by the consumers: one query per stats shard, one for
+    the hourly anomaly counters, one for the partial first hour and one snapshot read, no
+    matter how many ticks arrived. They are independent, so they run concurrently.
+    """
+    now = datetime.now(timezone.utc)
+    hour_ago = now - timedelta(hours=1)
+    day_ago = now - timedelta(hours=24)
+    lag_window = (now - timedelta(minutes=5)).strftime("%Y-%m-%dT%H:%M")
+    deadline = env_number("FANOUT_DEADLINE_SECONDS", DEFAULT_FANOUT_DEADLINE_SECONDS, float)
+    started = time.monotonic()
+
+    tasks = {
+        f"stats#{shard}": (lambda shard=shard: query_all(
+            prices_table,
+            KeyConditionExpression="symbol = :p AND #ts >= :since",
             ExpressionAttributeNames={"#ts": "timestamp"},
-            ExpressionAttributeValues={":s": symbol, ":t": one_hour_ago},
-            Select="COUNT",
-        )
-        events_last_hour += r.get("Count", 0)
-        # latest price for stats
-        r2 = prices_table.query(
-            KeyConditionExpression="symbol = :s",
-            ExpressionAttributeValues={":s": symbol},
-            Limit=1,
-            ScanIndexForward=False,
-        )
-        for item in r2.get("Items", []):
-            latest_prices[symbol] = item.get("price")
-    anomalies_24h = 0
-    r = anomaly_table.scan(
-        FilterExpression="detected_at >= :t",
-        ExpressionAttributeValues={":t": day_ago},
-        Select="COUNT",
+            ExpressionAttributeValues={":p": f"{STATS_PREFIX}#{shard}", ":since": hour_ago.strftime("%Y-%m-%dT%H:%M")},
+        ))
+        for shard in range(get_stats_shards())
+    }
+    tasks["anomaly_counters"] = lambda: query_all(
+        anomaly_table,
+        KeyConditionExpression="symbol = :p AND detected_at >= :h",
+        ExpressionAttributeValues={":p": ANOMALY_COUNTER_PARTITION, ":h": day_ago.strftime("%Y-%m-%dT%H")},
     )
-    anomalies_24h = r.get("Count", 0)
-    while r.get("LastEvaluatedKey"):
-        r = anomaly_table.scan(
-            FilterExpression="detected_at >= :t",
-            ExpressionAttributeValues={":t": day_ago},
-            ExclusiveStartKey=r["LastEvaluatedKey"],
-            Select="COUNT",
+    tasks["anomaly_partial_hour"] = lambda: count_partial_hour(anomaly_table, day_ago)
+    tasks["latest_prices"] = lambda: get_latest_snapshot(prices_table)
+    results, missing = fan_out(tasks, deadline)
+
+    minutes = [m for key, value in results.items() if key.startswith("stats#") for m in value]
+    events_last_hour = sum(int(m.get("events", 0)) for m in minutes)
+    failures = sum(int(m.get("failed", 0)) for m in minutes)
+    events_by_symbol = {}
+    for m in minutes:
+        for name, value in m.items():
+            if name.startswith("events#"):
+                symbol = name.split("#", 1)[1]
+                events_by_symbol[symbol] = events_by_symbol.get(symbol, 0) + int(value)
+    recent = [m for m in minutes if m["timestamp"] >= lag_window]
+    lag_count = sum(int(m.get("lag_count", 0)) for m in recent)
+    ingest_lag_ms = sum(int(m.get("lag_ms_sum", 0)) for m in recent) / lag_count if lag_count else None
+    last_update = max((m["updated_at"] for m in minutes if m.get("updated_at")), default=None)
+
+    counters = results.get("anomaly_counters", [])
+    anomalies_24h = count_anomalies_since(day_ago, counters, results.get("anomaly_partial_hour", 0))
+    hour_key = hour_ago.strftime("%Y-%m-%dT%H")
+    failures += sum(int(c.get("failed", 0)) for c in counters if c["detected_at"] >= hour_key)
+
+    status, reasons = pipeline_status(now, last_update, events_last_hour, failures, ingest_lag_ms)
+    latest = results.get("latest_prices", {})
+    if "latest_prices" in results:
+        # Symbols the snapshot has not seen yet, in the time left.
+        remaining = max(0.0, deadline - (time.monotonic() - started))
+        fallback, fallback_missing = fan_out(
+            {s: (lambda s=s: latest_item(prices_table, s)) for s in SYMBOLS if s not in latest}, remaining,
         )
-        anomalies_24h += r.get("Count", 0)
-    return response({
+        latest.update((s, item) for s, item in fallback.items() if item is not None)
+        missing += fallback_missing
+    latest_prices = {symbol: item.get("price") for symbol, item in latest.items()}
+    body = {
         "events_last_hour": events_last_hour,
+        "events_by_symbol": events_by_symbol,
+        "failures_last_hour": failures,
+        "ingest_lag_ms": round(ingest_lag_ms) if ingest_lag_ms is not None else None,
+        "last_event_at": last_update,
         "anomalies_24h": anomalies_24h,
-        "symbols_tracked": SYMBOLS,
+        "symbols_tracked": sorted(set(SYMBOLS) | set(latest_prices)),
         "latest_prices": latest_prices,
-        "pipeline_status": "operational",
-    })
+        "pipeline_status": status,
+        "status_reasons": reasons,
+    }
+    if missing:
+        return partial_response(body, missing)
+    return response(body)
 
 
-def lambda_handler(event, context):
-    method = (event.get("requestContext") or {}).get("http", {}).get("method", "GET")
-    raw_path = event.get("rawPath", "") or event.get("path", "")
-    path_params = event.get("pathParameters") or {}
-    query_params = event.get("queryStringParameters") or {}
-
+def dispatch(raw_path: str, path_params: dict, query_params: dict) -> dict:
     try:
         prices_table = get_table("PRICES_TABLE")
         candles_table = get_table("CANDLES_TABLE")
@@ -190,9 +623,6 @@ def lambda_handler(event, context):
     except ValueError as e:
         return error_response(str(e), 500)
 
-    if method != "GET":
-        return error_response("Method not allowed", 405)
-
     if raw_path == "/prices" and not path_params:
         return get_latest_prices_all(prices_table)
     if raw_path.startswith("/prices/"):
@@ -205,5 +635,36 @@ def lambda_handler(event, context):
         return get_candles(candles_table, symbol, query_params)
     if raw_path == "/stats":
         return get_stats(prices_table, anomaly_table)
+    if raw_path == "/correlations":
+        return get_correlations(anomaly_table, query_params)
 
     return error_response("Not found", 404)
+
+
+@instrumented("api_handler")
+def lambda_handler(event, context):
+    method = (event.get("requestContext") or {}).get("http", {}).get("method", "GET")
+    raw_path = event.get("rawPath", "") or event.get("path", "")
+    path_params = event.get("pathParameters") or {}
+    query_params = event.get("queryStringParameters") or {}
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+
+    if method != "GET":
+        return error_response("Method not allowed", 405)
+
+    ttl = route_cache_seconds(raw_path)
+    if not ttl:
+        with stage("query"):
+            return dispatch(raw_path, path_params, query_params)
+
+    cache = get_response_cache()
+    key = cache_key(raw_path, query_params)
+    entry = cache.get(key)
+    count("cache_hits" if entry is not None else "cache_misses")
+    if entry is None:
+        with stage("query"):
+            result = dispatch(raw_path, path_params, query_params)
+        if result["statusCode"] != 200 or result["headers"].get("Cache-Control") == "no-store":
+            return result
+        entry = cache.put(key, result["body"], ttl)
+    return cached_response(entry, headers.get("if-none-match"), cache.clock())
@@ -0,0 +1,70 @@
+"""
+Concurrent fan-out for independent DynamoDB reads, bounded by an overall deadline.
+
+Tasks run on a module-level thread pool that survives warm starts. Whatever has not
+finished by the deadline is reported back by key instead of being waited for, so a
+route can answer with partial results rather than run into the API Gateway timeout.
+Tasks should use the low-level client (thread-safe); boto3 resources are not.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_MAX_WORKERS = 16
+
+_executor = None
+_executor_workers = 0
+
+
+def get_executor(max_workers: int) -> ThreadPoolExecutor:
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != max_workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fanout")
+        _executor_workers = max_workers
+    return _executor
+
+
+def run_parallel(tasks: dict, deadline_seconds: float, max_workers: int = DEFAULT_MAX_WORKERS) -> tuple[dict, list]:
+    """Run {key: zero-arg callable} concurrently; returns ({key: result}, [keys not done]).
+
+    A task that raises is logged and counted as not done. With no time left nothing is
+    started; a single task runs on the calling thread, so it is not cut off once started.
+    """
+    if not tasks:
+        return {}, []
+    if deadline_seconds <= 0:
+        print(f"Fan-out deadline already passed; skipping {len(tasks)} tasks")
+        return {}, list(tasks)
+    if len(tasks) == 1:
+        (key, fn), = tasks.items()
+        try:
+            return {key: fn()}, []
+        except Exception as e:
+            print(f"Fan-out task {key} failed: {e}")
+            return {}, [key]
+
+    executor = get_executor(max_workers)
+    futures = {executor.submit(fn): key for key, fn in tasks.items()}
+    results = {}
+    failed = []
+    pending = set(futures)
+    stop_at = time.monotonic() + deadline_seconds
+    while pending:
+        remaining = stop_at - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                print(f"Fan-out task {key} failed: {e}")
+                failed.append(key)
+    for future in pending:
+        future.cancel()
+    timed_out = [futures[f] for f in pending]
+    if timed_out:
+        print(f"Fan-out deadline of {deadline_seconds}s hit with {len(timed_out)} of {len(tasks)} tasks outstanding")
+    return results, failed + timed_out
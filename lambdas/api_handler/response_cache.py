@@ -0,0 +1,137 @@
+"""
+Response cache for the API handler: serialized 200 responses kept for a few seconds per
+route, keyed on path + normalized query string, with ETags for conditional GETs.
+
+The first tier is an in-process LRU that lives as long as the warm container. An
+optional shared tier (any object with get(key) / put(key, entry, ttl)) lets containers
+reuse each other's responses; DynamoDBStore backs it with a table whose items expire
+through TTL, and MemoryStore is the local stand-in for tests and benchmarks.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+DEFAULT_MAX_ENTRIES = 512
+
+
+@dataclass
+class CacheEntry:
+    body: str
+    etag: str
+    expires_at: float  # wall-clock epoch seconds, so entries can move between containers
+
+
+def make_etag(body: str) -> str:
+    return '"' + hashlib.sha1(body.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def cache_key(path: str, query_params: dict | None) -> str:
+    """Path plus query parameters sorted by name, so ?a=1&b=2 and ?b=2&a=1 share an entry."""
+    if not query_params:
+        return path
+    return path + "?" + "&".join(f"{k}={query_params[k]}" for k in sorted(query_params))
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Compare opaque tags, ignoring weak validators added by proxies.
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates
+
+
+class MemoryStore:
+    """Shared-tier stand-in: a plain dict with expiry."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.entries: dict[str, CacheEntry] = {}
+
+    def get(self, key: str) -> CacheEntry | None:
+        entry = self.entries.get(key)
+        return entry if entry is not None and entry.expires_at > self.clock() else None
+
+    def put(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        self.entries[key] = entry
+
+
+class DynamoDBStore:
+    """Shared tier on a DynamoDB table (hash key cache_key, TTL attribute ttl)."""
+
+    def __init__(self, table, clock=time.time):
+        self.table = table
+        self.clock = clock
+
+    def get(self, key: str) -> CacheEntry | None:
+        item = self.table.get_item(Key={"cache_key": key}).get("Item")
+        if not item or float(item["expires_at"]) <= self.clock():
+            return None
+        return CacheEntry(item["body"], item["etag"], float(item["expires_at"]))
+
+    def put(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        self.table.put_item(Item={
+            "cache_key": key,
+            "body": entry.body,
+            "etag": entry.etag,
+            "expires_at": str(entry.expires_at),
+            # DynamoDB TTL deletes lazily; expires_at above is what readers trust.
+            "ttl": int(entry.expires_at) + 60,
+        })
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, shared=None, clock=time.time):
+        self.max_entries = max_entries
+        self.shared = shared
+        self.clock = clock
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get(self, key: str) -> CacheEntry | None:
+        now = self.clock()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > now:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        if entry is not None:
+            del self._entries[key]
+        if self.shared is not None:
+            try:
+                entry = self.shared.get(key)
+            except Exception as e:
+                print(f"Shared cache read failed for {key}: {e}")
+                entry = None
+            if entry is not None and entry.expires_at > now:
+                self._remember(key, entry)
+                self.shared_hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def put(self, key: str, body: str, ttl: float) -> CacheEntry:
+        entry = CacheEntry(body, make_etag(body), self.clock() + ttl)
+        self._remember(key, entry)
+        if self.shared is not None:
+            try:
+                self.shared.put(key, entry, ttl)
+            except Exception as e:
+                print(f"Shared cache write failed for {key}: {e}")
+        return entry
+
+    def _remember(self, key: str, entry: CacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
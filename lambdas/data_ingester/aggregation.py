@@ -0,0 +1,104 @@
+"""
+KPL-style record aggregation for the ingester: many encoded ticks are packed into one
+Kinesis record (record_codec.encode_aggregate), since a shard takes 1000 records/s but
+1 MB/s, and a tick is a few dozen bytes.
+
+Kinesis routes a record by the MD5 of its partition key, so ticks are grouped by the
+shard their own key hashes to (from a ListShards snapshot), and each aggregate is put with
+its first tick's hash as ExplicitHashKey. Every symbol therefore stays on the shard it
+would have reached alone, and keeps its order there. Without a shard map ticks are only
+grouped with others of the same partition key.
+"""
+import bisect
+import hashlib
+from dataclasses import dataclass
+
+from record_codec import AGGREGATE_OVERHEAD, AGGREGATE_RECORD_OVERHEAD, MAX_AGGREGATED_RECORDS, encode_aggregate
+
+DEFAULT_AGGREGATION_MAX_BYTES = 51_200  # the KPL's default AggregationMaxSize
+
+
+def hash_key(partition_key: str) -> int:
+    return int(hashlib.md5(partition_key.encode("utf-8")).hexdigest(), 16)
+
+
+class ShardMap:
+    """Open shards of a stream by hash key range."""
+
+    def __init__(self, shards: list[dict]):
+        ranges = sorted(
+            (int(s["HashKeyRange"]["StartingHashKey"]), int(s["HashKeyRange"]["EndingHashKey"]), s["ShardId"])
+            for s in shards
+        )
+        self._starts = [start for start, _, _ in ranges]
+        self._ranges = ranges
+
+    def __len__(self) -> int:
+        return len(self._ranges)
+
+    def shard_for(self, key: int) -> str | None:
+        i = bisect.bisect_right(self._starts, key) - 1
+        if i < 0:
+            return None
+        start, end, shard_id = self._ranges[i]
+        return shard_id if start <= key <= end else None
+
+
+def load_shard_map(kinesis, stream_name: str) -> ShardMap:
+    shards = []
+    request = {"StreamName": stream_name, "ShardFilter": {"Type": "AT_LATEST"}}
+    while True:
+        resp = kinesis.list_shards(**request)
+        shards.extend(resp.get("Shards", []))
+        if not resp.get("NextToken"):
+            return ShardMap(shards)
+        request = {"NextToken": resp["NextToken"]}
+
+
+@dataclass
+class Aggregate:
+    partition_key: str
+    explicit_hash_key: int | None
+    data: bytes
+    count: int
+
+    def entry(self) -> dict:
+        entry = {"Data": self.data, "PartitionKey": self.partition_key}
+        if self.explicit_hash_key is not None:
+            entry["ExplicitHashKey"] = str(self.explicit_hash_key)
+        return entry
+
+
+def aggregate(encoded: list[tuple[str, bytes]], shard_map: ShardMap | None,
+              max_bytes: int = DEFAULT_AGGREGATION_MAX_BYTES) -> list[Aggregate]:
+    """Pack (partition_key, encoded record) pairs into size-bounded aggregates, in order.
+
+    A group that ends up holding a single record is sent as that plain record.
+    """
+    groups: dict[str, list[tuple[str, int, bytes]]] = {}
+    for partition_key, data in encoded:
+        key = hash_key(partition_key)
+        shard = shard_map.shard_for(key) if shard_map else None
+        groups.setdefault(shard or f"key:{partition_key}", []).append((partition_key, key, data))
+
+    aggregates = []
+    for members in groups.values():
+        batch: list[tuple[str, int, bytes]] = []
+        size = AGGREGATE_OVERHEAD
+        for member in members:
+            record_size = AGGREGATE_RECORD_OVERHEAD + len(member[2])
+            if batch and (size + record_size > max_bytes or len(batch) >= MAX_AGGREGATED_RECORDS):
+                aggregates.append(_pack(batch))
+                batch, size = [], AGGREGATE_OVERHEAD
+            batch.append(member)
+            size += record_size
+        if batch:
+            aggregates.append(_pack(batch))
+    return aggregates
+
+
+def _pack(batch: list[tuple[str, int, bytes]]) -> Aggregate:
+    partition_key, key, data = batch[0]
+    if len(batch) == 1:
+        return Aggregate(partition_key, None, data, 1)
+    return Aggregate(partition_key, key, encode_aggregate([d for _, _, d in batch]), len(batch))
@@ -1,77 +1,160 @@
 """
 Data Ingester Lambda — fetches live quotes from Finnhub and pushes to Kinesis.
 Triggered by EventBridge every 60 seconds.
+
+Symbols are fetched concurrently (FETCH_CONCURRENCY workers, QUOTE_RATE_LIMIT requests per
+second) over a keep-alive connection pool that survives warm starts, then written with
+PutRecords, retrying only the entries Kinesis rejected. Records use the compact binary
+encoding from record_codec.py unless RECORD_FORMAT=json, and are packed many to a Kinesis
+record per destination shard (see aggregation.py) unless RECORD_AGGREGATION=false.
+Stage timings, record and call counts go out as embedded metrics (see metrics.py).
 """
-import json
 import os
-from datetime import datetime, timezone
-from urllib.request import urlopen, Request
-from urllib.error import URLError, HTTPError
-
-import boto3
-
-SYMBOLS = ["AAPL", "GOOGL", "MSFT", "AMZN", "TSLA", "META", "NVDA", "NFLX", "JPM", "V"]
-FINNHUB_QUOTE_URL = "https://finnhub.io/api/v1/quote?symbol={symbol}&token={api_key}"
-
-
-def fetch_quote(symbol: str, api_key: str) -> dict | None:
-    """Fetch quote for one symbol from Finnhub. Returns parsed record or None on failure."""
-    url = FINNHUB_QUOTE_URL.format(symbol=symbol, api_key=api_key)
-    req = Request(url, headers={"User-Agent": "FinPulse-Ingester/1.0"})
-    try:
-        with urlopen(req, timeout=10) as resp:
-            data = json.loads(resp.read().decode())
-    except (URLError, HTTPError, json.JSONDecodeError) as e:
-        print(f"Failed to fetch {symbol}: {e}")
-        return None
-
-    if not isinstance(data, dict):
-        return None
-
-    # Finnhub quote: c (current price), v (volume), dp (percent change)
-    price_raw = data.get("c")
-    volume_raw = data.get("v")
-    change_pct_raw = data.get("dp")
-
-    if price_raw is None:
-        return None
-
-    try:
-        price_f = float(price_raw)
-        volume_f = int(volume_raw) if volume_raw is not None else 0
-        change_f = float(change_pct_raw) if change_pct_raw is not None else 0.0
-    except (ValueError, TypeError):
-        return None
-
-    return {
-        "symbol": symbol,
-        "price": price_f,
-        "volume": volume_f,
-        "change_percent": change_f,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "source": "finnhub",
-    }
+import random
+import time
+
+import urllib3
+from botocore.exceptions import BotoCoreError, ClientError
+
+import aws
+from aggregation import DEFAULT_AGGREGATION_MAX_BYTES, Aggregate, aggregate, load_shard_map
+from config import env_number, tracked_symbols
+from metrics import count, instrumented, stage
+from quotes import FINNHUB_BASE_URL, QuoteProvider, RateLimiter, fetch_all
+from record_codec import encode_record
+
+DEFAULT_FETCH_CONCURRENCY = 16
+DEFAULT_QUOTE_RATE_LIMIT = 30.0  # Finnhub caps API calls at 30/s
+PUT_RECORDS_MAX_ENTRIES = 500
+PUT_RECORDS_MAX_BYTES = 5 * 1024 * 1024  # data plus partition keys, per request
+SHARD_MAP_TTL_SECONDS = 300
+PUT_RECORDS_MAX_ATTEMPTS = 4
+PUT_RECORDS_BASE_BACKOFF_SECONDS = 0.1
+
+# Module-level clients and HTTP pool are reused across warm invocations.
+_kinesis = None
+_http = None
+_rate_limiter = None
+_shard_map = None
+_shard_map_loaded_at = 0.0
+
+
+def get_kinesis():
+    global _kinesis
+    if _kinesis is None:
+        _kinesis = aws.client("kinesis")
+    return _kinesis
+
+
+aws.preload(get_kinesis)
+
+
+def get_http(concurrency: int) -> urllib3.PoolManager:
+    global _http
+    if _http is None:
+        _http = urllib3.PoolManager(maxsize=concurrency, block=True)
+    return _http
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter(env_number("QUOTE_RATE_LIMIT", DEFAULT_QUOTE_RATE_LIMIT, float))
+    return _rate_limiter
+
 
+def use_binary_records() -> bool:
+    return os.environ.get("RECORD_FORMAT", "binary").lower() != "json"
 
+
+def use_aggregation() -> bool:
+    return os.environ.get("RECORD_AGGREGATION", "true").lower() != "false"
+
+
+def get_shard_map(kinesis, stream_name: str):
+    """Open shards of the stream, re-listed every few minutes; None if ListShards fails."""
+    global _shard_map, _shard_map_loaded_at
+    if _shard_map is None or time.monotonic() - _shard_map_loaded_at > SHARD_MAP_TTL_SECONDS:
+        try:
+            _shard_map = load_shard_map(kinesis, stream_name)
+            _shard_map_loaded_at = time.monotonic()
+        except (ClientError, BotoCoreError) as e:
+            print(f"ListShards failed, aggregating per partition key only: {e}")
+            return None
+    return _shard_map
+
+
+def build_entries(records: list[dict], binary: bool = True, shard_map=None, max_bytes: int | None = None) -> list[Aggregate]:
+    """Encode records and, when max_bytes is set, aggregate them; one Aggregate per Kinesis record."""
+    encoded = [(record["symbol"], encode_record(record, binary)) for record in records]
+    if max_bytes is None:
+        return [Aggregate(key, None, data, 1) for key, data in encoded]
+    return aggregate(encoded, shard_map, max_bytes)
+
+
+def chunks(entries: list[Aggregate]) -> list[list[Aggregate]]:
+    """Split into PutRecords requests of at most 500 entries and 5 MiB."""
+    requests, current, size = [], [], 0
+    for entry in entries:
+        entry_size = len(entry.data) + len(entry.partition_key.encode("utf-8"))
+        if current and (len(current) >= PUT_RECORDS_MAX_ENTRIES or size + entry_size > PUT_RECORDS_MAX_BYTES):
+            requests.append(current)
+            current, size = [], 0
+        current.append(entry)
+        size += entry_size
+    if current:
+        requests.append(current)
+    return requests
+
+
+def put_records(kinesis, stream_name: str, entries: list[Aggregate], sleep=time.sleep) -> int:
+    """PutRecords in chunks, re-sending only failed entries; returns logical records accepted."""
+    put_count = 0
+    for chunk in chunks(entries):
+        for attempt in range(PUT_RECORDS_MAX_ATTEMPTS):
+            resp = kinesis.put_records(StreamName=stream_name, Records=[entry.entry() for entry in chunk])
+            results = resp.get("Records", [])
+            failed = [entry for entry, result in zip(chunk, results) if result.get("ErrorCode")]
+            put_count += sum(entry.count for entry in chunk) - sum(entry.count for entry in failed)
+            if not failed:
+                break
+            codes = sorted({result["ErrorCode"] for result in results if result.get("ErrorCode")})
+            print(f"PutRecords rejected {len(failed)} entries ({', '.join(codes)}), attempt {attempt + 1}")
+            chunk = failed
+            if attempt < PUT_RECORDS_MAX_ATTEMPTS - 1:
+                count("retries")
+                sleep(random.uniform(0, PUT_RECORDS_BASE_BACKOFF_SECONDS * 2 ** attempt))
+        else:
+            print(f"Dropping {sum(entry.count for entry in chunk)} records after {PUT_RECORDS_MAX_ATTEMPTS} PutRecords attempts")
+    return put_count
+
+
+@instrumented("data_ingester")
 def lambda_handler(event, context):
     stream_name = os.environ.get("KINESIS_STREAM_NAME")
     api_key = os.environ.get("ALPHA_VANTAGE_API_KEY")
     if not stream_name or not api_key:
         raise ValueError("KINESIS_STREAM_NAME and ALPHA_VANTAGE_API_KEY must be set")
 
-    kinesis = boto3.client("kinesis")
-    put_count = 0
+    symbols = tracked_symbols()
+    concurrency = max(1, env_number("FETCH_CONCURRENCY", DEFAULT_FETCH_CONCURRENCY))
+    provider = QuoteProvider(
+        api_key,
+        base_url=os.environ.get("QUOTE_API_URL", FINNHUB_BASE_URL),
+        http=get_http(concurrency),
+        rate_limiter=get_rate_limiter(),
+    )
+    with stage("fetch"):
+        records = fetch_all(provider, symbols, concurrency)
+    count("records", len(records))
+    kinesis = get_kinesis()
+    with stage("encode"):
+        if use_aggregation():
+            max_bytes = max(64, env_number("AGGREGATION_MAX_BYTES", DEFAULT_AGGREGATION_MAX_BYTES))
+            entries = build_entries(records, use_binary_records(), get_shard_map(kinesis, stream_name), max_bytes)
+        else:
+            entries = build_entries(records, use_binary_records())
+    with stage("write"):
+        put_count = put_records(kinesis, stream_name, entries) if entries else 0
 
-    for symbol in SYMBOLS:
-        record = fetch_quote(symbol, api_key)
-        if record is None:
-            continue
-        payload = json.dumps(record)
-        kinesis.put_record(
-            StreamName=stream_name,
-            Data=payload.encode("utf-8"),
-            PartitionKey=symbol,
-        )
-        put_count += 1
-
-    return {"statusCode": 200, "records_put": put_count, "symbols": SYMBOLS}
+    return {"statusCode": 200, "records_put": put_count, "kinesis_records": len(entries), "symbols": symbols}
@@ -0,0 +1,123 @@
+"""
+Quote fetching for the ingester: a pluggable upstream (Finnhub-compatible HTTP API at a
+configurable base URL), a token-bucket rate limiter shared by all workers, and a bounded
+thread pool that fetches every symbol over one pooled keep-alive connection set.
+
+urllib3 ships with botocore, so the pool needs no extra dependency in the Lambda runtime.
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import urllib3
+
+FINNHUB_BASE_URL = "https://finnhub.io"
+QUOTE_PATH = "/api/v1/quote"
+USER_AGENT = "FinPulse-Ingester/1.0"
+
+
+class RateLimiter:
+    """Thread-safe token bucket: at most `rate` acquisitions per second, bursting to `burst`."""
+
+    def __init__(self, rate: float, burst: int | None = None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self.sleep(wait)
+
+
+def parse_quote(symbol: str, data, source: str) -> dict | None:
+    """Turn a Finnhub quote payload into a pipeline record, or None if it is unusable."""
+    if not isinstance(data, dict):
+        return None
+
+    # Finnhub quote: c (current price), v (volume), dp (percent change)
+    price_raw = data.get("c")
+    volume_raw = data.get("v")
+    change_pct_raw = data.get("dp")
+
+    if price_raw is None:
+        return None
+
+    try:
+        price_f = float(price_raw)
+        volume_f = int(volume_raw) if volume_raw is not None else 0
+        change_f = float(change_pct_raw) if change_pct_raw is not None else 0.0
+    except (ValueError, TypeError):
+        return None
+
+    return {
+        "symbol": symbol,
+        "price": price_f,
+        "volume": volume_f,
+        "change_percent": change_f,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "source": source,
+    }
+
+
+class QuoteProvider:
+    """Finnhub-compatible quote upstream. Point `base_url` at a local fake to test or benchmark."""
+
+    def __init__(self, api_key: str, base_url: str = FINNHUB_BASE_URL, source: str = "finnhub",
+                 http: urllib3.PoolManager | None = None, rate_limiter: RateLimiter | None = None,
+                 timeout: float = 10.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.source = source
+        self.http = http or urllib3.PoolManager()
+        self.rate_limiter = rate_limiter
+        self.timeout = urllib3.Timeout(connect=min(3.0, timeout), read=timeout)
+
+    def fetch(self, symbol: str) -> dict | None:
+        """Fetch quote for one symbol. Returns parsed record or None on failure."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        try:
+            resp = self.http.request(
+                "GET",
+                self.base_url + QUOTE_PATH,
+                fields={"symbol": symbol, "token": self.api_key},
+                headers={"User-Agent": USER_AGENT},
+                timeout=self.timeout,
+                retries=False,
+            )
+        except urllib3.exceptions.HTTPError as e:
+            print(f"Failed to fetch {symbol}: {e}")
+            return None
+        if resp.status != 200:
+            print(f"Failed to fetch {symbol}: HTTP {resp.status}")
+            return None
+        try:
+            data = json.loads(resp.data.decode())
+        except (ValueError, UnicodeDecodeError) as e:
+            print(f"Failed to fetch {symbol}: {e}")
+            return None
+        return parse_quote(symbol, data, self.source)
+
+
+def fetch_all(provider: QuoteProvider, symbols: list[str], concurrency: int) -> list[dict]:
+    """Fetch every symbol with at most `concurrency` requests in flight; keeps symbol order."""
+    if concurrency <= 1 or len(symbols) <= 1:
+        results = [provider.fetch(s) for s in symbols]
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(symbols))) as pool:
+            results = list(pool.map(provider.fetch, symbols))
+    return [r for r in results if r is not None]
@@ -0,0 +1,119 @@
+"""
+Compaction of the raw data lake into Parquet.
+
+compact_day reads one day of the raw lake (see raw_lake.py), drops replayed duplicates
+(same symbol and timestamp), and writes one Parquet file per symbol:
+
+    curated/prices/dt=YYYY-MM-DD/symbol=<SYMBOL>/part-00000.parquet
+
+sorted by event time, zstd-compressed, in row groups with min/max statistics, so a query
+for one symbol reads one small file and can skip row groups outside its time range. dt is
+the raw partition's day (when Firehose delivered the ticks), so re-running a day only
+ever rewrites that day's files.
+
+With a LocalStore the job runs against a directory tree:
+
+    python lambdas/lake_compactor/compaction.py --root ./lake --day 2026-01-05
+"""
+import argparse
+import io
+import json
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from raw_lake import LocalStore, iter_ticks, parse_event_time, raw_prefix
+
+CURATED_PREFIX = "curated/prices"
+PART_NAME = "part-00000.parquet"
+DEFAULT_ROW_GROUP_ROWS = 4096
+COMPRESSION = "zstd"
+
+SCHEMA = pa.schema([
+    ("event_time", pa.timestamp("us", tz="UTC")),
+    ("timestamp", pa.string()),
+    ("price", pa.float64()),
+    ("volume", pa.int64()),
+    ("change_percent", pa.float64()),
+    ("source", pa.string()),
+])
+
+
+def curated_key(day: date, symbol: str) -> str:
+    return f"{CURATED_PREFIX}/dt={day.isoformat()}/symbol={symbol}/{PART_NAME}"
+
+
+def _number(value, cast):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_day(store, day: date) -> tuple[dict[str, dict[str, dict]], int]:
+    """Ticks of one raw day as {symbol: {timestamp: row}} (a replay overwrites its
+    duplicate), plus the number of ticks skipped as unusable."""
+    by_symbol: dict[str, dict[str, dict]] = {}
+    skipped = 0
+    for key in store.list(raw_prefix(day)):
+        for tick in iter_ticks(store.get(key)):
+            symbol = str(tick.get("symbol") or "").strip()
+            event_time = parse_event_time(tick.get("timestamp"))
+            if not symbol or event_time is None or "/" in symbol:
+                skipped += 1
+                continue
+            by_symbol.setdefault(symbol, {})[tick["timestamp"]] = {
+                "event_time": event_time,
+                "timestamp": tick["timestamp"],
+                "price": _number(tick.get("price"), float),
+                "volume": _number(tick.get("volume"), int),
+                "change_percent": _number(tick.get("change_percent"), float),
+                "source": tick.get("source"),
+            }
+    return by_symbol, skipped
+
+
+def to_parquet(rows: list[dict], row_group_rows: int = DEFAULT_ROW_GROUP_ROWS) -> bytes:
+    rows = sorted(rows, key=lambda r: r["event_time"])
+    table = pa.Table.from_pylist(rows, schema=SCHEMA)
+    buffer = io.BytesIO()
+    pq.write_table(
+        table, buffer,
+        compression=COMPRESSION,
+        row_group_size=row_group_rows,
+        write_statistics=True,
+        use_dictionary=["source"],
+    )
+    return buffer.getvalue()
+
+
+def compact_day(store, day: date, row_group_rows: int = DEFAULT_ROW_GROUP_ROWS) -> dict:
+    """Rewrite one raw day as per-symbol Parquet; returns counts for logging."""
+    by_symbol, skipped = read_day(store, day)
+    written_bytes = 0
+    for symbol, rows in sorted(by_symbol.items()):
+        data = to_parquet(list(rows.values()), row_group_rows)
+        store.put(curated_key(day, symbol), data)
+        written_bytes += len(data)
+    return {
+        "day": day.isoformat(),
+        "symbols": sorted(by_symbol),
+        "rows": sum(len(rows) for rows in by_symbol.values()),
+        "skipped": skipped,
+        "bytes_written": written_bytes,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compact one day of a local raw lake into Parquet.")
+    parser.add_argument("--root", required=True, help="directory standing in for the bucket")
+    parser.add_argument("--day", required=True, type=date.fromisoformat, help="raw partition day, YYYY-MM-DD")
+    parser.add_argument("--row-group-rows", type=int, default=DEFAULT_ROW_GROUP_ROWS)
+    args = parser.parse_args()
+    result = compact_day(LocalStore(args.root), args.day, args.row_group_rows)
+    print(json.dumps({k: v for k, v in result.items() if k != "symbols"} | {"symbols": len(result["symbols"])}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Lake Compactor Lambda — rewrites one day of raw Firehose JSON in the data lake as sorted,
+zstd-compressed Parquet per day and symbol (see compaction.py), then registers the new
+partitions on the Glue table Athena queries (prices_parquet).
+
+Scheduled daily for the previous UTC day; {"day": "YYYY-MM-DD"} in the event compacts a
+specific day instead. Re-running a day overwrites its files and re-registering existing
+partitions is a no-op.
+"""
+import copy
+import os
+from datetime import date, datetime, timedelta, timezone
+
+import aws
+from compaction import CURATED_PREFIX, compact_day
+from metrics import count, instrumented, stage
+from raw_lake import S3Store
+
+GLUE_BATCH_SIZE = 100
+
+_s3 = None
+_glue = None
+
+
+def get_s3():
+    global _s3
+    if _s3 is None:
+        _s3 = aws.client("s3")
+    return _s3
+
+
+def get_glue():
+    global _glue
+    if _glue is None:
+        _glue = aws.client("glue")
+    return _glue
+
+
+aws.preload(get_s3, get_glue)
+
+
+def register_partitions(glue, database: str, table: str, bucket: str, day: date, symbols: list[str]) -> int:
+    """Add (dt, symbol) partitions that do not exist yet; returns how many were created."""
+    descriptor = glue.get_table(DatabaseName=database, Name=table)["Table"]["StorageDescriptor"]
+    partitions = []
+    for symbol in symbols:
+        sd = copy.deepcopy(descriptor)
+        sd["Location"] = f"s3://{bucket}/{CURATED_PREFIX}/dt={day.isoformat()}/symbol={symbol}/"
+        partitions.append({"Values": [day.isoformat(), symbol], "StorageDescriptor": sd})
+    created = 0
+    for i in range(0, len(partitions), GLUE_BATCH_SIZE):
+        batch = partitions[i:i + GLUE_BATCH_SIZE]
+        resp = glue.batch_create_partition(DatabaseName=database, TableName=table, PartitionInputList=batch)
+        errors = [e for e in resp.get("Errors", []) if e.get("ErrorDetail", {}).get("ErrorCode") != "AlreadyExistsException"]
+        for error in errors:
+            print(f"Partition {error.get('PartitionValues')} not registered: {error.get('ErrorDetail')}")
+        created += len(batch) - len(resp.get("Errors", []))
+    return created
+
+
+@instrumented("lake_compactor")
+def lambda_handler(event, context):
+    bucket = os.environ.get("DATA_LAKE_BUCKET")
+    if not bucket:
+        raise ValueError("DATA_LAKE_BUCKET must be set")
+    if (event or {}).get("day"):
+        day = date.fromisoformat(event["day"])
+    else:
+        day = (datetime.now(timezone.utc) - timedelta(days=1)).date()
+
+    with stage("compact"):
+        result = compact_day(S3Store(get_s3(), bucket), day)
+    count("records", result["rows"])
+    database = os.environ.get("GLUE_DATABASE")
+    table = os.environ.get("GLUE_TABLE")
+    if database and table and result["symbols"]:
+        with stage("register"):
+            result["partitions_created"] = register_partitions(get_glue(), database, table, bucket, day, result["symbols"])
+    print(f"Compacted {result['day']}: {result['rows']} rows, {len(result['symbols'])} symbols, "
+          f"{result['bytes_written']} bytes, {result['skipped']} skipped")
+    return result
@@ -0,0 +1,102 @@
+"""
+Reading the raw data lake Firehose writes: raw-data/year=YYYY/month=MM/day=DD/<objects>,
+each object a run of JSON ticks (one per line since the lake transformer, back to back
+before it). Shared by the compactor and scripts/replay.py, so it must not import pyarrow.
+
+Stores are anything with list(prefix) / get(key) / put(key, data); LocalStore maps keys
+onto a directory tree laid out like the bucket.
+"""
+import json
+import os
+import re
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+RAW_PREFIX = "raw-data"
+_DAY_PATH = re.compile(r"year=(\d{4})/month=(\d{2})/day=(\d{2})/")
+
+
+class LocalStore:
+    """Object keys as paths under a root directory."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    def list(self, prefix: str) -> list[str]:
+        base = self.root / prefix
+        if not base.exists():
+            return []
+        return sorted(str(p.relative_to(self.root)) for p in base.rglob("*") if p.is_file())
+
+    def get(self, key: str) -> bytes:
+        return (self.root / key).read_bytes()
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+
+class S3Store:
+    def __init__(self, client, bucket: str):
+        self.client = client
+        self.bucket = bucket
+
+    def list(self, prefix: str) -> list[str]:
+        keys = []
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefix + "/"):
+            keys.extend(obj["Key"] for obj in page.get("Contents", []))
+        return sorted(keys)
+
+    def get(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+    def put(self, key: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+
+def raw_prefix(day: date) -> str:
+    return f"{RAW_PREFIX}/year={day:%Y}/month={day:%m}/day={day:%d}"
+
+
+def raw_days(store) -> list[date]:
+    """Every day that has raw objects, oldest first."""
+    days = set()
+    for key in store.list(RAW_PREFIX):
+        m = _DAY_PATH.search(key)
+        if m:
+            days.add(date(int(m.group(1)), int(m.group(2)), int(m.group(3))))
+    return sorted(days)
+
+
+def iter_ticks(data: bytes):
+    """JSON objects from a raw object, whether newline-separated or concatenated."""
+    text = data.decode("utf-8")
+    decoder = json.JSONDecoder()
+    pos, end = 0, len(text)
+    while pos < end:
+        while pos < end and text[pos].isspace():
+            pos += 1
+        if pos == end:
+            return
+        try:
+            obj, pos = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            # Skip to the next line and carry on; one torn write must not lose the object.
+            newline = text.find("\n", pos)
+            if newline < 0:
+                return
+            pos = newline + 1
+            continue
+        if isinstance(obj, dict):
+            yield obj
+
+
+def parse_event_time(ts) -> datetime | None:
+    try:
+        dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
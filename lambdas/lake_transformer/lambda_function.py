@@ -0,0 +1,38 @@
+"""
+Lake Transformer Lambda — Firehose data transformation for the raw-data/ prefix.
+
+Kinesis records may be binary ticks (see record_codec.py), aggregates of many ticks, or
+JSON from older producers; either way every tick is delivered to S3 as one
+newline-terminated JSON object, which is what the Athena raw_prices table (JsonSerDe) reads. Records that do not decode are
+marked ProcessingFailed, so Firehose writes them under errors/ instead of dropping them.
+"""
+import base64
+import json
+
+from metrics import count, instrumented
+from record_codec import decode_records
+
+
+def transform(data: bytes) -> bytes:
+    return "".join(json.dumps(tick, separators=(",", ":")) + "\n" for tick in decode_records(data)).encode("utf-8")
+
+
+@instrumented("lake_transformer")
+def lambda_handler(event, context):
+    records = []
+    failed = 0
+    for record in event.get("records", []):
+        try:
+            data = base64.b64encode(transform(base64.b64decode(record["data"]))).decode("ascii")
+            result = "Ok"
+        except (KeyError, ValueError, TypeError) as e:
+            print(f"Bad record {record.get('recordId')}: {e}")
+            data = record.get("data", "")
+            result = "ProcessingFailed"
+            failed += 1
+        records.append({"recordId": record.get("recordId"), "result": result, "data": data})
+    count("records", len(records))
+    if failed:
+        count("failed", failed)
+        print(f"{failed} of {len(records)} records failed to transform")
+    return {"records": records}
@@ -0,0 +1,67 @@
+"""
+BatchWriteItem helper: dedupes items by primary key, sends them 25 at a time (optionally
+several requests in parallel on a thread pool) and retries UnprocessedItems with
+exponential backoff and full jitter.
+
+Uses the low-level client, which is thread-safe, so items are serialized once up front.
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aws import serialize_item
+from metrics import count
+
+MAX_BATCH_SIZE = 25
+MAX_ATTEMPTS = 6
+BASE_BACKOFF_SECONDS = 0.05
+MAX_BACKOFF_SECONDS = 2.0
+
+
+def dedupe_items(items: list[dict], key_attributes: tuple[str, ...]) -> list[dict]:
+    """Keep one item per primary key; later items win, first-seen order is kept.
+
+    BatchWriteItem rejects a request that names the same key twice.
+    """
+    by_key = {}
+    for item in items:
+        by_key[tuple(item[k] for k in key_attributes)] = item
+    return list(by_key.values())
+
+
+def write_chunk(client, table_name: str, requests: list[dict], sleep=time.sleep) -> list[dict]:
+    """Send one BatchWriteItem of at most 25 requests; return requests still unprocessed."""
+    pending = requests
+    for attempt in range(MAX_ATTEMPTS):
+        resp = client.batch_write_item(RequestItems={table_name: pending})
+        pending = resp.get("UnprocessedItems", {}).get(table_name, [])
+        if not pending:
+            return []
+        if attempt < MAX_ATTEMPTS - 1:
+            count("retries")
+            sleep(random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt)))
+    return pending
+
+
+def batch_put(client, table_name: str, items: list[dict], key_attributes: tuple[str, ...], concurrency: int = 1) -> list[dict]:
+    """Put `items` (plain Python values) with BatchWriteItem after deduping by key.
+
+    Returns the items that were still unprocessed after all retries. Errors other than
+    throttling (e.g. validation, missing table) propagate from the client as ClientError.
+    """
+    items = dedupe_items(items, key_attributes)
+    requests = [{"PutRequest": {"Item": serialize_item(item)}} for item in items]
+    chunks = [requests[i:i + MAX_BATCH_SIZE] for i in range(0, len(requests), MAX_BATCH_SIZE)]
+    if concurrency > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(chunks))) as pool:
+            leftovers = list(pool.map(lambda chunk: write_chunk(client, table_name, chunk), chunks))
+    else:
+        leftovers = [write_chunk(client, table_name, chunk) for chunk in chunks]
+
+    def request_key(put: dict) -> tuple:
+        return tuple(next(iter(put["Item"][k].values())) for k in key_attributes)
+
+    unprocessed = {request_key(r["PutRequest"]) for chunk in leftovers for r in chunk}
+    if not unprocessed:
+        return []
+    return [item for item, r in zip(items, requests) if request_key(r["PutRequest"]) in unprocessed]
@@ -1,15 +1,63 @@
 """
 Price Processor Lambda — consumes Kinesis records and writes to DynamoDB.
-Triggered by Kinesis Data Stream. Records are base64-encoded JSON.
+Triggered by Kinesis Data Stream. Records are decoded a batch at a time by record_codec.py
+(binary ticks, or JSON from older producers).
+
+Items are accumulated for the whole batch, deduped on (symbol, timestamp) and written with
+BatchWriteItem (25 per request, BATCH_WRITE_CONCURRENCY requests in flight), retrying
+UnprocessedItems with backoff. The stored ticks are then folded into the latest-price
+snapshot (see snapshot.py) that backs GET /prices, and counted into the per-minute
+pipeline stats (see stats_counters.py) that back GET /stats, and appended to the symbol's
+compressed tick bucket (see tick_buckets.py; TICK_BUCKET_SECONDS, 0 turns it off) that
+history reads can use instead of the per-tick items. Stage timings, lag and call counts
+go out as embedded metrics (see metrics.py).
 """
-import base64
-import json
 import os
 from datetime import datetime, timezone, timedelta
 
-import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+from batch_write import batch_put, dedupe_items
+import aws
+from config import env_number
+from metrics import instrumented, observe_batch, stage
+from record_codec import decode_batch
+from snapshot import DEFAULT_SNAPSHOT_SHARDS, latest_entries, update_snapshot
+from stats_counters import DEFAULT_STATS_SHARDS, record_batch, source_shard
+from tick_buckets import DEFAULT_BUCKET_SECONDS, append_ticks
 
 TTL_DAYS = 7
+KEY_ATTRIBUTES = ("symbol", "timestamp")
+DEFAULT_BATCH_WRITE_CONCURRENCY = 4
+
+# Low-level clients are thread-safe and reused across warm invocations.
+_dynamodb_client = None
+
+
+def get_dynamodb_client():
+    global _dynamodb_client
+    if _dynamodb_client is None:
+        _dynamodb_client = aws.client("dynamodb")
+    return _dynamodb_client
+
+
+aws.preload(get_dynamodb_client)
+
+
+def get_batch_write_concurrency() -> int:
+    return max(1, env_number("BATCH_WRITE_CONCURRENCY", DEFAULT_BATCH_WRITE_CONCURRENCY))
+
+
+def get_snapshot_shards() -> int:
+    return max(1, env_number("SNAPSHOT_SHARDS", DEFAULT_SNAPSHOT_SHARDS))
+
+
+def get_stats_shards() -> int:
+    return max(1, env_number("STATS_SHARDS", DEFAULT_STATS_SHARDS))
+
+
+def get_tick_bucket_seconds() -> int:
+    return max(0, env_number("TICK_BUCKET_SECONDS", DEFAULT_BUCKET_SECONDS))
 
 
 def build_item(record: dict) -> dict:
@@ -41,35 +89,81 @@ def build_item(record: dict) -> dict:
     return item
 
 
+@instrumented("price_processor")
 def lambda_handler(event, context):
     table_name = os.environ.get("DYNAMODB_TABLE")
     if not table_name:
         raise ValueError("DYNAMODB_TABLE must be set")
 
-    dynamodb = boto3.resource("dynamodb")
-    table = dynamodb.Table(table_name)
-    written = 0
-    failed = 0
+    items = []
+    sequences_by_key: dict[tuple, list[str]] = {}
+    with stage("decode"):
+        batch = decode_batch(event.get("Records", []))
+        failed = batch.failed
 
-    for record in event.get("Records", []):
-        try:
-            payload = base64.b64decode(record["kinesis"]["data"]).decode("utf-8")
-            data = json.loads(payload)
-        except (KeyError, ValueError, TypeError) as e:
-            print(f"Bad record: {e}")
-            failed += 1
-            continue
-
-        item = build_item(data)
-        if item is None:
-            failed += 1
-            continue
+        for i in range(len(batch)):
+            item = build_item(batch.record(i))
+            if item is None:
+                failed += 1
+                continue
+            items.append(item)
+            sequence = batch.kinesis_records[i]["kinesis"].get("sequenceNumber")
+            if sequence:
+                sequences_by_key.setdefault(tuple(item[k] for k in KEY_ATTRIBUTES), []).append(sequence)
+    observe_batch(batch)
 
+    written = 0
+    failed_sequences = []
+    stored = []
+    if items:
         try:
-            table.put_item(Item=item)
-            written += 1
+            with stage("write"):
+                unprocessed = batch_put(get_dynamodb_client(), table_name, items, KEY_ATTRIBUTES, get_batch_write_concurrency())
         except Exception as e:
-            print(f"PutItem failed for {item.get('symbol')}: {e}")
-            failed += 1
+            print(f"BatchWriteItem failed: {e}")
+            unprocessed = items
+        for item in unprocessed:
+            print(f"PutItem failed for {item.get('symbol')}: still unprocessed after retries")
+            failed_sequences.extend(sequences_by_key.pop(tuple(item[k] for k in KEY_ATTRIBUTES), []))
+        failed += len(unprocessed)
+        written = len(items) - len(unprocessed)
 
-    return {"batchItemFailures": [], "written": written, "failed": failed}
+        # Only stored ticks go into the snapshot; a failed symbol replays from its latest record.
+        unprocessed_keys = {tuple(item[k] for k in KEY_ATTRIBUTES) for item in unprocessed}
+        stored = [item for item in dedupe_items(items, KEY_ATTRIBUTES) if tuple(item[k] for k in KEY_ATTRIBUTES) not in unprocessed_keys]
+        with stage("snapshot"):
+            stale = update_snapshot(get_dynamodb_client(), table_name, stored, get_snapshot_shards())
+        for symbol in stale:
+            latest = latest_entries([item for item in stored if item["symbol"] == symbol])[symbol]
+            failed_sequences.extend(sequences_by_key.get((symbol, latest["timestamp"]), []))
+
+        # A symbol whose bucket append failed replays its stored ticks; readers drop repeats.
+        bucket_seconds = get_tick_bucket_seconds()
+        if bucket_seconds and stored:
+            with stage("buckets"):
+                unbucketed = set(append_ticks(
+                    get_dynamodb_client(), table_name, stored, bucket_seconds, get_batch_write_concurrency(),
+                ))
+            for item in stored:
+                if item["symbol"] in unbucketed:
+                    failed_sequences.extend(sequences_by_key.get(tuple(item[k] for k in KEY_ATTRIBUTES), []))
+
+    # Stats are best effort: a lost increment must not make Kinesis replay stored ticks.
+    if event.get("Records"):
+        try:
+            with stage("stats"):
+                record_batch(
+                    get_dynamodb_client(), table_name, stored, failed, get_stats_shards(),
+                    sequences=sequences_by_key, retry_from=min(failed_sequences, key=int, default=""),
+                    source=source_shard(event["Records"][0]),
+                )
+        except (ClientError, BotoCoreError) as e:
+            print(f"Stats counter update failed: {e}")
+
+    # Malformed records are dropped rather than reported: retrying them can never succeed.
+    # Puts are keyed on (symbol, timestamp), so re-writing the replayed tail is idempotent.
+    return {
+        "batchItemFailures": [{"itemIdentifier": seq} for seq in sorted(set(failed_sequences), key=int)],
+        "written": written,
+        "failed": failed,
+    }
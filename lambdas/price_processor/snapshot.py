@@ -0,0 +1,99 @@
+"""
+Latest-price snapshot: every symbol's most recent price/volume/change kept in a handful of
+items of the prices table, so GET /prices is one BatchGetItem instead of a query per symbol.
+
+Symbols are spread over SNAPSHOT_SHARDS items keyed symbol="__latest__#<shard>",
+timestamp="snapshot"; each symbol is a map attribute named after the ticker. Updates are
+conditional on the stored timestamp, so a late or replayed record never regresses a
+symbol. A batch costs one UpdateItem per shard; if any symbol in it is stale the shard
+falls back to one conditional update per symbol. The key layout is in partitions.py,
+which api_handler reads it from as well.
+"""
+import zlib
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from aws import serialize, serialize_item
+from partitions import DEFAULT_SNAPSHOT_SHARDS, SNAPSHOT_PREFIX, SNAPSHOT_SORT_KEY
+
+SNAPSHOT_FIELDS = ("price", "timestamp", "volume", "change_percent")
+
+
+def shard_of(symbol: str, shards: int) -> int:
+    return zlib.crc32(symbol.encode("utf-8")) % shards if shards > 1 else 0
+
+
+def snapshot_key(shard: int) -> dict:
+    return {"symbol": f"{SNAPSHOT_PREFIX}#{shard}", "timestamp": SNAPSHOT_SORT_KEY}
+
+
+def latest_entries(items: list[dict]) -> dict[str, dict]:
+    """Newest item per symbol (by ISO timestamp), reduced to the snapshot fields."""
+    latest = {}
+    for item in items:
+        current = latest.get(item["symbol"])
+        if current is None or item["timestamp"] >= current["timestamp"]:
+            latest[item["symbol"]] = {f: item[f] for f in SNAPSHOT_FIELDS if f in item}
+    return latest
+
+
+def _is_conditional_failure(error: ClientError) -> bool:
+    return error.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+
+def _update(client, table_name: str, shard: int, entries: dict[str, dict]) -> None:
+    """One UpdateItem setting every symbol in `entries`, each guarded by its stored timestamp."""
+    names = {"#ts": "timestamp"}
+    values = {}
+    sets = []
+    conditions = []
+    for i, (symbol, entry) in enumerate(sorted(entries.items())):
+        names[f"#s{i}"] = symbol
+        values[f":e{i}"] = serialize(entry)
+        values[f":t{i}"] = serialize(entry["timestamp"])
+        sets.append(f"#s{i} = :e{i}")
+        conditions.append(f"(attribute_not_exists(#s{i}) OR #s{i}.#ts < :t{i})")
+    client.update_item(
+        TableName=table_name,
+        Key=serialize_item(snapshot_key(shard)),
+        UpdateExpression="SET " + ", ".join(sets),
+        ConditionExpression=" AND ".join(conditions),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+    )
+
+
+def update_snapshot(client, table_name: str, items: list[dict], shards: int = DEFAULT_SNAPSHOT_SHARDS) -> list[str]:
+    """Fold `items` into the snapshot; returns symbols whose update failed (not merely stale)."""
+    by_shard: dict[int, dict[str, dict]] = {}
+    for symbol, entry in latest_entries(items).items():
+        by_shard.setdefault(shard_of(symbol, shards), {})[symbol] = entry
+
+    failed = []
+    for shard, entries in by_shard.items():
+        try:
+            _update(client, table_name, shard, entries)
+            continue
+        except ClientError as e:
+            if not _is_conditional_failure(e):
+                print(f"Snapshot update failed for shard {shard}: {e}")
+                failed.extend(entries)
+                continue
+            if len(entries) == 1:
+                continue
+        except BotoCoreError as e:
+            print(f"Snapshot update failed for shard {shard}: {e}")
+            failed.extend(entries)
+            continue
+        # Some symbol already has a newer tick; apply the others one at a time.
+        for symbol, entry in entries.items():
+            try:
+                _update(client, table_name, shard, {symbol: entry})
+            except ClientError as e:
+                if not _is_conditional_failure(e):
+                    print(f"Snapshot update failed for {symbol}: {e}")
+                    failed.append(symbol)
+            except BotoCoreError as e:
+                print(f"Snapshot update failed for {symbol}: {e}")
+                failed.append(symbol)
+    return failed
@@ -0,0 +1,191 @@
+"""
+Pipeline stats counters: per-minute totals that /stats sums instead of running COUNT
+queries over the prices table.
+
+Each batch adds to one item of the prices table keyed symbol="__stats__#<shard>",
+timestamp="YYYY-MM-DDTHH:MM" (processing minute, UTC). The item holds the events
+written, per-symbol events ("events#AAPL"), records that failed, the summed ingest lag
+(processing time minus the tick's own timestamp) and when it was last updated. Writers
+are spread over STATS_SHARDS by the Kinesis shard they read, so a hot minute is spread
+over several items; readers query every shard. Items expire through the table's TTL
+after a couple of days.
+
+Ticks are counted once, however often they are delivered. Kinesis sequence numbers only
+grow within a shard, so the counter item also keeps the highest one counted into it per
+Kinesis shard ("counted#<shard id>"). A delivery's counter shard is picked from its Kinesis
+shard rather than at random, so a retry lands on the same partition; the update sets the
+mark and is conditioned on no later mark being stored, and a tick at or below the mark was
+counted by an earlier delivery and is skipped. The container remembers its marks, and a
+cold one reads the latest back from the partition's last MARK_LOOKBACK_MINUTES, so a
+retry that crosses into the next minute is still skipped. The marks expire with the
+counters. Ticks at or after the batch's first failed record are left for the retry, which
+redelivers them. Failures are counted per delivery.
+
+The key layout is in partitions.py, which api_handler reads it from as well.
+"""
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from botocore.exceptions import ClientError
+
+from aws import deserialize, serialize_item
+from partitions import DEFAULT_STATS_SHARDS, STATS_PREFIX
+
+STATS_TTL_DAYS = 2
+SEQUENCE_WIDTH = 64
+MARK_PREFIX = "counted#"
+MARK_LOOKBACK_MINUTES = 60
+MAX_COUNT_ATTEMPTS = 3
+
+# Highest sequence number counted per Kinesis shard, as last read or written.
+_marks: dict[str, str] = {}
+
+
+def minute_bucket(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M")
+
+
+def ingest_lag_ms(timestamp: str, now: datetime) -> int | None:
+    try:
+        dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return max(0, int((now - dt).total_seconds() * 1000))
+
+
+def sequence_key(sequence) -> str:
+    """Zero-padded Kinesis sequence number, so marks compare as strings; "" if it has none."""
+    sequence = str(sequence or "").strip()
+    return sequence.zfill(SEQUENCE_WIDTH) if sequence.isdigit() else ""
+
+
+def source_shard(record: dict) -> str:
+    """Kinesis shard of a record, from its "shardId-...:<sequence>" event ID; "" if unknown."""
+    return str(record.get("eventID") or "").rpartition(":")[0]
+
+
+def counter_shard(source: str, shards: int) -> int:
+    return zlib.crc32(source.encode("utf-8")) % shards if shards > 1 else 0
+
+
+def load_mark(client, table_name: str, source: str, shard: int, now: datetime) -> str:
+    """Latest mark of `source` in its counter partition over the last MARK_LOOKBACK_MINUTES."""
+    mark = MARK_PREFIX + source
+    query = {
+        "TableName": table_name,
+        "KeyConditionExpression": "#sym = :p AND #ts >= :since",
+        "FilterExpression": "attribute_exists(#mark)",
+        "ProjectionExpression": "#mark",
+        "ExpressionAttributeNames": {"#sym": "symbol", "#ts": "timestamp", "#mark": mark},
+        "ExpressionAttributeValues": serialize_item({
+            ":p": f"{STATS_PREFIX}#{shard}",
+            ":since": minute_bucket(now - timedelta(minutes=MARK_LOOKBACK_MINUTES)),
+        }),
+        "ScanIndexForward": False,
+        "ConsistentRead": True,
+    }
+    while True:
+        resp = client.query(**query)
+        for item in resp.get("Items", []):
+            return deserialize(item[mark])
+        if "LastEvaluatedKey" not in resp:
+            return ""
+        query["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def first_deliveries(stored: list[dict], sequences: dict, counted: str, retry_from: str = "") -> tuple[list[dict], str]:
+    """Stored items not counted before, and the mark that counting them moves to.
+
+    `sequences` maps (symbol, timestamp) to the sequence numbers that delivered it; items
+    without one are always counted. Items at or after `retry_from` wait for the retry.
+    """
+    fresh, mark = [], counted
+    for item in stored:
+        seqs = [k for k in map(sequence_key, sequences.get((item["symbol"], item["timestamp"]), ())) if k]
+        if not seqs:
+            fresh.append(item)
+            continue
+        if retry_from and max(seqs) >= retry_from:
+            continue
+        if min(seqs) > counted:
+            fresh.append(item)
+        mark = max(mark, max(seqs))
+    return fresh, mark
+
+
+def counter_update(table_name: str, stored: list[dict], failed: int, shard: int, now: datetime,
+                   source: str = "", mark: str = "", counted: str = "") -> dict:
+    """UpdateItem parameters adding one batch's counts to the current minute's counter item,
+    moving the source shard's mark from `counted` to `mark` if it moved."""
+    per_symbol: dict[str, int] = {}
+    lag_sum = lag_count = 0
+    for item in stored:
+        per_symbol[item["symbol"]] = per_symbol.get(item["symbol"], 0) + 1
+        lag = ingest_lag_ms(item.get("timestamp"), now)
+        if lag is not None:
+            lag_sum += lag
+            lag_count += 1
+
+    names = {
+        "#events": "events", "#failed": "failed", "#lag_sum": "lag_ms_sum", "#lag_n": "lag_count",
+        "#updated": "updated_at", "#ttl": "ttl",
+    }
+    values = {
+        ":events": len(stored), ":failed": failed, ":lag_sum": lag_sum, ":lag_n": lag_count,
+        ":updated": now.isoformat(), ":ttl": int((now + timedelta(days=STATS_TTL_DAYS)).timestamp()),
+    }
+    sets = ["#updated = :updated", "#ttl = :ttl"]
+    adds = ["#events :events", "#failed :failed", "#lag_sum :lag_sum", "#lag_n :lag_n"]
+    for i, (symbol, count) in enumerate(sorted(per_symbol.items())):
+        names[f"#e{i}"] = f"events#{symbol}"
+        values[f":e{i}"] = count
+        adds.append(f"#e{i} :e{i}")
+
+    guard = {}
+    if mark > counted:
+        names["#mark"] = MARK_PREFIX + source
+        values[":mark"] = mark
+        values[":counted"] = counted
+        sets.append("#mark = :mark")
+        guard = {
+            "ConditionExpression": "attribute_not_exists(#mark) OR #mark <= :counted",
+            "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+        }
+    return {
+        "TableName": table_name,
+        "Key": serialize_item({"symbol": f"{STATS_PREFIX}#{shard}", "timestamp": minute_bucket(now)}),
+        "UpdateExpression": f"SET {', '.join(sets)} ADD {', '.join(adds)}",
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": serialize_item(values),
+        **guard,
+    }
+
+
+def record_batch(client, table_name: str, stored: list[dict], failed: int, shards: int = DEFAULT_STATS_SHARDS,
+                 now: datetime | None = None, sequences: dict | None = None, retry_from: str = "",
+                 source: str = "") -> None:
+    """Add one batch's first deliveries from Kinesis shard `source` to the current minute's
+    counter item (one UpdateItem)."""
+    now = now or datetime.now(timezone.utc)
+    sequences = sequences or {}
+    retry_from = sequence_key(retry_from)
+    shard = counter_shard(source, shards)
+    counted = _marks.get(source)
+    if counted is None:
+        counted = load_mark(client, table_name, source, shard, now) if sequences else ""
+    for _ in range(MAX_COUNT_ATTEMPTS):
+        fresh, mark = first_deliveries(stored, sequences, counted, retry_from)
+        try:
+            client.update_item(**counter_update(table_name, fresh, failed, shard, now, source, mark, counted))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+            # Another delivery from this shard counted further; recount against its mark.
+            counted = deserialize(e.response.get("Item", {}).get(MARK_PREFIX + source, {"S": counted}))
+            continue
+        if mark:
+            _marks[source] = mark
+        return
+    print(f"Stats counters skipped: the mark of {source or 'the shard'} kept moving for {MAX_COUNT_ATTEMPTS} attempts")
@@ -0,0 +1,76 @@
+"""
+AWS clients for the lambdas, with boto3 imported on first use.
+
+Importing boto3 is most of a handler's import time (~200 ms of ~220 at full CPU, far
+more at 128 MB), and building the first client loads the service models on top. Nothing
+here imports boto3 until a client, resource or DynamoDB type (de)serializer is asked for,
+so tools that load a handler with stand-ins (benchmarks, scripts/replay.py) and code
+paths that make no AWS call never pay for it.
+
+Each handler still keeps its clients in module-level globals (created by its get_*()
+functions, replaceable by stand-ins). preload(get_x, ...) at the bottom of a handler
+calls those getters while the module is imported when PRELOAD_AWS_CLIENTS=true, which is
+how the functions are deployed: the SDK then loads during the Lambda init phase, before
+an event is waiting (and inside the snapshot with provisioned concurrency), instead of on
+the first invocation.
+"""
+import os
+
+from metrics import instrument
+
+_serializer = None
+_deserializer = None
+
+
+def client(service: str, **kwargs):
+    """A new instrumented boto3 client (see metrics.instrument)."""
+    import boto3
+
+    return instrument(boto3.client(service, **kwargs))
+
+
+def resource(service: str, **kwargs):
+    """A new boto3 resource whose underlying client is instrumented."""
+    import boto3
+
+    res = boto3.resource(service, **kwargs)
+    instrument(res.meta.client)
+    return res
+
+
+def serialize(value) -> dict:
+    """Python value -> DynamoDB attribute value ({"S": ...}, {"N": ...}, ...)."""
+    global _serializer
+    if _serializer is None:
+        from boto3.dynamodb.types import TypeSerializer
+
+        _serializer = TypeSerializer()
+    return _serializer.serialize(value)
+
+
+def deserialize(value: dict):
+    global _deserializer
+    if _deserializer is None:
+        from boto3.dynamodb.types import TypeDeserializer
+
+        _deserializer = TypeDeserializer()
+    return _deserializer.deserialize(value)
+
+
+def serialize_item(item: dict) -> dict:
+    return {k: serialize(v) for k, v in item.items()}
+
+
+def deserialize_item(item: dict) -> dict:
+    return {k: deserialize(v) for k, v in item.items()}
+
+
+def preload(*getters) -> None:
+    """Call the handler's client getters now if PRELOAD_AWS_CLIENTS=true."""
+    if os.environ.get("PRELOAD_AWS_CLIENTS", "false").lower() != "true":
+        return
+    for getter in getters:
+        try:
+            getter()
+        except Exception as e:  # the handler retries on first use
+            print(f"Preloading {getattr(getter, '__name__', getter)} failed: {e}")
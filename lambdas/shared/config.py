@@ -0,0 +1,28 @@
+"""
+Environment settings and the symbol registry shared by the lambdas.
+
+SYMBOLS (comma separated) overrides DEFAULT_SYMBOLS, the symbols the ingester polls and
+the API serves. Their compact wire ids are a separate, append-only list
+(record_codec.SYMBOL_IDS); a symbol without an id is still carried, just inline.
+"""
+import os
+
+DEFAULT_SYMBOLS = ("AAPL", "GOOGL", "MSFT", "AMZN", "TSLA", "META", "NVDA", "NFLX", "JPM", "V")
+
+
+def env_number(name: str, default, cast=int):
+    """os.environ[name] as `cast`; `default` when unset or malformed."""
+    try:
+        return cast(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    return os.environ.get(name, "true" if default else "false").strip().lower() == "true"
+
+
+def tracked_symbols() -> list[str]:
+    raw = os.environ.get("SYMBOLS", "")
+    symbols = [s.strip().upper() for s in raw.split(",") if s.strip()]
+    return symbols or list(DEFAULT_SYMBOLS)
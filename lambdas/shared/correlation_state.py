@@ -0,0 +1,182 @@
+"""
+Persisted form of the anomaly detector's return-correlation state (see the detector's
+correlation.py), read back by the detector after a cold start and by the API's
+/correlations route. Standard library only: the API package does not ship NumPy.
+
+A snapshot is one binary blob, little endian:
+
+    version (1 byte) | header length (uint32) | JSON header
+    last_prices, means, variances, observations   float64 x k each
+    correlations                                  float32 x k(k-1)/2, the upper triangle
+                                                  row by row (i < j)
+
+The header carries the symbols in matrix order and the step the state was taken at. At
+300 symbols the blob is about 190 KB, so it is split into chunk items of at most
+MAX_CHUNK_BYTES, all under symbol="__correlation__" in the anomalies table:
+
+    detected_at="head"                 step_us, chunk prefix and count, updated_at
+    detected_at="<prefix>#<i>"         chunk i of one write's blob; the prefix is the
+                                       step plus a token unique to the write
+
+Chunks are written first and the head switched to them last, conditionally on the head
+not holding this step or a later one already, so a reader that follows the head never
+sees a half-written snapshot. The chunks the head pointed at before are deleted
+afterwards; a reader that loses that race (chunks gone under the head it read) reads the
+head again.
+"""
+import json
+import math
+import struct
+import sys
+import uuid
+from array import array
+from dataclasses import dataclass
+
+from botocore.exceptions import ClientError
+
+CORRELATION_PARTITION = "__correlation__"
+HEAD_KEY = "head"
+FORMAT_VERSION = 1
+MAX_CHUNK_BYTES = 350_000  # DynamoDB caps items at 400 KB
+TTL_DAYS = 2
+READ_ATTEMPTS = 2
+_HEADER = struct.Struct("<BI")
+
+
+@dataclass
+class Snapshot:
+    symbols: list[str]
+    step_us: int
+    steps: int
+    window: int
+    last_prices: array  # "d", one per symbol; NaN until the symbol has a price
+    means: array  # "d", EW mean of the symbol's log returns per step
+    variances: array  # "d", EW variance of the same
+    observations: array  # "d", returns seen per symbol
+    correlations: array  # "f", upper triangle without the diagonal
+
+    def correlation(self, i: int, j: int) -> float:
+        if i == j:
+            return 1.0
+        if i > j:
+            i, j = j, i
+        return self.correlations[pair_index(i, j, len(self.symbols))]
+
+    def volatility(self, i: int) -> float:
+        """Standard deviation of the symbol's returns per step. The state starts at zero,
+        which still weighs (1 - alpha)^steps; that part is scaled back out."""
+        weight = 1.0 - (1.0 - 2.0 / (self.window + 1)) ** self.steps
+        return math.sqrt(self.variances[i] / weight) if weight > 0 else math.nan
+
+
+def pair_index(i: int, j: int, k: int) -> int:
+    """Position of (i, j), i < j, in a k x k upper triangle stored row by row."""
+    return i * (2 * k - i - 1) // 2 + (j - i - 1)
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def encode(snapshot: Snapshot) -> bytes:
+    header = json.dumps({
+        "symbols": snapshot.symbols,
+        "step_us": snapshot.step_us,
+        "steps": snapshot.steps,
+        "window": snapshot.window,
+    }, separators=(",", ":")).encode()
+    parts = [_HEADER.pack(FORMAT_VERSION, len(header)), header]
+    for values in (snapshot.last_prices, snapshot.means, snapshot.variances, snapshot.observations,
+                   snapshot.correlations):
+        parts.append(_little_endian(values))
+    return b"".join(parts)
+
+
+def decode(blob: bytes) -> Snapshot:
+    if len(blob) < _HEADER.size:
+        raise ValueError("Truncated correlation snapshot")
+    version, header_length = _HEADER.unpack_from(blob)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unknown correlation snapshot version {version}")
+    pos = _HEADER.size + header_length
+    header = json.loads(blob[_HEADER.size:pos])
+    k = len(header["symbols"])
+    vectors = []
+    for typecode, count in (("d", k), ("d", k), ("d", k), ("d", k), ("f", k * (k - 1) // 2)):
+        values = array(typecode)
+        end = pos + values.itemsize * count
+        if end > len(blob):
+            raise ValueError("Truncated correlation snapshot")
+        values.frombytes(blob[pos:end])
+        if sys.byteorder != "little":
+            values.byteswap()
+        vectors.append(values)
+        pos = end
+    return Snapshot(header["symbols"], int(header["step_us"]), int(header["steps"]), int(header["window"]), *vectors)
+
+
+def _delete_chunks(table, prefix: str, count: int) -> None:
+    for i in range(count):
+        table.delete_item(Key={"symbol": CORRELATION_PARTITION, "detected_at": f"{prefix}#{i}"})
+
+
+def save(table, snapshot: Snapshot, updated_at: str, now: float) -> bool:
+    """Write the snapshot and point the head at it; False if the head already holds this
+    step or a later one (another container got further)."""
+    blob = encode(snapshot)
+    chunks = [blob[i:i + MAX_CHUNK_BYTES] for i in range(0, len(blob), MAX_CHUNK_BYTES)]
+    ttl = int(now) + TTL_DAYS * 86400
+    prefix = f"{snapshot.step_us}#{uuid.uuid4().hex[:12]}"
+    for i, chunk in enumerate(chunks):
+        table.put_item(Item={
+            "symbol": CORRELATION_PARTITION,
+            "detected_at": f"{prefix}#{i}",
+            "data": chunk,
+            "ttl": ttl,
+        })
+    try:
+        old = table.put_item(
+            Item={
+                "symbol": CORRELATION_PARTITION,
+                "detected_at": HEAD_KEY,
+                "step_us": snapshot.step_us,
+                "chunk_prefix": prefix,
+                "chunks": len(chunks),
+                "symbols": len(snapshot.symbols),
+                "updated_at": updated_at,
+                "ttl": ttl,
+            },
+            ConditionExpression="attribute_not_exists(step_us) OR step_us < :step",
+            ExpressionAttributeValues={":step": snapshot.step_us},
+            ReturnValues="ALL_OLD",
+        ).get("Attributes") or {}
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        _delete_chunks(table, prefix, len(chunks))
+        return False
+    if "chunk_prefix" in old:
+        _delete_chunks(table, old["chunk_prefix"], int(old.get("chunks", 0)))
+    return True
+
+
+def load(table) -> tuple[Snapshot, dict] | None:
+    """The snapshot the head points at and the head item, or None if there is none."""
+    for _ in range(READ_ATTEMPTS):
+        head = table.get_item(Key={"symbol": CORRELATION_PARTITION, "detected_at": HEAD_KEY}).get("Item")
+        if not head or "chunk_prefix" not in head:
+            return None
+        parts = []
+        for i in range(int(head.get("chunks", 0))):
+            item = table.get_item(
+                Key={"symbol": CORRELATION_PARTITION, "detected_at": f"{head['chunk_prefix']}#{i}"}
+            ).get("Item")
+            if item is None:
+                break
+            parts.append(bytes(item["data"]))
+        else:
+            return decode(b"".join(parts)), head
+    return None
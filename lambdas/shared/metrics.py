@@ -0,0 +1,178 @@
+"""
+Hot-path metrics in CloudWatch Embedded Metric Format: one JSON log line per sampled
+invocation, which CloudWatch Logs turns into metrics (namespace METRICS_NAMESPACE,
+default FinPulse, dimension Function) without a PutMetricData call on the hot path.
+
+    @instrumented("aggregator")
+    def lambda_handler(event, context):
+        with stage("decode"):
+            batch = decode_batch(event["Records"])
+        observe_batch(batch)
+        ...
+
+stage(name) adds the block's wall time to <name>_ms, count(name) adds to a counter, and
+observe_batch(batch) records the batch size and how far behind it is: event_lag_ms from
+the oldest tick's own timestamp, iterator_lag_ms from the oldest Kinesis
+approximateArrivalTimestamp (what the IteratorAge metric reports, per batch). Clients
+passed through instrument() count their API calls per service (dynamodb_calls,
+sns_calls, ...) and the SDK's own retries (sdk_retries); retry loops in the handlers add
+to retries.
+
+Emission is off unless METRICS_ENABLED=true (Terraform sets it; local runs stay quiet).
+METRICS_SAMPLE_RATE (default 1) is the share of invocations that record anything; the
+rest run against no state at all, and every line carries sample_rate so sums can be
+scaled back up. Handlers run one invocation at a time per container, so the current
+invocation is module state that worker threads of the same invocation also count into.
+"""
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from record_codec import NO_TIMESTAMP
+
+DEFAULT_NAMESPACE = "FinPulse"
+
+_current = None
+_cold_start = True
+
+
+class Invocation:
+    """Metric values of one sampled invocation."""
+
+    def __init__(self, function: str, sample_rate: float):
+        self.function = function
+        self.sample_rate = sample_rate
+        self.values: dict[str, float] = {}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, value: float) -> None:
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + value
+
+    def maximum(self, name: str, value: float) -> None:
+        with self._lock:
+            if name not in self.values or value > self.values[name]:
+                self.values[name] = value
+
+    def document(self, namespace: str, properties: dict) -> dict:
+        values = {name: round(value, 3) for name, value in sorted(self.values.items())}
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": namespace,
+                    "Dimensions": [["Function"]],
+                    "Metrics": [
+                        {"Name": name, "Unit": "Milliseconds" if name.endswith("_ms") else "Count"}
+                        for name in values
+                    ],
+                }],
+            },
+            "Function": self.function,
+            **properties,
+            **values,
+        }
+
+
+def sample_rate() -> float:
+    if os.environ.get("METRICS_ENABLED", "false").lower() != "true":
+        return 0.0
+    try:
+        return min(1.0, max(0.0, float(os.environ.get("METRICS_SAMPLE_RATE", 1))))
+    except ValueError:
+        return 1.0
+
+
+def instrumented(function: str):
+    """Decorate a handler so each sampled invocation emits one EMF line, errors included."""
+    def decorate(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            global _current, _cold_start
+            cold, _cold_start = _cold_start, False
+            rate = sample_rate()
+            if rate <= 0 or random.random() >= rate:
+                return handler(event, context)
+            invocation = _current = Invocation(function, rate)
+            try:
+                return handler(event, context)
+            except Exception:
+                invocation.add("errors", 1)
+                raise
+            finally:
+                _current = None
+                invocation.add("duration_ms", (time.perf_counter() - invocation.started) * 1000)
+                emit(invocation, cold, context)
+        return wrapper
+    return decorate
+
+
+def emit(invocation: Invocation, cold_start: bool, context=None) -> None:
+    properties = {"sample_rate": invocation.sample_rate, "cold_start": cold_start}
+    request_id = getattr(context, "aws_request_id", None)
+    if request_id:
+        properties["request_id"] = request_id
+    namespace = os.environ.get("METRICS_NAMESPACE", DEFAULT_NAMESPACE)
+    print(json.dumps(invocation.document(namespace, properties), separators=(",", ":")))
+
+
+@contextmanager
+def stage(name: str):
+    invocation = _current
+    if invocation is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        invocation.add(f"{name}_ms", (time.perf_counter() - start) * 1000)
+
+
+def count(name: str, value: float = 1) -> None:
+    invocation = _current
+    if invocation is not None:
+        invocation.add(name, value)
+
+
+def observe_batch(batch, now: float | None = None) -> None:
+    """Record size and lag of a decoded record_codec.TickBatch."""
+    invocation = _current
+    if invocation is None:
+        return
+    now = time.time() if now is None else now
+    invocation.add("records", len(batch))
+    oldest_event = min((ts for ts in batch.timestamps_us if ts != NO_TIMESTAMP), default=None)
+    if oldest_event is not None:
+        invocation.maximum("event_lag_ms", max(0.0, now * 1000 - oldest_event / 1000))
+    arrivals = (r.get("kinesis", {}).get("approximateArrivalTimestamp") for r in batch.kinesis_records)
+    oldest_arrival = min((a for a in arrivals if isinstance(a, (int, float))), default=None)
+    if oldest_arrival is not None:
+        invocation.maximum("iterator_lag_ms", max(0.0, (now - oldest_arrival) * 1000))
+
+
+def _after_call(event_name: str = "", parsed=None, **kwargs) -> None:
+    invocation = _current
+    if invocation is None:
+        return
+    parts = event_name.split(".")
+    invocation.add(f"{parts[1] if len(parts) > 1 else 'aws'}_calls", 1)
+    retries = ((parsed or {}).get("ResponseMetadata") or {}).get("RetryAttempts") or 0
+    if retries:
+        invocation.add("sdk_retries", retries)
+
+
+def instrument(client):
+    """Count the API calls (and SDK retries) a boto3 client makes; returns the client.
+
+    Anything without botocore's event system (e.g. a benchmark stand-in) is returned as is.
+    """
+    events = getattr(getattr(client, "meta", None), "events", None)
+    if events is not None:
+        events.register("after-call", _after_call, unique_id="finpulse-metrics-after-call")
+    return client
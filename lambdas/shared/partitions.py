@@ -0,0 +1,19 @@
+"""
+Reserved partitions that one lambda writes and another reads, so both sides take the key
+layout from one place. Reserved partition keys start with "__"; the stream broadcaster
+skips them.
+"""
+# Latest-price snapshot in the prices table, written by price_processor (snapshot.py):
+# symbol="<SNAPSHOT_PREFIX>#<shard>", timestamp=SNAPSHOT_SORT_KEY.
+SNAPSHOT_PREFIX = "__latest__"
+SNAPSHOT_SORT_KEY = "snapshot"
+DEFAULT_SNAPSHOT_SHARDS = 1
+
+# Per-minute pipeline counters in the prices table, written by price_processor
+# (stats_counters.py): symbol="<STATS_PREFIX>#<shard>", timestamp="YYYY-MM-DDTHH:MM".
+STATS_PREFIX = "__stats__"
+DEFAULT_STATS_SHARDS = 1
+
+# Per-hour anomaly counters in the anomalies table, written by anomaly_detector:
+# symbol=ANOMALY_COUNTER_PARTITION, detected_at="YYYY-MM-DDTHH".
+ANOMALY_COUNTER_PARTITION = "__anomaly_count__"
@@ -0,0 +1,370 @@
+"""
+Wire format for price ticks on the Kinesis stream, shared by the ingester and every consumer.
+
+A record is either JSON (what the ingester used to write, and what is still accepted) or
+a fixed-layout binary tick, told apart by the first byte: JSON starts with "{", binary
+with its format version. Version 1 is, little-endian:
+
+    B   version (1)
+    B   flags: 1 = symbol inline, 2 = source inline, 4 = has source
+    H   symbol id in SYMBOL_IDS   | or B length + UTF-8 bytes when inline
+    q   timestamp, epoch microseconds (UTC)
+    d   price
+    q   volume
+    d   change_percent
+    B   source id in SOURCE_IDS   | or B length + UTF-8 bytes when inline (if present)
+
+encode_record only emits binary when it is lossless, i.e. decoding gives back exactly the
+fields and values (including the timestamp string, which is a DynamoDB sort key) that
+went in; anything else is written as JSON. decode_batch turns a whole Kinesis event into
+a TickBatch of columns, so consumers do not JSON-parse or ISO-parse record by record.
+
+Many ticks can share one Kinesis record (see the ingester's aggregation.py). An aggregate
+starts with AGGREGATE_V1, then H record count and, per record, H length + the encoded
+record (binary or JSON, never another aggregate). decode_batch and decode_records expand
+aggregates, so consumers iterate logical records either way; every tick of an aggregate
+shares its Kinesis sequence number.
+
+Lives in lambdas/shared/ and is copied into every lambda package by
+scripts/package_lambdas.sh. SYMBOL_IDS and SOURCE_IDS are append-only: ids already on
+the stream must keep their meaning.
+"""
+import base64
+import json
+import struct
+from array import array
+from datetime import datetime, timedelta, timezone
+
+VERSION_1 = 1
+JSON_MARKER = ord("{")
+AGGREGATE_V1 = 0xA1
+MAX_AGGREGATED_RECORDS = 0xFFFF
+
+SYMBOL_IDS = ("AAPL", "GOOGL", "MSFT", "AMZN", "TSLA", "META", "NVDA", "NFLX", "JPM", "V")
+SOURCE_IDS = ("finnhub", "bench", "replay")
+
+FLAG_SYMBOL_INLINE = 1
+FLAG_SOURCE_INLINE = 2
+FLAG_HAS_SOURCE = 4
+
+# Timestamp column value for JSON records whose timestamp is missing or unparseable.
+NO_TIMESTAMP = -(2 ** 63)
+
+_HEADER = struct.Struct("<BB")
+_SYMBOL_ID = struct.Struct("<H")
+_BODY = struct.Struct("<qdqd")
+# The usual record (dictionary symbol and source) unpacks in one call.
+_COMMON = struct.Struct("<BBHqdqdB")
+_COMMON_FLAGS = FLAG_HAS_SOURCE
+_BINARY_FIELDS = frozenset(("symbol", "timestamp", "price", "volume", "change_percent"))
+_SYMBOL_INDEX = {s: i for i, s in enumerate(SYMBOL_IDS)}
+_SOURCE_INDEX = {s: i for i, s in enumerate(SOURCE_IDS)}
+_AGGREGATE_HEADER = struct.Struct("<BH")
+_LENGTH = struct.Struct("<H")
+# Bytes an aggregate adds: its header, plus a length prefix per record.
+AGGREGATE_OVERHEAD = _AGGREGATE_HEADER.size
+AGGREGATE_RECORD_OVERHEAD = _LENGTH.size
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def timestamp_to_micros(ts: str) -> int | None:
+    """Epoch microseconds for an ISO-8601 timestamp ("Z" or offset; naive means UTC)."""
+    try:
+        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // _MICROSECOND
+
+
+def datetime_to_micros(dt: datetime) -> int:
+    """Epoch microseconds for an aware datetime, exactly (no float round trip)."""
+    return (dt - _EPOCH) // _MICROSECOND
+
+
+def micros_to_datetime(micros: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=micros)
+
+
+def micros_to_timestamp(micros: int) -> str:
+    """The ingester's timestamp form: datetime.isoformat() in UTC, "+00:00" suffix."""
+    return micros_to_datetime(micros).isoformat()
+
+
+def _pack_text(value: str) -> bytes | None:
+    raw = value.encode("utf-8")
+    return bytes((len(raw),)) + raw if len(raw) < 256 else None
+
+
+def _unpack_text(data: bytes, pos: int) -> tuple[str, int]:
+    end = pos + 1 + data[pos]
+    if end > len(data):
+        raise ValueError("Truncated record")
+    return data[pos + 1:end].decode("utf-8"), end
+
+
+def _encode_binary(record: dict) -> bytes | None:
+    keys = record.keys()
+    if not _BINARY_FIELDS <= keys or not keys <= _BINARY_FIELDS | {"source"}:
+        return None
+    symbol, ts, source = record["symbol"], record["timestamp"], record.get("source")
+    price, volume, change = record["price"], record["volume"], record["change_percent"]
+    if not isinstance(symbol, str) or not isinstance(ts, str) or not (source is None or isinstance(source, str)):
+        return None
+    if type(price) is not float or type(change) is not float or type(volume) is not int:
+        return None
+    if not -2 ** 63 <= volume < 2 ** 63:
+        return None
+    micros = timestamp_to_micros(ts)
+    if micros is None or micros_to_timestamp(micros) != ts:
+        return None
+
+    flags = 0
+    symbol_id = _SYMBOL_INDEX.get(symbol)
+    if symbol_id is None:
+        symbol_part = _pack_text(symbol)
+        if symbol_part is None:
+            return None
+        flags |= FLAG_SYMBOL_INLINE
+    else:
+        symbol_part = _SYMBOL_ID.pack(symbol_id)
+    source_part = b""
+    if "source" in record:
+        if source is None:
+            return None
+        flags |= FLAG_HAS_SOURCE
+        source_id = _SOURCE_INDEX.get(source)
+        if source_id is None:
+            source_part = _pack_text(source)
+            if source_part is None:
+                return None
+            flags |= FLAG_SOURCE_INLINE
+        else:
+            source_part = bytes((source_id,))
+    return _HEADER.pack(VERSION_1, flags) + symbol_part + _BODY.pack(micros, price, volume, change) + source_part
+
+
+def encode_record(record: dict, binary: bool = True) -> bytes:
+    """Binary when asked for and lossless, JSON otherwise."""
+    if binary:
+        data = _encode_binary(record)
+        if data is not None:
+            return data
+    return json.dumps(record).encode("utf-8")
+
+
+def encode_aggregate(records: list[bytes]) -> bytes:
+    """Pack already-encoded records into one aggregate record."""
+    if not 0 < len(records) <= MAX_AGGREGATED_RECORDS:
+        raise ValueError(f"An aggregate holds 1 to {MAX_AGGREGATED_RECORDS} records, got {len(records)}")
+    parts = [_AGGREGATE_HEADER.pack(AGGREGATE_V1, len(records))]
+    for record in records:
+        if len(record) > 0xFFFF or record[:1] == bytes((AGGREGATE_V1,)):
+            raise ValueError("Aggregated records must be plain records under 64 KiB")
+        parts.append(_LENGTH.pack(len(record)))
+        parts.append(record)
+    return b"".join(parts)
+
+
+def split_aggregate(data: bytes) -> list[bytes]:
+    """The encoded records inside an aggregate; raises ValueError if it is malformed."""
+    try:
+        _, count = _AGGREGATE_HEADER.unpack_from(data, 0)
+        records = []
+        pos = _AGGREGATE_HEADER.size
+        for _ in range(count):
+            (length,) = _LENGTH.unpack_from(data, pos)
+            pos += _LENGTH.size
+            records.append(data[pos:pos + length])
+            pos += length
+    except struct.error as e:
+        raise ValueError(f"Malformed aggregate: {e}") from e
+    if pos != len(data):
+        raise ValueError("Malformed aggregate: length does not match its records")
+    return records
+
+
+def _decode_v1(data: bytes) -> tuple:
+    """(symbol, micros, price, volume, change_percent, source) from a version 1 record."""
+    if len(data) == _COMMON.size and data[1] == _COMMON_FLAGS:
+        _, _, symbol_id, micros, price, volume, change, source_id = _COMMON.unpack(data)
+        return SYMBOL_IDS[symbol_id], micros, price, volume, change, SOURCE_IDS[source_id]
+    _, flags = _HEADER.unpack_from(data, 0)
+    pos = _HEADER.size
+    if flags & FLAG_SYMBOL_INLINE:
+        symbol, pos = _unpack_text(data, pos)
+    else:
+        symbol = SYMBOL_IDS[_SYMBOL_ID.unpack_from(data, pos)[0]]
+        pos += _SYMBOL_ID.size
+    micros, price, volume, change = _BODY.unpack_from(data, pos)
+    pos += _BODY.size
+    source = None
+    if flags & FLAG_HAS_SOURCE:
+        if flags & FLAG_SOURCE_INLINE:
+            source, _ = _unpack_text(data, pos)
+        else:
+            source = SOURCE_IDS[data[pos]]
+    return symbol, micros, price, volume, change, source
+
+
+def decode_record(data: bytes) -> dict:
+    """One record back to the dict the ingester built; raises ValueError if it is not one."""
+    if not data:
+        raise ValueError("Empty record")
+    if data[0] == JSON_MARKER:
+        record = json.loads(data.decode("utf-8"))
+        if not isinstance(record, dict):
+            raise ValueError("Record is not a JSON object")
+        return record
+    if data[0] != VERSION_1:
+        raise ValueError(f"Unsupported record version {data[0]}")
+    try:
+        symbol, micros, price, volume, change, source = _decode_v1(data)
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed record: {e}") from e
+    record = {
+        "symbol": symbol,
+        "price": price,
+        "volume": volume,
+        "change_percent": change,
+        "timestamp": micros_to_timestamp(micros),
+    }
+    if source is not None:
+        record["source"] = source
+    return record
+
+
+def decode_records(data: bytes) -> list[dict]:
+    """Every logical record in one Kinesis record's data (several if it is an aggregate)."""
+    if data[:1] == bytes((AGGREGATE_V1,)):
+        return [decode_record(record) for record in split_aggregate(data)]
+    return [decode_record(data)]
+
+
+def parse_float(value, default=None):
+    """float() of a JSON number, numeric string or Decimal; `default` when it is none of those."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _float_or_nan(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class TickBatch:
+    """Columns for the decodable records of one Kinesis event, in arrival order.
+
+    Missing JSON fields come through as "" (symbol), NO_TIMESTAMP, nan (price and
+    change_percent), 0 (volume) or None (source). `kinesis_records[i]` is the event record
+    row i came from, for sequence numbers; `failed` counts records that did not decode.
+    """
+
+    def __init__(self):
+        self.symbols: list[str] = []
+        self.timestamps_us = array("q")
+        self.prices = array("d")
+        self.volumes = array("q")
+        self.change_percents = array("d")
+        self.sources: list[str | None] = []
+        self.kinesis_records: list[dict] = []
+        self.failed = 0
+        # Rows from JSON records keep the original dict so record(i) and timestamp(i) give
+        # back exactly what was sent.
+        self._json_rows: dict[int, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def _append(self, kinesis_record: dict, symbol, micros, price, volume, change, source) -> None:
+        self.symbols.append(symbol)
+        self.timestamps_us.append(micros)
+        self.prices.append(price)
+        self.volumes.append(volume)
+        self.change_percents.append(change)
+        self.sources.append(source)
+        self.kinesis_records.append(kinesis_record)
+
+    def add(self, kinesis_record: dict, data: bytes) -> None:
+        """Append the logical records in `data`; raises ValueError if none of it decodes."""
+        if data[:1] == bytes((AGGREGATE_V1,)):
+            # A bad record inside an aggregate costs only that record.
+            for record in split_aggregate(data):
+                try:
+                    self._add_one(kinesis_record, record)
+                except (ValueError, TypeError) as e:
+                    print(f"Bad aggregated record: {e}")
+                    self.failed += 1
+            return
+        self._add_one(kinesis_record, data)
+
+    def _add_one(self, kinesis_record: dict, data: bytes) -> None:
+        if not data:
+            raise ValueError("Empty record")
+        if data[0] == JSON_MARKER:
+            record = decode_record(data)
+            ts = record.get("timestamp")
+            micros = timestamp_to_micros(ts) if isinstance(ts, str) and ts else None
+            try:
+                volume = int(record.get("volume") or 0)
+            except (TypeError, ValueError):
+                volume = 0
+            self._json_rows[len(self.symbols)] = record
+            self._append(
+                kinesis_record,
+                str(record.get("symbol") or "").strip(),
+                NO_TIMESTAMP if micros is None else micros,
+                _float_or_nan(record.get("price")),
+                volume,
+                _float_or_nan(record.get("change_percent")),
+                record.get("source"),
+            )
+            return
+        if data[0] != VERSION_1:
+            raise ValueError(f"Unsupported record version {data[0]}")
+        try:
+            self._append(kinesis_record, *_decode_v1(data))
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            raise ValueError(f"Malformed record: {e}") from e
+
+    def timestamp(self, i: int) -> str:
+        """Row i's timestamp string as sent ("" if a JSON record had none)."""
+        row = self._json_rows.get(i)
+        if row is not None:
+            ts = row.get("timestamp")
+            return ts if isinstance(ts, str) else ""
+        return micros_to_timestamp(self.timestamps_us[i])
+
+    def record(self, i: int) -> dict:
+        """Row i as the dict the ingester built."""
+        row = self._json_rows.get(i)
+        if row is not None:
+            return row
+        record = {
+            "symbol": self.symbols[i],
+            "price": self.prices[i],
+            "volume": self.volumes[i],
+            "change_percent": self.change_percents[i],
+            "timestamp": self.timestamp(i),
+        }
+        if self.sources[i] is not None:
+            record["source"] = self.sources[i]
+        return record
+
+
+def decode_batch(kinesis_records: list[dict]) -> TickBatch:
+    """Decode every record of a Kinesis event; bad records are logged and counted in `failed`."""
+    batch = TickBatch()
+    for record in kinesis_records:
+        try:
+            batch.add(record, base64.b64decode(record["kinesis"]["data"]))
+        except (KeyError, ValueError, TypeError) as e:
+            print(f"Bad record: {e}")
+            batch.failed += 1
+    return batch
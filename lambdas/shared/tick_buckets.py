@@ -0,0 +1,283 @@
+"""
+Bucketed tick storage: each symbol's ticks for a TICK_BUCKET_SECONDS window (default one
+hour) are packed into one item of the prices table, next to the per-tick items, so a
+day of history is a couple of dozen small items instead of a query through every tick.
+
+Items are keyed symbol="__ticks__#<SYMBOL>", timestamp=<bucket start, "...T14:00:00Z">.
+Their `chunks` attribute is a list of binary chunks: the price processor appends one
+chunk per batch and bucket with list_append, so writes never read the item first. A chunk
+holds ticks in timestamp order:
+
+    version (1 byte) | decimals (1 byte) | count (varint)
+    per tick: timestamp, scaled price, volume as zigzag varints, each the difference
+              from the tick before it; the first tick's timestamp counts from the
+              bucket start and its price and volume from zero
+
+Prices are integers scaled by 10**decimals, using the fewest decimals (at most 8) that
+represent every price in the chunk exactly. A tick a minute with cent prices packs into
+about 7 bytes, against ~100 for a tick item.
+
+Replayed batches append the same ticks again; readers keep one tick per timestamp, the
+last one written. DynamoDB bills an UpdateItem by the size of the whole item, so pick the
+bucket size that keeps a bucket to a few KB at the symbol's tick rate. An item that would
+pass MAX_ITEM_BYTES continues in "<bucket start>~1", "~2", ..., which sort right after it.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from record_codec import micros_to_datetime, micros_to_timestamp, timestamp_to_micros
+
+TICKS_PREFIX = "__ticks__"
+DEFAULT_BUCKET_SECONDS = 3600
+CHUNK_VERSION = 1
+MAX_DECIMALS = 8
+MAX_ITEM_BYTES = 350_000  # DynamoDB caps items at 400 KB
+MAX_PARTS = 16
+TTL_DAYS = 7
+PART_SEPARATOR = "~"
+
+# (symbol, bucket) -> overflow part the writer last appended to, across warm invocations.
+_parts: dict[tuple[str, str], int] = {}
+
+
+def partition(symbol: str) -> str:
+    return f"{TICKS_PREFIX}#{symbol}"
+
+
+def bucket_start(micros: int, seconds: int) -> int:
+    width = seconds * 1_000_000
+    return micros - micros % width
+
+
+def bucket_key(micros: int, seconds: int) -> str:
+    return micros_to_datetime(bucket_start(micros, seconds)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def part_key(bucket: str, part: int) -> str:
+    return f"{bucket}{PART_SEPARATOR}{part}" if part else bucket
+
+
+# ── chunk codec ──
+
+def _put_varint(out: bytearray, value: int) -> None:
+    value = (value << 1) ^ (value >> 63)  # zigzag: small negatives stay small
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _get_varint(data: bytes, pos: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("Truncated chunk")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return (result >> 1) ^ -(result & 1), pos
+        shift += 7
+
+
+def price_decimals(prices) -> int:
+    prices = list(prices)
+    for decimals in range(MAX_DECIMALS):
+        if all(round(p, decimals) == p for p in prices):
+            return decimals
+    return MAX_DECIMALS
+
+
+def encode_chunk(ticks: list[tuple[int, float, int]], base: int = 0) -> bytes:
+    """Pack (timestamp µs, price, volume) ticks into one chunk; `base` is the bucket start."""
+    ticks = sorted(ticks)
+    decimals = price_decimals(price for _, price, _ in ticks)
+    scale = 10 ** decimals
+    out = bytearray((CHUNK_VERSION, decimals))
+    _put_varint(out, len(ticks))
+    last_ts, last_price, last_volume = base, 0, 0
+    for ts, price, volume in ticks:
+        scaled = round(price * scale)
+        _put_varint(out, ts - last_ts)
+        _put_varint(out, scaled - last_price)
+        _put_varint(out, volume - last_volume)
+        last_ts, last_price, last_volume = ts, scaled, volume
+    return bytes(out)
+
+
+def decode_chunk(data: bytes, base: int = 0) -> list[tuple[int, float, int]]:
+    data = bytes(data)
+    if len(data) < 2 or data[0] != CHUNK_VERSION:
+        raise ValueError(f"Unknown tick chunk version {data[:1].hex()}")
+    scale = 10 ** data[1]
+    count, pos = _get_varint(data, 2)
+    ticks = []
+    ts, price, volume = base, 0, 0
+    for _ in range(count):
+        delta, pos = _get_varint(data, pos)
+        ts += delta
+        delta, pos = _get_varint(data, pos)
+        price += delta
+        delta, pos = _get_varint(data, pos)
+        volume += delta
+        ticks.append((ts, price / scale, volume))
+    return ticks
+
+
+def merge_items(items: list[dict]) -> list[tuple[int, float, int]]:
+    """Every tick in the bucket items, one per timestamp (last written wins), oldest first."""
+    by_ts = {}
+    for item in items:
+        base = timestamp_to_micros(item["timestamp"].split(PART_SEPARATOR)[0]) or 0
+        for chunk in item.get("chunks") or []:
+            try:
+                for tick in decode_chunk(getattr(chunk, "value", chunk), base):
+                    by_ts[tick[0]] = tick
+            except ValueError as e:
+                print(f"Skipping bad tick chunk in {item.get('symbol')} {item.get('timestamp')}: {e}")
+    return [by_ts[ts] for ts in sorted(by_ts)]
+
+
+def as_price_items(symbol: str, ticks: list[tuple[int, float, int]]) -> list[dict]:
+    """Ticks in the shape of the per-tick items (price as a string, like build_item)."""
+    return [
+        {"symbol": symbol, "timestamp": micros_to_timestamp(ts), "price": str(price), "volume": volume}
+        for ts, price, volume in ticks
+    ]
+
+
+# ── writing ──
+
+def group_items(items: list[dict], seconds: int) -> dict[tuple[str, str], list[tuple[int, float, int]]]:
+    """Price items (as build_item makes them) grouped by (symbol, bucket key)."""
+    groups: dict[tuple[str, str], list] = {}
+    for item in items:
+        micros = timestamp_to_micros(item.get("timestamp"))
+        try:
+            price = float(item.get("price"))
+        except (TypeError, ValueError):
+            continue
+        if micros is None or price != price:
+            continue
+        volume = int(item.get("volume") or 0)
+        groups.setdefault((item["symbol"], bucket_key(micros, seconds)), []).append((micros, price, volume))
+    return groups
+
+
+def append_chunk(client, table_name: str, symbol: str, bucket: str, chunk: bytes, ttl: int) -> None:
+    """Append one chunk to the bucket, moving on to overflow parts as items fill up."""
+    part = _parts.get((symbol, bucket), 0)
+    while part < MAX_PARTS:
+        try:
+            client.update_item(
+                TableName=table_name,
+                Key={"symbol": {"S": partition(symbol)}, "timestamp": {"S": part_key(bucket, part)}},
+                UpdateExpression="SET #chunks = list_append(if_not_exists(#chunks, :empty), :chunk), #ttl = :ttl "
+                                 "ADD #bytes :size",
+                ConditionExpression="attribute_not_exists(#bytes) OR #bytes <= :room",
+                ExpressionAttributeNames={"#chunks": "chunks", "#bytes": "chunk_bytes", "#ttl": "ttl"},
+                ExpressionAttributeValues={
+                    ":empty": {"L": []},
+                    ":chunk": {"L": [{"B": chunk}]},
+                    ":size": {"N": str(len(chunk))},
+                    ":room": {"N": str(MAX_ITEM_BYTES - len(chunk))},
+                    ":ttl": {"N": str(ttl)},
+                },
+            )
+            if len(_parts) > 10_000:
+                _parts.clear()
+            _parts[(symbol, bucket)] = part
+            return
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+        part += 1
+    raise RuntimeError(f"Tick bucket {symbol} {bucket} is full after {MAX_PARTS} parts")
+
+
+def append_ticks(client, table_name: str, items: list[dict], seconds: int = DEFAULT_BUCKET_SECONDS,
+                 concurrency: int = 1) -> list[str]:
+    """Append stored price items to their buckets, one UpdateItem per (symbol, bucket);
+    returns the symbols whose append failed."""
+    groups = group_items(items, seconds)
+    if not groups:
+        return []
+
+    def append(entry) -> str | None:
+        (symbol, bucket), ticks = entry
+        base = timestamp_to_micros(bucket)
+        ttl = base // 1_000_000 + seconds + TTL_DAYS * 86400
+        try:
+            append_chunk(client, table_name, symbol, bucket, encode_chunk(ticks, base), ttl)
+            return None
+        except (ClientError, BotoCoreError, RuntimeError) as e:
+            print(f"Tick bucket append failed for {symbol} {bucket}: {e}")
+            return symbol
+
+    if concurrency > 1 and len(groups) > 1:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(groups))) as pool:
+            results = list(pool.map(append, groups.items()))
+    else:
+        results = [append(entry) for entry in groups.items()]
+    return sorted({symbol for symbol in results if symbol})
+
+
+# ── reading ──
+
+def read_range(table, symbol: str, since_micros: int, until_micros: int | None = None,
+               seconds: int = DEFAULT_BUCKET_SECONDS) -> list[tuple[int, float, int]]:
+    """Ticks with since <= timestamp <= until, oldest first, from a resource Table."""
+    until_micros = int(time.time() * 1_000_000) if until_micros is None else until_micros
+    query = {
+        "KeyConditionExpression": "symbol = :p AND #ts BETWEEN :lo AND :hi",
+        "ExpressionAttributeNames": {"#ts": "timestamp"},
+        "ExpressionAttributeValues": {
+            ":p": partition(symbol),
+            ":lo": bucket_key(since_micros, seconds),
+            ":hi": bucket_key(until_micros, seconds) + PART_SEPARATOR * 2,
+        },
+        "ProjectionExpression": "symbol, #ts, chunks",
+    }
+    items = []
+    while True:
+        resp = table.query(**query)
+        items.extend(resp.get("Items", []))
+        if not resp.get("LastEvaluatedKey"):
+            break
+        query["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    return [t for t in merge_items(items) if since_micros <= t[0] <= until_micros]
+
+
+def read_latest(table, symbol: str, before_micros: int, limit: int,
+                seconds: int = DEFAULT_BUCKET_SECONDS) -> list[tuple[int, float, int]]:
+    """Up to `limit` newest ticks strictly before `before_micros`, oldest first.
+
+    Reads buckets newest first until it has enough ticks and has reached a bucket's base
+    item, so every overflow part of the oldest bucket it uses is included.
+    """
+    query = {
+        "KeyConditionExpression": "symbol = :p AND #ts <= :hi",
+        "ExpressionAttributeNames": {"#ts": "timestamp"},
+        "ExpressionAttributeValues": {
+            ":p": partition(symbol),
+            ":hi": bucket_key(before_micros - 1, seconds) + PART_SEPARATOR * 2,
+        },
+        "ProjectionExpression": "symbol, #ts, chunks",
+        "ScanIndexForward": False,
+        "Limit": 4,
+    }
+    items = []
+    while True:
+        resp = table.query(**query)
+        page = resp.get("Items", [])
+        items.extend(page)
+        complete = bool(page) and PART_SEPARATOR not in page[-1]["timestamp"]
+        if not resp.get("LastEvaluatedKey"):
+            break
+        if complete and sum(1 for t in merge_items(items) if t[0] < before_micros) >= limit:
+            break
+        query["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    ticks = [t for t in merge_items(items) if t[0] < before_micros]
+    return ticks[-limit:]
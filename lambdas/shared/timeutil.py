@@ -0,0 +1,11 @@
+"""
+ISO-8601 timestamp formatting for DynamoDB sort keys (candle and bucket starts). Tick
+timestamps on the stream are handled by record_codec (timestamp_to_micros and friends).
+"""
+from datetime import datetime
+
+
+def format_timestamp(dt: datetime) -> str:
+    """ISO form with a "Z" suffix (...T14:32:00Z), as candle keys and query bounds use."""
+    return dt.isoformat().replace("+00:00", "Z")
+
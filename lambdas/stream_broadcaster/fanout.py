@@ -0,0 +1,133 @@
+"""
+Fan-out core for the live stream: per-client symbol subscriptions and a bounded outbox that
+coalesces updates a client has not picked up yet.
+
+Messages are dicts with a "type" ("price", "candle" or "anomaly") and a "symbol". While a
+message waits in an outbox, a newer price for the same symbol (or a newer version of the
+same candle) replaces it in place, so a slow client receives the latest state instead of
+a backlog. Anomalies are never coalesced or dropped; if an outbox overflows, the oldest
+pending price or candle is dropped, and only anomalies may take it past max_pending.
+
+Transport-agnostic: the Lambda broadcaster uses one outbox per connection per invocation,
+the local asyncio server keeps one per connected client.
+"""
+from collections import OrderedDict
+
+MAX_PENDING = 256
+ALL_SYMBOLS = "*"
+
+
+def message_key(message: dict) -> tuple | None:
+    """Coalescing key of a message, or None if it must always be delivered."""
+    kind = message.get("type")
+    if kind == "price":
+        return ("price", message.get("symbol"))
+    if kind == "candle":
+        return ("candle", message.get("symbol"), message.get("candle_timestamp"))
+    return None
+
+
+def parse_symbols(raw) -> frozenset | None:
+    """Subscription from "AAPL,MSFT", a list, or "*"/empty for every symbol (None)."""
+    if raw is None:
+        return None
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    symbols = frozenset(str(s).strip().upper() for s in raw if str(s).strip())
+    if not symbols or ALL_SYMBOLS in symbols:
+        return None
+    return symbols
+
+
+class Outbox:
+    """Pending messages for one client, in first-queued order, coalesced by message_key."""
+
+    def __init__(self, max_pending: int = MAX_PENDING):
+        self.max_pending = max_pending
+        self._pending: OrderedDict = OrderedDict()
+        self._sequence = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def put(self, message: dict) -> None:
+        key = message_key(message)
+        if key is not None and key in self._pending:
+            self._pending[key] = message
+            self.coalesced += 1
+            return
+        if key is None:
+            self._sequence += 1
+            key = ("seq", self._sequence)
+        self._pending[key] = message
+        if len(self._pending) > self.max_pending:
+            self._evict(len(self._pending) - self.max_pending)
+
+    def _evict(self, excess: int) -> None:
+        """Drop the `excess` oldest coalescable messages; anomalies are kept."""
+        victims = []
+        for key in self._pending:
+            if len(victims) == excess:
+                break
+            if key[0] != "seq":
+                victims.append(key)
+        for key in victims:
+            del self._pending[key]
+        self.dropped += len(victims)
+
+    def drain(self, limit: int | None = None) -> list[dict]:
+        """Remove and return up to `limit` pending messages, oldest first."""
+        messages = []
+        while self._pending and (limit is None or len(messages) < limit):
+            messages.append(self._pending.popitem(last=False)[1])
+        return messages
+
+
+class Hub:
+    """Registry of subscribed clients; publish() routes a message into matching outboxes.
+
+    `on_ready(client_id)` is called when a client's outbox goes from empty to non-empty,
+    which is the cue for a transport to wake that client's writer.
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING, on_ready=None):
+        self.max_pending = max_pending
+        self.on_ready = on_ready
+        self._subscriptions: dict[str, frozenset | None] = {}
+        self._outboxes: dict[str, Outbox] = {}
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self, client_id: str, symbols: frozenset | None) -> Outbox:
+        self._subscriptions[client_id] = symbols
+        return self._outboxes.setdefault(client_id, Outbox(self.max_pending))
+
+    def unsubscribe(self, client_id: str) -> None:
+        self._subscriptions.pop(client_id, None)
+        self._outboxes.pop(client_id, None)
+
+    def wants(self, client_id: str, symbol: str) -> bool:
+        symbols = self._subscriptions.get(client_id)
+        return symbols is None or symbol in symbols
+
+    def publish(self, message: dict) -> int:
+        """Queue `message` for every client subscribed to its symbol; returns clients reached."""
+        symbol = message.get("symbol")
+        reached = 0
+        for client_id, symbols in self._subscriptions.items():
+            if symbols is not None and symbol not in symbols:
+                continue
+            outbox = self._outboxes[client_id]
+            was_empty = not outbox
+            outbox.put(message)
+            reached += 1
+            if was_empty and self.on_ready is not None:
+                self.on_ready(client_id)
+        return reached
+
+    def drain(self, client_id: str, limit: int | None = None) -> list[dict]:
+        outbox = self._outboxes.get(client_id)
+        return outbox.drain(limit) if outbox is not None else []
@@ -0,0 +1,291 @@
+"""
+Stream Broadcaster Lambda — pushes live prices, candles and anomalies to browsers over an
+API Gateway WebSocket API, so the dashboard does not have to poll the REST API.
+
+One function serves two kinds of events:
+  * WebSocket routes ($connect, $disconnect, subscribe) maintain the connections table.
+    Clients pick symbols with ?symbols=AAPL,MSFT on connect or by sending
+    {"action": "subscribe", "symbols": [...]}; no symbols means all of them.
+  * DynamoDB Streams from the prices, candles and anomalies tables are turned into
+    messages and fanned out. Prices come from the tick items price_processor writes, so
+    the broadcaster adds no reader to the Kinesis shards. Each connection gets one frame per invocation,
+    {"messages": [...]}, with prices and candles coalesced to their latest value (see
+    fanout.py). Delivery is best effort: nothing is retried and connections that have gone
+    away are removed.
+
+Stage timings, message counts and call counts go out as embedded metrics (see metrics.py).
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+import aws
+from config import env_number
+from fanout import ALL_SYMBOLS, Outbox, parse_symbols
+from metrics import count, instrumented, stage
+from record_codec import parse_float
+
+CONNECTION_TTL_HOURS = 2  # API Gateway closes WebSocket connections after 2 hours
+DEFAULT_CONNECTIONS_CACHE_SECONDS = 5
+DEFAULT_POST_CONCURRENCY = 16
+
+_dynamodb = None
+_management = None
+# Connections scanned from DynamoDB, reused for a few seconds across warm invocations.
+_connections = None
+_connections_loaded_at = 0.0
+
+
+def get_dynamodb():
+    global _dynamodb
+    if _dynamodb is None:
+        _dynamodb = aws.resource("dynamodb")
+    return _dynamodb
+
+
+def get_management(endpoint: str):
+    global _management
+    if _management is None:
+        _management = aws.client("apigatewaymanagementapi", endpoint_url=endpoint)
+    return _management
+
+
+# The management client needs the WebSocket endpoint, so only DynamoDB is preloaded.
+aws.preload(get_dynamodb)
+
+
+def get_connections_table():
+    return get_dynamodb().Table(os.environ.get("CONNECTIONS_TABLE", "finpulse-ws-connections"))
+
+
+def to_json(value):
+    """Make DynamoDB values JSON-friendly: Decimal to int/float, sets to lists."""
+    if isinstance(value, Decimal):
+        return int(value) if value % 1 == 0 else float(value)
+    if isinstance(value, dict):
+        return {k: to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, set, tuple)):
+        return [to_json(v) for v in value]
+    return value
+
+
+# ── WebSocket routes ────────────────────────────────
+
+def save_connection(connection_id: str, symbols: frozenset | None) -> None:
+    ttl = int((datetime.now(timezone.utc) + timedelta(hours=CONNECTION_TTL_HOURS)).timestamp())
+    get_connections_table().put_item(Item={
+        "connection_id": connection_id,
+        "symbols": ",".join(sorted(symbols)) if symbols else ALL_SYMBOLS,
+        "ttl": ttl,
+    })
+
+
+def handle_route(event) -> dict:
+    ctx = event.get("requestContext", {})
+    route = ctx.get("routeKey")
+    connection_id = ctx.get("connectionId")
+
+    if route == "$connect":
+        params = event.get("queryStringParameters") or {}
+        save_connection(connection_id, parse_symbols(params.get("symbols")))
+    elif route == "$disconnect":
+        get_connections_table().delete_item(Key={"connection_id": connection_id})
+    elif route == "subscribe":
+        try:
+            body = json.loads(event.get("body") or "{}")
+        except json.JSONDecodeError:
+            return {"statusCode": 400, "body": "Invalid JSON"}
+        save_connection(connection_id, parse_symbols(body.get("symbols")))
+    else:
+        return {"statusCode": 400, "body": f"Unsupported route: {route}"}
+    return {"statusCode": 200, "body": "ok"}
+
+
+# ── Broadcast sources ───────────────────────────────
+
+def price_message(item: dict) -> dict | None:
+    # "__"-prefixed partitions hold the snapshot, stats counters and tick buckets.
+    symbol = item.get("symbol", "")
+    price = parse_float(item.get("price"))
+    if not symbol or symbol.startswith("__") or price is None:
+        return None
+    return {
+        "type": "price",
+        "symbol": symbol,
+        "price": price,
+        "volume": to_json(item.get("volume", 0)),
+        "change_percent": parse_float(item.get("change_percent"), 0.0),
+        "timestamp": item.get("timestamp"),
+    }
+
+
+def candle_message(item: dict) -> dict | None:
+    # Rollup tiers live in "SYMBOL#5m"-style partitions; only the 1m candles are pushed.
+    # "__"-prefixed partitions hold the aggregator's watermarks and late ticks.
+    symbol = item.get("symbol", "")
+    ts = item.get("candle_timestamp")
+    if not symbol or "#" in symbol or symbol.startswith("__") or not ts:
+        return None
+    message = {"type": "candle", "symbol": symbol, "candle_timestamp": ts}
+    for field in ("open", "high", "low", "close"):
+        message[field] = parse_float(item.get(field))
+    message["volume"] = to_json(item.get("volume", 0))
+    message["num_trades"] = to_json(item.get("num_trades", 0))
+    # The aggregator sets final once the symbol's watermark has passed the candle; that
+    # write is the "candle closed" event, and the candle does not change after it.
+    message["closed"] = bool(item.get("final"))
+    return message
+
+
+def anomaly_message(item: dict) -> dict | None:
+    # "__"-prefixed partitions hold bookkeeping items such as the hourly anomaly counters.
+    symbol = item.get("symbol", "")
+    if not symbol or symbol.startswith("__"):
+        return None
+    message = {"type": "anomaly", **to_json(item)}
+    message.pop("time_bucket", None)
+    for field in ("current_price", "mean_price", "deviation_percent", "z_score"):
+        if field in message:
+            message[field] = parse_float(message[field])
+    return message
+
+
+def stream_message(record: dict) -> dict | None:
+    if record.get("eventName") not in ("INSERT", "MODIFY"):
+        return None
+    image = record.get("dynamodb", {}).get("NewImage")
+    if not image:
+        return None
+    item = aws.deserialize_item(image)
+    if "detected_at" in item:
+        return anomaly_message(item)
+    if "candle_timestamp" in item:
+        return candle_message(item)
+    if "timestamp" in item:
+        return price_message(item)
+    return None
+
+
+def build_messages(records: list) -> list[dict]:
+    messages = []
+    for record in records:
+        message = stream_message(record) if record.get("eventSource") == "aws:dynamodb" else None
+        if message is not None:
+            messages.append(message)
+    return messages
+
+
+# ── Fan-out ─────────────────────────────────────────
+
+def load_connections() -> list[tuple[str, frozenset | None]]:
+    """(connection_id, symbols) for every open connection, cached for a few seconds."""
+    global _connections, _connections_loaded_at
+    max_age = env_number("CONNECTIONS_CACHE_SECONDS", DEFAULT_CONNECTIONS_CACHE_SECONDS, float)
+    if _connections is not None and time.monotonic() - _connections_loaded_at < max_age:
+        return _connections
+
+    table = get_connections_table()
+    scan = {"ProjectionExpression": "connection_id, symbols"}
+    connections = []
+    while True:
+        resp = table.scan(**scan)
+        for item in resp.get("Items", []):
+            connections.append((item["connection_id"], parse_symbols(item.get("symbols"))))
+        if "LastEvaluatedKey" not in resp:
+            break
+        scan["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    _connections = connections
+    _connections_loaded_at = time.monotonic()
+    return connections
+
+
+def forget_connections(connection_ids: set) -> None:
+    global _connections
+    if _connections is not None:
+        _connections = [c for c in _connections if c[0] not in connection_ids]
+    table = get_connections_table()
+    for connection_id in connection_ids:
+        try:
+            table.delete_item(Key={"connection_id": connection_id})
+        except (ClientError, BotoCoreError) as e:
+            print(f"Failed to delete connection {connection_id}: {e}")
+
+
+def post(management, connection_id: str, data: bytes) -> str:
+    """Send one frame; returns "sent", "gone" or "failed"."""
+    try:
+        management.post_to_connection(ConnectionId=connection_id, Data=data)
+        return "sent"
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "GoneException":
+            return "gone"
+        print(f"Failed to post to {connection_id}: {e}")
+    except BotoCoreError as e:
+        print(f"Failed to post to {connection_id}: {e}")
+    return "failed"
+
+
+def broadcast(messages: list[dict], connections: list, management, concurrency: int) -> dict:
+    """Coalesce `messages` per distinct subscription and post one frame per connection."""
+    frames: dict = {}
+    dropped = 0
+    for _, symbols in connections:
+        if symbols in frames:
+            continue
+        outbox = Outbox()
+        for message in messages:
+            if symbols is None or message.get("symbol") in symbols:
+                outbox.put(message)
+        dropped += outbox.dropped
+        frames[symbols] = json.dumps({"messages": outbox.drain()}).encode("utf-8") if outbox else None
+
+    if dropped:
+        count("messages_dropped", dropped)
+        print(f"Outbox overflow: dropped {dropped} price/candle messages")
+
+    targets = [(cid, frames[symbols]) for cid, symbols in connections if frames[symbols] is not None]
+    if not targets:
+        return {"sent": 0, "gone": 0, "failed": 0}
+    workers = max(1, min(concurrency, len(targets)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(lambda t: post(management, t[0], t[1]), targets))
+
+    gone = {cid for (cid, _), outcome in zip(targets, outcomes) if outcome == "gone"}
+    if gone:
+        forget_connections(gone)
+    return {outcome: outcomes.count(outcome) for outcome in ("sent", "gone", "failed")}
+
+
+@instrumented("stream_broadcaster")
+def lambda_handler(event, context):
+    if event.get("requestContext", {}).get("routeKey"):
+        return handle_route(event)
+
+    with stage("decode"):
+        messages = build_messages(event.get("Records", []))
+    count("records", len(event.get("Records", [])))
+    count("messages", len(messages))
+    if not messages:
+        return {"batchItemFailures": [], "messages": 0}
+
+    with stage("connections"):
+        connections = load_connections()
+    if not connections:
+        return {"batchItemFailures": [], "messages": len(messages), "connections": 0}
+
+    endpoint = os.environ.get("WEBSOCKET_ENDPOINT")
+    if not endpoint:
+        raise ValueError("WEBSOCKET_ENDPOINT must be set")
+    concurrency = max(1, env_number("POST_CONCURRENCY", DEFAULT_POST_CONCURRENCY))
+    with stage("publish"):
+        result = broadcast(messages, connections, get_management(endpoint), concurrency)
+    count("connections", len(connections))
+    print(f"Broadcast {len(messages)} messages to {len(connections)} connections: {result}")
+
+    # Pushes are best effort; never make the stream retry a batch for a slow browser.
+    return {"batchItemFailures": [], "messages": len(messages), "connections": len(connections), **result}
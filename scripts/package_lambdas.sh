@@ -4,6 +4,16 @@ set -e
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PROJECT_ROOT="$(cd "$SCRIPT_DIR/.." && pwd)"
 LAMBDAS_DIR="$PROJECT_ROOT/lambdas"
+# Modules every function imports (e.g. record_codec.py, aws.py); copied into each package.
+SHARED_DIR="$LAMBDAS_DIR/shared"
+# /var/task is read-only, so the runtime cannot cache bytecode there and would compile
+# every module on every cold start: packages ship unchecked-hash .pyc files instead
+# (used as-is; zip timestamps would not match timestamp-based ones). Only the runtime's
+# Python version (3.11) can use them.
+PYTHON="${PYTHON:-python3}"
+if ! "$PYTHON" -c 'import sys; sys.exit(sys.implementation.cache_tag != "cpython-311")'; then
+  echo "Warning: $PYTHON is not Python 3.11; the Lambda runtime will ignore its bytecode"
+fi
 
 echo "Packaging Lambda functions from $LAMBDAS_DIR"
 echo "---"
@@ -11,9 +21,11 @@ echo "---"
 for LAMBDA_DIR in "$LAMBDAS_DIR"/*/; do
   [ -d "$LAMBDA_DIR" ] || continue
   NAME="$(basename "$LAMBDA_DIR")"
+  [ "$NAME" = "shared" ] && continue
   echo "Packaging $NAME..."
 
   STAGE="$(mktemp -d)"
+  cp "$SHARED_DIR"/*.py "$STAGE/" 2>/dev/null || true
   cp "$LAMBDA_DIR"/*.py "$STAGE/" 2>/dev/null || true
   if [ ! -f "$STAGE/lambda_function.py" ]; then
     echo "  Skipping $NAME: no lambda_function.py found"
@@ -28,8 +40,11 @@ for LAMBDA_DIR in "$LAMBDAS_DIR"/*/; do
     echo "  No requirements.txt or empty — skipping dependency install"
   fi
 
+  echo "  Compiling bytecode..."
+  "$PYTHON" -m compileall -q -f -j 0 --invalidation-mode unchecked-hash "$STAGE" > /dev/null
+
   echo "  Creating package.zip..."
-  (cd "$STAGE" && zip -r -q package.zip . -x "*.pyc" -x "*__pycache__*")
+  (cd "$STAGE" && zip -r -q package.zip .)
   mv "$STAGE/package.zip" "$LAMBDA_DIR/package.zip"
   rm -rf "$STAGE"
 
@@ -0,0 +1,378 @@
+"""
+Replay archived ticks through the stream consumers in-process: rebuild candles, or re-run
+the anomaly detectors after a threshold change, over weeks of history in minutes.
+
+Sources are the raw data lake (the bucket, or a local directory laid out like it), read
+one raw day at a time, or JSONL files, one file at a time. Each such part is put in
+event-time order, de-duplicated on (symbol, timestamp) and cut into event-time slices;
+every slice goes through the selected handlers in pipeline order (price_processor,
+aggregator, anomaly_detector), each receiving Kinesis-shaped batches as it would from the
+stream, with failed records retried from the first reported sequence number like the
+event source mapping does.
+
+Symbols are spread over --workers threads by hash, the way partition keys map to shards,
+so each symbol's records go through one worker in order. With CORRELATION_ENABLED=true the
+anomaly_detector stage runs on one thread over the whole slice in event-time order
+instead: its correlation engine spans every symbol, is not thread-safe, and drops ticks
+older than the last step it closed. Sequence numbers are derived from the part and the
+record's position in it, so they are identical on every run: --checkpoint resumes at the
+first unfinished slice and re-sends it, and the handlers' idempotency
+(keyed puts, the candles' merged-sequence guard, conditional anomaly writes) makes the
+repeat a no-op. Replayed sequence numbers sort below live Kinesis ones, so candles that
+already hold live data are left alone; rebuild into a fresh candles table. Replayed ticks
+count towards the current minute's /stats ingest counters once: each worker stands in for
+a Kinesis shard ("shardId-replay<worker>" event IDs), and the counters skip sequence
+numbers a shard already counted, including a slice a resumed run re-sends within the
+hour with the same --workers.
+
+--speed paces slices against event time (60 = one hour of history per minute; use a small
+--slice-minutes for smooth pacing), 0 runs flat out. Alerts go nowhere unless
+--publish-alerts is given.
+
+    python scripts/replay.py --lake-bucket finpulse-data-lake --from 2026-01-01 --to 2026-01-21 \\
+        --handlers aggregator --candles-table finpulse-candles-rebuild --workers 8 --checkpoint replay.json
+    python scripts/replay.py --jsonl ./ticks --handlers price_processor,anomaly_detector \\
+        --prices-table finpulse-live-prices --anomaly-table finpulse-anomalies-rerun
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterable, NamedTuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "benchmarks"))
+sys.path.insert(0, str(PROJECT_ROOT / "lambdas" / "lake_compactor"))
+sys.path.insert(0, str(PROJECT_ROOT / "lambdas" / "shared"))
+
+from harness import load_lambda  # noqa: E402
+from raw_lake import LocalStore, S3Store, iter_ticks, parse_event_time, raw_days, raw_prefix  # noqa: E402
+from config import env_flag  # noqa: E402
+from record_codec import encode_record  # noqa: E402
+
+PIPELINE = ("price_processor", "aggregator", "anomaly_detector")
+SEQUENCE_STRIDE = 10 ** 10  # sequence numbers per part: part ordinal * stride + position
+DEFAULT_WORKERS = 4
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_SLICE_MINUTES = 60
+MAX_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 0.2
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class ReplayError(Exception):
+    pass
+
+
+class Part(NamedTuple):
+    name: str
+    ordinal: int
+    load: Callable[[], Iterable[dict]]
+
+
+class ReplayRecord(NamedTuple):
+    event_time: datetime
+    symbol: str
+    sequence: int
+    kinesis: dict
+
+
+class Stage(NamedTuple):
+    name: str
+    handler: Callable
+    env: dict
+    serial: bool = False  # one thread, all symbols in event-time order
+
+
+class DiscardedAlerts:
+    """Takes the anomaly detector's SNS publishes during a replay and only counts them."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def publish(self, **kwargs):
+        with self._lock:
+            self.count += 1
+        return {"MessageId": f"replay-{self.count}"}
+
+
+def _load_day(store, day: date):
+    for key in store.list(raw_prefix(day)):
+        yield from iter_ticks(store.get(key))
+
+
+def _load_file(path: Path):
+    return iter_ticks(path.read_bytes())
+
+
+def lake_parts(store, since: date | None = None, until: date | None = None) -> list[Part]:
+    days = [d for d in raw_days(store) if (since is None or d >= since) and (until is None or d <= until)]
+    return [Part(d.isoformat(), d.toordinal(), partial(_load_day, store, d)) for d in days]
+
+
+def jsonl_parts(path: str | Path) -> list[Part]:
+    path = Path(path)
+    if path.is_file():
+        files = [path]
+    else:
+        files = sorted(p for p in path.rglob("*") if p.is_file() and p.suffix in (".jsonl", ".json"))
+    return [Part(str(f), i + 1, partial(_load_file, f)) for i, f in enumerate(files)]
+
+
+def prepare(part: Part) -> tuple[list[ReplayRecord], int]:
+    """The part's usable ticks in event-time order, the last copy of each (symbol,
+    timestamp) kept, as Kinesis records; plus how many ticks were unusable."""
+    latest = {}
+    skipped = 0
+    for tick in part.load():
+        symbol = str(tick.get("symbol") or "").strip()
+        event_time = parse_event_time(tick.get("timestamp"))
+        if not symbol or event_time is None:
+            skipped += 1
+            continue
+        latest[(symbol, tick["timestamp"])] = (event_time, symbol, tick)
+    ordered = sorted(latest.values(), key=lambda entry: entry[:2])
+    if len(ordered) >= SEQUENCE_STRIDE:
+        raise ReplayError(f"{part.name}: {len(ordered)} ticks exceed the {SEQUENCE_STRIDE} a part can number")
+
+    records = []
+    for position, (event_time, symbol, tick) in enumerate(ordered, start=1):
+        sequence = part.ordinal * SEQUENCE_STRIDE + position
+        records.append(ReplayRecord(event_time, symbol, sequence, {
+            "eventSource": "aws:kinesis",
+            "kinesis": {
+                "partitionKey": symbol,
+                "sequenceNumber": str(sequence),
+                "data": base64.b64encode(encode_record(tick)).decode("ascii"),
+            },
+        }))
+    return records, skipped
+
+
+def slices(records: list[ReplayRecord], minutes: int) -> list[tuple[datetime, list[ReplayRecord]]]:
+    """Consecutive event-time windows of `minutes`, keyed by their start."""
+    width = timedelta(minutes=minutes)
+    grouped: dict[datetime, list[ReplayRecord]] = {}
+    for record in records:
+        start = _EPOCH + (record.event_time - _EPOCH) // width * width
+        grouped.setdefault(start, []).append(record)
+    return sorted(grouped.items())
+
+
+def load_checkpoint(path: str | None) -> dict:
+    state = {"done_parts": [], "part": None, "through": None}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            state.update(json.load(f))
+    return state
+
+
+def save_checkpoint(path: str | None, state: dict) -> None:
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def make_stages(handlers: list[str], prices_table: str | None = None, candles_table: str | None = None,
+                anomaly_table: str | None = None, alerts_topic_arn: str | None = None,
+                publish_alerts: bool = False) -> list[Stage]:
+    """Load the selected handlers in pipeline order with the environment each one reads.
+
+    Clients are created here, before any worker thread exists, so the threads share them.
+    """
+    needs = {
+        "price_processor": {"DYNAMODB_TABLE": prices_table},
+        "aggregator": {"DYNAMODB_TABLE": candles_table},
+        "anomaly_detector": {
+            "DYNAMODB_TABLE": prices_table,
+            "ANOMALY_TABLE": anomaly_table,
+            "SNS_TOPIC_ARN": alerts_topic_arn if publish_alerts else (alerts_topic_arn or "replay:discarded"),
+            # Discarded alerts are all counted, and leave no cooldown claims in the table.
+            **({} if publish_alerts else {"ALERT_COOLDOWN_SECONDS": "0"}),
+        },
+    }
+    unknown = set(handlers) - set(PIPELINE)
+    if unknown:
+        raise ReplayError(f"Unknown handlers: {', '.join(sorted(unknown))}")
+
+    stages = []
+    for name in PIPELINE:
+        if name not in handlers:
+            continue
+        missing = [k for k, v in needs[name].items() if not v]
+        if missing:
+            raise ReplayError(f"{name} needs {', '.join(missing)} (see --help)")
+        module = load_lambda(name)
+        if name == "price_processor":
+            module.get_dynamodb_client()
+        else:
+            module.get_dynamodb()
+        if name == "anomaly_detector":
+            if not publish_alerts:
+                module._sns = DiscardedAlerts()
+            module.get_sns()
+        # Invocations overlap across worker threads, which embedded metrics cannot attribute.
+        serial = name == "anomaly_detector" and env_flag("CORRELATION_ENABLED")
+        stages.append(Stage(name, module.lambda_handler, {**needs[name], "METRICS_ENABLED": "false"}, serial))
+    return stages
+
+
+class Replayer:
+    def __init__(self, stages: list[Stage], workers: int = DEFAULT_WORKERS, batch_size: int = DEFAULT_BATCH_SIZE,
+                 slice_minutes: int = DEFAULT_SLICE_MINUTES, speed: float = 0.0, checkpoint: str | None = None,
+                 sleep=time.sleep, clock=time.monotonic):
+        self.stages = stages
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.slice_minutes = max(1, slice_minutes)
+        self.speed = speed
+        self.checkpoint = checkpoint
+        self.sleep = sleep
+        self.clock = clock
+        self.totals: Counter = Counter()
+        self._lock = threading.Lock()
+        self._origin = None
+
+    def run(self, parts: list[Part]) -> Counter:
+        state = load_checkpoint(self.checkpoint)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="replay") as executor:
+            for part in parts:
+                if part.name in state["done_parts"]:
+                    continue
+                through = state["through"] if state["part"] == part.name else None
+                started = time.perf_counter()
+                records, skipped = prepare(part)
+                replayed = 0
+                for slice_start, batch in slices(records, self.slice_minutes):
+                    if through is not None and slice_start.isoformat() <= through:
+                        continue
+                    self.pace(slice_start)
+                    self.replay_slice(executor, batch)
+                    replayed += len(batch)
+                    state.update(part=part.name, through=slice_start.isoformat())
+                    save_checkpoint(self.checkpoint, state)
+                state["done_parts"].append(part.name)
+                state.update(part=None, through=None)
+                save_checkpoint(self.checkpoint, state)
+
+                elapsed = time.perf_counter() - started
+                self.add({"ticks": replayed, "skipped": skipped})
+                print(f"{part.name}: {replayed} ticks replayed, {skipped} skipped, {elapsed:.1f} s "
+                      f"({replayed / elapsed if elapsed else 0:.0f} ticks/s)")
+        return self.totals
+
+    def pace(self, slice_start: datetime) -> None:
+        if self.speed <= 0:
+            return
+        if self._origin is None:
+            self._origin = (slice_start, self.clock())
+        event_origin, wall_origin = self._origin
+        delay = wall_origin + (slice_start - event_origin).total_seconds() / self.speed - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+
+    def replay_slice(self, executor: ThreadPoolExecutor, records: list[ReplayRecord]) -> None:
+        shards: list[list[ReplayRecord]] = [[] for _ in range(self.workers)]
+        for record in records:
+            worker = zlib.crc32(record.symbol.encode("utf-8")) % self.workers
+            record.kinesis["eventID"] = f"shardId-replay{worker:04d}:{record.sequence}"
+            shards[worker].append(record)
+        shards = [shard for shard in shards if shard]
+        for stage in self.stages:
+            os.environ.update(stage.env)
+            if stage.serial:
+                self.replay_shard(stage, records)
+                continue
+            # list() re-raises the first worker failure here.
+            list(executor.map(partial(self.replay_shard, stage), shards))
+
+    def replay_shard(self, stage: Stage, records: list[ReplayRecord]) -> None:
+        for i in range(0, len(records), self.batch_size):
+            self.deliver(stage, records[i:i + self.batch_size])
+
+    def deliver(self, stage: Stage, records: list[ReplayRecord]) -> None:
+        """Invoke the handler; on reported failures resend from the first failed sequence."""
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            response = stage.handler({"Records": [r.kinesis for r in records]}, None) or {}
+            failures = response.get("batchItemFailures") or []
+            self.add({f"{stage.name}.invocations": 1} | {
+                f"{stage.name}.{k}": v for k, v in response.items()
+                if isinstance(v, int) and not isinstance(v, bool)
+            })
+            if not failures:
+                return
+            first = min(int(f["itemIdentifier"]) for f in failures)
+            records = [r for r in records if r.sequence >= first]
+            self.add({f"{stage.name}.retries": 1})
+            if attempt < MAX_ATTEMPTS:
+                self.sleep(RETRY_BASE_SECONDS * 2 ** attempt)
+        raise ReplayError(f"{stage.name} still failing from sequence {records[0].sequence} after {MAX_ATTEMPTS} attempts")
+
+    def add(self, counts: dict) -> None:
+        with self._lock:
+            self.totals.update(counts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--lake-bucket", help="data lake bucket; replays its raw-data/ days")
+    source.add_argument("--lake-root", help="local directory laid out like the data lake bucket")
+    source.add_argument("--jsonl", help="JSONL file, or directory of .jsonl/.json files replayed in name order")
+    parser.add_argument("--from", dest="since", type=date.fromisoformat, help="first raw day (lake sources)")
+    parser.add_argument("--to", dest="until", type=date.fromisoformat, help="last raw day (lake sources)")
+    parser.add_argument("--handlers", default=",".join(PIPELINE), help="comma separated, run in pipeline order")
+    parser.add_argument("--prices-table", help="price_processor and anomaly_detector DYNAMODB_TABLE")
+    parser.add_argument("--candles-table", help="aggregator DYNAMODB_TABLE")
+    parser.add_argument("--anomaly-table", help="anomaly_detector ANOMALY_TABLE")
+    parser.add_argument("--alerts-topic-arn", help="SNS topic for --publish-alerts")
+    parser.add_argument("--publish-alerts", action="store_true", help="send detected anomalies to SNS")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="parallel symbol shards")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="records per handler invocation")
+    parser.add_argument("--slice-minutes", type=int, default=DEFAULT_SLICE_MINUTES, help="event time per checkpoint")
+    parser.add_argument("--speed", type=float, default=0.0, help="event time per wall time; 0 = unthrottled")
+    parser.add_argument("--checkpoint", help="JSON file to resume from and record progress in")
+    args = parser.parse_args()
+
+    if args.jsonl:
+        parts = jsonl_parts(args.jsonl)
+    else:
+        if args.lake_bucket:
+            import boto3
+
+            store = S3Store(boto3.client("s3"), args.lake_bucket)
+        else:
+            store = LocalStore(args.lake_root)
+        parts = lake_parts(store, args.since, args.until)
+    if not parts:
+        parser.error("no input found")
+
+    try:
+        stages = make_stages(
+            [h.strip() for h in args.handlers.split(",") if h.strip()],
+            args.prices_table, args.candles_table, args.anomaly_table, args.alerts_topic_arn, args.publish_alerts,
+        )
+    except ReplayError as e:
+        parser.error(str(e))
+
+    replayer = Replayer(stages, args.workers, args.batch_size, args.slice_minutes, args.speed, args.checkpoint)
+    started = time.perf_counter()
+    totals = replayer.run(parts)
+    print(json.dumps(dict(sorted(totals.items())) | {"seconds": round(time.perf_counter() - started, 1)}))
+
+
+if __name__ == "__main__":
+    main()
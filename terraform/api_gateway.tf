@@ -3,10 +3,11 @@ resource "aws_apigatewayv2_api" "main" {
   protocol_type = "HTTP"
 
   cors_configuration {
-    allow_origins = ["*"]
-    allow_methods = ["GET", "POST", "OPTIONS"]
-    allow_headers = ["Content-Type"]
-    max_age       = 300
+    allow_origins  = ["*"]
+    allow_methods  = ["GET", "POST", "OPTIONS"]
+    allow_headers  = ["Content-Type", "If-None-Match"]
+    expose_headers = ["ETag"]
+    max_age        = 300
   }
 }
 
@@ -70,6 +71,12 @@ resource "aws_apigatewayv2_route" "get_stats" {
   target    = "integrations/${aws_apigatewayv2_integration.lambda.id}"
 }
 
+resource "aws_apigatewayv2_route" "get_correlations" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "GET /correlations"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda.id}"
+}
+
 # Lambda permission for API Gateway
 resource "aws_lambda_permission" "api_gateway" {
   statement_id  = "AllowAPIGateway"
@@ -77,4 +84,37 @@ resource "aws_lambda_permission" "api_gateway" {
   function_name = aws_lambda_function.api_handler.function_name
   principal     = "apigateway.amazonaws.com"
   source_arn    = "${aws_apigatewayv2_api.main.execution_arn}/*/*"
-}
\ No newline at end of file
+}
+# ── WebSocket API (live push) ──────────────────────
+resource "aws_apigatewayv2_api" "websocket" {
+  name                       = "${var.project_name}-live"
+  protocol_type              = "WEBSOCKET"
+  route_selection_expression = "$request.body.action"
+}
+
+resource "aws_apigatewayv2_stage" "websocket" {
+  api_id      = aws_apigatewayv2_api.websocket.id
+  name        = "live"
+  auto_deploy = true
+}
+
+resource "aws_apigatewayv2_integration" "stream_broadcaster" {
+  api_id           = aws_apigatewayv2_api.websocket.id
+  integration_type = "AWS_PROXY"
+  integration_uri  = aws_lambda_function.stream_broadcaster.invoke_arn
+}
+
+resource "aws_apigatewayv2_route" "ws_routes" {
+  for_each  = toset(["$connect", "$disconnect", "subscribe"])
+  api_id    = aws_apigatewayv2_api.websocket.id
+  route_key = each.value
+  target    = "integrations/${aws_apigatewayv2_integration.stream_broadcaster.id}"
+}
+
+resource "aws_lambda_permission" "api_gateway_websocket" {
+  statement_id  = "AllowAPIGatewayWebSocket"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.stream_broadcaster.function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${aws_apigatewayv2_api.websocket.execution_arn}/*/*"
+}
@@ -35,3 +35,77 @@ resource "aws_athena_named_query" "create_table" {
     TBLPROPERTIES ('has_encrypted_data'='false');
   EOF
 }
+
+# Compacted lake written by the lake_compactor Lambda: one zstd Parquet file per day and
+# symbol, sorted by event_time. Partitions are registered by the compactor as it writes.
+resource "aws_glue_catalog_table" "prices_parquet" {
+  name          = "prices_parquet"
+  database_name = aws_athena_database.main.name
+  table_type    = "EXTERNAL_TABLE"
+
+  parameters = {
+    EXTERNAL              = "TRUE"
+    "parquet.compression" = "ZSTD"
+    classification        = "parquet"
+  }
+
+  partition_keys {
+    name = "dt"
+    type = "string"
+  }
+
+  partition_keys {
+    name = "symbol"
+    type = "string"
+  }
+
+  storage_descriptor {
+    location      = "s3://${aws_s3_bucket.data_lake.id}/curated/prices/"
+    input_format  = "org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat"
+    output_format = "org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat"
+
+    ser_de_info {
+      serialization_library = "org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe"
+    }
+
+    columns {
+      name = "event_time"
+      type = "timestamp"
+    }
+    columns {
+      name = "timestamp"
+      type = "string"
+    }
+    columns {
+      name = "price"
+      type = "double"
+    }
+    columns {
+      name = "volume"
+      type = "bigint"
+    }
+    columns {
+      name = "change_percent"
+      type = "double"
+    }
+    columns {
+      name = "source"
+      type = "string"
+    }
+  }
+}
+
+resource "aws_athena_named_query" "symbol_history" {
+  name      = "symbol-price-history"
+  workgroup = aws_athena_workgroup.main.name
+  database  = aws_athena_database.main.name
+  query     = <<-EOF
+    -- Reads one Parquet file per day; row-group statistics skip hours outside the range.
+    SELECT event_time, price, volume
+    FROM prices_parquet
+    WHERE symbol = 'AAPL'
+      AND dt BETWEEN '2026-01-01' AND '2026-01-31'
+      AND event_time BETWEEN TIMESTAMP '2026-01-05 14:00:00' AND TIMESTAMP '2026-01-05 16:00:00'
+    ORDER BY event_time;
+  EOF
+}
@@ -72,6 +72,75 @@ resource "aws_cloudwatch_dashboard" "main" {
           period = 60
           stat   = "Sum"
         }
+      },
+      # Embedded metrics from lambdas/shared/metrics.py (namespace FinPulse, dimension Function)
+      {
+        type   = "metric"
+        x      = 0
+        y      = 12
+        width  = 12
+        height = 6
+        properties = {
+          title   = "Event-time and iterator lag (max, ms)"
+          region  = "us-east-1"
+          metrics = [
+            ["FinPulse", "event_lag_ms", "Function", "price_processor"],
+            ["FinPulse", "event_lag_ms", "Function", "aggregator"],
+            ["FinPulse", "event_lag_ms", "Function", "anomaly_detector"],
+            ["FinPulse", "iterator_lag_ms", "Function", "price_processor"],
+            ["FinPulse", "iterator_lag_ms", "Function", "aggregator"],
+            ["FinPulse", "iterator_lag_ms", "Function", "anomaly_detector"]
+          ]
+          period = 60
+          stat   = "Maximum"
+        }
+      },
+      {
+        type   = "metric"
+        x      = 12
+        y      = 12
+        width  = 12
+        height = 6
+        properties = {
+          title   = "Hot-path stages (p99, ms)"
+          region  = "us-east-1"
+          metrics = [
+            ["FinPulse", "decode_ms", "Function", "price_processor"],
+            ["FinPulse", "write_ms", "Function", "price_processor"],
+            ["FinPulse", "snapshot_ms", "Function", "price_processor"],
+            ["FinPulse", "write_ms", "Function", "aggregator"],
+            ["FinPulse", "history_ms", "Function", "anomaly_detector"],
+            ["FinPulse", "compute_ms", "Function", "anomaly_detector"],
+            ["FinPulse", "publish_ms", "Function", "anomaly_detector"],
+            ["FinPulse", "publish_ms", "Function", "stream_broadcaster"]
+          ]
+          period = 60
+          stat   = "p99"
+        }
+      },
+      {
+        type   = "metric"
+        x      = 0
+        y      = 18
+        width  = 24
+        height = 6
+        properties = {
+          title   = "AWS calls and retries"
+          region  = "us-east-1"
+          metrics = [
+            ["FinPulse", "dynamodb_calls", "Function", "price_processor"],
+            ["FinPulse", "dynamodb_calls", "Function", "aggregator"],
+            ["FinPulse", "dynamodb_calls", "Function", "anomaly_detector"],
+            ["FinPulse", "sns_calls", "Function", "anomaly_detector"],
+            ["FinPulse", "retries", "Function", "price_processor"],
+            ["FinPulse", "retries", "Function", "aggregator"],
+            ["FinPulse", "retries", "Function", "data_ingester"],
+            ["FinPulse", "sdk_retries", "Function", "price_processor"],
+            ["FinPulse", "sdk_retries", "Function", "anomaly_detector"]
+          ]
+          period = 60
+          stat   = "Sum"
+        }
       }
     ]
   })
@@ -94,3 +163,22 @@ resource "aws_cloudwatch_metric_alarm" "lambda_errors" {
     FunctionName = aws_lambda_function.data_ingester.function_name
   }
 }
+
+# Alarm: ticks reaching the price processor more than 2 minutes after their event time
+resource "aws_cloudwatch_metric_alarm" "price_processor_lag" {
+  alarm_name          = "${var.project_name}-price-processor-lag"
+  comparison_operator = "GreaterThanThreshold"
+  evaluation_periods  = 3
+  metric_name         = "event_lag_ms"
+  namespace           = "FinPulse"
+  period              = 60
+  statistic           = "Maximum"
+  threshold           = 120000
+  treat_missing_data  = "notBreaching"
+  alarm_description   = "Price processor event-time lag above 2 minutes for 3 minutes"
+  alarm_actions       = [aws_sns_topic.anomaly_alerts.arn]
+
+  dimensions = {
+    Function = "price_processor"
+  }
+}
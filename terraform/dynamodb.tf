@@ -4,6 +4,10 @@ resource "aws_dynamodb_table" "live_prices" {
   hash_key     = "symbol"
   range_key    = "timestamp"
 
+  # Feeds the stream broadcaster
+  stream_enabled   = true
+  stream_view_type = "NEW_IMAGE"
+
   attribute {
     name = "symbol"
     type = "S"
@@ -30,6 +34,10 @@ resource "aws_dynamodb_table" "price_candles" {
   hash_key     = "symbol"
   range_key    = "candle_timestamp"
 
+  # Feeds the stream broadcaster
+  stream_enabled   = true
+  stream_view_type = "NEW_IMAGE"
+
   attribute {
     name = "symbol"
     type = "S"
@@ -56,6 +64,10 @@ resource "aws_dynamodb_table" "anomalies" {
   hash_key     = "symbol"
   range_key    = "detected_at"
 
+  # Feeds the stream broadcaster
+  stream_enabled   = true
+  stream_view_type = "NEW_IMAGE"
+
   attribute {
     name = "symbol"
     type = "S"
@@ -66,7 +78,41 @@ resource "aws_dynamodb_table" "anomalies" {
     type = "S"
   }
 
+  # Day bucket ("YYYY-MM-DD") written by the anomaly detector; lets /anomalies read a
+  # time window newest-first without scanning the table.
+  attribute {
+    name = "time_bucket"
+    type = "S"
+  }
+
+  global_secondary_index {
+    name            = "by_time"
+    hash_key        = "time_bucket"
+    range_key       = "detected_at"
+    projection_type = "ALL"
+  }
+
   tags = {
     Name = "${var.project_name}-anomalies"
   }
 }
+
+resource "aws_dynamodb_table" "ws_connections" {
+  name         = "${var.project_name}-ws-connections"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "connection_id"
+
+  attribute {
+    name = "connection_id"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  tags = {
+    Name = "${var.project_name}-ws-connections"
+  }
+}
@@ -23,3 +23,29 @@ resource "aws_lambda_permission" "allow_eventbridge" {
   principal     = "scheduler.amazonaws.com"
   source_arn    = aws_scheduler_schedule.data_ingestion.arn
 }
+
+# Compact the previous day's raw JSON into Parquet once Firehose has flushed it.
+resource "aws_scheduler_schedule" "lake_compaction" {
+  name       = "${var.project_name}-lake-compaction"
+  group_name = "default"
+
+  flexible_time_window {
+    mode = "OFF"
+  }
+
+  schedule_expression          = "cron(15 1 * * ? *)"
+  schedule_expression_timezone = "UTC"
+
+  target {
+    arn      = aws_lambda_function.lake_compactor.arn
+    role_arn = aws_iam_role.scheduler_role.arn
+  }
+}
+
+resource "aws_lambda_permission" "allow_compaction_schedule" {
+  statement_id  = "AllowCompactionSchedule"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.lake_compactor.function_name
+  principal     = "scheduler.amazonaws.com"
+  source_arn    = aws_scheduler_schedule.lake_compaction.arn
+}
@@ -16,6 +16,20 @@ resource "aws_kinesis_firehose_delivery_stream" "s3_delivery" {
     buffering_size     = 5   # MB
     buffering_interval = 300 # seconds (5 min)
 
+    # Binary ticks on the stream are rewritten as one JSON object per line for Athena.
+    processing_configuration {
+      enabled = true
+
+      processors {
+        type = "Lambda"
+
+        parameters {
+          parameter_name  = "LambdaArn"
+          parameter_value = "${aws_lambda_function.lake_transformer.arn}:$LATEST"
+        }
+      }
+    }
+
     cloudwatch_logging_options {
       enabled         = true
       log_group_name  = "/aws/firehose/${var.project_name}"
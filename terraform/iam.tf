@@ -47,17 +47,40 @@ resource "aws_iam_role_policy" "lambda_custom" {
         Action = [
           "dynamodb:PutItem",
           "dynamodb:GetItem",
+          "dynamodb:BatchGetItem",
           "dynamodb:Query",
           "dynamodb:Scan",
           "dynamodb:UpdateItem",
+          "dynamodb:DeleteItem",
           "dynamodb:BatchWriteItem"
         ]
         Resource = [
           aws_dynamodb_table.live_prices.arn,
           aws_dynamodb_table.price_candles.arn,
-          aws_dynamodb_table.anomalies.arn
+          aws_dynamodb_table.anomalies.arn,
+          "${aws_dynamodb_table.anomalies.arn}/index/*",
+          aws_dynamodb_table.ws_connections.arn
         ]
       },
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:GetRecords",
+          "dynamodb:GetShardIterator",
+          "dynamodb:DescribeStream",
+          "dynamodb:ListStreams"
+        ]
+        Resource = [
+          aws_dynamodb_table.live_prices.stream_arn,
+          aws_dynamodb_table.price_candles.stream_arn,
+          aws_dynamodb_table.anomalies.stream_arn
+        ]
+      },
+      {
+        Effect   = "Allow"
+        Action   = "execute-api:ManageConnections"
+        Resource = "${aws_apigatewayv2_api.websocket.execution_arn}/*"
+      },
       {
         Effect = "Allow"
         Action = [
@@ -73,6 +96,11 @@ resource "aws_iam_role_policy" "lambda_custom" {
         ]
         Resource = "${aws_s3_bucket.data_lake.arn}/*"
       },
+      {
+        Effect   = "Allow"
+        Action   = "s3:ListBucket"
+        Resource = aws_s3_bucket.data_lake.arn
+      },
       {
         Effect = "Allow"
         Action = [
@@ -86,7 +114,8 @@ resource "aws_iam_role_policy" "lambda_custom" {
         Effect = "Allow"
         Action = [
           "glue:GetTable",
-          "glue:GetDatabase"
+          "glue:GetDatabase",
+          "glue:BatchCreatePartition"
         ]
         Resource = "*"
       }
@@ -138,6 +167,17 @@ resource "aws_iam_role_policy" "firehose_policy" {
           "kinesis:ListShards"
         ]
         Resource = aws_kinesis_stream.main.arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "lambda:InvokeFunction",
+          "lambda:GetFunctionConfiguration"
+        ]
+        Resource = [
+          aws_lambda_function.lake_transformer.arn,
+          "${aws_lambda_function.lake_transformer.arn}:*"
+        ]
       }
     ]
   })
@@ -167,8 +207,11 @@ resource "aws_iam_role_policy" "scheduler_invoke_lambda" {
     Version = "2012-10-17"
     Statement = [{
       Effect   = "Allow"
-      Action   = "lambda:InvokeFunction"
-      Resource = aws_lambda_function.data_ingester.arn
+      Action = "lambda:InvokeFunction"
+      Resource = [
+        aws_lambda_function.data_ingester.arn,
+        aws_lambda_function.lake_compactor.arn
+      ]
     }]
   })
 }
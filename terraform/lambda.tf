@@ -1,3 +1,14 @@
+# Embedded metrics (lambdas/shared/metrics.py) for every function, and AWS clients
+# created during the init phase rather than on the first invocation (lambdas/shared/aws.py).
+locals {
+  metrics_env = {
+    METRICS_ENABLED     = "true"
+    METRICS_NAMESPACE   = "FinPulse"
+    METRICS_SAMPLE_RATE = var.metrics_sample_rate
+    PRELOAD_AWS_CLIENTS = "true"
+  }
+}
+
 # ── Data Ingester Lambda ──────────────────────────
 resource "aws_lambda_function" "data_ingester" {
   function_name = "${var.project_name}-data-ingester"
@@ -11,10 +22,15 @@ resource "aws_lambda_function" "data_ingester" {
   source_code_hash = filebase64sha256("${path.module}/../lambdas/data_ingester/package.zip")
 
   environment {
-    variables = {
+    variables = merge(local.metrics_env, {
       KINESIS_STREAM_NAME   = aws_kinesis_stream.main.name
       ALPHA_VANTAGE_API_KEY = var.alpha_vantage_api_key
-    }
+      FETCH_CONCURRENCY     = "16"
+      QUOTE_RATE_LIMIT      = "30"
+      RECORD_FORMAT         = "binary"
+      RECORD_AGGREGATION    = "true"
+      AGGREGATION_MAX_BYTES = "51200"
+    })
   }
 }
 
@@ -31,9 +47,13 @@ resource "aws_lambda_function" "price_processor" {
   source_code_hash = filebase64sha256("${path.module}/../lambdas/price_processor/package.zip")
 
   environment {
-    variables = {
-      DYNAMODB_TABLE = aws_dynamodb_table.live_prices.name
-    }
+    variables = merge(local.metrics_env, {
+      DYNAMODB_TABLE          = aws_dynamodb_table.live_prices.name
+      BATCH_WRITE_CONCURRENCY = "4"
+      SNAPSHOT_SHARDS         = "1"
+      STATS_SHARDS            = "1"
+      TICK_BUCKET_SECONDS     = "3600"
+    })
   }
 }
 
@@ -47,6 +67,7 @@ resource "aws_lambda_event_source_mapping" "price_processor_trigger" {
   # Process even if some records fail
   bisect_batch_on_function_error = true
   maximum_retry_attempts         = 3
+  function_response_types        = ["ReportBatchItemFailures"]
 }
 
 # ── Anomaly Detector Lambda ────────────────────────
@@ -62,12 +83,30 @@ resource "aws_lambda_function" "anomaly_detector" {
   source_code_hash = filebase64sha256("${path.module}/../lambdas/anomaly_detector/package.zip")
 
   environment {
-    variables = {
+    variables = merge(local.metrics_env, {
       DYNAMODB_TABLE   = aws_dynamodb_table.live_prices.name
       ANOMALY_TABLE    = aws_dynamodb_table.anomalies.name
       SNS_TOPIC_ARN    = aws_sns_topic.anomaly_alerts.arn
       Z_SCORE_THRESHOLD = "2.5"
-    }
+      ANOMALY_DETECTORS = "zscore"
+      HISTORY_WINDOW   = "30"
+      STATE_CACHE_MAX_SYMBOLS = "1000"
+      STATE_CACHE_TTL_SECONDS = "180"
+      ALERT_COOLDOWN_SECONDS  = "300"
+      ALERT_DIGEST_MAX        = "50"
+      ALERT_CONCURRENCY       = "8"
+      TICK_BUCKET_SECONDS     = "3600"
+      HISTORY_FROM_BUCKETS    = var.history_from_buckets
+      CORRELATION_ENABLED      = "true"
+      CORRELATION_WINDOW       = "120"
+      CORRELATION_MIN_STEPS    = "30"
+      CORRELATION_MAX_SYMBOLS  = "500"
+      CORRELATION_SAVE_SECONDS = "300"
+      MARKET_Z_THRESHOLD       = "3.0"
+      MARKET_BREADTH           = "0.7"
+      DIVERGENCE_Z_THRESHOLD   = "4.0"
+      MIN_PEER_CORRELATION     = "0.5"
+    })
   }
 }
 
@@ -79,6 +118,7 @@ resource "aws_lambda_event_source_mapping" "anomaly_detector_trigger" {
 
   bisect_batch_on_function_error = true
   maximum_retry_attempts         = 3
+  function_response_types        = ["ReportBatchItemFailures"]
 }
 
 # ── Aggregator Lambda ──────────────────────────────
@@ -94,9 +134,11 @@ resource "aws_lambda_function" "aggregator" {
   source_code_hash = filebase64sha256("${path.module}/../lambdas/aggregator/package.zip")
 
   environment {
-    variables = {
-      DYNAMODB_TABLE = aws_dynamodb_table.price_candles.name
-    }
+    variables = merge(local.metrics_env, {
+      DYNAMODB_TABLE           = aws_dynamodb_table.price_candles.name
+      ROLLUP_RESOLUTIONS       = "5m,15m,1h,1d"
+      ALLOWED_LATENESS_SECONDS = "60"
+    })
   }
 }
 
@@ -108,6 +150,7 @@ resource "aws_lambda_event_source_mapping" "aggregator_trigger" {
 
   bisect_batch_on_function_error = true
   maximum_retry_attempts         = 3
+  function_response_types        = ["ReportBatchItemFailures"]
 }
 
 # ── API Handler Lambda ─────────────────────────────
@@ -123,7 +166,7 @@ resource "aws_lambda_function" "api_handler" {
   source_code_hash = filebase64sha256("${path.module}/../lambdas/api_handler/package.zip")
 
   environment {
-    variables = {
+    variables = merge(local.metrics_env, {
       PRICES_TABLE   = aws_dynamodb_table.live_prices.name
       CANDLES_TABLE  = aws_dynamodb_table.price_candles.name
       ANOMALY_TABLE  = aws_dynamodb_table.anomalies.name
@@ -131,6 +174,93 @@ resource "aws_lambda_function" "api_handler" {
       ATHENA_DATABASE  = aws_athena_database.main.name
       ATHENA_WORKGROUP = aws_athena_workgroup.main.name
       ATHENA_OUTPUT    = "s3://${aws_s3_bucket.data_lake.id}/athena-results/"
-    }
+      SNAPSHOT_SHARDS  = "1"
+      STATS_SHARDS     = "1"
+      RESPONSE_CACHE_ENABLED     = "true"
+      RESPONSE_CACHE_MAX_ENTRIES = "512"
+      FANOUT_MAX_WORKERS            = "16"
+      FANOUT_DEADLINE_SECONDS       = "5"
+      DYNAMODB_MAX_POOL_CONNECTIONS = "32"
+      TICK_BUCKET_SECONDS           = "3600"
+      HISTORY_FROM_BUCKETS          = var.history_from_buckets
+    })
+  }
+}
+
+# ── Stream Broadcaster Lambda ──────────────────────
+resource "aws_lambda_function" "stream_broadcaster" {
+  function_name = "${var.project_name}-stream-broadcaster"
+  role          = aws_iam_role.lambda_role.arn
+  handler       = "lambda_function.lambda_handler"
+  runtime       = "python3.11"
+  timeout       = 30
+  memory_size   = 256
+
+  filename         = "${path.module}/../lambdas/stream_broadcaster/package.zip"
+  source_code_hash = filebase64sha256("${path.module}/../lambdas/stream_broadcaster/package.zip")
+
+  environment {
+    variables = merge(local.metrics_env, {
+      CONNECTIONS_TABLE         = aws_dynamodb_table.ws_connections.name
+      WEBSOCKET_ENDPOINT        = "https://${aws_apigatewayv2_api.websocket.id}.execute-api.${var.aws_region}.amazonaws.com/${aws_apigatewayv2_stage.websocket.name}"
+      CONNECTIONS_CACHE_SECONDS = "5"
+      POST_CONCURRENCY          = "16"
+    })
+  }
+}
+
+# Prices, candles and anomalies from their tables' streams. The Kinesis shard already has
+# four readers sharing its 5 GetRecords/s, so the broadcaster follows the prices table instead.
+resource "aws_lambda_event_source_mapping" "stream_broadcaster_tables" {
+  for_each = {
+    prices    = aws_dynamodb_table.live_prices.stream_arn
+    candles   = aws_dynamodb_table.price_candles.stream_arn
+    anomalies = aws_dynamodb_table.anomalies.stream_arn
+  }
+  event_source_arn  = each.value
+  function_name     = aws_lambda_function.stream_broadcaster.arn
+  starting_position = "LATEST"
+  batch_size        = 100
+
+  maximum_batching_window_in_seconds = 0
+  maximum_retry_attempts             = 0
+}
+
+# ── Lake Transformer Lambda (Firehose) ─────────────
+resource "aws_lambda_function" "lake_transformer" {
+  function_name = "${var.project_name}-lake-transformer"
+  role          = aws_iam_role.lambda_role.arn
+  handler       = "lambda_function.lambda_handler"
+  runtime       = "python3.11"
+  timeout       = 60
+  memory_size   = 128
+
+  filename         = "${path.module}/../lambdas/lake_transformer/package.zip"
+  source_code_hash = filebase64sha256("${path.module}/../lambdas/lake_transformer/package.zip")
+
+  environment {
+    variables = local.metrics_env
+  }
+}
+
+# ── Lake Compactor Lambda ──────────────────────────
+resource "aws_lambda_function" "lake_compactor" {
+  function_name = "${var.project_name}-lake-compactor"
+  role          = aws_iam_role.lambda_role.arn
+  handler       = "lambda_function.lambda_handler"
+  runtime       = "python3.11"
+  timeout       = 900
+  memory_size   = 1024
+  layers        = ["arn:aws:lambda:${var.aws_region}:336392948345:layer:AWSSDKPandas-Python311:${var.sdk_pandas_layer_version}"]
+
+  filename         = "${path.module}/../lambdas/lake_compactor/package.zip"
+  source_code_hash = filebase64sha256("${path.module}/../lambdas/lake_compactor/package.zip")
+
+  environment {
+    variables = merge(local.metrics_env, {
+      DATA_LAKE_BUCKET = aws_s3_bucket.data_lake.id
+      GLUE_DATABASE    = aws_athena_database.main.name
+      GLUE_TABLE       = aws_glue_catalog_table.prices_parquet.name
+    })
   }
 }
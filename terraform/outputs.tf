@@ -18,3 +18,8 @@ output "cloudwatch_dashboard_url" {
 output "sns_topic_arn" {
   value = aws_sns_topic.anomaly_alerts.arn
 }
+
+output "websocket_endpoint" {
+  value       = aws_apigatewayv2_stage.websocket.invoke_url
+  description = "WebSocket URL for live prices, candles and anomalies (VITE_STREAM_URL)"
+}
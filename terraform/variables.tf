@@ -19,7 +19,22 @@ variable "alert_email" {
   type        = string
 }
 
+variable "sdk_pandas_layer_version" {
+  description = "Version of the AWS-published AWSSDKPandas-Python311 layer that provides pyarrow to the lake compactor"
+  default     = "12"
+}
+
 variable "environment" {
   description = "Environment (dev/prod)"
   default     = "dev"
 }
+
+variable "metrics_sample_rate" {
+  description = "Share of Lambda invocations that emit embedded metrics (0-1)"
+  default     = "1"
+}
+
+variable "history_from_buckets" {
+  description = "Serve price history and detector windows from the tick buckets; turn on once buckets hold 7 days of ticks"
+  default     = "false"
+}
@@ -0,0 +1,14 @@
+"""
+The lambdas import their siblings and lambdas/shared/ by bare name, as they do in the
+deployed zip; benchmarks/harness.py sets that up and benchmarks/stubs.py stands in for
+AWS, so both are reused here.
+"""
+import sys
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent.parent / "benchmarks"
+SHARED_DIR = BENCHMARKS_DIR.parent / "lambdas" / "shared"
+
+for path in (SHARED_DIR, BENCHMARKS_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
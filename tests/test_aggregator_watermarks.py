@@ -0,0 +1,110 @@
+from botocore.exceptions import ClientError
+import pytest
+
+from harness import kinesis_event, load_lambda
+from stubs import StubDynamoDB, StubTable
+
+
+class FlakyTable(StubTable):
+    """Fails writes to the candles listed in `failing` until they are cleared."""
+
+    def __init__(self):
+        super().__init__("candles", "symbol", "candle_timestamp")
+        self.failing = set()
+
+    def update_item(self, Key: dict, UpdateExpression: str, **kwargs):
+        if (Key["symbol"], Key["candle_timestamp"]) in self.failing:
+            raise ClientError({"Error": {"Code": "ProvisionedThroughputExceededException", "Message": "slow down"}},
+                              "UpdateItem")
+        return super().update_item(Key=Key, UpdateExpression=UpdateExpression, **kwargs)
+
+
+@pytest.fixture
+def aggregator(monkeypatch):
+    module = load_lambda("aggregator")
+    monkeypatch.setenv("DYNAMODB_TABLE", "candles")
+    monkeypatch.setenv("ROLLUP_RESOLUTIONS", "")
+    monkeypatch.setenv("ALLOWED_LATENESS_SECONDS", "0")
+    module.watermarks.STATES.clear()
+    table = FlakyTable()
+    monkeypatch.setattr(module, "_dynamodb", StubDynamoDB(table))
+    yield module, table
+    module.watermarks.STATES.clear()
+
+
+def tick(timestamp: str, price: float = 100.0) -> dict:
+    return {"symbol": "SYM", "timestamp": timestamp, "price": price, "volume": 10}
+
+
+def final_candles(table: StubTable) -> set[str]:
+    return {key[1] for key, item in table.items.items() if key[0] == "SYM" and item.get("final")}
+
+
+def test_candles_finalize_once_the_watermark_passes(aggregator):
+    module, table = aggregator
+    module.lambda_handler(kinesis_event([tick("2024-01-02T10:00:05Z"), tick("2024-01-02T10:01:05Z")]), None)
+    assert final_candles(table) == {"2024-01-02T10:00:00Z"}
+
+    module.lambda_handler(kinesis_event([tick("2024-01-02T10:03:00Z")], first_sequence=3), None)
+    assert final_candles(table) == {"2024-01-02T10:00:00Z", "2024-01-02T10:01:00Z"}
+
+
+def test_retry_after_a_failed_merge_still_finalizes_the_candles_merged_before_it(aggregator):
+    module, table = aggregator
+    table.failing.add(("SYM", "2024-01-02T10:01:00Z"))
+    first = module.lambda_handler(
+        kinesis_event([tick("2024-01-02T10:00:05Z"), tick("2024-01-02T10:01:05Z")]), None
+    )
+    assert first["batchItemFailures"] == [{"itemIdentifier": "2"}]
+    assert ("SYM", "2024-01-02T10:00:00Z") in table.items
+
+    # Kinesis redelivers from the failed record on; record 1 is not seen again.
+    table.failing.clear()
+    module.watermarks.STATES.clear()  # the retry may land on a fresh container
+    retry = module.lambda_handler(kinesis_event([tick("2024-01-02T10:01:05Z")], first_sequence=2), None)
+    assert retry["batchItemFailures"] == []
+
+    module.lambda_handler(kinesis_event([tick("2024-01-02T10:03:00Z")], first_sequence=3), None)
+    assert final_candles(table) == {"2024-01-02T10:00:00Z", "2024-01-02T10:01:00Z"}
+
+
+def test_late_ticks_are_set_aside_and_final_candles_never_change(aggregator):
+    module, table = aggregator
+    module.lambda_handler(kinesis_event([tick("2024-01-02T10:00:05Z"), tick("2024-01-02T10:02:00Z")]), None)
+    final = dict(table.items[("SYM", "2024-01-02T10:00:00Z")])
+    assert final["final"] is True
+
+    result = module.lambda_handler(kinesis_event([tick("2024-01-02T10:00:30Z", price=500.0)], first_sequence=3), None)
+    assert result["late"] == 1
+    assert table.items[("SYM", "2024-01-02T10:00:00Z")] == final
+    late = [key for key in table.items if key[0] == f"{module.watermarks.LATE_PREFIX}#SYM"]
+    assert len(late) == 1 and late[0][1].startswith("2024-01-02T10:00:30")
+
+
+def test_records_at_or_below_merged_through_are_replays(aggregator):
+    module, table = aggregator
+    event = kinesis_event([tick("2024-01-02T10:00:05Z"), tick("2024-01-02T10:00:10Z")])
+    module.lambda_handler(event, None)
+    before = {key: dict(item) for key, item in table.items.items()}
+
+    result = module.lambda_handler(event, None)
+    assert result["replayed"] == 2
+    assert result["processed"] == 0
+    assert table.items == before
+
+
+def test_rollups_take_the_whole_batch_after_a_failed_minute_is_retried(aggregator, monkeypatch):
+    module, table = aggregator
+    monkeypatch.setenv("ROLLUP_RESOLUTIONS", "5m")
+    event = kinesis_event([tick("2024-01-02T10:00:05Z", price=90.0), tick("2024-01-02T10:01:05Z")])
+    table.failing.add(("SYM", "2024-01-02T10:00:00Z"))
+    first = module.lambda_handler(event, None)
+    assert first["batchItemFailures"] == [{"itemIdentifier": "1"}, {"itemIdentifier": "2"}]
+    assert ("SYM#5m", "2024-01-02T10:00:00Z") not in table.items
+
+    table.failing.clear()
+    retry = module.lambda_handler(event, None)
+    assert retry["batchItemFailures"] == []
+    rollup = table.items[("SYM#5m", "2024-01-02T10:00:00Z")]
+    assert (rollup["open"], rollup["low"], rollup["high"]) == (90, 90, 100)
+    assert (rollup["volume"], rollup["num_trades"]) == (20, 2)
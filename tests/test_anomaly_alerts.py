@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from harness import load_lambda
+from stubs import StubDynamoDBClient, StubSNS, StubTable
+
+
+@pytest.fixture(scope="module")
+def alerts():
+    return load_lambda("anomaly_detector").alerts
+
+
+def alert(symbol: str, direction: str, z_score: float, severity: str = "MEDIUM") -> dict:
+    return {"symbol": symbol, "direction": direction, "z_score": z_score, "severity": severity}
+
+
+def test_a_batch_sends_one_alert_per_symbol_and_direction_the_strongest(alerts):
+    sns = StubSNS()
+    batch = [alert("AAPL", "SPIKE", 3.1), alert("AAPL", "SPIKE", -4.2), alert("AAPL", "DROP", 3.5),
+             alert("MSFT", "SPIKE", 3.0, "HIGH")]
+    result = alerts.send_alerts(sns, "topic", batch, alerts.Cooldowns(), alerts.MemoryCooldowns())
+    assert (result["alerts_sent"], result["alerts_suppressed"], result["alert_messages"]) == (3, 1, 1)
+
+    body = json.loads(sns.published[0]["Message"])
+    assert body["count"] == 3
+    assert [(a["symbol"], a["direction"]) for a in body["alerts"]] == [("MSFT", "SPIKE"), ("AAPL", "SPIKE"),
+                                                                      ("AAPL", "DROP")]
+    spike = body["alerts"][1]
+    assert (spike["z_score"], spike["occurrences"]) == (-4.2, 2)
+
+
+def test_a_lone_alert_keeps_the_single_anomaly_format(alerts):
+    sns = StubSNS()
+    alerts.send_alerts(sns, "topic", [alert("AAPL", "SPIKE", 3.1)], alerts.Cooldowns(), alerts.MemoryCooldowns())
+    assert sns.published[0]["Subject"] == "FinPulse Anomaly: AAPL SPIKE (MEDIUM)"
+    assert json.loads(sns.published[0]["Message"]) == alert("AAPL", "SPIKE", 3.1)
+
+
+def test_cooldown_holds_across_containers_until_the_window_ends(alerts):
+    table = StubTable("anomalies", "symbol", "detected_at")
+    store = alerts.DynamoDBCooldowns(StubDynamoDBClient(table), "anomalies")
+    clock = {"now": 1000.0}
+    first, second = alerts.Cooldowns(lambda: clock["now"]), alerts.Cooldowns(lambda: clock["now"])
+    sns = StubSNS()
+    batch = [alert("AAPL", "SPIKE", 3.1)]
+
+    assert alerts.send_alerts(sns, "topic", batch, first, store, cooldown_seconds=300)["alerts_sent"] == 1
+    # Another container reading a different shard loses the conditional claim.
+    assert alerts.send_alerts(sns, "topic", batch, second, store, cooldown_seconds=300)["alerts_suppressed"] == 1
+    # Both now know the hold, so a repeat inside the window costs no round trip.
+    claims = first.claims + second.claims
+    alerts.send_alerts(sns, "topic", batch, second, store, cooldown_seconds=300)
+    assert first.claims + second.claims == claims and second.local_hits == 1
+
+    clock["now"] += 300
+    assert alerts.send_alerts(sns, "topic", batch, second, store, cooldown_seconds=300)["alerts_sent"] == 1
+    assert len(sns.published) == 2
@@ -0,0 +1,66 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from harness import load_lambda
+from stubs import StubDynamoDB, StubTable
+
+api = load_lambda("api_handler")
+
+
+@pytest.fixture
+def anomalies(monkeypatch):
+    for name in ("PRICES_TABLE", "CANDLES_TABLE", "ANOMALY_TABLE"):
+        monkeypatch.setenv(name, name.lower())
+    monkeypatch.setenv("RESPONSE_CACHE_ENABLED", "false")
+    table = StubTable("anomaly_table", "symbol", "detected_at", indexes={"by_time": ("time_bucket", "detected_at")})
+    tables = [StubTable("prices_table", "symbol", "timestamp"), StubTable("candles_table", "symbol", "candle_timestamp"),
+              table]
+    monkeypatch.setattr(api, "_dynamodb", StubDynamoDB(*tables))
+    now = datetime.now(timezone.utc)
+    # Hours ago; 26 and up fall in the previous day bucket whatever the time of day.
+    for symbol, hours_ago, severity in [("AAPL", 1, "HIGH"), ("MSFT", 2, "MEDIUM"), ("AAPL", 3, "MEDIUM"),
+                                        ("TSLA", 26, "HIGH"), ("AAPL", 27, "HIGH"), ("MSFT", 60, "HIGH")]:
+        dt = now - timedelta(hours=hours_ago)
+        table.put_item(Item={"symbol": symbol, "detected_at": dt.isoformat().replace("+00:00", "Z"),
+                             "time_bucket": dt.strftime("%Y-%m-%d"), "severity": severity})
+    return table
+
+
+def get(query: dict) -> dict:
+    event = {"requestContext": {"http": {"method": "GET"}}, "rawPath": "/anomalies", "queryStringParameters": query}
+    return api.lambda_handler(event, None)
+
+
+def all_pages(query: dict) -> list[list[tuple[str, str]]]:
+    pages, cursor = [], None
+    while True:
+        resp = get({**query, **({"cursor": cursor} if cursor else {})})
+        assert resp["statusCode"] == 200
+        body = json.loads(resp["body"])
+        pages.append([(a["symbol"], a["severity"]) for a in body["anomalies"]])
+        assert all("time_bucket" not in a for a in body["anomalies"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_cursor_pages_walk_every_day_bucket_newest_first_without_repeats(anomalies):
+    pages = all_pages({"limit": "2", "hours": "48"})
+    assert pages == [[("AAPL", "HIGH"), ("MSFT", "MEDIUM")], [("AAPL", "MEDIUM"), ("TSLA", "HIGH")],
+                     [("AAPL", "HIGH")]]
+
+
+def test_cursor_pages_keep_the_symbol_and_severity_filters(anomalies):
+    assert all_pages({"limit": "1", "hours": "48", "symbol": "aapl"}) == [
+        [("AAPL", "HIGH")], [("AAPL", "MEDIUM")], [("AAPL", "HIGH")]]
+    assert sum(all_pages({"limit": "1", "hours": "168", "severity": "high"}), []) == [
+        ("AAPL", "HIGH"), ("TSLA", "HIGH"), ("AAPL", "HIGH"), ("MSFT", "HIGH")]
+
+
+def test_a_cursor_that_is_not_ours_is_rejected(anomalies):
+    for cursor in ("not-a-cursor", api.encode_cursor("1999-01-01", None)):
+        resp = get({"cursor": cursor})
+        assert resp["statusCode"] == 400
+        assert json.loads(resp["body"])["error"] == "Invalid cursor"
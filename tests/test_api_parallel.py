@@ -0,0 +1,22 @@
+from harness import load_lambda
+
+load_lambda("api_handler")  # puts the handler's modules on sys.path
+from parallel import run_parallel  # noqa: E402
+
+
+def test_tasks_run_and_report_failures():
+    def boom():
+        raise RuntimeError("boom")
+
+    results, missing = run_parallel({"a": lambda: 1, "b": lambda: 2, "c": boom}, 5.0)
+    assert results == {"a": 1, "b": 2}
+    assert missing == ["c"]
+
+
+def test_no_task_starts_once_the_deadline_has_passed():
+    calls = []
+    for tasks in ({"only": lambda: calls.append("only")}, {"a": lambda: calls.append("a"), "b": lambda: calls.append("b")}):
+        results, missing = run_parallel(tasks, 0.0)
+        assert results == {}
+        assert sorted(missing) == sorted(tasks)
+    assert calls == []
@@ -0,0 +1,85 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from harness import load_lambda
+from stubs import StubDynamoDB, StubTable
+
+api = load_lambda("api_handler")
+from response_cache import MemoryStore, ResponseCache  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def anomalies(monkeypatch):
+    for name in ("PRICES_TABLE", "CANDLES_TABLE", "ANOMALY_TABLE"):
+        monkeypatch.setenv(name, name.lower())
+    monkeypatch.delenv("RESPONSE_CACHE_ENABLED", raising=False)
+    table = StubTable("anomaly_table", "symbol", "detected_at")
+    tables = [StubTable("prices_table", "symbol", "timestamp"), StubTable("candles_table", "symbol", "candle_timestamp"),
+              table]
+    monkeypatch.setattr(api, "_dynamodb", StubDynamoDB(*tables))
+    clock = Clock()
+    monkeypatch.setattr(api, "_response_cache", ResponseCache(shared=MemoryStore(clock), clock=clock))
+    add_anomaly(table, minutes_ago=5)
+    return table, clock
+
+
+def add_anomaly(table: StubTable, minutes_ago: int) -> None:
+    detected_at = (datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)).isoformat().replace("+00:00", "Z")
+    table.put_item(Item={"symbol": "AAPL", "detected_at": detected_at, "severity": "HIGH", "z_score": "4.1"})
+
+
+def get(headers: dict | None = None) -> dict:
+    event = {"requestContext": {"http": {"method": "GET"}}, "rawPath": "/anomalies",
+             "queryStringParameters": {"symbol": "AAPL"}, "headers": headers or {}}
+    return api.lambda_handler(event, None)
+
+
+def test_a_matching_if_none_match_gets_a_bodyless_304_without_a_query(anomalies):
+    table, _ = anomalies
+    first = get()
+    assert first["statusCode"] == 200
+    etag = first["headers"]["ETag"]
+    assert first["headers"]["Cache-Control"] == "public, max-age=5"
+    assert json.loads(first["body"])["count"] == 1
+
+    queries = table.calls["Query"]
+    for header in (etag, f'"stale", W/{etag}', "*"):
+        resp = get({"If-None-Match": header})
+        assert (resp["statusCode"], resp["body"], resp["headers"]["ETag"]) == (304, "", etag)
+    assert get({"If-None-Match": '"stale"'})["body"] == first["body"]
+    assert table.calls["Query"] == queries
+
+
+def test_a_changed_response_gets_a_new_etag_once_the_entry_expires(anomalies):
+    table, clock = anomalies
+    etag = get()["headers"]["ETag"]
+    add_anomaly(table, minutes_ago=1)
+    assert get({"If-None-Match": etag})["statusCode"] == 304
+
+    clock.now += 5
+    resp = get({"If-None-Match": etag})
+    assert resp["statusCode"] == 200
+    assert resp["headers"]["ETag"] != etag
+    assert json.loads(resp["body"])["count"] == 2
+
+
+def test_another_container_answers_from_the_shared_tier_with_the_same_etag(anomalies, monkeypatch):
+    table, clock = anomalies
+    shared = api._response_cache.shared
+    etag = get()["headers"]["ETag"]
+
+    cold = ResponseCache(shared=shared, clock=clock)
+    monkeypatch.setattr(api, "_response_cache", cold)
+    queries = table.calls["Query"]
+    assert get({"If-None-Match": etag})["statusCode"] == 304
+    assert (cold.shared_hits, table.calls["Query"]) == (1, queries)
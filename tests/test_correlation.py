@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from harness import load_lambda
+
+SECOND = 1_000_000
+
+
+@pytest.fixture(scope="module")
+def correlation():
+    return load_lambda("anomaly_detector").correlation
+
+
+def engine(correlation, symbols=("AAA", "BBB", "CCC")):
+    eng = correlation.CorrelationEngine(window=10, step_seconds=60, min_steps=2)
+    eng.track(symbols)
+    return eng
+
+
+def play(eng, rounds: list[dict[str, float]], start: int = 0) -> None:
+    """Feed one round per minute, every symbol in it, and close each round."""
+    for n, prices in enumerate(rounds):
+        micros = start + n * 60 * SECOND
+        for symbol, price in prices.items():
+            eng.add(symbol, micros, price, f"t{micros}")
+        eng.flush()
+
+
+def test_a_step_closes_when_all_report_a_symbol_reports_again_or_time_runs_out(correlation):
+    eng = engine(correlation)
+    eng.add("AAA", 0, 100.0, "t0")
+    eng.add("BBB", 0, 50.0, "t0")
+    assert eng.flush() == [] and len(eng.pending) == 2
+
+    # AAA's next round closes the split one; CCC kept no price, so no returns yet.
+    eng.add("AAA", 60 * SECOND, 101.0, "t1")
+    assert (eng.steps, eng.through_us, len(eng.pending)) == (0, 0, 1)
+    eng.add("BBB", 60 * SECOND, 51.0, "t1")
+    eng.add("CCC", 60 * SECOND, 20.0, "t1")
+    eng.flush()
+    assert eng.steps == 1 and not eng.pending
+    assert eng.means[0] == pytest.approx(eng.alpha * np.log(101 / 100))
+
+    # A tick a whole step after the open one's first closes it without the others.
+    eng.add("BBB", 120 * SECOND, 52.0, "t2")
+    eng.add("AAA", 180 * SECOND, 102.0, "t3")
+    assert eng.steps == 2 and list(eng.pending) == [0]
+    assert eng.last_prices[2] == 20.0
+
+
+def test_ticks_at_or_before_the_last_closed_step_are_ignored(correlation):
+    eng = engine(correlation)
+    play(eng, [{"AAA": 100.0, "BBB": 50.0, "CCC": 20.0}, {"AAA": 101.0, "BBB": 51.0, "CCC": 21.0}])
+    means, steps = eng.means.copy(), eng.steps
+
+    assert eng.add("AAA", 60 * SECOND, 500.0, "replay") == []
+    assert eng.add("BBB", 0, 500.0, "replay") == []
+    assert eng.add("ZZZ", 120 * SECOND, 1.0, "untracked") == []
+    assert eng.ignored == 3
+    assert not eng.pending and eng.steps == steps
+    np.testing.assert_array_equal(eng.means, means)
+
+
+def test_a_restored_engine_carries_on_like_the_one_it_was_saved_from(correlation):
+    rng = np.random.default_rng(25)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (12, 3)), axis=0))
+    rounds = [dict(zip(("AAA", "BBB", "CCC"), row)) for row in prices]
+    saved = engine(correlation)
+    play(saved, rounds[:8])
+
+    restored = correlation.CorrelationEngine(window=10, step_seconds=60, min_steps=2)
+    restored.restore(saved.snapshot())
+    assert restored.symbols == saved.symbols
+    assert (restored.steps, restored.through_us) == (saved.steps, saved.through_us)
+    np.testing.assert_allclose(restored.cov, saved.cov, rtol=1e-6)
+
+    # Replayed ticks stay ignored after the restore, and new rounds move both the same way.
+    assert restored.add("AAA", 7 * 60 * SECOND, 1.0, "replay") == []
+    play(saved, rounds[8:], start=8 * 60 * SECOND)
+    play(restored, rounds[8:], start=8 * 60 * SECOND)
+    np.testing.assert_allclose(restored.means, saved.means)
+    np.testing.assert_allclose(restored.cov, saved.cov, rtol=1e-5)
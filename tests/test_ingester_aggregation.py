@@ -0,0 +1,57 @@
+from harness import load_lambda
+from stubs import StubKinesis
+
+load_lambda("data_ingester")  # puts the ingester's modules on sys.path
+from aggregation import ShardMap, aggregate, hash_key  # noqa: E402
+from record_codec import decode_records, encode_record  # noqa: E402
+
+SYMBOLS = [f"SYM{i:02d}" for i in range(24)]
+
+
+def ticks(rounds: int = 5) -> list[dict]:
+    return [
+        {"symbol": symbol, "price": 100.0 + n, "volume": n, "timestamp": f"2026-01-05T14:3{n}:00+00:00"}
+        for n in range(rounds) for symbol in SYMBOLS
+    ]
+
+
+def shard_map(shards: int = 4) -> ShardMap:
+    return ShardMap(StubKinesis(shards=shards).list_shards()["Shards"])
+
+
+def test_aggregates_stay_within_one_shard_and_the_size_bound_and_expand_in_order():
+    records = ticks()
+    shards, max_bytes = shard_map(), 300
+    aggregates = aggregate([(r["symbol"], encode_record(r)) for r in records], shards, max_bytes)
+    assert len(aggregates) < len(records)
+
+    received = {}
+    for agg in aggregates:
+        assert len(agg.data) <= max_bytes
+        routed = agg.explicit_hash_key if agg.explicit_hash_key is not None else hash_key(agg.partition_key)
+        shard = shards.shard_for(routed)
+        decoded = decode_records(agg.data)
+        assert len(decoded) == agg.count
+        # Every tick lands on the shard its own partition key would have reached alone.
+        assert {shards.shard_for(hash_key(r["symbol"])) for r in decoded} == {shard}
+        received.setdefault(shard, []).extend(decoded)
+
+    assert sum(map(len, received.values())) == len(records)
+    for symbol in SYMBOLS:
+        sent = [r["price"] for r in records if r["symbol"] == symbol]
+        (arrived,) = [[r["price"] for r in rows if r["symbol"] == symbol] for rows in received.values()
+                      if any(r["symbol"] == symbol for r in rows)]
+        assert arrived == sent
+
+
+def test_without_a_shard_map_ticks_are_grouped_by_partition_key_and_lone_ticks_go_plain():
+    records = ticks(rounds=2) + [{"symbol": "LONE", "price": 1.0, "volume": 1, "timestamp": "2026-01-05T14:30:00Z"}]
+    aggregates = aggregate([(r["symbol"], encode_record(r)) for r in records], None)
+    assert len(aggregates) == len(SYMBOLS) + 1
+    for agg in aggregates:
+        assert {r["symbol"] for r in decode_records(agg.data)} == {agg.partition_key}
+
+    lone = aggregates[-1]
+    assert lone.count == 1 and lone.data == encode_record(records[-1])
+    assert "ExplicitHashKey" not in lone.entry()
+    assert aggregates[0].entry()["ExplicitHashKey"] == str(hash_key(SYMBOLS[0]))
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from harness import kinesis_event, load_lambda
+from stubs import StubDynamoDBClient, StubTable
+
+SHARD = "shardId-000000000000"
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    module = load_lambda("price_processor")
+    import stats_counters
+
+    monkeypatch.setenv("DYNAMODB_TABLE", "prices")
+    monkeypatch.setenv("TICK_BUCKET_SECONDS", "0")
+    monkeypatch.setattr(stats_counters, "_marks", {})
+    table = StubTable("prices", "symbol", "timestamp")
+    monkeypatch.setattr(module, "_dynamodb_client", StubDynamoDBClient(table))
+    return module, table, stats_counters
+
+
+def ticks(*timestamps: str) -> list[dict]:
+    return [{"symbol": "SYM", "timestamp": ts, "price": 100.0, "volume": 10} for ts in timestamps]
+
+
+def shard_event(records: list[dict], first_sequence: int) -> dict:
+    event = kinesis_event(records, first_sequence=first_sequence)
+    for record in event["Records"]:
+        record["eventID"] = f"{SHARD}:{record['kinesis']['sequenceNumber']}"
+    return event
+
+
+def counters(table: StubTable) -> list[dict]:
+    return [item for key, item in table.items.items() if key[0].startswith("__stats__#")]
+
+
+def counted_events(table: StubTable) -> int:
+    return sum(int(item.get("events", 0)) for item in counters(table))
+
+
+def test_redelivered_records_are_counted_once(processor):
+    module, table, stats_counters = processor
+    event = shard_event(ticks("2026-01-05T10:00:00Z", "2026-01-05T10:01:00Z"), first_sequence=100)
+    module.lambda_handler(event, None)
+    module.lambda_handler(event, None)
+    assert counted_events(table) == 2
+
+    # A cold container reads the mark back; a replay numbered below it adds nothing.
+    stats_counters._marks.clear()
+    module.lambda_handler(shard_event(ticks("2026-01-05T09:59:00Z"), first_sequence=5), None)
+    assert counted_events(table) == 2
+
+    module.lambda_handler(shard_event(ticks("2026-01-05T10:02:00Z"), first_sequence=102), None)
+    assert counted_events(table) == 3
+
+    # The marks live on the counter items, not in an item of their own.
+    assert {item["symbol"] for item in counters(table)} == {"__stats__#0"}
+    assert all(f"counted#{SHARD}" in item for item in counters(table))
+
+
+def test_a_retry_in_the_next_minute_on_a_cold_container_is_skipped(processor):
+    _, table, stats_counters = processor
+    client = StubDynamoDBClient(table)
+    stored = [{"symbol": "SYM", "timestamp": "2026-01-05T10:00:00Z"}]
+    sequences = {("SYM", "2026-01-05T10:00:00Z"): ["7"]}
+    now = datetime(2026, 1, 5, 10, 0, 50, tzinfo=timezone.utc)
+    stats_counters.record_batch(client, "prices", stored, 0, shards=4, now=now, sequences=sequences, source=SHARD)
+
+    stats_counters._marks.clear()
+    stats_counters.record_batch(client, "prices", stored, 0, shards=4, now=now + timedelta(minutes=1),
+                                sequences=sequences, source=SHARD)
+    assert counted_events(table) == 1
+    assert len({item["symbol"] for item in counters(table)}) == 1
+
+
+def test_records_from_the_first_failure_on_wait_for_the_retry(processor):
+    _, _, stats_counters = processor
+    stored = [{"symbol": "SYM", "timestamp": f"2026-01-05T10:0{i}:00Z"} for i in range(3)]
+    sequences = {("SYM", item["timestamp"]): [str(10 + i)] for i, item in enumerate(stored)}
+    retry_from = stats_counters.sequence_key("11")
+
+    fresh, mark = stats_counters.first_deliveries(stored, sequences, "", retry_from)
+    assert [item["timestamp"] for item in fresh] == ["2026-01-05T10:00:00Z"]
+    assert mark == stats_counters.sequence_key("10")
+
+    # The retry redelivers 11 and 12, which are counted then.
+    fresh, mark = stats_counters.first_deliveries(stored[1:], sequences, mark)
+    assert len(fresh) == 2
+    assert mark == stats_counters.sequence_key("12")
@@ -0,0 +1,111 @@
+import base64
+import math
+
+import pytest
+
+from record_codec import (
+    AGGREGATE_V1, JSON_MARKER, NO_TIMESTAMP, VERSION_1, decode_batch, decode_record, decode_records,
+    encode_aggregate, encode_record, split_aggregate, timestamp_to_micros,
+)
+
+TICK = {
+    "symbol": "AAPL",
+    "price": 187.25,
+    "volume": 1200,
+    "change_percent": -0.42,
+    "timestamp": "2026-01-05T14:30:00.123456+00:00",
+    "source": "finnhub",
+}
+
+
+def kinesis(data: bytes, sequence: int = 1) -> dict:
+    return {"kinesis": {"sequenceNumber": str(sequence), "data": base64.b64encode(data).decode("ascii")}}
+
+
+@pytest.mark.parametrize("record", [
+    TICK,
+    {**TICK, "symbol": "BRK.B", "source": "some-feed"},  # both inline
+    {k: v for k, v in TICK.items() if k != "source"},
+])
+def test_v1_round_trip(record):
+    data = encode_record(record)
+    assert data[0] == VERSION_1
+    assert decode_record(data) == record
+    assert decode_records(data) == [record]
+
+
+@pytest.mark.parametrize("record", [
+    {**TICK, "price": 187},  # int price would come back as a float
+    {**TICK, "timestamp": "2026-01-05T14:30:00Z"},  # the sort key must stay byte for byte
+    {**TICK, "exchange": "XNAS"},
+    {**TICK, "symbol": "X" * 300},
+    {**TICK, "source": None},
+])
+def test_lossy_records_fall_back_to_json(record):
+    data = encode_record(record)
+    assert data[0] == JSON_MARKER
+    assert decode_record(data) == record
+
+
+def test_json_rows_keep_the_original_dict():
+    sent = {"symbol": " MSFT ", "price": "410.5", "volume": None}
+    batch = decode_batch([kinesis(encode_record(sent, binary=False))])
+    assert batch.failed == 0
+    assert batch.symbols == ["MSFT"]
+    assert batch.timestamps_us[0] == NO_TIMESTAMP
+    assert batch.prices[0] == 410.5
+    assert batch.volumes[0] == 0
+    assert math.isnan(batch.change_percents[0])
+    assert batch.record(0) == sent
+    assert batch.timestamp(0) == ""
+
+
+def test_aggregate_expands_to_every_record_with_the_shared_sequence():
+    second = {**TICK, "symbol": "MSFT", "price": 410.5}
+    legacy = {"symbol": "TSLA", "price": 250, "timestamp": "2026-01-05T14:30:01Z"}
+    data = encode_aggregate([encode_record(TICK), encode_record(second), encode_record(legacy, binary=False)])
+    assert data[0] == AGGREGATE_V1
+    assert decode_records(data) == [TICK, second, legacy]
+
+    batch = decode_batch([kinesis(data, sequence=7)])
+    assert len(batch) == 3 and batch.failed == 0
+    assert batch.symbols == ["AAPL", "MSFT", "TSLA"]
+    assert batch.timestamps_us[2] == timestamp_to_micros(legacy["timestamp"])
+    assert {r["kinesis"]["sequenceNumber"] for r in batch.kinesis_records} == {"7"}
+    assert [batch.record(i) for i in range(3)] == [TICK, second, legacy]
+
+
+def test_aggregates_do_not_nest():
+    with pytest.raises(ValueError):
+        encode_aggregate([encode_aggregate([encode_record(TICK)])])
+
+
+@pytest.mark.parametrize("cut", [1, 3, 10])
+def test_truncated_v1_record_is_rejected(cut):
+    data = encode_record(TICK)[:-cut]
+    with pytest.raises(ValueError):
+        decode_record(data)
+    batch = decode_batch([kinesis(data), kinesis(encode_record(TICK), sequence=2)])
+    assert batch.failed == 1
+    assert batch.symbols == ["AAPL"]
+
+
+def test_truncated_aggregate_is_rejected():
+    data = encode_aggregate([encode_record(TICK), encode_record(TICK)])
+    with pytest.raises(ValueError):
+        split_aggregate(data[:-4])
+    assert decode_batch([kinesis(data[:-4])]).failed == 1
+
+
+def test_bad_record_inside_an_aggregate_costs_only_itself():
+    data = encode_aggregate([encode_record(TICK), encode_record(TICK)[:5], b"\x07junk"])
+    batch = decode_batch([kinesis(data)])
+    assert len(batch) == 1
+    assert batch.failed == 2
+
+
+def test_empty_and_unknown_records_are_rejected():
+    for data in (b"", b"\x09abc"):
+        with pytest.raises(ValueError):
+            decode_record(data)
+    assert decode_batch([kinesis(b""), {"kinesis": {}}]).failed == 2
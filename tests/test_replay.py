@@ -0,0 +1,53 @@
+import importlib.util
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "replay.py"
+
+
+@pytest.fixture(scope="module")
+def replay():
+    spec = importlib.util.spec_from_file_location("replay", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def fake_lambda(name):
+    return SimpleNamespace(lambda_handler=None, get_dynamodb=lambda: None, get_sns=lambda: None)
+
+
+def test_the_anomaly_detector_runs_serially_only_with_correlation_on(replay, monkeypatch):
+    monkeypatch.setattr(replay, "load_lambda", fake_lambda)
+    monkeypatch.setenv("CORRELATION_ENABLED", "true")
+    stages = replay.make_stages(["aggregator", "anomaly_detector"], "prices", "candles", "anomalies")
+    assert [(s.name, s.serial) for s in stages] == [("aggregator", False), ("anomaly_detector", True)]
+
+    monkeypatch.setenv("CORRELATION_ENABLED", "false")
+    stages = replay.make_stages(["anomaly_detector"], "prices", "candles", "anomalies")
+    assert not stages[0].serial
+
+
+def test_a_serial_stage_gets_the_whole_slice_in_event_time_order_on_one_thread(replay):
+    start = datetime(2026, 1, 5, 10, tzinfo=timezone.utc)
+    symbols = ["AAPL", "MSFT", "NVDA", "TSLA", "JPM", "V"] * 3
+    records = [
+        replay.ReplayRecord(start + timedelta(seconds=i), symbol, i + 1,
+                            {"eventSource": "aws:kinesis", "kinesis": {"partitionKey": symbol, "sequenceNumber": str(i + 1)}})
+        for i, symbol in enumerate(symbols)
+    ]
+    calls = []
+
+    def handler(event, context):
+        calls.append((threading.get_ident(), [int(r["kinesis"]["sequenceNumber"]) for r in event["Records"]]))
+        return {}
+
+    replayer = replay.Replayer([replay.Stage("anomaly_detector", handler, {}, serial=True)], workers=4)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        replayer.replay_slice(executor, records)
+    assert calls == [(threading.get_ident(), list(range(1, len(symbols) + 1)))]
@@ -0,0 +1,27 @@
+import pytest
+
+from harness import load_lambda
+
+
+@pytest.fixture(scope="module")
+def broadcaster():
+    return load_lambda("stream_broadcaster")
+
+
+def stream_record(broadcaster, item: dict) -> dict:
+    aws = broadcaster.aws
+    return {"eventSource": "aws:dynamodb", "eventName": "INSERT", "dynamodb": {"NewImage": aws.serialize_item(item)}}
+
+
+def test_prices_come_from_the_prices_table_stream_and_reserved_partitions_are_skipped(broadcaster):
+    tick = {"symbol": "AAPL", "timestamp": "2024-01-02T10:00:05Z", "price": "187.12", "volume": 300,
+            "change_percent": "-0.4", "ttl": 1}
+    records = [
+        stream_record(broadcaster, tick),
+        stream_record(broadcaster, {"symbol": "__latest__#0", "timestamp": "snapshot", "prices": {}}),
+        stream_record(broadcaster, {"symbol": "__ticks__#AAPL", "timestamp": "2024-01-02T10", "price": "1"}),
+    ]
+    assert broadcaster.build_messages(records) == [{
+        "type": "price", "symbol": "AAPL", "price": 187.12, "volume": 300, "change_percent": -0.4,
+        "timestamp": "2024-01-02T10:00:05Z",
+    }]
@@ -0,0 +1,55 @@
+import pytest
+
+from tick_buckets import (
+    CHUNK_VERSION, MAX_DECIMALS, PART_SEPARATOR, decode_chunk, encode_chunk, merge_items, price_decimals,
+)
+
+BASE = 1_767_621_600_000_000  # 2026-01-05T14:00:00Z
+MINUTE = 60_000_000
+
+
+def test_round_trip_sorts_and_keeps_values():
+    ticks = [(BASE + 2 * MINUTE, 187.3, 900), (BASE + MINUTE, 187.25, 1200), (BASE, 187.0, 0)]
+    data = encode_chunk(ticks, BASE)
+    assert data[0] == CHUNK_VERSION
+    assert data[1] == 2
+    assert decode_chunk(data, BASE) == sorted(ticks)
+
+
+def test_deltas_may_go_negative():
+    ticks = [(BASE, 250.5, 5000), (BASE + 1, 0.0001, 1), (BASE + 2, 99_999.99, 10 ** 12)]
+    assert decode_chunk(encode_chunk(ticks, BASE), BASE) == ticks
+
+
+def test_a_tick_a_minute_at_cent_prices_packs_small():
+    ticks = [(BASE + i * MINUTE, 187.0 + (i % 7) / 100, 1000 + i) for i in range(60)]
+    data = encode_chunk(ticks, BASE)
+    assert len(data) <= 8 * len(ticks)
+    assert decode_chunk(data, BASE) == ticks
+
+
+def test_empty_chunk():
+    assert decode_chunk(encode_chunk([], BASE), BASE) == []
+
+
+def test_price_decimals_stop_at_the_cap():
+    assert price_decimals([1.0, 2.0]) == 0
+    assert price_decimals([1.5, 2.25]) == 2
+    assert price_decimals([1 / 3]) == MAX_DECIMALS
+
+
+@pytest.mark.parametrize("data", [b"", b"\x09\x02\x01", encode_chunk([(BASE, 1.5, 10), (BASE + 1, 1.75, 20)], BASE)[:-1]])
+def test_unknown_or_truncated_chunks_are_rejected(data):
+    with pytest.raises(ValueError):
+        decode_chunk(data, BASE)
+
+
+def test_merge_keeps_the_last_written_tick_per_timestamp():
+    first = encode_chunk([(BASE, 10.0, 1), (BASE + MINUTE, 11.0, 1)], BASE)
+    replayed = encode_chunk([(BASE + MINUTE, 11.5, 2)], BASE)
+    items = [
+        {"symbol": "__ticks__#SYM", "timestamp": "2026-01-05T14:00:00Z", "chunks": [first, b"\x09bad", replayed]},
+        {"symbol": "__ticks__#SYM", "timestamp": f"2026-01-05T14:00:00Z{PART_SEPARATOR}1",
+         "chunks": [encode_chunk([(BASE + 2 * MINUTE, 12.0, 3)], BASE)]},
+    ]
+    assert merge_items(items) == [(BASE, 10.0, 1), (BASE + MINUTE, 11.5, 2), (BASE + 2 * MINUTE, 12.0, 3)]